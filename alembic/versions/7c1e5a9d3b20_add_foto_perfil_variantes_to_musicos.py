@@ -0,0 +1,28 @@
+"""add_foto_perfil_variantes_to_musicos
+
+Revision ID: 7c1e5a9d3b20
+Revises: 442b9e7f242c
+Create Date: 2026-10-19 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5a9d3b20'
+down_revision: Union[str, None] = '442b9e7f242c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('musicos', sa.Column('foto_perfil_variantes', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('musicos', 'foto_perfil_variantes')
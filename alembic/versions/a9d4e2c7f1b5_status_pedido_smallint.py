@@ -0,0 +1,68 @@
+"""status_pedido_smallint
+
+Revision ID: a9d4e2c7f1b5
+Revises: f3a8c6e0b2d4
+Create Date: 2026-10-19 20:31:47.603218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e2c7f1b5'
+down_revision: Union[str, None] = 'f3a8c6e0b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesmos códigos de app.models.CODIGOS_STATUS_PEDIDO. Texto desconhecido (ou NULL) vira pendente.
+_PARA_CODIGO = "CASE status_pedido WHEN 'atendido' THEN '1' WHEN 'recusado' THEN '2' ELSE '0' END"
+_PARA_TEXTO = "CASE status_pedido WHEN 1 THEN 'atendido' WHEN 2 THEN 'recusado' ELSE 'pendente' END"
+_CODIGO_PARA_TEXTO = "CASE status_pedido WHEN '1' THEN 'atendido' WHEN '2' THEN 'recusado' ELSE 'pendente' END"
+_CHECK = "status_pedido IN (0, 1, 2)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_pedidos_musica_pendentes', table_name='pedidos_musica')
+    # Índice comum em status: três valores, nunca seletivo; as consultas usam o parcial abaixo
+    op.drop_index(op.f('ix_pedidos_musica_status_pedido'), table_name='pedidos_musica')
+
+    for tabela in ('pedidos_musica', 'pedidos_musica_arquivo'):
+        # Primeiro o texto vira o código ('0'/'1'/'2'), depois a coluna muda de tipo ('1'::smallint / CAST no SQLite)
+        op.execute(f"UPDATE {tabela} SET status_pedido = {_PARA_CODIGO}")
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.alter_column(
+                'status_pedido', existing_type=sa.String(), type_=sa.SmallInteger(), nullable=False,
+                server_default=sa.text('0') if tabela == 'pedidos_musica' else None,
+                postgresql_using='status_pedido::smallint',
+            )
+            batch_op.create_check_constraint(f'ck_{tabela}_status_pedido', _CHECK)
+
+    op.create_index(
+        'ix_pedidos_musica_pendentes', 'pedidos_musica', ['musico_id', 'data_hora_pedido', 'id'], unique=False,
+        postgresql_where=sa.text('status_pedido = 0'), sqlite_where=sa.text('status_pedido = 0'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pedidos_musica_pendentes', table_name='pedidos_musica')
+    for tabela in ('pedidos_musica_arquivo', 'pedidos_musica'):
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.drop_constraint(f'ck_{tabela}_status_pedido', type_='check')
+            batch_op.alter_column(
+                'status_pedido', existing_type=sa.SmallInteger(), type_=sa.String(),
+                nullable=tabela == 'pedidos_musica', server_default=None,
+                postgresql_using=_PARA_TEXTO,
+            )
+        # No SQLite o CAST da recriação deixa '0'/'1'/'2'; no PostgreSQL o USING já converteu
+        op.execute(f"UPDATE {tabela} SET status_pedido = {_CODIGO_PARA_TEXTO} WHERE status_pedido IN ('0', '1', '2')")
+
+    op.create_index(op.f('ix_pedidos_musica_status_pedido'), 'pedidos_musica', ['status_pedido'], unique=False)
+    op.create_index(
+        'ix_pedidos_musica_pendentes', 'pedidos_musica', ['musico_id', 'data_hora_pedido', 'id'], unique=False,
+        postgresql_where=sa.text("status_pedido = 'pendente'"), sqlite_where=sa.text("status_pedido = 'pendente'"),
+    )
@@ -0,0 +1,72 @@
+"""create_series_shows
+
+Revision ID: b6f1d9a3e5c7
+Revises: a9d4e2c7f1b5
+Create Date: 2026-10-19 21:12:40.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f1d9a3e5c7'
+down_revision: Union[str, None] = 'a9d4e2c7f1b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesma expressão de app.models.agora_utc (hora do banco, em UTC sem fuso)
+_AGORA_UTC = {
+    'postgresql': "timezone('utc', statement_timestamp())",
+    'sqlite': "(strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    agora = _AGORA_UTC.get(op.get_bind().dialect.name, 'CURRENT_TIMESTAMP')
+    op.create_table('series_shows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('musico_id', sa.Integer(), nullable=False),
+    sa.Column('frequencia', sa.String(), nullable=False),
+    sa.Column('intervalo', sa.Integer(), nullable=False),
+    sa.Column('dias_semana', sa.JSON(), nullable=True),
+    sa.Column('data_hora_inicio', sa.DateTime(), nullable=False),
+    sa.Column('data_fim', sa.DateTime(), nullable=True),
+    sa.Column('max_ocorrencias', sa.Integer(), nullable=True),
+    sa.Column('excecoes', sa.JSON(), nullable=False),
+    sa.Column('local_nome', sa.String(), nullable=False),
+    sa.Column('local_endereco', sa.String(), nullable=True),
+    sa.Column('descricao_evento', sa.Text(), nullable=True),
+    sa.Column('link_evento', sa.String(), nullable=True),
+    sa.Column('expandida_ate', sa.DateTime(), nullable=False),
+    sa.Column('encerrada', sa.Boolean(), nullable=False),
+    sa.Column('data_hora_cadastro', sa.DateTime(), server_default=sa.text(agora), nullable=False),
+    sa.CheckConstraint("frequencia IN ('semanal', 'mensal')", name='ck_series_shows_frequencia'),
+    sa.CheckConstraint('intervalo >= 1', name='ck_series_shows_intervalo'),
+    sa.ForeignKeyConstraint(['musico_id'], ['musicos.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_series_shows_id'), 'series_shows', ['id'], unique=False)
+    op.create_index(op.f('ix_series_shows_musico_id'), 'series_shows', ['musico_id'], unique=False)
+    op.create_index(op.f('ix_series_shows_expandida_ate'), 'series_shows', ['expandida_ate'], unique=False)
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.add_column(sa.Column('serie_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_shows_serie_id_series_shows', 'series_shows', ['serie_id'], ['id'], ondelete='SET NULL')
+    op.create_index('ux_shows_serie_id_data_hora_evento', 'shows', ['serie_id', 'data_hora_evento'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_shows_serie_id_data_hora_evento', table_name='shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_constraint('fk_shows_serie_id_series_shows', type_='foreignkey')
+        batch_op.drop_column('serie_id')
+
+    op.drop_index(op.f('ix_series_shows_expandida_ate'), table_name='series_shows')
+    op.drop_index(op.f('ix_series_shows_musico_id'), table_name='series_shows')
+    op.drop_index(op.f('ix_series_shows_id'), table_name='series_shows')
+    op.drop_table('series_shows')
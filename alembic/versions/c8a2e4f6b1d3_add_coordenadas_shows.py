@@ -0,0 +1,48 @@
+"""add_coordenadas_shows
+
+Revision ID: c8a2e4f6b1d3
+Revises: b6f1d9a3e5c7
+Create Date: 2026-10-19 21:58:06.274190
+
+"""
+import contextlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8a2e4f6b1d3'
+down_revision: Union[str, None] = 'b6f1d9a3e5c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sem backfill: os shows existentes só têm o endereço em texto; ficam fora de /shows/proximos até serem editados
+    for tabela in ('shows', 'series_shows'):
+        op.add_column(tabela, sa.Column('latitude', sa.Float(), nullable=True))
+        op.add_column(tabela, sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('shows', sa.Column('geocelula', sa.BigInteger(), nullable=True))
+
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # Como nos demais índices de shows: CONCURRENTLY no PostgreSQL para não travar os cadastros
+    with op.get_context().autocommit_block() if postgres else contextlib.nullcontext():
+        op.create_index(
+            'ix_shows_geocelula_data_hora_evento', 'shows', ['geocelula', 'data_hora_evento'], unique=False,
+            postgresql_concurrently=postgres,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shows_geocelula_data_hora_evento', table_name='shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_column('geocelula')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+    with op.batch_alter_table('series_shows') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
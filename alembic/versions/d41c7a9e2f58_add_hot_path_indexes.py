@@ -0,0 +1,53 @@
+"""add_hot_path_indexes
+
+Revision ID: d41c7a9e2f58
+Revises: b3e8f1a2c4d6
+Create Date: 2026-10-19 18:22:41.906315
+
+"""
+import contextlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c7a9e2f58'
+down_revision: Union[str, None] = 'b3e8f1a2c4d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_SO_PENDENTES = "status_pedido = 'pendente'"
+
+# (nome, tabela, colunas, where do índice parcial). Os de pedidos_musica já levam o id no fim (desempate
+# da ordenação por data), para que e7b2d5f1a9c3 não precise reconstruí-los no PostgreSQL
+_INDICES = [
+    ('ix_itens_repertorio_musico_id_id', 'itens_repertorio', ['musico_id', 'id'], None),
+    ('ix_shows_musico_id_data_hora_evento', 'shows', ['musico_id', 'data_hora_evento'], None),
+    ('ix_pedidos_musica_musico_id_data_hora_pedido', 'pedidos_musica', ['musico_id', 'data_hora_pedido', 'id'], None),
+    ('ix_pedidos_musica_solicitante_id_data_hora_pedido', 'pedidos_musica', ['solicitante_id', 'data_hora_pedido', 'id'], None),
+    ('ix_pedidos_musica_pendentes', 'pedidos_musica', ['musico_id', 'data_hora_pedido', 'id'], _SO_PENDENTES),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # No PostgreSQL, CONCURRENTLY para não travar escritas em pedidos_musica durante a criação
+    # (não roda dentro de transação, daí o autocommit_block)
+    with op.get_context().autocommit_block() if postgres else contextlib.nullcontext():
+        for nome, tabela, colunas, where in _INDICES:
+            op.create_index(
+                nome, tabela, colunas, unique=False,
+                postgresql_concurrently=postgres,
+                postgresql_where=sa.text(where) if where else None,
+                sqlite_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for nome, tabela, _, _ in reversed(_INDICES):
+        op.drop_index(nome, table_name=tabela)
+
@@ -0,0 +1,159 @@
+"""create_locais
+
+Revision ID: d5b9f3a7c2e1
+Revises: c8a2e4f6b1d3
+Create Date: 2026-10-19 22:41:15.830462
+
+"""
+import contextlib
+import difflib
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b9f3a7c2e1'
+down_revision: Union[str, None] = 'c8a2e4f6b1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesma expressão de app.models.agora_utc (hora do banco, em UTC sem fuso)
+_AGORA_UTC = {
+    'postgresql': "timezone('utc', statement_timestamp())",
+    'sqlite': "(strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+}
+
+# Cópia das regras de app/locais.py na data desta migração (a migração não importa o app)
+_LIMIAR_NOME = 0.88
+_LIMIAR_ENDERECO = 0.8
+_ARTIGOS_INICIAIS = ("o ", "a ", "os ", "as ", "the ")
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def _normalizar(texto):
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return _NAO_ALFANUMERICO.sub(" ", sem_acento.lower()).strip()
+
+
+def _chave_nome(nome):
+    normalizado = _normalizar(nome)
+    for artigo in _ARTIGOS_INICIAIS:
+        if normalizado.startswith(artigo):
+            normalizado = normalizado[len(artigo):]
+            break
+    return normalizado.replace(" ", "") or nome
+
+
+def _mesmo_local(local, chave, endereco):
+    nota = 1.0 if local["chave"] == chave else difflib.SequenceMatcher(None, local["chave"], chave).ratio()
+    if nota < _LIMIAR_NOME:
+        return 0.0
+    if local["endereco_normalizado"] and endereco and difflib.SequenceMatcher(None, local["endereco_normalizado"], endereco).ratio() < _LIMIAR_ENDERECO:
+        return 0.0
+    return nota
+
+
+def _agrupar_locais_existentes() -> None:
+    """Um local por grupo de (nome, endereço) equivalentes nos shows e séries já gravados; a grafia mais usada dá o nome."""
+    conexao = op.get_bind()
+    grafias = conexao.execute(sa.text(
+        "SELECT local_nome, local_endereco, SUM(usos) AS usos FROM ("
+        " SELECT local_nome, local_endereco, COUNT(*) AS usos FROM shows GROUP BY local_nome, local_endereco"
+        " UNION ALL SELECT local_nome, local_endereco, COUNT(*) AS usos FROM series_shows GROUP BY local_nome, local_endereco"
+        ") grafias GROUP BY local_nome, local_endereco ORDER BY usos DESC, local_nome, local_endereco"
+    )).all()
+
+    locais, por_bloco, destino = [], {}, {}
+    for nome, endereco, _ in grafias:
+        chave, endereco_normalizado = _chave_nome(nome), _normalizar(endereco)
+        pontuados = [(_mesmo_local(local, chave, endereco_normalizado), local) for local in por_bloco.get(chave[:4], [])]
+        pontuados = [(nota, local) for nota, local in pontuados if nota > 0]
+        if pontuados:
+            local = max(pontuados, key=lambda par: (par[0], -par[1]["id"]))[1]
+        else:
+            local = {
+                "id": len(locais) + 1, "nome": nome.strip(), "endereco": endereco, "chave": chave, "bloco": chave[:4],
+                "endereco_normalizado": endereco_normalizado,
+            }
+            locais.append(local)
+            por_bloco.setdefault(local["bloco"], []).append(local)
+        destino[(nome, endereco)] = local["id"]
+    if not locais:
+        return
+
+    op.bulk_insert(sa.table(
+        'locais', sa.column('id', sa.Integer), sa.column('nome', sa.String), sa.column('endereco', sa.String),
+        sa.column('chave', sa.String), sa.column('bloco', sa.String), sa.column('endereco_normalizado', sa.String),
+    ), locais)
+    if conexao.dialect.name == 'postgresql':
+        op.execute("SELECT setval(pg_get_serial_sequence('locais', 'id'), (SELECT MAX(id) FROM locais))")
+
+    for tabela in ('shows', 'series_shows'):
+        com_endereco = [{"local_id": local_id, "nome": nome, "endereco": endereco} for (nome, endereco), local_id in destino.items() if endereco is not None]
+        sem_endereco = [{"local_id": local_id, "nome": nome} for (nome, endereco), local_id in destino.items() if endereco is None]
+        if com_endereco:
+            conexao.execute(sa.text(f"UPDATE {tabela} SET local_id = :local_id WHERE local_nome = :nome AND local_endereco = :endereco"), com_endereco)
+        if sem_endereco:
+            conexao.execute(sa.text(f"UPDATE {tabela} SET local_id = :local_id WHERE local_nome = :nome AND local_endereco IS NULL"), sem_endereco)
+    op.execute(
+        "UPDATE locais SET"
+        " latitude = (SELECT MIN(latitude) FROM shows WHERE shows.local_id = locais.id AND shows.latitude IS NOT NULL),"
+        " longitude = (SELECT MIN(longitude) FROM shows WHERE shows.local_id = locais.id AND shows.latitude IS NOT NULL)"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    agora = _AGORA_UTC.get(op.get_bind().dialect.name, 'CURRENT_TIMESTAMP')
+    op.create_table('locais',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(), nullable=False),
+    sa.Column('endereco', sa.String(), nullable=True),
+    sa.Column('chave', sa.String(), nullable=False),
+    sa.Column('bloco', sa.String(), nullable=False),
+    sa.Column('endereco_normalizado', sa.String(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('data_hora_cadastro', sa.DateTime(), server_default=sa.text(agora), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('chave', 'endereco_normalizado', name='uq_locais_chave_endereco_normalizado')
+    )
+    op.create_index(op.f('ix_locais_id'), 'locais', ['id'], unique=False)
+    op.create_index(op.f('ix_locais_bloco'), 'locais', ['bloco'], unique=False)
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.add_column(sa.Column('local_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_shows_local_id_locais', 'locais', ['local_id'], ['id'])
+    with op.batch_alter_table('series_shows') as batch_op:
+        batch_op.add_column(sa.Column('local_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_series_shows_local_id_locais', 'locais', ['local_id'], ['id'])
+
+    # O agrupamento lê os dados: no modo --sql (offline) não há o que ler; rode esta migração conectado
+    if not op.get_context().as_sql:
+        _agrupar_locais_existentes()
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block() if postgres else contextlib.nullcontext():
+        op.create_index(
+            'ix_shows_local_id_data_hora_evento', 'shows', ['local_id', 'data_hora_evento'], unique=False,
+            postgresql_concurrently=postgres,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shows_local_id_data_hora_evento', table_name='shows')
+    with op.batch_alter_table('series_shows') as batch_op:
+        batch_op.drop_constraint('fk_series_shows_local_id_locais', type_='foreignkey')
+        batch_op.drop_column('local_id')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_constraint('fk_shows_local_id_locais', type_='foreignkey')
+        batch_op.drop_column('local_id')
+    op.drop_index(op.f('ix_locais_bloco'), table_name='locais')
+    op.drop_index(op.f('ix_locais_id'), table_name='locais')
+    op.drop_table('locais')
@@ -0,0 +1,37 @@
+"""create_refresh_tokens_usados
+
+Revision ID: e4c7a1b9d2f6
+Revises: d5b9f3a7c2e1
+Create Date: 2026-10-20 10:12:48.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c7a1b9d2f6'
+down_revision: Union[str, None] = 'd5b9f3a7c2e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sem backfill: os jtis usados até aqui estavam só na memória dos workers
+    op.create_table('refresh_tokens_usados',
+    sa.Column('jti_digest', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('expira_em', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti_digest')
+    )
+    op.create_index('ix_refresh_tokens_usados_expira_em', 'refresh_tokens_usados', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_tokens_usados_expira_em', table_name='refresh_tokens_usados')
+    op.drop_table('refresh_tokens_usados')
@@ -0,0 +1,86 @@
+"""server_side_timestamps
+
+Revision ID: e7b2d5f1a9c3
+Revises: d41c7a9e2f58
+Create Date: 2026-10-19 19:05:12.418730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d5f1a9c3'
+down_revision: Union[str, None] = 'd41c7a9e2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesma expressão de app.models.agora_utc (hora do banco, em UTC sem fuso)
+_AGORA_UTC = {
+    'postgresql': "timezone('utc', statement_timestamp())",
+    'sqlite': "(strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+}
+
+_COLUNAS = [
+    ('pedidos_musica', 'data_hora_pedido'),
+    ('shows', 'data_hora_cadastro'),
+    ('usuarios_publico', 'data_cadastro'),
+]
+
+_SO_PENDENTES = "status_pedido = 'pendente'"
+
+# Índices de pedidos_musica (criados em d41c7a9e2f58). No SQLite o batch recria a tabela e o índice parcial
+# não sobreviveria à reflexão: saem antes e voltam iguais depois. No PostgreSQL o ALTER COLUMN os mantém,
+# então não são tocados (reconstruí-los travaria escritas na maior tabela)
+_INDICES_PEDIDOS = [
+    ('ix_pedidos_musica_musico_id_data_hora_pedido', 'musico_id', None),
+    ('ix_pedidos_musica_solicitante_id_data_hora_pedido', 'solicitante_id', None),
+    ('ix_pedidos_musica_pendentes', 'musico_id', _SO_PENDENTES),
+]
+
+
+def _recria_indices_pedidos() -> bool:
+    return op.get_bind().dialect.name == 'sqlite'
+
+
+def _criar_indices_pedidos() -> None:
+    for nome, dono, where in _INDICES_PEDIDOS:
+        op.create_index(
+            nome, 'pedidos_musica', [dono, 'data_hora_pedido', 'id'], unique=False,
+            sqlite_where=sa.text(where) if where else None,
+        )
+
+
+def _remover_indices_pedidos() -> None:
+    for nome, _, _ in _INDICES_PEDIDOS:
+        op.drop_index(nome, table_name='pedidos_musica')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    agora = _AGORA_UTC.get(op.get_bind().dialect.name, 'CURRENT_TIMESTAMP')
+    # Backfill: linhas sem data recebem a hora da migração. As que já têm a hora de boot do worker
+    # (o default antigo) não têm como ser corrigidas; o id desempata a ordem entre elas.
+    for tabela, coluna in _COLUNAS:
+        op.execute(f"UPDATE {tabela} SET {coluna} = {agora} WHERE {coluna} IS NULL")
+
+    if _recria_indices_pedidos():
+        _remover_indices_pedidos()
+    for tabela, coluna in _COLUNAS:
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.alter_column(coluna, existing_type=sa.DateTime(), nullable=False, server_default=sa.text(agora))
+    if _recria_indices_pedidos():
+        _criar_indices_pedidos()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _recria_indices_pedidos():
+        _remover_indices_pedidos()
+    for tabela, coluna in reversed(_COLUNAS):
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.alter_column(coluna, existing_type=sa.DateTime(), nullable=True, server_default=None)
+    if _recria_indices_pedidos():
+        _criar_indices_pedidos()
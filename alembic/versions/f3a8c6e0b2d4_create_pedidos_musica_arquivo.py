@@ -0,0 +1,52 @@
+"""create_pedidos_musica_arquivo
+
+Revision ID: f3a8c6e0b2d4
+Revises: e7b2d5f1a9c3
+Create Date: 2026-10-19 19:48:03.115902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c6e0b2d4'
+down_revision: Union[str, None] = 'e7b2d5f1a9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesma expressão de app.models.agora_utc (hora do banco, em UTC sem fuso)
+_AGORA_UTC = {
+    'postgresql': "timezone('utc', statement_timestamp())",
+    'sqlite': "(strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    agora = _AGORA_UTC.get(op.get_bind().dialect.name, 'CURRENT_TIMESTAMP')
+    op.create_table('pedidos_musica_arquivo',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('solicitante_id', sa.Integer(), nullable=False),
+    sa.Column('musico_id', sa.Integer(), nullable=False),
+    sa.Column('item_repertorio_id', sa.Integer(), nullable=False),
+    sa.Column('mensagem_opcional', sa.Text(), nullable=True),
+    sa.Column('data_hora_pedido', sa.DateTime(), nullable=False),
+    sa.Column('status_pedido', sa.String(), nullable=False),
+    sa.Column('arquivado_em', sa.DateTime(), server_default=sa.text(agora), nullable=False),
+    sa.ForeignKeyConstraint(['item_repertorio_id'], ['itens_repertorio.id'], ),
+    sa.ForeignKeyConstraint(['musico_id'], ['musicos.id'], ),
+    sa.ForeignKeyConstraint(['solicitante_id'], ['usuarios_publico.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pedidos_musica_arquivo_musico_id_data_hora_pedido', 'pedidos_musica_arquivo', ['musico_id', 'data_hora_pedido', 'id'], unique=False)
+    op.create_index('ix_pedidos_musica_arquivo_solicitante_id_data_hora_pedido', 'pedidos_musica_arquivo', ['solicitante_id', 'data_hora_pedido', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pedidos_musica_arquivo_solicitante_id_data_hora_pedido', table_name='pedidos_musica_arquivo')
+    op.drop_index('ix_pedidos_musica_arquivo_musico_id_data_hora_pedido', table_name='pedidos_musica_arquivo')
+    op.drop_table('pedidos_musica_arquivo')
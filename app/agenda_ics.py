@@ -0,0 +1,154 @@
+# app/agenda_ics.py
+# Agenda de um músico em iCalendar (RFC 5545), para assinar no Google Agenda, Apple Calendar, Outlook etc.
+# Esses clientes consultam o feed de tempos em tempos, para sempre; por isso o feed fica pronto em bytes
+# num cache por processo (com o ETag já calculado) e só é refeito quando um show do músico muda.
+# Um cliente que manda If-None-Match recebe 304 sem nenhuma consulta ao banco.
+#
+# O crud chama invalidar_agenda depois do commit de toda escrita em shows (e no perfil do músico, cujo nome
+# vai no feed). Com vários processos, os outros só veem a mudança quando a entrada expira
+# (AGENDA_ICS_CACHE_TTL_SEGUNDOS), como no cache de principais do crud.py.
+import datetime
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import CacheTTL
+
+AGENDA_ICS_CACHE_TTL_SEGUNDOS = float(os.getenv("AGENDA_ICS_CACHE_TTL_SEGUNDOS", "300"))
+AGENDA_ICS_CACHE_MAX_ITENS = int(os.getenv("AGENDA_ICS_CACHE_MAX_ITENS", "5000"))
+# Shows passados que continuam no feed (os clientes apagam da agenda o que some dele)
+AGENDA_ICS_DIAS_PASSADOS = float(os.getenv("AGENDA_ICS_DIAS_PASSADOS", "30"))
+AGENDA_ICS_MAXIMO_SHOWS = int(os.getenv("AGENDA_ICS_MAXIMO_SHOWS", "500"))
+# Show não tem horário de término; o evento ocupa este tempo na agenda
+AGENDA_ICS_DURACAO_MINUTOS = int(os.getenv("AGENDA_ICS_DURACAO_MINUTOS", "120"))
+
+TIPO_CONTEUDO = "text/calendar; charset=utf-8"
+
+
+class AgendaICS(NamedTuple):
+    conteudo: bytes
+    etag: str
+
+
+_cache_agendas = CacheTTL(max_itens=AGENDA_ICS_CACHE_MAX_ITENS, ttl_segundos=AGENDA_ICS_CACHE_TTL_SEGUNDOS)
+# Invalidações por músico: um feed montado com dados lidos antes de uma invalidação não entra no cache
+_geracoes: Dict[int, int] = {}
+_lock_geracoes = threading.Lock()
+
+
+def invalidar_agenda(musico_id: int) -> None:
+    with _lock_geracoes:
+        _geracoes[musico_id] = _geracoes.get(musico_id, 0) + 1
+    _cache_agendas.remover(musico_id)
+
+
+def limpar_cache() -> None:
+    _cache_agendas.limpar()
+
+
+def _escapar(texto: str) -> str:
+    return (
+        texto.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+    )
+
+
+def _dobrar(linha: str) -> Iterable[str]:
+    """Quebra a linha em pedaços de até 75 octetos (UTF-8), sem partir caracteres; as continuações começam com espaço."""
+    pedaco, tamanho, limite = [], 0, 75
+    for caractere in linha:
+        octetos = len(caractere.encode("utf-8"))
+        if tamanho + octetos > limite:
+            yield "".join(pedaco)
+            pedaco, tamanho, limite = [" "], 1, 75
+        pedaco.append(caractere)
+        tamanho += octetos
+    yield "".join(pedaco)
+
+
+def _data_utc(data_hora: datetime.datetime) -> str:
+    # Como as demais colunas DateTime, datas sem fuso já estão em UTC
+    if data_hora.tzinfo is not None:
+        data_hora = data_hora.astimezone(datetime.timezone.utc)
+    return data_hora.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _evento(show: models.Show, nome_artistico: str) -> List[str]:
+    inicio = show.data_hora_evento
+    linhas = [
+        "BEGIN:VEVENT",
+        f"UID:show-{show.id}@palcoapp",
+        # DTSTAMP fixo (cadastro do show): com o horário da geração, o ETag mudaria a cada feed refeito
+        f"DTSTAMP:{_data_utc(show.data_hora_cadastro or inicio)}",
+        f"DTSTART:{_data_utc(inicio)}",
+        f"DTEND:{_data_utc(inicio + datetime.timedelta(minutes=AGENDA_ICS_DURACAO_MINUTOS))}",
+        f"SUMMARY:{_escapar(f'{nome_artistico} - {show.local_nome}')}",
+        f"LOCATION:{_escapar(', '.join(parte for parte in (show.local_nome, show.local_endereco) if parte))}",
+    ]
+    if show.latitude is not None and show.longitude is not None:
+        linhas.append(f"GEO:{show.latitude:.6f};{show.longitude:.6f}")
+    if show.descricao_evento:
+        linhas.append(f"DESCRIPTION:{_escapar(show.descricao_evento)}")
+    if show.link_evento:
+        linhas.append(f"URL:{show.link_evento}")
+    linhas.append("END:VEVENT")
+    return linhas
+
+
+def renderizar(musico: models.Musico, shows: Iterable[models.Show]) -> bytes:
+    nome_artistico = musico.nome_artistico or f"Músico {musico.id}"
+    linhas = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//PalcoApp//Agenda de shows//PT-BR",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escapar(f'{nome_artistico} (PalcoApp)')}",
+        # Sugestão de intervalo de atualização para os clientes que a respeitam
+        f"REFRESH-INTERVAL;VALUE=DURATION:PT{max(1, int(AGENDA_ICS_CACHE_TTL_SEGUNDOS // 60))}M",
+    ]
+    for show in shows:
+        linhas.extend(_evento(show, nome_artistico))
+    linhas.append("END:VCALENDAR")
+    return "".join(dobrada + "\r\n" for linha in linhas for dobrada in _dobrar(linha)).encode("utf-8")
+
+
+def obter_agenda(db: Session, musico_id: int) -> Optional[AgendaICS]:
+    """Feed do músico (do cache, ou montado com duas consultas); None se ele não existir ou estiver inativo."""
+    agenda = _cache_agendas.obter(musico_id)
+    if agenda is not None:
+        return agenda
+    with _lock_geracoes:
+        geracao = _geracoes.get(musico_id, 0)
+
+    musico = db.get(models.Musico, musico_id)
+    if musico is None or musico.is_active is False:
+        return None
+    desde = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=AGENDA_ICS_DIAS_PASSADOS)
+    # Índice (musico_id, data_hora_evento)
+    shows = (
+        db.query(models.Show)
+        .filter(models.Show.musico_id == musico_id, models.Show.data_hora_evento >= desde)
+        .order_by(models.Show.data_hora_evento.asc(), models.Show.id.asc())
+        .limit(AGENDA_ICS_MAXIMO_SHOWS)
+        .all()
+    )
+    conteudo = renderizar(musico, shows)
+    # ETag fraco: o corpo pode sair comprimido (CompressaoMiddleware) com o mesmo ETag
+    agenda = AgendaICS(conteudo=conteudo, etag=f'W/"{hashlib.sha256(conteudo).hexdigest()[:32]}"')
+    with _lock_geracoes:
+        if _geracoes.get(musico_id, 0) == geracao:
+            _cache_agendas.definir(musico_id, agenda)
+    return agenda
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca do If-None-Match (lista separada por vírgulas, ou *) com o ETag."""
+    if not if_none_match:
+        return False
+    candidatos = [candidato.strip() for candidato in if_none_match.split(",")]
+    return "*" in candidatos or any(candidato.removeprefix("W/") == etag.removeprefix("W/") for candidato in candidatos)
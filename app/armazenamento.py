@@ -0,0 +1,309 @@
+# app/armazenamento.py
+# Armazenamento de arquivos (fotos de perfil) atrás de uma interface única, com
+# implementações para o Google Cloud Storage e para o disco local (desenvolvimento/testes).
+# O backend é escolhido por ARMAZENAMENTO_BACKEND ("gcs" ou "local").
+#
+# Todos os métodos são bloqueantes (SDK do GCS ou I/O de disco): chame-os via run_in_threadpool.
+import hashlib
+import hmac
+import logging
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from .security import SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+ARMAZENAMENTO_BACKEND = os.getenv("ARMAZENAMENTO_BACKEND", "gcs")
+ARMAZENAMENTO_LOCAL_DIR = os.getenv("ARMAZENAMENTO_LOCAL_DIR", os.path.join(os.path.dirname(__file__), "static"))
+ARMAZENAMENTO_LOCAL_URL_BASE = os.getenv("ARMAZENAMENTO_LOCAL_URL_BASE", "/static")
+UPLOAD_ASSINADO_EXPIRA_SEGUNDOS = int(os.getenv("UPLOAD_ASSINADO_EXPIRA_SEGUNDOS", "900"))
+CACHE_CONTROL_IMUTAVEL = "public, max-age=31536000, immutable"
+
+
+class ArmazenamentoNaoConfigurado(Exception):
+    pass
+
+
+class UploadAssinado(NamedTuple):
+    url: str
+    metodo: str
+    headers: Dict[str, str]
+    expira_em: int  # epoch (s)
+
+
+class InfoArquivo(NamedTuple):
+    tamanho: int
+    content_type: Optional[str]
+
+
+class ArquivoListado(NamedTuple):
+    nome: str
+    atualizado_em: float  # epoch (s) da última escrita
+
+
+class Armazenamento(ABC):
+    @abstractmethod
+    def enviar_arquivo(self, nome: str, arquivo: BinaryIO, tamanho: Optional[int], content_type: str) -> str:
+        """Envia um arquivo (lido em pedaços) e retorna a URL pública."""
+
+    @abstractmethod
+    def enviar_bytes(self, nome: str, dados: bytes, content_type: str) -> str:
+        """Envia um conteúdo imutável (nome único) e retorna a URL pública."""
+
+    @abstractmethod
+    def ler(self, nome: str) -> bytes: ...
+
+    @abstractmethod
+    def ler_inicio(self, nome: str, quantidade: int) -> bytes: ...
+
+    @abstractmethod
+    def obter_info(self, nome: str) -> Optional[InfoArquivo]:
+        """Tamanho e content-type do arquivo, ou None se ele não existe."""
+
+    @abstractmethod
+    def deletar(self, nome: str) -> bool:
+        """Remove o arquivo; retorna False se ele já não existia."""
+
+    @abstractmethod
+    def listar(self, prefixo: str, tamanho_pagina: int = 1000) -> Iterator[ArquivoListado]:
+        """Percorre os arquivos sob `prefixo`, buscando uma página de `tamanho_pagina` por vez."""
+
+    @abstractmethod
+    def url_publica(self, nome: str) -> str: ...
+
+    @abstractmethod
+    def nome_a_partir_da_url(self, url: str) -> Optional[str]:
+        """Caminho do arquivo se a URL pertence a este armazenamento, senão None."""
+
+    @abstractmethod
+    def gerar_upload_assinado(self, nome: str, content_type: str, tamanho_maximo: int, expira_em_segundos: int = UPLOAD_ASSINADO_EXPIRA_SEGUNDOS) -> UploadAssinado:
+        """URL para o cliente enviar o arquivo (até `tamanho_maximo` bytes) direto ao armazenamento, sem passar pela API."""
+
+    @abstractmethod
+    def publicar(self, nome: str) -> None:
+        """Torna público um arquivo recebido pela URL assinada (os enviados pela API já saem públicos)."""
+
+
+class ArmazenamentoGCS(Armazenamento):
+    def __init__(self, bucket_name: str):
+        if not bucket_name:
+            raise ArmazenamentoNaoConfigurado("GCS_BUCKET_NAME não configurado")
+        self.bucket_name = bucket_name
+        self.prefixo_url = f"https://storage.googleapis.com/{bucket_name}/"
+        self._cliente = None
+        self._lock = threading.Lock()
+
+    @property
+    def cliente(self):
+        # storage.Client() autentica e monta uma sessão HTTP: criamos uma vez por processo e reutilizamos
+        if self._cliente is None:
+            with self._lock:
+                if self._cliente is None:
+                    from google.cloud import storage
+                    self._cliente = storage.Client()
+        return self._cliente
+
+    def _blob(self, nome: str):
+        return self.cliente.bucket(self.bucket_name).blob(nome)
+
+    @staticmethod
+    def _tornar_publico(blob) -> None:
+        try:
+            blob.make_public()
+        except Exception as e_public:
+            # Buckets com acesso uniforme não aceitam ACL por objeto; a URL pública ainda funciona se o bucket for público
+            logger.warning("Não foi possível tornar o blob '%s' público programaticamente: %s", blob.name, e_public)
+
+    def enviar_arquivo(self, nome, arquivo, tamanho, content_type):
+        blob = self._blob(nome)
+        arquivo.seek(0)
+        blob.upload_from_file(arquivo, size=tamanho, content_type=content_type)
+        self._tornar_publico(blob)
+        return self.url_publica(nome)
+
+    def enviar_bytes(self, nome, dados, content_type):
+        blob = self._blob(nome)
+        # Nomes são únicos por upload, então o conteúdo nunca muda: pode ficar em cache indefinidamente
+        blob.cache_control = CACHE_CONTROL_IMUTAVEL
+        blob.upload_from_string(dados, content_type=content_type)
+        self._tornar_publico(blob)
+        return self.url_publica(nome)
+
+    def ler(self, nome):
+        return self._blob(nome).download_as_bytes()
+
+    def ler_inicio(self, nome, quantidade):
+        return self._blob(nome).download_as_bytes(start=0, end=quantidade - 1)
+
+    def obter_info(self, nome):
+        blob = self.cliente.bucket(self.bucket_name).get_blob(nome)
+        if blob is None:
+            return None
+        return InfoArquivo(tamanho=blob.size, content_type=blob.content_type)
+
+    def deletar(self, nome):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._blob(nome).delete()
+        except NotFound:
+            return False
+        return True
+
+    def listar(self, prefixo, tamanho_pagina=1000):
+        # O iterador do SDK pede a próxima página só quando a anterior foi consumida
+        for blob in self.cliente.list_blobs(self.bucket_name, prefix=prefixo, page_size=tamanho_pagina):
+            atualizado = blob.updated or blob.time_created
+            yield ArquivoListado(nome=blob.name, atualizado_em=atualizado.timestamp() if atualizado else time.time())
+
+    def url_publica(self, nome):
+        return f"{self.prefixo_url}{nome}"
+
+    def nome_a_partir_da_url(self, url):
+        if not url or not url.startswith(self.prefixo_url):
+            return None
+        return url[len(self.prefixo_url):].split("?")[0] or None
+
+    def gerar_upload_assinado(self, nome, content_type, tamanho_maximo, expira_em_segundos=UPLOAD_ASSINADO_EXPIRA_SEGUNDOS):
+        # URL V4 assinada pela conta de serviço: o cliente faz PUT direto no GCS. O limite de tamanho vai assinado,
+        # então o GCS recusa um corpo maior antes de gravá-lo (o cliente precisa mandar o cabeçalho como veio)
+        from datetime import timedelta
+        cabecalhos_assinados = {"x-goog-content-length-range": f"0,{tamanho_maximo}"}
+        url = self._blob(nome).generate_signed_url(
+            version="v4", expiration=timedelta(seconds=expira_em_segundos), method="PUT", content_type=content_type,
+            headers=cabecalhos_assinados,
+        )
+        return UploadAssinado(
+            url=url, metodo="PUT", headers={"Content-Type": content_type, **cabecalhos_assinados}, expira_em=int(time.time()) + expira_em_segundos,
+        )
+
+    def publicar(self, nome):
+        self._tornar_publico(self._blob(nome))
+
+
+class ArmazenamentoLocal(Armazenamento):
+    """
+    Grava no disco e serve os arquivos pela própria API (montados em `url_base`).
+    Pensado para desenvolvimento, testes e benchmarks offline. O "upload assinado" é um
+    PUT para /armazenamento/upload com assinatura HMAC, simulando a URL assinada do GCS.
+    """
+
+    def __init__(self, diretorio: str, url_base: str):
+        self.diretorio = os.path.abspath(diretorio)
+        self.url_base = url_base.rstrip("/")
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def _caminho(self, nome: str) -> str:
+        caminho = os.path.abspath(os.path.join(self.diretorio, nome))
+        if not caminho.startswith(self.diretorio + os.sep):
+            raise ValueError(f"Nome de arquivo inválido: {nome}")
+        return caminho
+
+    def enviar_arquivo(self, nome, arquivo, tamanho, content_type):
+        caminho = self._caminho(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        arquivo.seek(0)
+        with open(caminho + ".parcial", "wb") as destino:
+            shutil.copyfileobj(arquivo, destino, 64 * 1024)
+        os.replace(caminho + ".parcial", caminho)
+        return self.url_publica(nome)
+
+    def enviar_bytes(self, nome, dados, content_type):
+        caminho = self._caminho(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho + ".parcial", "wb") as destino:
+            destino.write(dados)
+        os.replace(caminho + ".parcial", caminho)
+        return self.url_publica(nome)
+
+    def ler(self, nome):
+        with open(self._caminho(nome), "rb") as arquivo:
+            return arquivo.read()
+
+    def ler_inicio(self, nome, quantidade):
+        with open(self._caminho(nome), "rb") as arquivo:
+            return arquivo.read(quantidade)
+
+    def obter_info(self, nome):
+        try:
+            return InfoArquivo(tamanho=os.path.getsize(self._caminho(nome)), content_type=None)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def deletar(self, nome):
+        try:
+            os.remove(self._caminho(nome))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def listar(self, prefixo, tamanho_pagina=1000):
+        raiz = os.path.join(self.diretorio, prefixo)
+        for pasta, _, arquivos in os.walk(raiz):
+            for arquivo in sorted(arquivos):
+                caminho = os.path.join(pasta, arquivo)
+                try:
+                    atualizado_em = os.path.getmtime(caminho)
+                except FileNotFoundError:
+                    continue  # removido enquanto listávamos
+                yield ArquivoListado(nome=os.path.relpath(caminho, self.diretorio).replace(os.sep, "/"), atualizado_em=atualizado_em)
+
+    def url_publica(self, nome):
+        return f"{self.url_base}/{nome}"
+
+    def nome_a_partir_da_url(self, url):
+        prefixo = self.url_base + "/"
+        if not url or not url.startswith(prefixo):
+            return None
+        return url[len(prefixo):].split("?")[0] or None
+
+    @staticmethod
+    def _assinatura(nome: str, content_type: str, expira_em: int) -> str:
+        mensagem = f"{nome}|{content_type}|{expira_em}".encode("utf-8")
+        return hmac.new(SECRET_KEY.encode("utf-8"), mensagem, hashlib.sha256).hexdigest()
+
+    def gerar_upload_assinado(self, nome, content_type, tamanho_maximo, expira_em_segundos=UPLOAD_ASSINADO_EXPIRA_SEGUNDOS):
+        # O tamanho máximo é aplicado pelo LimiteTamanhoUploadMiddleware na rota /armazenamento/upload
+        expira_em = int(time.time()) + expira_em_segundos
+        query = urlencode({"nome": nome, "content_type": content_type, "expira_em": expira_em,
+                           "assinatura": self._assinatura(nome, content_type, expira_em)})
+        return UploadAssinado(url=f"/armazenamento/upload?{query}", metodo="PUT", headers={"Content-Type": content_type}, expira_em=expira_em)
+
+    def publicar(self, nome):
+        pass  # Tudo o que está no diretório é servido pela API
+
+    def validar_upload_assinado(self, nome: str, content_type: str, expira_em: int, assinatura: str) -> bool:
+        if expira_em < time.time():
+            return False
+        return hmac.compare_digest(self._assinatura(nome, content_type, expira_em), assinatura)
+
+
+_armazenamento: Optional[Armazenamento] = None
+_armazenamento_lock = threading.Lock()
+
+
+def obter_armazenamento() -> Armazenamento:
+    """Instância única por processo, conforme ARMAZENAMENTO_BACKEND. Pode lançar ArmazenamentoNaoConfigurado."""
+    global _armazenamento
+    if _armazenamento is None:
+        with _armazenamento_lock:
+            if _armazenamento is None:
+                if ARMAZENAMENTO_BACKEND == "local":
+                    _armazenamento = ArmazenamentoLocal(ARMAZENAMENTO_LOCAL_DIR, ARMAZENAMENTO_LOCAL_URL_BASE)
+                elif ARMAZENAMENTO_BACKEND == "gcs":
+                    _armazenamento = ArmazenamentoGCS(os.getenv("GCS_BUCKET_NAME", ""))
+                else:
+                    raise ArmazenamentoNaoConfigurado(f"ARMAZENAMENTO_BACKEND desconhecido: {ARMAZENAMENTO_BACKEND}")
+    return _armazenamento
+
+
+def definir_armazenamento(armazenamento: Optional[Armazenamento]) -> None:
+    # Troca o backend em uso (testes e benchmarks); None volta a ler a configuração
+    global _armazenamento
+    with _armazenamento_lock:
+        _armazenamento = armazenamento
@@ -0,0 +1,131 @@
+# app/arquivamento_pedidos.py
+# Arquivamento dos pedidos já tratados: move de pedidos_musica para pedidos_musica_arquivo os pedidos
+# "atendido"/"recusado" com mais de ARQUIVAMENTO_PEDIDOS_DIAS dias, em lotes pequenos (cada lote é uma
+# transação curta: INSERT ... SELECT no arquivo + DELETE na tabela quente). Assim a tabela que as filas
+# ao vivo consultam (e os índices dela) só guarda o que ainda importa e cabe em memória.
+#
+# Os pendentes nunca saem, por mais antigos que sejam. O arquivo só é lido quando pedido
+# explicitamente (incluir_arquivados=True em crud.obter_pedidos_para_musico / obter_pedidos_feitos_por_fan).
+#
+# Uso avulso: python -m app.arquivamento_pedidos [--simular] [--dias N]
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .jobs import enfileirar, tarefa
+
+logger = logging.getLogger(__name__)
+
+ARQUIVAMENTO_PEDIDOS_DIAS = float(os.getenv("ARQUIVAMENTO_PEDIDOS_DIAS", "30"))
+ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS = float(os.getenv("ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS", "3600"))  # 0 desliga
+ARQUIVAMENTO_PEDIDOS_TAMANHO_LOTE = int(os.getenv("ARQUIVAMENTO_PEDIDOS_TAMANHO_LOTE", "1000"))
+# Folga entre lotes, para o arquivamento não disputar o banco com as requisições
+ARQUIVAMENTO_PEDIDOS_PAUSA_SEGUNDOS = float(os.getenv("ARQUIVAMENTO_PEDIDOS_PAUSA_SEGUNDOS", "0.05"))
+
+STATUS_ARQUIVAVEIS = (models.StatusPedido.ATENDIDO, models.StatusPedido.RECUSADO)
+_COLUNAS = ("id", "solicitante_id", "musico_id", "item_repertorio_id", "mensagem_opcional", "data_hora_pedido", "status_pedido")
+
+_pedidos = models.PedidoMusica.__table__
+_arquivo = models.PedidoMusicaArquivado.__table__
+
+
+def _condicao_arquivavel(limite_data: datetime.datetime):
+    return [_pedidos.c.status_pedido.in_(STATUS_ARQUIVAVEIS), _pedidos.c.data_hora_pedido < limite_data]
+
+
+def arquivar_lote(db: Session, limite_data: datetime.datetime, tamanho_lote: int = ARQUIVAMENTO_PEDIDOS_TAMANHO_LOTE) -> int:
+    """Move até `tamanho_lote` pedidos arquiváveis e faz commit. Devolve quantos moveu (0 = acabou)."""
+    # SKIP LOCKED (PostgreSQL): pula pedidos que alguma requisição está alterando agora
+    ids = db.execute(
+        select(_pedidos.c.id).where(*_condicao_arquivavel(limite_data))
+        .order_by(_pedidos.c.id).limit(tamanho_lote).with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.rollback()
+        return 0
+    db.execute(insert(_arquivo).from_select(_COLUNAS, select(*(_pedidos.c[coluna] for coluna in _COLUNAS)).where(_pedidos.c.id.in_(ids))))
+    db.execute(delete(_pedidos).where(_pedidos.c.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def arquivar_pedidos(
+    bind,
+    dias: float = ARQUIVAMENTO_PEDIDOS_DIAS,
+    tamanho_lote: int = ARQUIVAMENTO_PEDIDOS_TAMANHO_LOTE,
+    pausa_segundos: float = ARQUIVAMENTO_PEDIDOS_PAUSA_SEGUNDOS,
+    max_lotes: Optional[int] = None,
+    simular: bool = False,
+) -> Dict[str, int]:
+    """
+    Arquiva, lote a lote, tudo o que estiver elegível agora. Bloqueante: no servidor, chame via
+    run_in_threadpool. Com `simular`, só conta o que seria arquivado.
+    """
+    limite_data = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=dias)
+    resumo = {"arquivados": 0, "lotes": 0}
+    with Session(bind=bind) as db:
+        if simular:
+            resumo["arquivados"] = db.execute(select(func.count()).select_from(_pedidos).where(*_condicao_arquivavel(limite_data))).scalar_one()
+        else:
+            while max_lotes is None or resumo["lotes"] < max_lotes:
+                movidos = arquivar_lote(db, limite_data, tamanho_lote)
+                if not movidos:
+                    break
+                resumo["arquivados"] += movidos
+                resumo["lotes"] += 1
+                if movidos < tamanho_lote:
+                    break
+                if pausa_segundos > 0:
+                    time.sleep(pausa_segundos)
+
+    logger.info("Arquivamento de pedidos%s concluído", " (simulação)" if simular else "", extra={**resumo, "limite_data": limite_data.isoformat()})
+    return resumo
+
+
+@tarefa("arquivamento_pedidos", concorrencia=1, max_tentativas=1)
+def _job_arquivamento_pedidos(bind) -> None:
+    arquivar_pedidos(bind)
+
+
+def _agendar_arquivamento(bind) -> None:
+    with Session(bind=bind) as db:
+        enfileirar(db, "arquivamento_pedidos", unico=True)
+
+
+async def executar_arquivamento_periodico(bind, intervalo_segundos: float = ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS) -> None:
+    # Como a limpeza de fotos: o laço só enfileira o job (um por vez entre processos); o worker de jobs executa
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await run_in_threadpool(_agendar_arquivamento, bind)
+        except Exception as e_arquivamento:
+            logger.exception("Erro ao agendar o arquivamento de pedidos: %s", e_arquivamento)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move os pedidos tratados e antigos para pedidos_musica_arquivo")
+    parser.add_argument("--simular", action="store_true", help="Só conta o que seria arquivado")
+    parser.add_argument("--dias", type=float, default=ARQUIVAMENTO_PEDIDOS_DIAS, help="Arquiva pedidos tratados mais antigos que isto")
+    parser.add_argument("--lote", type=int, default=ARQUIVAMENTO_PEDIDOS_TAMANHO_LOTE)
+    parser.add_argument("--max-lotes", type=int, default=None, help="Para depois de N lotes (o resto fica para a próxima)")
+    args = parser.parse_args()
+
+    from .database import engine
+    from .logs import configurar_logs
+    configurar_logs()
+    resumo = arquivar_pedidos(engine, dias=args.dias, tamanho_lote=args.lote, max_lotes=args.max_lotes, simular=args.simular)
+    print(json.dumps(resumo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# app/cache.py
+# Cache em memória (por processo) com limite de itens e expiração por entrada.
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """
+    Cache LRU limitado a `max_itens`, em que cada entrada expira após `ttl_segundos`
+    (ou no instante monotônico passado em `expira_em`). Seguro para uso entre threads.
+    """
+
+    def __init__(self, max_itens: int, ttl_segundos: float):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: Hashable, padrao: Any = None) -> Any:
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                return padrao
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+
+    def definir(self, chave: Hashable, valor: Any, ttl_segundos: Optional[float] = None, expira_em: Optional[float] = None) -> None:
+        if expira_em is None:
+            expira_em = time.monotonic() + (self.ttl_segundos if ttl_segundos is None else ttl_segundos)
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave: Hashable) -> None:
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self) -> int:
+        return len(self._itens)
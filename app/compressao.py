@@ -0,0 +1,211 @@
+# app/compressao.py
+# Middleware ASGI de compressão de respostas (gzip e brotli) com métricas por rota (palcoapp_compressao_* no /metrics).
+import os
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+try:  # brotli é opcional: sem ele, só negociamos gzip
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+from .metricas import COMPRESSAO_BYTES_COMPRIMIDOS, COMPRESSAO_BYTES_ORIGINAIS, COMPRESSAO_CPU, COMPRESSAO_RESPOSTAS
+
+COMPRESSAO_TAMANHO_MINIMO = int(os.getenv("COMPRESSAO_TAMANHO_MINIMO", "1024"))  # bytes
+COMPRESSAO_NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", "6"))  # 1 (rápido) a 9 (menor)
+COMPRESSAO_QUALIDADE_BROTLI = int(os.getenv("COMPRESSAO_QUALIDADE_BROTLI", "4"))  # 0 a 11
+
+# Só vale a pena comprimir formatos textuais; imagens e afins já vêm comprimidos.
+TIPOS_COMPRESSIVEIS = ("text/", "application/json", "application/javascript", "application/xml", "+json", "+xml")
+
+
+# Filhos rotulados das métricas por (rota, codificação), para não passar por .labels() a cada resposta
+_series: Dict[Tuple[str, str], tuple] = {}
+
+
+def _registrar_estatistica(rota: str, codificacao: str, bytes_originais: int, bytes_comprimidos: int, segundos_cpu: float) -> None:
+    filhos = _series.get((rota, codificacao))
+    if filhos is None:
+        filhos = _series[(rota, codificacao)] = (
+            COMPRESSAO_RESPOSTAS.labels(rota, codificacao), COMPRESSAO_BYTES_ORIGINAIS.labels(rota, codificacao),
+            COMPRESSAO_BYTES_COMPRIMIDOS.labels(rota, codificacao), COMPRESSAO_CPU.labels(rota, codificacao),
+        )
+    respostas, originais, comprimidos, cpu = filhos
+    respostas.inc()
+    originais.inc(bytes_originais)
+    comprimidos.inc(bytes_comprimidos)
+    cpu.inc(segundos_cpu)
+
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """Escolhe 'br' ou 'gzip' a partir do header Accept-Encoding, respeitando q=0."""
+    aceitas: Dict[str, float] = {}
+    for parte in accept_encoding.split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceitas[nome] = qualidade
+
+    candidatas = ["br", "gzip"] if brotli is not None else ["gzip"]
+    melhor, melhor_q = None, 0.0
+    for codificacao in candidatas:
+        qualidade = aceitas.get(codificacao, aceitas.get("*", 0.0))
+        if qualidade > melhor_q:
+            melhor, melhor_q = codificacao, qualidade
+    return melhor
+
+
+class _Compressor:
+    """Compressor incremental; acumula o tempo de CPU gasto comprimindo."""
+
+    def __init__(self, codificacao: str, nivel_gzip: int, qualidade_brotli: int):
+        self.codificacao = codificacao
+        self.segundos_cpu = 0.0
+        if codificacao == "br":
+            self._brotli = brotli.Compressor(quality=qualidade_brotli)
+        else:
+            self._zlib = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)  # wbits=31 -> cabeçalho gzip
+
+    def comprimir(self, dados: bytes, flush: bool = False) -> bytes:
+        inicio = time.thread_time()
+        if self.codificacao == "br":
+            saida = self._brotli.process(dados)
+            if flush:
+                saida += self._brotli.flush()
+        else:
+            saida = self._zlib.compress(dados)
+            if flush:
+                saida += self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        self.segundos_cpu += time.thread_time() - inicio
+        return saida
+
+    def finalizar(self) -> bytes:
+        inicio = time.thread_time()
+        saida = self._brotli.finish() if self.codificacao == "br" else self._zlib.flush(zlib.Z_FINISH)
+        self.segundos_cpu += time.thread_time() - inicio
+        return saida
+
+
+def _tipo_compressivel(content_type: str) -> bool:
+    content_type = content_type.split(";")[0].strip().lower()
+    return any(content_type.startswith(t) or content_type.endswith(t) for t in TIPOS_COMPRESSIVEIS)
+
+
+class CompressaoMiddleware:
+    """
+    Negocia gzip/brotli pelo Accept-Encoding. Respostas completas abaixo de
+    `tamanho_minimo` saem sem compressão; respostas em streaming (geradores)
+    são comprimidas pedaço a pedaço, com flush a cada pedaço para o cliente
+    continuar recebendo dados à medida que são produzidos.
+    """
+
+    def __init__(
+        self,
+        app,
+        tamanho_minimo: int = COMPRESSAO_TAMANHO_MINIMO,
+        nivel_gzip: int = COMPRESSAO_NIVEL_GZIP,
+        qualidade_brotli: int = COMPRESSAO_QUALIDADE_BROTLI,
+    ):
+        self.app = app
+        self.tamanho_minimo = tamanho_minimo
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for nome, valor in scope.get("headers", []):
+            if nome == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+                break
+        codificacao = escolher_codificacao(accept_encoding) if accept_encoding else None
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        mensagem_inicio = None
+        compressor: Optional[_Compressor] = None
+        repassar = False
+        bytes_originais = 0
+        bytes_comprimidos = 0
+
+        def rota_atual() -> str:
+            rota = scope.get("route")
+            return getattr(rota, "path", None) or "<sem rota>"
+
+        async def enviar_comprimido(message):
+            nonlocal mensagem_inicio, compressor, repassar, bytes_originais, bytes_comprimidos
+
+            if message["type"] == "http.response.start":
+                mensagem_inicio = message
+                return
+            if message["type"] != "http.response.body" or repassar:
+                await send(message)
+                return
+
+            corpo = message.get("body", b"")
+            mais_corpo = message.get("more_body", False)
+
+            if compressor is None:
+                # Primeiro pedaço do corpo: decide se comprime ou repassa a resposta intacta.
+                headers = {k.lower(): v for k, v in mensagem_inicio.get("headers", [])}
+                content_length = headers.get(b"content-length")
+                pequeno = (not mais_corpo and len(corpo) < self.tamanho_minimo) or (
+                    content_length is not None and int(content_length) < self.tamanho_minimo
+                )
+                if (
+                    pequeno
+                    or b"content-encoding" in headers
+                    or not _tipo_compressivel(headers.get(b"content-type", b"").decode("latin-1"))
+                ):
+                    repassar = True
+                    await send(mensagem_inicio)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(codificacao, self.nivel_gzip, self.qualidade_brotli)
+                novos_headers = [
+                    (k, v) for k, v in mensagem_inicio.get("headers", [])
+                    if k.lower() not in (b"content-length", b"content-encoding")
+                ]
+                novos_headers.append((b"content-encoding", codificacao.encode("latin-1")))
+                if b"vary" in headers:
+                    novos_headers = [(k, v) for k, v in novos_headers if k.lower() != b"vary"]
+                    novos_headers.append((b"vary", headers[b"vary"] + b", Accept-Encoding"))
+                else:
+                    novos_headers.append((b"vary", b"Accept-Encoding"))
+
+                if not mais_corpo:
+                    comprimido = compressor.comprimir(corpo) + compressor.finalizar()
+                    novos_headers.append((b"content-length", str(len(comprimido)).encode("latin-1")))
+                    await send({**mensagem_inicio, "headers": novos_headers})
+                    await send({"type": "http.response.body", "body": comprimido, "more_body": False})
+                    _registrar_estatistica(rota_atual(), codificacao, len(corpo), len(comprimido), compressor.segundos_cpu)
+                    return
+
+                await send({**mensagem_inicio, "headers": novos_headers})
+
+            # Streaming: comprime cada pedaço e dá flush para não segurar dados no buffer.
+            bytes_originais += len(corpo)
+            if mais_corpo:
+                pedaco = compressor.comprimir(corpo, flush=True)
+            else:
+                pedaco = compressor.comprimir(corpo) + compressor.finalizar()
+            bytes_comprimidos += len(pedaco)
+            await send({"type": "http.response.body", "body": pedaco, "more_body": mais_corpo})
+            if not mais_corpo:
+                _registrar_estatistica(rota_atual(), codificacao, bytes_originais, bytes_comprimidos, compressor.segundos_cpu)
+
+        await self.app(scope, receive, enviar_comprimido)
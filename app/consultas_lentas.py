@@ -0,0 +1,212 @@
+# app/consultas_lentas.py
+# Registro de consultas lentas, para saber qual função do crud está pesando no banco.
+#
+# Cada consulta é medida (eventos do engine), o SQL vira uma "impressão digital" (literais e
+# listas de IN trocados por "?", espaços normalizados) e é agrupado junto com a função de app/
+# que a disparou (ex.: app.crud.obter_musicos). Guarda no máximo CONSULTAS_LENTAS_MAX_GRUPOS
+# grupos; o relatório ordena por tempo total ou p95. Com a tabela cheia, vale o "space-saving": o grupo
+# novo toma o lugar do de menor total e herda esse total como margem de erro, então não é o próximo a
+# sair e uma consulta que só fica lenta depois ainda consegue subir ao top-N.
+#
+# Opt-in: CONSULTAS_LENTAS_ATIVO=true. Consultas acima de CONSULTAS_LENTAS_LIMIAR_MS também
+# geram um aviso individual no log, e a cada CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS o
+# top-N é escrito no log (0 desliga). Em tempo real: GET /admin/consultas_lentas.
+import asyncio
+import functools
+import heapq
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+CONSULTAS_LENTAS_ATIVO = os.getenv("CONSULTAS_LENTAS_ATIVO", "false").lower() in ("1", "true", "sim")
+CONSULTAS_LENTAS_LIMIAR_MS = float(os.getenv("CONSULTAS_LENTAS_LIMIAR_MS", "200"))
+CONSULTAS_LENTAS_MAX_GRUPOS = int(os.getenv("CONSULTAS_LENTAS_MAX_GRUPOS", "500"))
+CONSULTAS_LENTAS_TOP = int(os.getenv("CONSULTAS_LENTAS_TOP", "20"))
+CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS = float(os.getenv("CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS", "900"))
+# Durações guardadas por grupo para o p95 (as mais recentes)
+_AMOSTRAS_POR_GRUPO = 256
+_PROFUNDIDADE_MAXIMA_PILHA = 40
+
+logger = logging.getLogger(__name__)
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_RE_PARAMETRO = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# INSERT de várias linhas: "VALUES (?+), (?+), ..." (ou "(?), (?)") vira uma tupla só, qualquer que seja o lote
+_RE_VALUES = re.compile(r"\bVALUES\s*\(\?\+?\)(?:\s*,\s*\(\?\+?\))*", re.IGNORECASE)
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def impressao_digital(sql: str) -> str:
+    """
+    Normaliza o SQL para agrupar execuções da mesma consulta:
+    "SELECT ... WHERE id IN (?, ?, ?) AND nome = 'x' LIMIT 10" -> "SELECT ... WHERE id IN (?+) AND nome = ? LIMIT ?"
+    e "INSERT ... VALUES (?, ?), (?, ?)" -> "INSERT ... VALUES (?+)".
+    Os textos que o SQLAlchemy gera se repetem (cache de compilação), então o cache aqui quase sempre acerta.
+    """
+    normalizado = _RE_STRING.sub("?", sql)
+    normalizado = _RE_PARAMETRO.sub("?", normalizado)
+    normalizado = _RE_NUMERO.sub("?", normalizado)
+    normalizado = _RE_LISTA.sub("(?+)", normalizado)
+    normalizado = _RE_VALUES.sub("VALUES (?+)", normalizado)
+    return _RE_ESPACOS.sub(" ", normalizado).strip()
+
+
+def funcao_chamadora() -> str:
+    """Primeira função de app/ na pilha (fora deste módulo e do das métricas), ex.: 'app.crud.obter_musicos'."""
+    frame = sys._getframe(1)
+    for _ in range(_PROFUNDIDADE_MAXIMA_PILHA):
+        if frame is None:
+            break
+        modulo = frame.f_globals.get("__name__", "")
+        if modulo.startswith("app.") and modulo not in (__name__, "app.metricas"):
+            return f"{modulo}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<fora de app>"
+
+
+class _Grupo:
+    __slots__ = ("impressao", "funcao", "execucoes", "total", "herdado", "maximo", "amostras")
+
+    def __init__(self, impressao: str, funcao: str, herdado: float = 0.0):
+        self.impressao = impressao
+        self.funcao = funcao
+        self.execucoes = 0
+        self.total = 0.0
+        self.herdado = herdado  # Total do grupo que este substituiu (space-saving): só conta para o descarte
+        self.maximo = 0.0
+        self.amostras: deque = deque(maxlen=_AMOSTRAS_POR_GRUPO)
+
+    def peso(self) -> float:
+        return self.total + self.herdado
+
+    def p95(self) -> float:
+        ordenadas = sorted(self.amostras)
+        return ordenadas[min(len(ordenadas) - 1, math.ceil(0.95 * len(ordenadas)) - 1)] if ordenadas else 0.0
+
+
+class RegistroConsultas:
+    """Tabela (limitada) de grupos de consultas. Chamado dos threads do threadpool: protegido por lock."""
+
+    def __init__(self, max_grupos: int = CONSULTAS_LENTAS_MAX_GRUPOS, limiar_ms: float = CONSULTAS_LENTAS_LIMIAR_MS):
+        self.max_grupos = max_grupos
+        self.limiar_ms = limiar_ms
+        self.descartados = 0
+        self._grupos: Dict[Tuple[str, str], _Grupo] = {}
+        # Heap (peso, chave) para achar o menor sem percorrer a tabela. Os pesos só crescem, então uma entrada
+        # pode estar velha (menor que o peso atual): ao sair do topo, volta para o heap com o peso atualizado
+        self._heap: List[Tuple[float, Tuple[str, str]]] = []
+        self._lock = threading.Lock()
+
+    def _descartar_menor(self) -> float:
+        while True:
+            peso, chave = heapq.heappop(self._heap)
+            grupo = self._grupos.get(chave)
+            if grupo is None:
+                continue
+            if grupo.peso() > peso:
+                heapq.heappush(self._heap, (grupo.peso(), chave))
+                continue
+            del self._grupos[chave]
+            self.descartados += 1
+            return peso
+
+    def registrar(self, sql: str, duracao: float, funcao: str) -> None:
+        impressao = impressao_digital(sql)
+        with self._lock:
+            grupo = self._grupos.get((impressao, funcao))
+            if grupo is None:
+                herdado = 0.0
+                if len(self._grupos) >= self.max_grupos:
+                    # Tabela cheia: sai o grupo de menor peso, e o novo herda o peso dele
+                    herdado = self._descartar_menor()
+                grupo = self._grupos[(impressao, funcao)] = _Grupo(impressao, funcao, herdado)
+                heapq.heappush(self._heap, (herdado, (impressao, funcao)))
+            grupo.execucoes += 1
+            grupo.total += duracao
+            grupo.amostras.append(duracao)
+            if duracao > grupo.maximo:
+                grupo.maximo = duracao
+        if duracao * 1000 >= self.limiar_ms:
+            logger.warning(
+                "Consulta lenta (%.1f ms) em %s", duracao * 1000, funcao,
+                extra={"duracao_ms": round(duracao * 1000, 2), "funcao": funcao, "sql": impressao[:500]},
+            )
+
+    def relatorio(self, ordem: str = "total", limite: int = CONSULTAS_LENTAS_TOP) -> List[dict]:
+        if ordem not in ("total", "p95", "maximo", "execucoes"):
+            raise ValueError(f"Ordem inválida: {ordem}")
+        with self._lock:
+            linhas = [{
+                "funcao": grupo.funcao,
+                "sql": grupo.impressao,
+                "execucoes": grupo.execucoes,
+                "total_ms": round(grupo.total * 1000, 2),
+                "media_ms": round(grupo.total * 1000 / grupo.execucoes, 3),
+                "p95_ms": round(grupo.p95() * 1000, 3),
+                "maximo_ms": round(grupo.maximo * 1000, 3),
+                "herdado_ms": round(grupo.herdado * 1000, 2), # Margem de erro: o total real pode ter até isto a mais
+            } for grupo in self._grupos.values()]
+        chave = {"total": "total_ms", "p95": "p95_ms", "maximo": "maximo_ms", "execucoes": "execucoes"}[ordem]
+        return sorted(linhas, key=lambda linha: linha[chave], reverse=True)[:limite]
+
+    def zerar(self) -> None:
+        with self._lock:
+            self._grupos.clear()
+            self._heap.clear()
+            self.descartados = 0
+
+
+registro_consultas = RegistroConsultas()
+
+
+# --- Eventos do engine ---
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_consultas_lentas_inicio", []).append(time.perf_counter())
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - conn.info["_consultas_lentas_inicio"].pop()
+    registro_consultas.registrar(statement, duracao, funcao_chamadora())
+
+
+def _erro_na_consulta(contexto_excecao):
+    conn = contexto_excecao.connection
+    if conn is not None and conn.info.get("_consultas_lentas_inicio"):
+        conn.info["_consultas_lentas_inicio"].pop()
+
+
+def instrumentar_consultas_lentas(engine) -> None:
+    """Liga o registro de consultas no engine (idempotente)."""
+    if event.contains(engine, "before_cursor_execute", _antes_da_consulta):
+        return
+    event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+    event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+    event.listen(engine, "handle_error", _erro_na_consulta)
+
+
+def desinstrumentar_consultas_lentas(engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _antes_da_consulta):
+        event.remove(engine, "before_cursor_execute", _antes_da_consulta)
+        event.remove(engine, "after_cursor_execute", _depois_da_consulta)
+        event.remove(engine, "handle_error", _erro_na_consulta)
+
+
+async def executar_relatorio_periodico(intervalo_segundos: float = CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS, registro: Optional[RegistroConsultas] = None) -> None:
+    # Laço iniciado com a app: escreve o top-N acumulado desde o início do processo
+    registro = registro or registro_consultas
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        top = registro.relatorio("total", CONSULTAS_LENTAS_TOP)
+        if top:
+            logger.info("Top %d consultas por tempo total", len(top), extra={"consultas": top, "grupos_descartados": registro.descartados})
@@ -1,43 +1,83 @@
 # app/crud.py
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func 
-from typing import Optional, List
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Optional, List, Tuple, Union
+from itertools import islice
 import datetime
-# import logging 
-
-from . import models, schemas
-from .security import verificar_senha, obter_hash_da_senha
-
-# logger = logging.getLogger(__name__)
+import heapq
+import logging
+import os
+import threading
+
+from . import agenda_ics, geo, locais, models, schemas, series_shows
+from .cache import CacheTTL
+from .security import obter_hash_da_senha
+
+logger = logging.getLogger(__name__)
+
+# Identidades (id/email/is_active) das contas autenticadas ficam num cache curto para que requisições
+# seguidas não voltem ao banco. Toda escrita na conta feita por aqui invalida a entrada; mudanças feitas
+# por outro processo ou direto no banco só valem quando ela expira.
+PRINCIPAL_CACHE_TTL_SEGUNDOS = float(os.getenv("PRINCIPAL_CACHE_TTL_SEGUNDOS", "15"))
+_cache_principais = CacheTTL(max_itens=10_000, ttl_segundos=PRINCIPAL_CACHE_TTL_SEGUNDOS)
+# Invalidações por conta, como em agenda_ics: uma identidade lida antes de uma invalidação não entra no cache
+_geracoes_principais: Dict[Tuple[str, int], int] = {}
+_lock_geracoes_principais = threading.Lock()
 
 # --- Funções CRUD para Músicos ---
 def obter_musico_por_email(db: Session, email: str) -> Optional[models.Musico]:
-    # # --- PRINTS DE DEPURAÇÃO COMENTADOS ---
-    # print(f"    [CRUD.PY - obter_musico_por_email] Buscando músico com email: '{email}'")
     musico = db.query(models.Musico).filter(models.Musico.email == email).first()
-    # if musico:
-    #     print(f"    [CRUD.PY - obter_musico_por_email] Músico encontrado: ID={musico.id}, Email='{musico.email}'")
-    # else:
-    #     print(f"    [CRUD.PY - obter_musico_por_email] Músico com email '{email}' NÃO encontrado.")
     return musico
 
 def atualizar_foto_perfil_musico(db: Session, musico_id: int, foto_url: str) -> Optional[models.Musico]:
-    db_musico = obter_musico_por_id(db, musico_id=musico_id) 
+    # Só a linha: quem chama já tem o músico carregado (db.get acha no identity map, sem consulta)
+    db_musico = obter_conta_musico(db, musico_id=musico_id)
     if db_musico:
         db_musico.foto_perfil_url = foto_url
+        db_musico.foto_perfil_variantes = None # As miniaturas da foto nova são geradas em segundo plano
         db.commit()
-        db.refresh(db_musico)
+        # Sem refresh: o despacho dos jobs logo depois faz outro commit e expiraria o objeto de novo
         return db_musico
     return None
 
+def atualizar_variantes_foto_musico(db: Session, musico_id: int, foto_url: str, variantes: dict) -> bool:
+    # Só grava se a foto não mudou enquanto as miniaturas eram geradas (um upload mais novo vence)
+    atualizados = db.query(models.Musico).filter(
+        models.Musico.id == musico_id, models.Musico.foto_perfil_url == foto_url
+    ).update({models.Musico.foto_perfil_variantes: variantes}, synchronize_session=False)
+    db.commit()
+    return atualizados > 0
+
+def obter_fotos_perfil_referenciadas(db: Session, urls: List[str]) -> set:
+    # Quais destas URLs ainda são a foto de algum músico (usado pela limpeza de arquivos órfãos)
+    if not urls:
+        return set()
+    linhas = db.query(models.Musico.foto_perfil_url).filter(models.Musico.foto_perfil_url.in_(urls)).all()
+    return {linha.foto_perfil_url for linha in linhas}
+
 def obter_musico_por_id(db: Session, musico_id: int) -> Optional[models.Musico]:
+    # selectinload: um SELECT por coleção (pelos índices de musico_id). Com joinedload nas três o
+    # resultado era o produto itens x shows x pedidos, milhares de linhas para um músico ativo.
     return db.query(models.Musico).options(
-        joinedload(models.Musico.itens_repertorio),
-        joinedload(models.Musico.shows),
-        joinedload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.solicitante),
-        joinedload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.item_repertorio_pedido)
+        selectinload(models.Musico.itens_repertorio),
+        selectinload(models.Musico.shows),
+        selectinload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.solicitante),
+        selectinload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.item_repertorio_pedido)
     ).filter(models.Musico.id == musico_id).first()
 
+def obter_identidade_musico(db: Session, musico_id: int) -> Optional[schemas.UsuarioAutenticado]:
+    # Só id/email/is_active: usado a cada requisição autenticada, não carrega relacionamentos
+    linha = db.query(models.Musico.id, models.Musico.email, models.Musico.is_active).filter(models.Musico.id == musico_id).first()
+    if linha is None:
+        return None
+    return schemas.UsuarioAutenticado(id=linha.id, email=linha.email, is_active=linha.is_active is not False, role="musico")
+
+def obter_conta_musico(db: Session, musico_id: int) -> Optional[models.Musico]:
+    # Só a linha do músico, sem eager loads (os relacionamentos são lazy)
+    return db.get(models.Musico, musico_id)
+
 def obter_musicos(
     db: Session, 
     skip: int = 0, 
@@ -51,19 +91,19 @@ def obter_musicos(
     if search_term:
         search_pattern = f"%{search_term}%"
         query = query.filter(models.Musico.nome_artistico.ilike(search_pattern))
-        # print(f"CRUD obter_musicos: Aplicando filtro de busca por nome: '{search_term}'")
 
     if genero_filter: 
         genero_pattern = f"%{genero_filter}%" 
         query = query.filter(models.Musico.generos_musicais.ilike(genero_pattern))
-        # print(f"CRUD obter_musicos: Aplicando filtro de gênero: '{genero_filter}'")
     
     musicos = query.options(
         joinedload(models.Musico.itens_repertorio), 
-        joinedload(models.Musico.shows)             
+        joinedload(models.Musico.shows),
+        # selectinload: uma consulta para os pedidos de todos os músicos da página (o lazy load era uma por músico)
+        selectinload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.solicitante),
+        selectinload(models.Musico.pedidos_recebidos).joinedload(models.PedidoMusica.item_repertorio_pedido)
     ).order_by(models.Musico.nome_artistico.asc()).offset(skip).limit(limit).all()
-    
-    # print(f"CRUD obter_musicos: Retornando {len(musicos)} músicos com os filtros aplicados.")
+    logger.debug("obter_musicos: %d músicos", len(musicos), extra={"busca": search_term, "genero": genero_filter, "skip": skip, "limit": limit})
     return musicos
 
 def criar_musico(db: Session, musico: schemas.MusicoCreate) -> models.Musico:
@@ -76,30 +116,27 @@ def criar_musico(db: Session, musico: schemas.MusicoCreate) -> models.Musico:
     db.add(db_musico)
     db.commit()
     db.refresh(db_musico)
+    # Conta recém-criada: as coleções estão vazias, não há o que carregar (sem isso, um lazy load por coleção)
+    for colecao in ("itens_repertorio", "shows", "pedidos_recebidos"):
+        set_committed_value(db_musico, colecao, [])
     return db_musico
 
-def autenticar_musico(db: Session, email: str, senha_texto_plano: str) -> Optional[models.Musico]:
-    # # --- PRINTS DE DEPURAÇÃO COMENTADOS ---
-    # print(f"  [CRUD.PY - autenticar_musico] Iniciando autenticação para email de MÚSICO: '{email}'")
-
-    musico_no_banco = obter_musico_por_email(db, email=email) 
-    
-    if not musico_no_banco:
-        return None
-    
-    # print(f"  [CRUD.PY - autenticar_musico] Senha HASHED armazenada para MÚSICO '{email}': '{musico_no_banco.hashed_password if hasattr(musico_no_banco, 'hashed_password') else 'N/A'}'")
-    
-    senha_correta = verificar_senha(senha_texto_plano, musico_no_banco.hashed_password)
-    
-    # print(f"  [CRUD.PY - autenticar_musico] Resultado da verificação de senha para MÚSICO '{email}' (senha_correta): {senha_correta}")
-    # if not senha_correta:
-    #     print(f"  [CRUD.PY - autenticar_musico] Verificação de senha FALHOU para o MÚSICO '{email}'.")
-    # else:
-    #     print(f"  [CRUD.PY - autenticar_musico] Verificação de senha BEM-SUCEDIDA para o MÚSICO '{email}'.")
-        
+def concluir_autenticacao(
+    db: Session, conta: Union[models.Musico, models.UsuarioPublico], role: str, senha_correta: bool, novo_hash: Optional[str]
+) -> Optional[Union[models.Musico, models.UsuarioPublico]]:
+    """
+    Segunda metade do login, com o resultado de security.verificar_e_atualizar_senha (que roda no pool de hashing):
+    a conta se a senha confere, regravando o hash se ele usa um custo desatualizado; senão None.
+    """
     if not senha_correta:
+        logger.info("Senha incorreta no login", extra={"role": role, "user_id": conta.id})
         return None
-    return musico_no_banco
+    if novo_hash: # Hash com custo desatualizado: regrava com os parâmetros atuais
+        conta.hashed_password = novo_hash
+        db.commit()
+        db.refresh(conta)
+        logger.info("Hash de senha regravado com o custo atual", extra={"role": role, "user_id": conta.id})
+    return conta
 
 def atualizar_musico(db: Session, musico_db_obj: models.Musico, musico_update_data: schemas.MusicoUpdate) -> models.Musico:
     update_data = musico_update_data.model_dump(exclude_unset=True)
@@ -109,6 +146,8 @@ def atualizar_musico(db: Session, musico_db_obj: models.Musico, musico_update_da
     db.add(musico_db_obj)
     db.commit()
     db.refresh(musico_db_obj)
+    invalidar_principal("musico", musico_db_obj.id)
+    agenda_ics.invalidar_agenda(musico_db_obj.id) # O nome artístico vai no feed
     return musico_db_obj
 
 # --- Funções CRUD para Itens de Repertório ---
@@ -123,7 +162,8 @@ def criar_item_repertorio_para_musico(db: Session, item: schemas.ItemRepertorioC
     return db_item
 
 def obter_itens_repertorio_do_musico(db: Session, musico_id: int, skip: int = 0, limit: int = 100) -> List[models.ItemRepertorio]:
-    return db.query(models.ItemRepertorio).filter(models.ItemRepertorio.musico_id == musico_id).offset(skip).limit(limit).all()
+    # ORDER BY id: paginação estável, servida pelo índice (musico_id, id)
+    return db.query(models.ItemRepertorio).filter(models.ItemRepertorio.musico_id == musico_id).order_by(models.ItemRepertorio.id).offset(skip).limit(limit).all()
 
 def obter_item_repertorio_do_musico_por_id(db: Session, item_id: int, musico_id: int) -> Optional[models.ItemRepertorio]:
     return db.query(models.ItemRepertorio).filter(models.ItemRepertorio.id == item_id, models.ItemRepertorio.musico_id == musico_id).first()
@@ -154,18 +194,69 @@ def deletar_item_repertorio_do_musico(db: Session, item_id: int, musico_id: int)
     return db_item 
 
 # --- Funções CRUD para Shows ---
+def _dados_show(show: schemas.ShowCreate, musico_id: int) -> dict:
+    dados = show.model_dump()
+    if dados.get("link_evento") is not None:
+        dados["link_evento"] = str(dados["link_evento"])
+    dados["musico_id"] = musico_id
+    dados["geocelula"] = geo.geocelula(dados.get("latitude"), dados.get("longitude"))
+    return dados
+
+def _atribuir_locais(db: Session, lista_dados: List[dict]) -> List[dict]:
+    # local_id de cada show pelo local deduplicado; uma consulta para o lote todo
+    resolvidos = locais.resolver_locais(db, [(dados["local_nome"], dados.get("local_endereco"), dados.get("latitude"), dados.get("longitude")) for dados in lista_dados])
+    for dados, local in zip(lista_dados, resolvidos):
+        dados["local_id"] = local.id
+    return lista_dados
+
 def criar_show_para_musico(db: Session, show: schemas.ShowCreate, musico_id: int) -> models.Show:
-    show_data_dict = show.model_dump()
-    if show_data_dict.get("link_evento") is not None:
-        show_data_dict["link_evento"] = str(show_data_dict["link_evento"])
-    db_show = models.Show(**show_data_dict, musico_id=musico_id)
+    db_show = models.Show(**_atribuir_locais(db, [_dados_show(show, musico_id)])[0])
     db.add(db_show)
     db.commit()
+    agenda_ics.invalidar_agenda(musico_id)
     db.refresh(db_show)
     return db_show
 
+def criar_shows_em_lote(db: Session, shows: List[schemas.ShowCreate], musico_id: int) -> List[models.Show]:
+    # Um INSERT em lote e um commit para todos (tudo ou nada), em vez de um commit + refresh por show.
+    # Sem sort_by_parameter_order: no SQLite ele faz um INSERT por linha; a resposta sai na ordem da agenda
+    lista_dados = _atribuir_locais(db, [_dados_show(show, musico_id) for show in shows])
+    ids = db.scalars(insert(models.Show).returning(models.Show.id), lista_dados).all()
+    db.commit()
+    agenda_ics.invalidar_agenda(musico_id)
+    return db.query(models.Show).options(joinedload(models.Show.musico)).filter(models.Show.id.in_(ids)).order_by(models.Show.data_hora_evento.asc(), models.Show.id.asc()).all()
+
+def criar_serie_show(db: Session, serie: schemas.SerieShowCreate, musico_id: int) -> Tuple[models.SerieShow, int]:
+    """Grava a série e já gera os shows até o horizonte (SERIES_SHOWS_HORIZONTE_DIAS). Devolve (série, shows gerados)."""
+    dados = serie.model_dump()
+    if dados.get("link_evento") is not None:
+        dados["link_evento"] = str(dados["link_evento"])
+    dados["data_hora_inicio"] = series_shows.utc_sem_fuso(dados["data_hora_inicio"])
+    if dados["data_fim"] is not None:
+        dados["data_fim"] = series_shows.utc_sem_fuso(dados["data_fim"])
+    dados["excecoes"] = sorted({data.isoformat() for data in dados["excecoes"]})
+    dados["local_id"] = locais.resolver_locais(db, [(dados["local_nome"], dados["local_endereco"], dados["latitude"], dados["longitude"])])[0].id
+    db_serie = models.SerieShow(**dados, musico_id=musico_id, expandida_ate=dados["data_hora_inicio"], encerrada=False)
+    db.add(db_serie)
+    db.flush()
+    horizonte = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(days=series_shows.SERIES_SHOWS_HORIZONTE_DIAS)
+    gerados = series_shows.expandir_serie(db, db_serie, horizonte)
+    db.commit()
+    agenda_ics.invalidar_agenda(musico_id)
+    return db_serie, gerados
+
 def obter_shows_do_musico(db: Session, musico_id: int, skip: int = 0, limit: int = 100) -> List[models.Show]:
-    return db.query(models.Show).filter(models.Show.musico_id == musico_id).order_by(models.Show.data_hora_evento.asc()).offset(skip).limit(limit).all()
+    # joinedload: schemas.Show serializa o músico de cada show (sem ele, uma consulta extra por show)
+    return db.query(models.Show).options(joinedload(models.Show.musico)).filter(models.Show.musico_id == musico_id).order_by(models.Show.data_hora_evento.asc()).offset(skip).limit(limit).all()
+
+def _ocorrencias_nao_geradas_no_dia(db: Session, inicio_do_dia: datetime.datetime) -> List[models.Show]:
+    # As séries só existem em `shows` até a janela do job; os dias futuros (até o horizonte máximo) somam as
+    # ocorrências calculadas em memória. Leitura não grava: gerar shows fica com o job e com criar_serie_show
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    fim_do_dia = inicio_do_dia + datetime.timedelta(days=1)
+    if not agora < fim_do_dia <= agora + datetime.timedelta(days=series_shows.SERIES_SHOWS_HORIZONTE_MAXIMO_DIAS):
+        return []
+    return series_shows.ocorrencias_nao_geradas(db, inicio_do_dia, fim_do_dia)
 
 def obter_todos_os_shows(
     db: Session, 
@@ -176,26 +267,94 @@ def obter_todos_os_shows(
     query = db.query(models.Show).options(
         joinedload(models.Show.musico) 
     )
+    nao_gerados: List[models.Show] = []
     if data_filtro:
-        query = query.filter(func.date(models.Show.data_hora_evento) == data_filtro)
-        # print(f"CRUD obter_todos_os_shows: Aplicando filtro de data_especifica: '{data_filtro}'")
+        # Intervalo [dia, dia + 1) em vez de date(coluna) = dia, que não usa o índice de data_hora_evento
+        inicio_do_dia = datetime.datetime.combine(data_filtro, datetime.time.min)
+        nao_gerados = _ocorrencias_nao_geradas_no_dia(db, inicio_do_dia)
+        query = query.filter(
+            models.Show.data_hora_evento >= inicio_do_dia,
+            models.Show.data_hora_evento < inicio_do_dia + datetime.timedelta(days=1),
+        )
     else:
         agora = datetime.datetime.now(datetime.timezone.utc)
         query = query.filter(models.Show.data_hora_evento >= agora)
-        # print(f"CRUD obter_todos_os_shows: Listando shows futuros a partir de {agora}")
     query = query.order_by(models.Show.data_hora_evento.asc())
-    shows = query.offset(skip).limit(limit).all()
-    # print(f"CRUD obter_todos_os_shows: Retornando {len(shows)} shows com os filtros aplicados.")
+    if nao_gerados:
+        # A página sai da junção das duas listas: do banco vêm os skip + limit primeiros, sem offset
+        gravados = query.limit(skip + limit).all()
+        shows = sorted(gravados + nao_gerados, key=lambda show: show.data_hora_evento)[skip:skip + limit]
+    else:
+        shows = query.offset(skip).limit(limit).all()
+    logger.debug("obter_todos_os_shows: %d shows", len(shows), extra={"data_filtro": data_filtro, "skip": skip, "limit": limit})
     return shows
 
+def _candidatos_proximos(db: Session, latitude: float, longitude: float, raio_km: float, agora: datetime.datetime) -> List[Tuple[int, float, float]]:
+    # Faixas de geocelula (índice) e a caixa em volta do círculo; só (id, latitude, longitude), até o teto
+    faixas = geo.faixas_geocelula(latitude, longitude, raio_km)
+    lat_min, lat_max, trechos_lon = geo.caixa(latitude, longitude, raio_km)
+    return db.execute(
+        select(models.Show.id, models.Show.latitude, models.Show.longitude).where(
+            or_(*(models.Show.geocelula.between(inicio, fim) for inicio, fim in faixas)),
+            models.Show.latitude.between(lat_min, lat_max),
+            or_(*(models.Show.longitude.between(inicio, fim) for inicio, fim in trechos_lon)),
+            models.Show.data_hora_evento >= agora,
+        ).limit(geo.PROXIMOS_MAX_CANDIDATOS)
+    ).all()
+
+def obter_shows_proximos(
+    db: Session, latitude: float, longitude: float, raio_km: float, limit: int = 50
+) -> List[Tuple[models.Show, float]]:
+    """Shows futuros a até `raio_km` do ponto, do mais perto para o mais longe, com a distância em km."""
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    # 1) Lê os candidatos do raio pedido. Uma leitura abaixo do teto é completa: todo show a até `raio` está nela,
+    #    então, se ela tem `limit` shows dentro de `raio` (ou se `raio` já é o pedido), esses são os mais próximos.
+    #    Se bateu no teto, o raio encolhe; se coube mas veio curta, cresce de volta, sem passar do que estourou.
+    # 2) A distância exata filtra e ordena em Python; 3) só os `limit` mais próximos viram objetos do ORM
+    raio, raio_completo, raio_estourado = raio_km, 0.0, None
+    distancias: Optional[dict] = None
+    for _ in range(geo.PROXIMOS_MAX_BUSCAS):
+        candidatos = _candidatos_proximos(db, latitude, longitude, raio, agora)
+        if len(candidatos) < geo.PROXIMOS_MAX_CANDIDATOS:
+            distancias = {}
+            for show_id, show_latitude, show_longitude in candidatos:
+                distancia = geo.distancia_km(latitude, longitude, show_latitude, show_longitude)
+                if distancia <= raio:
+                    distancias[show_id] = round(distancia, 3)
+            if len(distancias) >= limit or raio >= raio_km:
+                break
+            raio_completo = raio
+            raio = (raio + raio_estourado) / 2
+        else:
+            raio_estourado = raio
+            raio = (raio_completo + raio) / 2 if raio_completo else raio / 4
+    else:
+        # Poucas buscas para a densidade da região: fica a última leitura completa (os mais próximos, mas menos
+        # que `limit`) ou, se nenhuma coube no teto, nenhum resultado em vez de uma amostra arbitrária
+        logger.warning("obter_shows_proximos: buscas esgotadas antes de achar %d shows", limit,
+                       extra={"latitude": latitude, "longitude": longitude, "raio_km": raio_km, "raio_completo_km": raio_completo})
+    if not distancias:
+        return []
+    mais_proximos = heapq.nsmallest(limit, distancias, key=lambda show_id: (distancias[show_id], show_id))
+    shows = db.query(models.Show).options(joinedload(models.Show.musico)).filter(models.Show.id.in_(mais_proximos)).all()
+    proximos = [(show, distancias[show.id]) for show in shows]
+    proximos.sort(key=lambda par: (par[1], par[0].data_hora_evento, par[0].id))
+    return proximos
+
+def obter_local_por_id(db: Session, local_id: int) -> Optional[models.Local]:
+    return db.get(models.Local, local_id)
+
+def obter_shows_do_local(db: Session, local_id: int, skip: int = 0, limit: int = 100, incluir_passados: bool = False) -> List[models.Show]:
+    # Índice (local_id, data_hora_evento): sem comparar texto de nome/endereço
+    query = db.query(models.Show).options(joinedload(models.Show.musico)).filter(models.Show.local_id == local_id)
+    if not incluir_passados:
+        query = query.filter(models.Show.data_hora_evento >= datetime.datetime.now(datetime.timezone.utc))
+    return query.order_by(models.Show.data_hora_evento.asc(), models.Show.id.asc()).offset(skip).limit(limit).all()
+
 def obter_show_por_id(db: Session, show_id: int) -> Optional[models.Show]:
     show = db.query(models.Show).options(
         joinedload(models.Show.musico) 
     ).filter(models.Show.id == show_id).first()
-    # if show:
-    #     print(f"CRUD obter_show_por_id: Show ID {show_id} encontrado: {show.local_nome}, Músico: {show.musico.nome_artistico if show.musico else 'N/A'}")
-    # else:
-    #     print(f"CRUD obter_show_por_id: Show ID {show_id} NÃO encontrado.")
     return show
 
 def obter_show_do_musico_por_id(db: Session, show_id: int, musico_id: int) -> Optional[models.Show]:
@@ -213,10 +372,20 @@ def atualizar_show_do_musico(
     update_data = show_update_data.model_dump(exclude_unset=True)
     if "link_evento" in update_data and update_data["link_evento"] is not None:
         update_data["link_evento"] = str(update_data["link_evento"])
+    # Confere contra o que está gravado: o show fica com as duas coordenadas ou com nenhuma
+    if (update_data.get("latitude", db_show.latitude) is None) != (update_data.get("longitude", db_show.longitude) is None):
+        raise ValueError("Informe latitude e longitude juntas")
+    if "local_nome" in update_data or "local_endereco" in update_data:
+        # Antes das atribuições: se a resolução do local desfizer a transação (corrida), nada se perde
+        novos = {campo: update_data.get(campo, getattr(db_show, campo)) for campo in ("local_nome", "local_endereco", "latitude", "longitude")}
+        update_data["local_id"] = locais.resolver_locais(db, [(novos["local_nome"], novos["local_endereco"], novos["latitude"], novos["longitude"])])[0].id
     for key, value in update_data.items():
         setattr(db_show, key, value)
+    if "latitude" in update_data or "longitude" in update_data:
+        db_show.geocelula = geo.geocelula(db_show.latitude, db_show.longitude)
     db.add(db_show)
     db.commit()
+    agenda_ics.invalidar_agenda(musico_id)
     db.refresh(db_show)
     return db_show
 
@@ -226,37 +395,54 @@ def deletar_show_do_musico(db: Session, show_id: int, musico_id: int) -> Optiona
         return None
     db.delete(db_show)
     db.commit()
+    agenda_ics.invalidar_agenda(musico_id)
     return db_show 
 
 # --- Funções CRUD para UsuarioPublico (Fãs) ---
 def obter_usuario_publico_por_email(db: Session, email: str) -> Optional[models.UsuarioPublico]:
-    # # --- PRINTS DE DEPURAÇÃO COMENTADOS (E OS DE TESTE QUE ADICIONAMOS) ---
-    # print(f"    [CRUD.PY - obter_usuario_publico_por_email] Buscando usuário (fã) com email (original): '{email}'")
-    # total_usuarios = db.query(models.UsuarioPublico).count()
-    # print(f"    [CRUD.PY - obter_usuario_publico_por_email] Total de usuários na tabela 'usuarios_publico': {total_usuarios}")
-    # email_param = email.lower() 
-    # print(f"    [CRUD.PY - obter_usuario_publico_por_email] Buscando com ILIKE e email normalizado para minúsculas: '{email_param}'")
-    # usuario_ilike = db.query(models.UsuarioPublico).filter(func.lower(models.UsuarioPublico.email) == email_param).first()
-    # if usuario_ilike:
-    #     print(f"    [CRUD.PY - obter_usuario_publico_por_email] Usuário (fã) ENCONTRADO com ILIKE: ID={usuario_ilike.id}, Email='{usuario_ilike.email}'")
-    # else:
-    #     print(f"    [CRUD.PY - obter_usuario_publico_por_email] Usuário (fã) com email '{email}' NÃO encontrado mesmo com ILIKE.")
-    
     usuario_original = db.query(models.UsuarioPublico).filter(models.UsuarioPublico.email == email).first()
-    # if usuario_original:
-    #     print(f"    [CRUD.PY - obter_usuario_publico_por_email] Resultado da busca ORIGINAL (==): ENCONTRADO - ID={usuario_original.id}, Email='{usuario_original.email}'")
-    # else:
-    #     print(f"    [CRUD.PY - obter_usuario_publico_por_email] Resultado da busca ORIGINAL (==): NÃO ENCONTRADO para email '{email}'")
     return usuario_original
 
 def obter_usuario_publico_por_id(db: Session, usuario_id: int) -> Optional[models.UsuarioPublico]:
     return db.query(models.UsuarioPublico).options(
-        joinedload(models.UsuarioPublico.musicos_favoritos).joinedload(models.Musico.itens_repertorio),
-        joinedload(models.UsuarioPublico.musicos_favoritos).joinedload(models.Musico.shows),            
-        joinedload(models.UsuarioPublico.pedidos_feitos).joinedload(models.PedidoMusica.musico_destinatario),
-        joinedload(models.UsuarioPublico.pedidos_feitos).joinedload(models.PedidoMusica.item_repertorio_pedido)
+        selectinload(models.UsuarioPublico.musicos_favoritos).selectinload(models.Musico.itens_repertorio),
+        selectinload(models.UsuarioPublico.musicos_favoritos).selectinload(models.Musico.shows),
+        selectinload(models.UsuarioPublico.pedidos_feitos).joinedload(models.PedidoMusica.musico_destinatario),
+        selectinload(models.UsuarioPublico.pedidos_feitos).joinedload(models.PedidoMusica.item_repertorio_pedido)
     ).filter(models.UsuarioPublico.id == usuario_id).first()
 
+def obter_identidade_usuario_publico(db: Session, usuario_id: int) -> Optional[schemas.UsuarioAutenticado]:
+    linha = db.query(models.UsuarioPublico.id, models.UsuarioPublico.email, models.UsuarioPublico.is_active).filter(models.UsuarioPublico.id == usuario_id).first()
+    if linha is None:
+        return None
+    return schemas.UsuarioAutenticado(id=linha.id, email=linha.email, is_active=linha.is_active is not False, role="fan")
+
+def obter_identidade_em_cache(db: Session, role: str, user_id: int) -> Optional[schemas.UsuarioAutenticado]:
+    chave = (role, user_id)
+    principal = _cache_principais.obter(chave)
+    if principal is None:
+        with _lock_geracoes_principais:
+            geracao = _geracoes_principais.get(chave, 0)
+        carregar = obter_identidade_musico if role == "musico" else obter_identidade_usuario_publico
+        principal = carregar(db, user_id)
+        # Uma invalidação durante a leitura (atualizar_* de outra requisição) pode ter vindo depois dela: não guarda
+        with _lock_geracoes_principais:
+            if principal is not None and _geracoes_principais.get(chave, 0) == geracao:
+                _cache_principais.definir(chave, principal)
+    return principal
+
+def invalidar_principal(role: str, user_id: int) -> None:
+    """Descarta a identidade em cache; chame depois do commit de qualquer mudança de email ou is_active."""
+    with _lock_geracoes_principais:
+        _geracoes_principais[(role, user_id)] = _geracoes_principais.get((role, user_id), 0) + 1
+    _cache_principais.remover((role, user_id))
+
+def limpar_cache_principais() -> None:
+    _cache_principais.limpar()
+
+def obter_conta_usuario_publico(db: Session, usuario_id: int) -> Optional[models.UsuarioPublico]:
+    return db.get(models.UsuarioPublico, usuario_id)
+
 def criar_usuario_publico(db: Session, usuario: schemas.UsuarioPublicoCreate) -> models.UsuarioPublico:
     senha_hasheada = obter_hash_da_senha(usuario.password)
     db_usuario = models.UsuarioPublico(
@@ -269,29 +455,6 @@ def criar_usuario_publico(db: Session, usuario: schemas.UsuarioPublicoCreate) ->
     db.refresh(db_usuario)
     return db_usuario
 
-def autenticar_usuario_publico(db: Session, email: str, senha_texto_plano: str) -> Optional[models.UsuarioPublico]:
-    # # --- PRINTS DE DEPURAÇÃO COMENTADOS ---
-    # print(f"  [CRUD.PY - autenticar_usuario_publico] Iniciando autenticação para email de FÃ: '{email}'")
-
-    usuario_no_banco = obter_usuario_publico_por_email(db, email=email) 
-    
-    if not usuario_no_banco:
-        return None
-    
-    # print(f"  [CRUD.PY - autenticar_usuario_publico] Senha HASHED armazenada para FÃ '{email}': '{usuario_no_banco.hashed_password if hasattr(usuario_no_banco, 'hashed_password') else 'N/A'}'")
-    
-    senha_correta = verificar_senha(senha_texto_plano, usuario_no_banco.hashed_password)
-    
-    # print(f"  [CRUD.PY - autenticar_usuario_publico] Resultado da verificação de senha para FÃ '{email}' (senha_correta): {senha_correta}")
-    # if not senha_correta:
-    #     print(f"  [CRUD.PY - autenticar_usuario_publico] Verificação de senha FALHOU para o FÃ '{email}'.")
-    # else:
-    #     print(f"  [CRUD.PY - autenticar_usuario_publico] Verificação de senha BEM-SUCEDIDA para o FÃ '{email}'.")
-        
-    if not senha_correta:
-        return None
-    return usuario_no_banco
-
 def atualizar_usuario_publico(
     db: Session, 
     usuario_db_obj: models.UsuarioPublico, 
@@ -299,7 +462,6 @@ def atualizar_usuario_publico(
     ) -> models.UsuarioPublico:
     update_data = usuario_update_data.model_dump(exclude_unset=True) 
     
-    # print(f"CRUD atualizar_usuario_publico: Dados para update: {update_data}")
 
     for key, value in update_data.items():
         if hasattr(usuario_db_obj, key):
@@ -308,9 +470,24 @@ def atualizar_usuario_publico(
     db.add(usuario_db_obj)
     db.commit()
     db.refresh(usuario_db_obj)
-    # print(f"CRUD atualizar_usuario_publico: Usuário ID {usuario_db_obj.id} atualizado. Novo nome: {usuario_db_obj.nome_completo}")
+    invalidar_principal("fan", usuario_db_obj.id)
     return usuario_db_obj
 
+# --- Refresh tokens usados (rotação) ---
+def marcar_refresh_token_usado(db: Session, jti_digest: bytes, role: str, user_id: int, expira_em: datetime.datetime) -> bool:
+    """
+    Grava o jti como usado e faz commit. False se ele já estava gravado (token reutilizado): a chave primária
+    decide, então duas renovações simultâneas com o mesmo token, mesmo em workers diferentes, não passam ambas.
+    Os jtis expirados saem pela limpeza periódica (app/limpeza_refresh_tokens.py), fora da renovação.
+    """
+    try:
+        db.execute(insert(models.RefreshTokenUsado).values(jti_digest=jti_digest, role=role, user_id=user_id, expira_em=expira_em))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
 # --- Funções CRUD para Favoritos ---
 def verificar_se_musico_e_favorito(db: Session, usuario_id: int, musico_id: int) -> bool:
     usuario = db.query(models.UsuarioPublico).options(joinedload(models.UsuarioPublico.musicos_favoritos)).filter(models.UsuarioPublico.id == usuario_id).first()
@@ -351,36 +528,47 @@ def criar_pedido_musica(
     db.refresh(db_pedido)
     return db_pedido
 
-def obter_pedidos_para_musico(
-    db: Session, musico_id: int, skip: int = 0, limit: int = 100
-) -> List[models.PedidoMusica]:
-    return (
-        db.query(models.PedidoMusica)
-        .filter(models.PedidoMusica.musico_id == musico_id)
-        .options(
-            joinedload(models.PedidoMusica.solicitante),
-            joinedload(models.PedidoMusica.item_repertorio_pedido)
+def _listar_pedidos(
+    db: Session, filtros, relacionamentos: List[str], skip: int, limit: int, incluir_arquivados: bool
+) -> List[Union[models.PedidoMusica, models.PedidoMusicaArquivado]]:
+    # `filtros(modelo)` devolve as condições para PedidoMusica ou PedidoMusicaArquivado (mesmas colunas)
+    def consultar(modelo, skip: int, limit: int):
+        return (
+            db.query(modelo)
+            .filter(*filtros(modelo))
+            .options(*(joinedload(getattr(modelo, nome)) for nome in relacionamentos))
+            .order_by(modelo.data_hora_pedido.desc(), modelo.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
         )
-        .order_by(models.PedidoMusica.data_hora_pedido.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+
+    if not incluir_arquivados:
+        return consultar(models.PedidoMusica, skip, limit)
+    # Cada tabela já vem ordenada: basta juntar as primeiras skip+limit de cada uma e cortar a página
+    quentes = consultar(models.PedidoMusica, 0, skip + limit)
+    arquivados = consultar(models.PedidoMusicaArquivado, 0, skip + limit)
+    juntos = heapq.merge(quentes, arquivados, key=lambda pedido: (pedido.data_hora_pedido, pedido.id), reverse=True)
+    return list(islice(juntos, skip, skip + limit))
+
+def obter_pedidos_para_musico(
+    db: Session, musico_id: int, skip: int = 0, limit: int = 100, status_pedido: Optional[models.StatusPedido] = None,
+    incluir_arquivados: bool = False
+) -> List[Union[models.PedidoMusica, models.PedidoMusicaArquivado]]:
+    def filtros(modelo):
+        condicoes = [modelo.musico_id == musico_id]
+        if status_pedido is not None:
+            # StatusPedido.PENDENTE cai no índice parcial ix_pedidos_musica_pendentes
+            condicoes.append(modelo.status_pedido == status_pedido)
+        return condicoes
+    return _listar_pedidos(db, filtros, ["solicitante", "item_repertorio_pedido"], skip, limit, incluir_arquivados)
 
 def obter_pedidos_feitos_por_fan(
-    db: Session, solicitante_id: int, skip: int = 0, limit: int = 100
-) -> List[models.PedidoMusica]:
-    return (
-        db.query(models.PedidoMusica)
-        .filter(models.PedidoMusica.solicitante_id == solicitante_id)
-        .options( 
-            joinedload(models.PedidoMusica.musico_destinatario),
-            joinedload(models.PedidoMusica.item_repertorio_pedido)
-        )
-        .order_by(models.PedidoMusica.data_hora_pedido.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    db: Session, solicitante_id: int, skip: int = 0, limit: int = 100, incluir_arquivados: bool = False
+) -> List[Union[models.PedidoMusica, models.PedidoMusicaArquivado]]:
+    return _listar_pedidos(
+        db, lambda modelo: [modelo.solicitante_id == solicitante_id], ["musico_destinatario", "item_repertorio_pedido"],
+        skip, limit, incluir_arquivados,
     )
 
 def obter_pedido_musica_por_id(
@@ -392,11 +580,29 @@ def obter_pedido_musica_por_id(
     return query.first()
 
 
+class TransicaoStatusPedidoInvalida(ValueError):
+    """O pedido não pode ir do status atual para o pedido (ex.: um pedido recusado não volta a ser atendido)."""
+
+
 def atualizar_status_pedido_musica(
-    db: Session, pedido_db_obj: models.PedidoMusica, novo_status: str
+    db: Session, pedido_db_obj: models.PedidoMusica, novo_status: Union[models.StatusPedido, str]
 ) -> models.PedidoMusica:
-    pedido_db_obj.status_pedido = novo_status
-    db.add(pedido_db_obj)
+    novo_status = models.StatusPedido(novo_status)
+    atual = pedido_db_obj.status_pedido
+    if novo_status == atual:
+        return pedido_db_obj
+    if novo_status not in models.TRANSICOES_STATUS_PEDIDO[atual]:
+        raise TransicaoStatusPedidoInvalida(f"Pedido {atual} não pode passar para {novo_status}")
+    # UPDATE condicional: se outra requisição mudou o status no meio tempo, nenhuma linha muda e a transição é recusada
+    resultado = db.execute(
+        update(models.PedidoMusica)
+        .where(models.PedidoMusica.id == pedido_db_obj.id, models.PedidoMusica.status_pedido == atual)
+        .values(status_pedido=novo_status)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != 1:
+        db.rollback()
+        raise TransicaoStatusPedidoInvalida(f"O status do pedido {pedido_db_obj.id} mudou durante a atualização")
     db.commit()
     db.refresh(pedido_db_obj)
     return pedido_db_obj
\ No newline at end of file
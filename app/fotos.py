@@ -0,0 +1,235 @@
+# app/fotos.py
+# Fotos de perfil: limite de tamanho no corpo da requisição, validação do conteúdo pelos
+# "magic bytes", troca da foto do músico e geração das miniaturas em segundo plano.
+# O armazenamento em si (GCS ou disco local) fica em app/armazenamento.py.
+import asyncio
+import logging
+import os
+import re
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import BackgroundTasks, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .armazenamento import Armazenamento, obter_armazenamento
+from .imagens import FORMATOS_VARIANTE, IMAGENS_WORKERS, gerar_variantes, nome_blob_variante, obter_pool_imagens
+from .jobs import despachar, enfileirar, tarefa
+
+logger = logging.getLogger(__name__)
+
+FOTO_TAMANHO_MAXIMO_BYTES = int(os.getenv("FOTO_TAMANHO_MAXIMO_BYTES", str(5 * 1024 * 1024)))
+# Folga para os cabeçalhos/boundaries do multipart em cima do tamanho da foto
+MARGEM_MULTIPART_BYTES = 64 * 1024
+PASTA_FOTOS_PERFIL = "profile_pics"
+
+
+class TipoImagem(NamedTuple):
+    extensao: str
+    content_type: str
+
+
+TIPOS_IMAGEM_ACEITOS = {"image/jpeg": TipoImagem("jpg", "image/jpeg"), "image/png": TipoImagem("png", "image/png")}
+
+
+def detectar_tipo_imagem(cabecalho: bytes) -> Optional[TipoImagem]:
+    # Decide pelo conteúdo, não pela extensão do nome do arquivo enviado
+    if cabecalho.startswith(b"\xff\xd8\xff"):
+        return TIPOS_IMAGEM_ACEITOS["image/jpeg"]
+    if cabecalho.startswith(b"\x89PNG\r\n\x1a\n"):
+        return TIPOS_IMAGEM_ACEITOS["image/png"]
+    return None
+
+
+async def validar_foto(foto_arquivo: UploadFile, tamanho_maximo: int = FOTO_TAMANHO_MAXIMO_BYTES) -> TipoImagem:
+    """Confere tamanho e tipo real da foto e deixa o arquivo posicionado no início para o upload."""
+    tamanho = foto_arquivo.size
+    if tamanho is None:
+        foto_arquivo.file.seek(0, os.SEEK_END)
+        tamanho = foto_arquivo.file.tell()
+    if tamanho == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Arquivo de foto vazio.")
+    if tamanho > tamanho_maximo:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Foto maior que o limite de {tamanho_maximo // (1024 * 1024)} MB.")
+
+    await foto_arquivo.seek(0)
+    tipo = detectar_tipo_imagem(await foto_arquivo.read(16))
+    await foto_arquivo.seek(0)
+    if tipo is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tipo de arquivo inválido. Apenas imagens PNG e JPEG.")
+    return tipo
+
+
+def nome_arquivo_foto(musico_id: int, tipo: TipoImagem) -> str:
+    return f"{PASTA_FOTOS_PERFIL}/user_{musico_id}_{uuid.uuid4()}.{tipo.extensao}"
+
+
+def nome_arquivo_pertence_ao_musico(nome: str, musico_id: int) -> bool:
+    # Impede que o finalize aponte para um arquivo de outro músico ou fora da pasta de fotos
+    return re.fullmatch(rf"{PASTA_FOTOS_PERFIL}/user_{musico_id}_[0-9a-f\-]{{36}}\.(jpg|png)", nome) is not None
+
+
+async def validar_foto_enviada(armazenamento: Armazenamento, nome: str, tamanho_maximo: int = FOTO_TAMANHO_MAXIMO_BYTES) -> None:
+    """Validação do upload direto (URL assinada): o arquivo já está no armazenamento, então confere lá."""
+    info = await run_in_threadpool(armazenamento.obter_info, nome)
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload não encontrado no armazenamento.")
+    if info.tamanho > tamanho_maximo:
+        await run_in_threadpool(armazenamento.deletar, nome)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Foto maior que o limite de {tamanho_maximo // (1024 * 1024)} MB.")
+    tipo = detectar_tipo_imagem(await run_in_threadpool(armazenamento.ler_inicio, nome, 16))
+    if tipo is None or not nome.endswith("." + tipo.extensao):
+        await run_in_threadpool(armazenamento.deletar, nome)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tipo de arquivo inválido. Apenas imagens PNG e JPEG.")
+
+
+async def trocar_foto_perfil(
+    db: Session, musico: models.Musico, nome_arquivo: str, url_nova: str, background_tasks: BackgroundTasks
+) -> models.Musico:
+    """Grava a nova URL e agenda a remoção da foto antiga (e miniaturas) e a geração das novas miniaturas."""
+    armazenamento = obter_armazenamento()
+    musico_id = musico.id  # lido antes dos commits, que expiram o objeto
+    urls_antigas = [musico.foto_perfil_url] if musico.foto_perfil_url else []
+    for por_tamanho in (musico.foto_perfil_variantes or {}).values():
+        urls_antigas.extend(por_tamanho.values())
+    nomes_antigos = [
+        nome for nome in (armazenamento.nome_a_partir_da_url(url) for url in urls_antigas if url != url_nova) if nome
+    ]
+
+    musico_atualizado = crud.atualizar_foto_perfil_musico(db, musico_id=musico_id, foto_url=url_nova)
+    if not musico_atualizado:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Não foi possível atualizar o perfil do músico no banco com a nova URL da foto.")
+
+    logger.info("Foto de perfil atualizada", extra={"musico_id": musico_id, "foto_url": url_nova})
+    # Nada disso precisa atrasar a resposta: vira job (app/jobs.py), com novas tentativas em caso de falha.
+    # Se a remoção falhar de vez, a limpeza periódica (app/limpeza_fotos.py) recolhe os arquivos.
+    if nomes_antigos:
+        despachar(db, background_tasks, "deletar_arquivos", {"nomes": nomes_antigos})
+    despachar(db, background_tasks, "variantes_foto", {"musico_id": musico_id, "nome_original": nome_arquivo, "url_original": url_nova})
+    return musico_atualizado
+
+
+@tarefa("deletar_arquivos", concorrencia=4, max_tentativas=6)
+async def deletar_arquivos(bind, nomes: List[str]) -> None:
+    """Job: remove os arquivos do armazenamento. Se algum falhar, o job falha e é tentado de novo (inteiro; deletar é idempotente)."""
+    armazenamento = obter_armazenamento()
+    falhas = []
+    for nome in nomes:
+        try:
+            if not await run_in_threadpool(armazenamento.deletar, nome):
+                logger.info("Foto antiga '%s' não encontrada no armazenamento para deletar", nome)
+        except Exception as e_del:
+            logger.warning("Erro ao deletar foto antiga '%s': %s", nome, e_del)
+            falhas.append(nome)
+    if falhas:
+        raise RuntimeError(f"{len(falhas)} arquivo(s) não removidos: {falhas[:5]}")
+
+
+# --- Variantes (miniaturas) ---
+@tarefa("variantes_foto", concorrencia=IMAGENS_WORKERS, max_tentativas=3)
+async def processar_variantes_foto(bind, musico_id: int, nome_original: str, url_original: str) -> None:
+    """
+    Job disparado após o upload: lê a foto do armazenamento, gera as miniaturas no pool de
+    processos, envia e grava as URLs no músico (se a foto ainda for a mesma).
+    """
+    armazenamento = obter_armazenamento()
+    if await run_in_threadpool(armazenamento.obter_info, nome_original) is None:
+        # A foto já foi trocada e removida antes de o job rodar: não há o que processar
+        logger.info("'%s' não existe mais no armazenamento; job de miniaturas ignorado", nome_original)
+        return
+    conteudo = await run_in_threadpool(armazenamento.ler, nome_original)
+    loop = asyncio.get_running_loop()
+    variantes = await loop.run_in_executor(obter_pool_imagens(), gerar_variantes, conteudo)
+
+    envios, chaves = [], []
+    for formato, por_tamanho in variantes.items():
+        content_type = FORMATOS_VARIANTE[formato][1]
+        for tamanho, dados in por_tamanho.items():
+            nome = nome_blob_variante(nome_original, tamanho, formato)
+            envios.append(run_in_threadpool(armazenamento.enviar_bytes, nome, dados, content_type))
+            chaves.append((formato, str(tamanho)))
+    urls = await asyncio.gather(*envios)
+
+    variantes_urls: Dict[str, Dict[str, str]] = {}
+    for (formato, tamanho), url in zip(chaves, urls):
+        variantes_urls.setdefault(formato, {})[tamanho] = url
+
+    with Session(bind=bind) as db:
+        if not crud.atualizar_variantes_foto_musico(db, musico_id=musico_id, foto_url=url_original, variantes=variantes_urls):
+            logger.info("Foto do músico mudou durante o processamento; miniaturas de '%s' descartadas", nome_original, extra={"musico_id": musico_id})
+            # Ninguém vai referenciar estas miniaturas: remove agora em vez de esperar a limpeza periódica
+            enfileirar(db, "deletar_arquivos", {"nomes": [nome_blob_variante(nome_original, int(t), f) for f, t in chaves]})
+
+
+# --- Limite de tamanho do corpo ---
+class _CorpoMuitoGrande(Exception):
+    pass
+
+
+class LimiteTamanhoUploadMiddleware:
+    """
+    Recusa com 413 uploads acima do limite da rota antes que o corpo seja lido e
+    guardado pelo parser de multipart: pelo Content-Length, quando informado, ou
+    contando os bytes à medida que chegam (uploads chunked).
+    """
+
+    def __init__(self, app, limites: Dict[str, int]):
+        self.app = app
+        self.limites = limites
+
+    async def __call__(self, scope, receive, send):
+        limite = self.limites.get(scope.get("path")) if scope["type"] == "http" else None
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        for nome, valor in scope.get("headers", []):
+            if nome == b"content-length":
+                try:
+                    if int(valor) > limite:
+                        await self._responder_413(send)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        recebidos = 0
+        excedeu = False
+        respondeu_413 = False
+
+        async def receive_limitado():
+            nonlocal recebidos, excedeu
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if recebidos > limite:
+                    excedeu = True
+                    raise _CorpoMuitoGrande()
+            return mensagem
+
+        async def send_limitado(mensagem):
+            nonlocal respondeu_413
+            if not excedeu:
+                await send(mensagem)
+            elif not respondeu_413:
+                # O parser do corpo transforma a interrupção num erro genérico; trocamos pela resposta 413
+                respondeu_413 = True
+                await self._responder_413(send)
+
+        try:
+            await self.app(scope, receive_limitado, send_limitado)
+        except _CorpoMuitoGrande:
+            if not respondeu_413:
+                await self._responder_413(send)
+
+    @staticmethod
+    async def _responder_413(send):
+        corpo = b'{"detail":"Arquivo maior que o limite permitido."}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode()), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": corpo})
@@ -0,0 +1,105 @@
+# app/geo.py
+# Busca de shows por proximidade sem extensão espacial no banco (funciona igual no SQLite e no PostgreSQL).
+#
+# Cada show com coordenadas guarda a `geocelula`: um geohash em forma de inteiro (bits de longitude e
+# latitude intercalados, curva Z, 26 bits por eixo). Células vizinhas no mapa têm prefixos de bits em comum,
+# e todo o conteúdo de uma célula de nível n é uma faixa contínua de inteiros. Assim, "shows num raio" vira
+# poucas faixas BETWEEN sobre o índice (geocelula, data_hora_evento), sem depender da collation de texto
+# (o que um geohash em string exigiria para LIKE 'prefixo%' usar o índice nos dois bancos).
+# As células cobrem mais que o círculo (até 4x a caixa em volta dele); a própria caixa em latitude/longitude
+# filtra o excesso na mesma consulta, e a distância exata (haversine) é calculada só para o que sobra.
+import math
+import os
+from typing import List, Optional, Tuple
+
+BITS_POR_EIXO = 26  # ~0,6 m por célula no equador: sobra precisão para qualquer raio de busca
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU_LATITUDE = 111.32
+# Teto de candidatos lidos por consulta (só id e coordenadas). Uma leitura que bate no teto não é usada para
+# ordenar: a busca repete com um raio menor (e depois vai ajustando o raio entre o que coube e o que estourou)
+PROXIMOS_MAX_CANDIDATOS = int(os.getenv("PROXIMOS_MAX_CANDIDATOS", "5000"))
+PROXIMOS_MAX_BUSCAS = int(os.getenv("PROXIMOS_MAX_BUSCAS", "8"))
+
+
+def _intercalar(lon_bits: int, lat_bits: int, bits: int) -> int:
+    # Como no geohash: o bit mais alto é de longitude, depois latitude, alternando
+    valor = 0
+    for posicao in range(bits - 1, -1, -1):
+        valor = (valor << 2) | (((lon_bits >> posicao) & 1) << 1) | ((lat_bits >> posicao) & 1)
+    return valor
+
+
+def _indice_no_eixo(valor: float, minimo: float, extensao: float, bits: int) -> int:
+    celulas = 1 << bits
+    return min(celulas - 1, max(0, int((valor - minimo) / extensao * celulas)))
+
+
+def geocelula(latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+    """Geohash inteiro (52 bits) do ponto; None se faltar alguma coordenada."""
+    if latitude is None or longitude is None:
+        return None
+    return _intercalar(
+        _indice_no_eixo(longitude, -180.0, 360.0, BITS_POR_EIXO),
+        _indice_no_eixo(latitude, -90.0, 180.0, BITS_POR_EIXO),
+        BITS_POR_EIXO,
+    )
+
+
+def caixa(latitude: float, longitude: float, raio_km: float) -> Tuple[float, float, List[Tuple[float, float]]]:
+    """
+    Caixa que contém o círculo: (lat_min, lat_max, trechos de longitude). Uma caixa que passa do antimeridiano
+    (±180) vira dois trechos [inicio, fim].
+    """
+    delta_lat = raio_km / KM_POR_GRAU_LATITUDE
+    cos_lat = math.cos(math.radians(latitude))
+    delta_lon = 180.0 if cos_lat < 1e-6 else min(180.0, raio_km / (KM_POR_GRAU_LATITUDE * cos_lat))
+    lat_min, lat_max = max(-90.0, latitude - delta_lat), min(90.0, latitude + delta_lat)
+    lon_min, lon_max = longitude - delta_lon, longitude + delta_lon
+    if lon_max - lon_min >= 360.0:
+        trechos_lon = [(-180.0, 180.0)]
+    elif lon_min < -180.0:
+        trechos_lon = [(lon_min + 360.0, 180.0), (-180.0, lon_max)]
+    elif lon_max > 180.0:
+        trechos_lon = [(lon_min, 180.0), (-180.0, lon_max - 360.0)]
+    else:
+        trechos_lon = [(lon_min, lon_max)]
+    return lat_min, lat_max, trechos_lon
+
+
+def faixas_geocelula(latitude: float, longitude: float, raio_km: float) -> List[Tuple[int, int]]:
+    """
+    Faixas [inicio, fim] de geocelula que cobrem o círculo (pela caixa que o contém). O nível das células é o
+    mais fino em que a caixa ainda cabe em 2x2 delas: no máximo 4 células por trecho de longitude.
+    """
+    lat_min, lat_max, trechos_lon = caixa(latitude, longitude, raio_km)
+
+    extensao_lat = max(lat_max - lat_min, 1e-9)
+    extensao_lon = max(max(fim - inicio for inicio, fim in trechos_lon), 1e-9)
+    nivel = max(0, min(BITS_POR_EIXO, int(math.floor(min(math.log2(180.0 / extensao_lat), math.log2(360.0 / extensao_lon))))))
+    deslocamento = 2 * (BITS_POR_EIXO - nivel)
+
+    prefixos = set()
+    lat_inicio, lat_fim = (_indice_no_eixo(valor, -90.0, 180.0, nivel) for valor in (lat_min, lat_max))
+    for inicio, fim in trechos_lon:
+        lon_inicio, lon_fim = (_indice_no_eixo(valor, -180.0, 360.0, nivel) for valor in (inicio, fim))
+        for lon_bits in range(lon_inicio, lon_fim + 1):
+            for lat_bits in range(lat_inicio, lat_fim + 1):
+                prefixos.add(_intercalar(lon_bits, lat_bits, nivel))
+
+    # Células consecutivas na curva viram uma faixa só (menos ORs na consulta)
+    faixas: List[Tuple[int, int]] = []
+    for prefixo in sorted(prefixos):
+        inicio, fim = prefixo << deslocamento, ((prefixo + 1) << deslocamento) - 1
+        if faixas and faixas[-1][1] + 1 == inicio:
+            faixas[-1] = (faixas[-1][0], fim)
+        else:
+            faixas.append((inicio, fim))
+    return faixas
+
+
+def distancia_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distância em km pela fórmula de haversine."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,72 @@
+# app/imagens.py
+# Pipeline de imagens das fotos de perfil: decodifica uma vez, aplica a orientação do EXIF
+# (e descarta os metadados) e gera miniaturas quadradas de tamanho fixo em WebP e JPEG.
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+# Lados (px) das miniaturas quadradas geradas para cada foto, do maior para o menor
+TAMANHOS_MINIATURA: Tuple[int, ...] = (640, 256, 96)
+FORMATOS_VARIANTE = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+IMAGENS_WORKERS = int(os.getenv("IMAGENS_WORKERS", str(os.cpu_count() or 1)))
+# Limite de pixels aceitos na decodificação (protege contra "bombas" de descompressão)
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGENS_MAX_PIXELS", str(50_000_000)))
+
+
+def gerar_variantes(conteudo: bytes) -> Dict[str, Dict[int, bytes]]:
+    """
+    Recebe os bytes da foto original e retorna {formato: {tamanho: bytes}}.
+    Roda em processo separado (CPU intensivo), por isso só recebe e devolve bytes.
+    """
+    with Image.open(io.BytesIO(conteudo)) as original:
+        # Para JPEG, decodifica já reduzido (DCT scaling): bem mais rápido que decodificar a foto inteira
+        original.draft("RGB", (TAMANHOS_MINIATURA[0] * 2, TAMANHOS_MINIATURA[0] * 2))
+        imagem = ImageOps.exif_transpose(original)  # retorna uma cópia já carregada
+    if imagem.mode in ("RGBA", "LA", "P"):
+        # Transparência vira fundo branco (JPEG não tem canal alfa)
+        imagem = imagem.convert("RGBA")
+        fundo = Image.new("RGB", imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel("A"))
+        imagem = fundo
+    elif imagem.mode != "RGB":
+        imagem = imagem.convert("RGB")
+
+    variantes: Dict[str, Dict[int, bytes]] = {formato: {} for formato in FORMATOS_VARIANTE}
+    atual = imagem
+    for tamanho in TAMANHOS_MINIATURA:
+        # Cada tamanho parte do anterior (já menor), em vez de redimensionar a original de novo
+        atual = ImageOps.fit(atual, (tamanho, tamanho), method=Image.Resampling.LANCZOS)
+        for formato, (formato_pil, _, opcoes) in FORMATOS_VARIANTE.items():
+            saida = io.BytesIO()
+            # Sem o parâmetro exif=..., o Pillow não grava metadados: o EXIF (GPS, câmera) é descartado
+            atual.save(saida, format=formato_pil, **opcoes)
+            variantes[formato][tamanho] = saida.getvalue()
+    return variantes
+
+
+def nome_blob_variante(blob_original: str, tamanho: int, formato: str) -> str:
+    # profile_pics/user_1_<uuid>.jpg -> profile_pics/variantes/user_1_<uuid>_256.webp
+    pasta, _, arquivo = blob_original.rpartition("/")
+    base = arquivo.rsplit(".", 1)[0]
+    return f"{pasta}/variantes/{base}_{tamanho}.{formato}" if pasta else f"variantes/{base}_{tamanho}.{formato}"
+
+
+_pool_imagens: Optional[ProcessPoolExecutor] = None
+
+
+def obter_pool_imagens() -> ProcessPoolExecutor:
+    global _pool_imagens
+    if _pool_imagens is None:
+        # Nunca fork: o pool nasce com o processo já rodando threads (QueueListener dos logs, pool de hashing,
+        # executor de jobs), e o filho herdaria travas seguradas por elas. forkserver (ou spawn, onde não há)
+        # começa de um processo limpo, que só importa este módulo
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool_imagens = ProcessPoolExecutor(max_workers=IMAGENS_WORKERS, mp_context=multiprocessing.get_context(metodo))
+    return _pool_imagens
@@ -0,0 +1,392 @@
+# app/jobs.py
+# Fila de tarefas em segundo plano persistida na tabela `jobs` (models.Job).
+#
+# - Reserva: no PostgreSQL, SELECT ... FOR UPDATE SKIP LOCKED; nos demais bancos (SQLite),
+#   UPDATE condicional por candidato (só um worker consegue trocar 'pendente' -> 'executando').
+#   A reserva tem prazo (JOBS_RESERVA_SEGUNDOS), renovado a cada JOBS_RENOVACAO_SEGUNDOS enquanto o job roda:
+#   se o worker morrer, o job volta para a fila (ou vira 'falhou', se já esgotou as tentativas).
+# - Falhas: o job volta a 'pendente' com espera exponencial até esgotar max_tentativas ('falhou').
+# - Concorrência: limite total (JOBS_WORKERS) e por tipo (`concorrencia` em @tarefa), por processo.
+# - Onde roda: no próprio processo da API (JOBS_WORKER_EM_PROCESSO, iniciado no lifespan) ou
+#   separado, com `python -m app.jobs`. Os dois modos podem coexistir sobre o mesmo banco.
+import argparse
+import asyncio
+import datetime
+import inspect
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, inspect as inspecionar, or_, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .metricas import JOBS_DURACAO, JOBS_ESPERA, JOBS_EXECUTADOS
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKER_EM_PROCESSO = os.getenv("JOBS_WORKER_EM_PROCESSO", "true").lower() in ("1", "true", "sim")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_INTERVALO_POLL_SEGUNDOS = float(os.getenv("JOBS_INTERVALO_POLL_SEGUNDOS", "1"))
+JOBS_RESERVA_SEGUNDOS = int(os.getenv("JOBS_RESERVA_SEGUNDOS", "300"))
+JOBS_RENOVACAO_SEGUNDOS = float(os.getenv("JOBS_RENOVACAO_SEGUNDOS", str(JOBS_RESERVA_SEGUNDOS / 3)))
+JOBS_ESPERA_BASE_SEGUNDOS = float(os.getenv("JOBS_ESPERA_BASE_SEGUNDOS", "5"))
+JOBS_ESPERA_MAXIMA_SEGUNDOS = float(os.getenv("JOBS_ESPERA_MAXIMA_SEGUNDOS", "3600"))
+JOBS_RETENCAO_CONCLUIDOS_HORAS = float(os.getenv("JOBS_RETENCAO_CONCLUIDOS_HORAS", "24"))
+
+
+class TipoJob(NamedTuple):
+    funcao: Callable
+    concorrencia: int
+    max_tentativas: int
+
+
+class JobReservado(NamedTuple):
+    id: int
+    tipo: str
+    payload: Dict[str, Any]
+    tentativas: int
+    max_tentativas: int
+    executar_em: datetime.datetime
+
+
+_TIPOS: Dict[str, TipoJob] = {}
+
+
+def tarefa(tipo: str, concorrencia: int = 1, max_tentativas: int = 5):
+    """
+    Registra a função que executa os jobs de `tipo`. Ela é chamada como `funcao(bind, **payload)`
+    (o payload precisa ser serializável em JSON) e pode ser síncrona (roda no threadpool) ou async.
+    Qualquer exceção conta como falha e o job é tentado de novo.
+    """
+    def registrar(funcao: Callable) -> Callable:
+        _TIPOS[tipo] = TipoJob(funcao, concorrencia, max_tentativas)
+        return funcao
+    return registrar
+
+
+def _agora() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# --- Enfileiramento ---
+def enfileirar(db: Session, tipo: str, payload: Optional[Dict[str, Any]] = None, atraso_segundos: float = 0, unico: bool = False) -> Optional[models.Job]:
+    """Grava o job (e faz commit). Com `unico`, não enfileira se já houver um do mesmo tipo pendente ou executando."""
+    if tipo not in _TIPOS:
+        raise ValueError(f"Tipo de job não registrado: {tipo}")
+    if unico:
+        existente = db.query(models.Job.id).filter(
+            models.Job.tipo == tipo, models.Job.status.in_(("pendente", "executando"))
+        ).first()
+        if existente:
+            return None
+    agora = _agora()
+    job = models.Job(
+        tipo=tipo, payload=payload or {}, status="pendente", tentativas=0, max_tentativas=_TIPOS[tipo].max_tentativas,
+        executar_em=agora + datetime.timedelta(seconds=atraso_segundos), criado_em=agora,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def despachar(db: Session, background_tasks, tipo: str, payload: Optional[Dict[str, Any]] = None) -> models.Job:
+    """
+    Enfileira a partir de um handler. Com o worker rodando no processo, já agenda a execução para
+    logo depois da resposta (sem esperar o próximo poll); o registro na tabela garante que o job
+    não se perde se o processo cair antes disso.
+    """
+    job = enfileirar(db, tipo, payload)
+    if _executor_ativo is not None and background_tasks is not None:
+        # id pela identidade: job.id depois do commit recarregaria o objeto (uma consulta a mais por job)
+        job_id = inspecionar(job).identity[0]
+        background_tasks.add_task(_executor_ativo.executar_agora, db.get_bind(), job_id, tipo)
+    return job
+
+
+# --- Reserva e conclusão (bloqueantes: chamadas via run_in_threadpool) ---
+def _reserva_vencida(agora: datetime.datetime):
+    return and_(models.Job.status == "executando", models.Job.travado_ate < agora)
+
+
+def _condicao_disponivel(agora: datetime.datetime):
+    return or_(
+        and_(models.Job.status == "pendente", models.Job.executar_em <= agora),
+        and_(_reserva_vencida(agora), models.Job.tentativas < models.Job.max_tentativas),
+    )
+
+
+def reservar_jobs(bind, vagas: Dict[str, int], trabalhador: str, job_id: Optional[int] = None, limite_total: Optional[int] = None) -> List[JobReservado]:
+    """Reserva até vagas[tipo] jobs disponíveis de cada tipo, no máximo `limite_total` ao todo (ou só o job `job_id`)."""
+    agora = _agora()
+    valores = {
+        "status": "executando", "travado_por": trabalhador, "iniciado_em": agora,
+        "travado_ate": agora + datetime.timedelta(seconds=JOBS_RESERVA_SEGUNDOS),
+        "tentativas": models.Job.tentativas + 1,
+    }
+    reservados: List[int] = []
+    with Session(bind=bind) as db:
+        # Reserva vencida na última tentativa: o worker morreu (ou travou) executando; não roda de novo
+        db.execute(
+            update(models.Job).where(_reserva_vencida(agora), models.Job.tentativas >= models.Job.max_tentativas).values(
+                status="falhou", concluido_em=agora, travado_por=None, travado_ate=None,
+                ultimo_erro="Reserva vencida sem conclusão na última tentativa",
+            )
+        )
+        for tipo, quantidade in vagas.items():
+            if limite_total is not None:
+                quantidade = min(quantidade, limite_total - len(reservados))
+                if quantidade <= 0:
+                    break
+            consulta = db.query(models.Job).filter(_condicao_disponivel(agora), models.Job.tipo == tipo)
+            if job_id is not None:
+                consulta = consulta.filter(models.Job.id == job_id)
+            consulta = consulta.order_by(models.Job.executar_em, models.Job.id).limit(quantidade)
+
+            if bind.dialect.name == "postgresql":
+                # Linhas travadas por outro worker são puladas em vez de esperadas
+                ids = [job.id for job in consulta.with_for_update(skip_locked=True)]
+                if ids:
+                    db.execute(update(models.Job).where(models.Job.id.in_(ids)).values(**valores))
+                reservados.extend(ids)
+            else:
+                # Sem SKIP LOCKED: reserva otimista, o UPDATE só pega se o job ainda estiver disponível
+                for (candidato,) in consulta.with_entities(models.Job.id).all():
+                    resultado = db.execute(
+                        update(models.Job).where(models.Job.id == candidato, _condicao_disponivel(agora)).values(**valores)
+                    )
+                    if resultado.rowcount == 1:
+                        reservados.append(candidato)
+            db.commit()
+
+        if not reservados:
+            return []
+        jobs = db.query(models.Job).filter(models.Job.id.in_(reservados), models.Job.travado_por == trabalhador).all()
+        return [JobReservado(j.id, j.tipo, dict(j.payload or {}), j.tentativas, j.max_tentativas, j.executar_em) for j in jobs]
+
+
+def renovar_reserva(bind, job_id: int, trabalhador: str) -> bool:
+    """Estende o prazo da reserva do job; False se ele já não está com este worker."""
+    with Session(bind=bind) as db:
+        resultado = db.execute(
+            update(models.Job).where(models.Job.id == job_id, models.Job.travado_por == trabalhador, models.Job.status == "executando")
+            .values(travado_ate=_agora() + datetime.timedelta(seconds=JOBS_RESERVA_SEGUNDOS))
+        )
+        db.commit()
+    return resultado.rowcount == 1
+
+
+def finalizar_job(bind, job: JobReservado, trabalhador: str, erro: Optional[str]) -> str:
+    """Marca o job como concluído ou agenda a próxima tentativa. Retorna o novo status."""
+    agora = _agora()
+    if erro is None:
+        valores = {"status": "concluido", "concluido_em": agora, "ultimo_erro": None}
+    elif job.tentativas >= job.max_tentativas:
+        valores = {"status": "falhou", "concluido_em": agora, "ultimo_erro": erro}
+    else:
+        espera = min(JOBS_ESPERA_BASE_SEGUNDOS * 2 ** (job.tentativas - 1), JOBS_ESPERA_MAXIMA_SEGUNDOS)
+        espera *= random.uniform(0.75, 1.25)  # espalha as novas tentativas de jobs que falharam juntos
+        valores = {"status": "pendente", "executar_em": agora + datetime.timedelta(seconds=espera), "ultimo_erro": erro}
+    valores.update(travado_por=None, travado_ate=None)
+    with Session(bind=bind) as db:
+        # Se a reserva venceu e outro worker pegou o job, este resultado é descartado
+        db.execute(update(models.Job).where(models.Job.id == job.id, models.Job.travado_por == trabalhador).values(**valores))
+        db.commit()
+    return valores["status"]
+
+
+def remover_jobs_antigos(bind, horas: float = JOBS_RETENCAO_CONCLUIDOS_HORAS) -> int:
+    limite = _agora() - datetime.timedelta(hours=horas)
+    with Session(bind=bind) as db:
+        removidos = db.query(models.Job).filter(
+            models.Job.status == "concluido", models.Job.concluido_em < limite
+        ).delete(synchronize_session=False)
+        db.commit()
+    return removidos
+
+
+# --- Métricas ---
+_RESULTADOS = {"concluido": "concluido", "pendente": "reagendado", "falhou": "falhou"}
+
+
+def _registrar_metrica(job: JobReservado, espera_segundos: float, duracao_segundos: float, status_final: str) -> None:
+    JOBS_EXECUTADOS.labels(job.tipo, _RESULTADOS[status_final]).inc()
+    JOBS_ESPERA.labels(job.tipo).observe(espera_segundos)
+    JOBS_DURACAO.labels(job.tipo).observe(duracao_segundos)
+
+
+def obter_fila_jobs(db: Session) -> Dict[str, Any]:
+    """Profundidade da fila por tipo/status e espera do job pronto mais antigo de cada tipo (exportadas no /metrics)."""
+    agora = _agora()
+    fila: Dict[str, Dict[str, int]] = {}
+    for tipo, status_job, quantidade in db.query(models.Job.tipo, models.Job.status, func.count(models.Job.id)).group_by(models.Job.tipo, models.Job.status):
+        fila.setdefault(tipo, {})[status_job] = quantidade
+    mais_antigos = db.query(models.Job.tipo, func.min(models.Job.executar_em)).filter(
+        models.Job.status == "pendente", models.Job.executar_em <= agora
+    ).group_by(models.Job.tipo)
+    return {
+        "fila": fila,
+        "espera_mais_antiga_s": {tipo: round((agora - desde).total_seconds(), 1) for tipo, desde in mais_antigos},
+    }
+
+
+# --- Execução ---
+class ExecutorJobs:
+    """Pool de workers assíncronos de um processo: reserva jobs conforme as vagas livres e os executa."""
+
+    def __init__(self, bind, workers: int = JOBS_WORKERS, intervalo_poll: float = JOBS_INTERVALO_POLL_SEGUNDOS, tipos: Optional[List[str]] = None):
+        self.bind = bind
+        self.workers = workers
+        self.intervalo_poll = intervalo_poll
+        self.tipos = tipos
+        self.trabalhador = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executando: Dict[str, int] = {}
+        self._tarefas: set = set()
+        self._acordar: Optional[asyncio.Event] = None
+        self._lock_reserva = asyncio.Lock()
+        self._ultima_remocao = 0.0
+
+    def _vagas(self) -> Dict[str, int]:
+        # Vagas livres por tipo; o limite total (workers) é aplicado na reserva
+        tipos = [t for t in _TIPOS if self.tipos is None or t in self.tipos]
+        random.shuffle(tipos)  # nenhum tipo fica sempre com as vagas que sobram
+        vagas = {t: _TIPOS[t].concorrencia - self._executando.get(t, 0) for t in tipos}
+        return {t: n for t, n in vagas.items() if n > 0}
+
+    async def _manter_reserva(self, bind, job: JobReservado) -> None:
+        # Jobs longos (arquivamento, varredura de fotos) passam do prazo da reserva; sem renovar,
+        # outro worker pegaria o mesmo job e o rodaria em paralelo, furando a `concorrencia`
+        while True:
+            await asyncio.sleep(JOBS_RENOVACAO_SEGUNDOS)
+            try:
+                if not await run_in_threadpool(renovar_reserva, bind, job.id, self.trabalhador):
+                    logger.warning("Reserva do job %s (%s) perdida durante a execução", job.id, job.tipo,
+                                   extra={"job_id": job.id, "job_tipo": job.tipo})
+                    return
+            except Exception as e_renovar:
+                logger.exception("Erro ao renovar a reserva do job %s: %s", job.id, e_renovar)
+
+    async def _executar(self, bind, job: JobReservado) -> None:
+        config = _TIPOS.get(job.tipo)
+        espera = max(0.0, (_agora() - job.executar_em).total_seconds())
+        inicio = time.perf_counter()
+        erro = None
+        renovacao = asyncio.create_task(self._manter_reserva(bind, job))
+        try:
+            if config is None:
+                raise LookupError(f"Tipo de job não registrado: {job.tipo}")
+            if inspect.iscoroutinefunction(config.funcao):
+                await config.funcao(bind, **job.payload)
+            else:
+                await run_in_threadpool(config.funcao, bind, **job.payload)
+        except Exception as e_job:
+            erro = f"{type(e_job).__name__}: {e_job}"
+            logger.exception(
+                "Erro no job %s (%s), tentativa %s/%s", job.id, job.tipo, job.tentativas, job.max_tentativas,
+                extra={"job_id": job.id, "job_tipo": job.tipo},
+            )
+        finally:
+            renovacao.cancel()
+            duracao = time.perf_counter() - inicio
+            self._executando[job.tipo] -= 1
+            try:
+                status_final = await run_in_threadpool(finalizar_job, bind, job, self.trabalhador, erro)
+                _registrar_metrica(job, espera, duracao, status_final)
+            finally:
+                if self._acordar is not None:
+                    self._acordar.set()
+
+    async def _reservar(self, bind, job_id: Optional[int] = None, tipo: Optional[str] = None) -> List[JobReservado]:
+        # Uma reserva por vez: as vagas são calculadas e ocupadas sem outra reserva no meio
+        async with self._lock_reserva:
+            livres = self.workers - sum(self._executando.values())
+            vagas = self._vagas()
+            if tipo is not None:
+                vagas = {tipo: 1} if tipo in vagas else {}
+            if livres <= 0 or not vagas:
+                return []
+            reservados = await run_in_threadpool(reservar_jobs, bind, vagas, self.trabalhador, job_id, livres)
+            for job in reservados:
+                self._executando[job.tipo] = self._executando.get(job.tipo, 0) + 1
+            return reservados
+
+    def _iniciar(self, bind, reservados: List[JobReservado]) -> None:
+        for job in reservados:
+            tarefa_job = asyncio.create_task(self._executar(bind, job))
+            self._tarefas.add(tarefa_job)
+            tarefa_job.add_done_callback(self._tarefas.discard)
+
+    async def executar_agora(self, bind, job_id: int, tipo: str) -> None:
+        """Executa um job recém-enfileirado (BackgroundTask); sem vaga para o tipo, fica para o laço principal."""
+        reservados = await self._reservar(bind, job_id=job_id, tipo=tipo)
+        if reservados:
+            await self._executar(bind, reservados[0])
+        elif self._acordar is not None:
+            self._acordar.set()
+
+    async def executar_para_sempre(self) -> None:
+        self._acordar = asyncio.Event()
+        while True:
+            try:
+                self._iniciar(self.bind, await self._reservar(self.bind))
+                if time.monotonic() - self._ultima_remocao > 3600:
+                    self._ultima_remocao = time.monotonic()
+                    await run_in_threadpool(remover_jobs_antigos, self.bind)
+            except Exception as e_poll:
+                logger.exception("Erro ao buscar jobs: %s", e_poll)
+            # Dorme até o próximo poll ou até um job terminar/ser enfileirado neste processo
+            try:
+                await asyncio.wait_for(self._acordar.wait(), self.intervalo_poll)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+
+    async def drenar(self) -> None:
+        """Executa tudo o que estiver disponível agora e retorna quando a fila (pronta) esvaziar."""
+        while True:
+            reservados = await self._reservar(self.bind)
+            self._iniciar(self.bind, reservados)
+            if not reservados and not self._tarefas:
+                return
+            if self._tarefas:
+                await asyncio.wait(set(self._tarefas), return_when=asyncio.FIRST_COMPLETED)
+
+    async def parar(self, tempo_limite: float = 10) -> None:
+        # Jobs que não terminarem a tempo voltam para a fila quando a reserva vencer
+        if self._tarefas:
+            await asyncio.wait(set(self._tarefas), timeout=tempo_limite)
+
+
+_executor_ativo: Optional[ExecutorJobs] = None
+
+
+def definir_executor_ativo(executor: Optional[ExecutorJobs]) -> None:
+    global _executor_ativo
+    _executor_ativo = executor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs do PalcoApp")
+    parser.add_argument("--workers", type=int, default=JOBS_WORKERS)
+    parser.add_argument("--tipos", nargs="*", help="Só executa estes tipos de job")
+    parser.add_argument("--uma-vez", action="store_true", help="Executa os jobs prontos e sai")
+    args = parser.parse_args()
+
+    from .database import engine
+    from .logs import configurar_logs
+    # Com `python -m app.jobs` este arquivo roda como __main__: usa o módulo app.jobs, onde as tarefas se registram
+    from . import jobs, fotos, limpeza_fotos, limpeza_refresh_tokens, arquivamento_pedidos, series_shows  # noqa: F401 (registram as tarefas)
+
+    configurar_logs()
+    executor = jobs.ExecutorJobs(engine, workers=args.workers, tipos=args.tipos)
+    logger.info("Worker %s iniciado; tipos: %s", executor.trabalhador, args.tipos or sorted(jobs._TIPOS))
+    asyncio.run(executor.drenar() if args.uma_vez else executor.executar_para_sempre())
+
+
+if __name__ == "__main__":
+    main()
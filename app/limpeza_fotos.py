@@ -0,0 +1,134 @@
+# app/limpeza_fotos.py
+# Limpeza periódica das fotos de perfil órfãs: percorre profile_pics/ no armazenamento em
+# lotes e remove os arquivos (originais e miniaturas) que nenhum Musico.foto_perfil_url referencia.
+#
+# Seguro para rodar junto com uploads: arquivos mais novos que LIMPEZA_FOTOS_IDADE_MINIMA_SEGUNDOS
+# nunca são removidos (o upload grava o arquivo antes de gravar a URL no banco, e o upload
+# assinado só é finalizado depois), e cada lote consulta o banco no momento em que é avaliado.
+#
+# Uso avulso: python -m app.limpeza_fotos [--simular]
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from itertools import islice
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import crud
+from .armazenamento import UPLOAD_ASSINADO_EXPIRA_SEGUNDOS, Armazenamento, obter_armazenamento
+from .fotos import PASTA_FOTOS_PERFIL, TIPOS_IMAGEM_ACEITOS
+from .jobs import enfileirar, tarefa
+
+logger = logging.getLogger(__name__)
+
+LIMPEZA_FOTOS_INTERVALO_SEGUNDOS = float(os.getenv("LIMPEZA_FOTOS_INTERVALO_SEGUNDOS", str(6 * 3600)))  # 0 desliga
+LIMPEZA_FOTOS_IDADE_MINIMA_SEGUNDOS = float(os.getenv(
+    "LIMPEZA_FOTOS_IDADE_MINIMA_SEGUNDOS", str(max(3600, 2 * UPLOAD_ASSINADO_EXPIRA_SEGUNDOS))
+))
+LIMPEZA_FOTOS_TAMANHO_LOTE = int(os.getenv("LIMPEZA_FOTOS_TAMANHO_LOTE", "500"))
+
+# profile_pics/variantes/user_1_<uuid>_256.webp -> "user_1_<uuid>"
+_RE_VARIANTE = re.compile(r"(?P<base>.+)_\d+\.[a-z]+")
+
+
+def urls_candidatas(armazenamento: Armazenamento, nome: str) -> List[str]:
+    """URLs de foto original que, se referenciadas no banco, mantêm este arquivo vivo."""
+    pasta_variantes = f"{PASTA_FOTOS_PERFIL}/variantes/"
+    if nome.startswith(pasta_variantes):
+        casamento = _RE_VARIANTE.fullmatch(nome[len(pasta_variantes):])
+        if casamento:
+            # A miniatura não guarda a extensão da original: vale qualquer uma das aceitas
+            return [armazenamento.url_publica(f"{PASTA_FOTOS_PERFIL}/{casamento['base']}.{tipo.extensao}")
+                    for tipo in TIPOS_IMAGEM_ACEITOS.values()]
+    return [armazenamento.url_publica(nome)]
+
+
+def coletar_fotos_orfas(
+    bind,
+    armazenamento: Optional[Armazenamento] = None,
+    idade_minima_segundos: float = LIMPEZA_FOTOS_IDADE_MINIMA_SEGUNDOS,
+    tamanho_lote: int = LIMPEZA_FOTOS_TAMANHO_LOTE,
+    simular: bool = False,
+) -> Dict[str, int]:
+    """
+    Uma passada completa pela pasta de fotos. Bloqueante (I/O de armazenamento e banco):
+    no servidor, chame via run_in_threadpool. Com `simular`, só conta o que seria removido.
+    """
+    armazenamento = armazenamento or obter_armazenamento()
+    limite = time.time() - idade_minima_segundos
+    resumo = {"verificados": 0, "recentes": 0, "referenciados": 0, "deletados": 0, "falhas": 0}
+
+    arquivos = armazenamento.listar(PASTA_FOTOS_PERFIL + "/", tamanho_pagina=tamanho_lote)
+    while True:
+        lote = list(islice(arquivos, tamanho_lote))
+        if not lote:
+            break
+        resumo["verificados"] += len(lote)
+        antigos = [arquivo.nome for arquivo in lote if arquivo.atualizado_em < limite]
+        resumo["recentes"] += len(lote) - len(antigos)
+
+        candidatas = {nome: urls_candidatas(armazenamento, nome) for nome in antigos}
+        with Session(bind=bind) as db:
+            referenciadas = crud.obter_fotos_perfil_referenciadas(db, [url for urls in candidatas.values() for url in urls])
+
+        for nome, urls in candidatas.items():
+            if referenciadas.intersection(urls):
+                resumo["referenciados"] += 1
+                continue
+            if simular:
+                resumo["deletados"] += 1
+                continue
+            try:
+                armazenamento.deletar(nome)
+                resumo["deletados"] += 1
+            except Exception as e_del:
+                resumo["falhas"] += 1
+                logger.warning("Erro ao deletar '%s': %s", nome, e_del)
+
+    logger.info("Limpeza de fotos órfãs%s concluída", " (simulação)" if simular else "", extra=resumo)
+    return resumo
+
+
+@tarefa("limpeza_fotos", concorrencia=1, max_tentativas=1)
+def _job_limpeza_fotos(bind) -> None:
+    coletar_fotos_orfas(bind)
+
+
+def _agendar_limpeza(bind) -> None:
+    with Session(bind=bind) as db:
+        enfileirar(db, "limpeza_fotos", unico=True)
+
+
+async def executar_limpeza_periodica(bind, intervalo_segundos: float = LIMPEZA_FOTOS_INTERVALO_SEGUNDOS) -> None:
+    # Laço iniciado com a app: só enfileira o job (um por vez, mesmo com vários processos da API);
+    # quem executa é o worker de jobs. A primeira passada espera um intervalo inteiro.
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await run_in_threadpool(_agendar_limpeza, bind)
+        except Exception as e_limpeza:
+            logger.exception("Erro ao agendar a limpeza periódica: %s", e_limpeza)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove fotos de perfil que nenhum músico referencia")
+    parser.add_argument("--simular", action="store_true", help="Só conta o que seria removido")
+    parser.add_argument("--idade-minima", type=float, default=LIMPEZA_FOTOS_IDADE_MINIMA_SEGUNDOS, help="Ignora arquivos mais novos que isto (s)")
+    parser.add_argument("--lote", type=int, default=LIMPEZA_FOTOS_TAMANHO_LOTE)
+    args = parser.parse_args()
+
+    from .database import engine
+    from .logs import configurar_logs
+    configurar_logs()
+    resumo = coletar_fotos_orfas(engine, idade_minima_segundos=args.idade_minima, tamanho_lote=args.lote, simular=args.simular)
+    print(json.dumps(resumo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# app/limpeza_refresh_tokens.py
+# Poda de refresh_tokens_usados: um jti só precisa ficar gravado até o token dele expirar (depois disso o
+# próprio exp o recusa). A renovação de tokens só insere; esta limpeza apaga os expirados de todas as contas,
+# em lotes pequenos pelo índice de expira_em, para a tabela acompanhar só os tokens ainda válidos.
+import asyncio
+import datetime
+import logging
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .jobs import enfileirar, tarefa
+
+logger = logging.getLogger(__name__)
+
+LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS = float(os.getenv("LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS", "3600"))  # 0 desliga
+LIMPEZA_REFRESH_TOKENS_TAMANHO_LOTE = int(os.getenv("LIMPEZA_REFRESH_TOKENS_TAMANHO_LOTE", "5000"))
+
+
+def remover_refresh_tokens_expirados(bind, tamanho_lote: int = LIMPEZA_REFRESH_TOKENS_TAMANHO_LOTE) -> int:
+    """Apaga, lote a lote (um commit por lote), os jtis cujo token já expirou. Devolve quantos apagou."""
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    tabela = models.RefreshTokenUsado
+    removidos = 0
+    with Session(bind=bind) as db:
+        while True:
+            lote = select(tabela.jti_digest).where(tabela.expira_em < agora).limit(tamanho_lote)
+            apagados = db.execute(delete(tabela).where(tabela.jti_digest.in_(lote))).rowcount
+            db.commit()
+            removidos += apagados
+            if apagados < tamanho_lote:
+                break
+    logger.info("Limpeza de refresh tokens usados concluída", extra={"removidos": removidos})
+    return removidos
+
+
+@tarefa("limpeza_refresh_tokens", concorrencia=1, max_tentativas=1)
+def _job_limpeza_refresh_tokens(bind) -> None:
+    remover_refresh_tokens_expirados(bind)
+
+
+def _agendar_limpeza(bind) -> None:
+    with Session(bind=bind) as db:
+        enfileirar(db, "limpeza_refresh_tokens", unico=True)
+
+
+async def executar_limpeza_refresh_tokens_periodica(bind, intervalo_segundos: float = LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS) -> None:
+    # Como a limpeza de fotos: o laço só enfileira o job (um por vez entre processos); o worker de jobs executa
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await run_in_threadpool(_agendar_limpeza, bind)
+        except Exception as e_limpeza:
+            logger.exception("Erro ao agendar a limpeza de refresh tokens: %s", e_limpeza)
@@ -0,0 +1,140 @@
+# app/locais.py
+# Locais (casas de show) deduplicados. O nome digitado em cada show ("Bar do Zé", "bar do ze", "O Bar do Zé!")
+# é reduzido a uma chave (sem acento, caixa, pontuação, espaços e artigo inicial). Primeiro vêm os locais
+# com a mesma chave (índice da unique em chave + endereço): se um deles bate no endereço, é o mesmo local.
+# Só o que sobra é comparado por semelhança (difflib) do nome e do endereço com os locais do mesmo `bloco`
+# (4 primeiros caracteres da chave, coluna indexada) de tamanho compatível com o limiar, até
+# LOCAIS_MAX_CANDIDATOS: blocos comuns ("bard", "casa", "teat") têm milhares de locais, e sem o teto cada
+# cadastro traria todos. Erros de digitação nos 4 primeiros caracteres não são pegos, e num bloco acima do
+# teto um local parecido pode ficar de fora (vira um local novo, o que só custa uma duplicata).
+#
+# A migração que criou a tabela agrupou os locais dos shows existentes com as mesmas regras
+# (alembic/versions/d5b9f3a7c2e1_create_locais.py): mudanças aqui não reprocessam os dados antigos.
+import difflib
+import math
+import os
+import re
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, insert, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+LOCAIS_LIMIAR_NOME = float(os.getenv("LOCAIS_LIMIAR_NOME", "0.88"))
+LOCAIS_LIMIAR_ENDERECO = float(os.getenv("LOCAIS_LIMIAR_ENDERECO", "0.8"))
+LOCAIS_MAX_CANDIDATOS = int(os.getenv("LOCAIS_MAX_CANDIDATOS", "200"))
+
+_ARTIGOS_INICIAIS = ("o ", "a ", "os ", "as ", "the ")
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Minúsculas, sem acentos e com qualquer pontuação virando um espaço só."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return _NAO_ALFANUMERICO.sub(" ", sem_acento.lower()).strip()
+
+
+def chave_nome(nome: str) -> str:
+    normalizado = normalizar(nome)
+    for artigo in _ARTIGOS_INICIAIS:
+        if normalizado.startswith(artigo):
+            normalizado = normalizado[len(artigo):]
+            break
+    return normalizado.replace(" ", "")
+
+
+def _semelhanca(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _mesmo_local(local: models.Local, chave: str, endereco: str) -> float:
+    """Pontuação (0 = diferente) de o local ser o mesmo lugar que (chave, endereço)."""
+    nota_nome = 1.0 if local.chave == chave else _semelhanca(local.chave, chave)
+    if nota_nome < LOCAIS_LIMIAR_NOME:
+        return 0.0
+    # Sem endereço de um dos lados, vale só o nome; com os dois, eles também precisam bater
+    if local.endereco_normalizado and endereco and _semelhanca(local.endereco_normalizado, endereco) < LOCAIS_LIMIAR_ENDERECO:
+        return 0.0
+    return nota_nome
+
+
+def _faixa_de_tamanho(chave: str) -> Tuple[int, int]:
+    # ratio() = 2 * iguais / (len(a) + len(b)) <= 2 * menor / soma: fora desta faixa a nota não chega ao limiar
+    limiar = max(LOCAIS_LIMIAR_NOME, 0.01)
+    return math.floor(len(chave) * limiar / (2 - limiar)), math.ceil(len(chave) * (2 - limiar) / limiar)
+
+
+def _candidatos(db: Session, chaves: Sequence[Tuple[str, str]]) -> List[models.Local]:
+    """Locais com a mesma chave e, para o que eles não resolverem, até LOCAIS_MAX_CANDIDATOS parecidos do mesmo bloco."""
+    candidatos = db.query(models.Local).filter(models.Local.chave.in_({chave for chave, _ in chaves})).all()
+    faixas: dict = {}
+    for chave, endereco in chaves:
+        if any(local.chave == chave and _mesmo_local(local, chave, endereco) for local in candidatos):
+            continue
+        minimo, maximo = _faixa_de_tamanho(chave)
+        anterior = faixas.get(chave[:4], (minimo, maximo))
+        faixas[chave[:4]] = (min(anterior[0], minimo), max(anterior[1], maximo))
+    if faixas:
+        conhecidos = {local.id for local in candidatos}
+        parecidos = db.query(models.Local).filter(or_(*(
+            and_(models.Local.bloco == bloco, func.length(models.Local.chave).between(minimo, maximo))
+            for bloco, (minimo, maximo) in faixas.items()
+        ))).limit(LOCAIS_MAX_CANDIDATOS).all()
+        candidatos.extend(local for local in parecidos if local.id not in conhecidos)
+    return candidatos
+
+
+def _resolver(db: Session, pedidos: Sequence[Tuple[str, Optional[str], Optional[float], Optional[float]]]) -> List[models.Local]:
+    chaves = [(chave_nome(nome) or normalizar(nome) or nome, normalizar(endereco)) for nome, endereco, _, _ in pedidos]
+    # Os locais novos do próprio lote também valem como candidatos
+    candidatos = _candidatos(db, chaves)
+    novos: List[models.Local] = []  # Ainda fora da sessão: vão num INSERT só, lá embaixo
+    resolvidos = []
+    for (nome, endereco, latitude, longitude), (chave, endereco_normalizado) in zip(pedidos, chaves):
+        pontuados = [(_mesmo_local(local, chave, endereco_normalizado), local) for local in candidatos if local.bloco == chave[:4]]
+        pontuados = [(nota, local) for nota, local in pontuados if nota > 0]
+        if pontuados:
+            # Empate: o local mais antigo (os novos ainda não têm id)
+            local = max(pontuados, key=lambda par: (par[0], -(par[1].id or float("inf"))))[1]
+        else:
+            local = models.Local(nome=nome.strip(), endereco=endereco, chave=chave, bloco=chave[:4], endereco_normalizado=endereco_normalizado)
+            novos.append(local)
+            candidatos.append(local)
+        if local.latitude is None and latitude is not None and longitude is not None:
+            local.latitude, local.longitude = latitude, longitude
+        resolvidos.append(local)
+
+    if novos:
+        # INSERT em lote e releitura só dos novos, pela chave única (chave, endereco_normalizado); pela unidade
+        # de trabalho do ORM, o SQLite faria um INSERT por local
+        db.execute(insert(models.Local), [
+            {coluna: getattr(local, coluna) for coluna in ("nome", "endereco", "chave", "bloco", "endereco_normalizado", "latitude", "longitude")}
+            for local in novos
+        ])
+        gravados = {
+            (local.chave, local.endereco_normalizado): local
+            for local in db.query(models.Local).filter(
+                tuple_(models.Local.chave, models.Local.endereco_normalizado).in_([(local.chave, local.endereco_normalizado) for local in novos])
+            )
+        }
+        resolvidos = [gravados[(local.chave, local.endereco_normalizado)] if local.id is None else local for local in resolvidos]
+    db.flush()
+    return resolvidos
+
+
+def resolver_locais(db: Session, pedidos: Sequence[Tuple[str, Optional[str], Optional[float], Optional[float]]]) -> List[models.Local]:
+    """
+    Para cada (nome, endereço, latitude, longitude), o local existente equivalente ou um novo (já com id, sem commit).
+    Chame no início da transação: se outra requisição criar o mesmo local ao mesmo tempo (unique em chave +
+    endereço), a transação é desfeita e a resolução refeita, agora enxergando o local que a outra gravou.
+    """
+    try:
+        return _resolver(db, pedidos)
+    except IntegrityError:
+        db.rollback()
+        return _resolver(db, pedidos)
@@ -0,0 +1,208 @@
+# app/logs.py
+# Logs estruturados (uma linha JSON por registro) sem I/O no caminho da requisição:
+# os handlers dos loggers só colocam o registro numa fila (QueueHandler) e um thread
+# separado (QueueListener) formata e escreve no stdout.
+#
+# Configuração pelo ambiente:
+#   LOG_LEVEL            nível padrão (INFO)
+#   LOG_LEVELS           níveis por módulo, ex.: "app.crud=DEBUG,app.jobs=WARNING,sqlalchemy.engine=INFO"
+#   LOG_FORMATO          "json" (padrão) ou "texto" (mais legível no desenvolvimento)
+#   LOG_AMOSTRA_DEBUG    fração dos registros DEBUG que é escrita (1 = todos); um registro pode
+#                        trocar a taxa com extra={"amostra": 0.01}
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json")
+LOG_AMOSTRA_DEBUG = float(os.getenv("LOG_AMOSTRA_DEBUG", "1"))
+LOG_FILA_MAXIMA = int(os.getenv("LOG_FILA_MAXIMA", "10000"))
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_RE_REQUEST_ID = re.compile(r"[A-Za-z0-9._\-]{1,64}")
+
+# Atributos que todo LogRecord tem; o que sobrar veio de extra={...} e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "amostra"}
+
+
+def obter_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def parse_niveis(texto: str) -> Dict[str, str]:
+    """'app.crud=DEBUG, app.jobs=warning' -> {'app.crud': 'DEBUG', 'app.jobs': 'WARNING'}"""
+    niveis = {}
+    for item in texto.split(","):
+        if "=" in item:
+            nome, nivel = item.split("=", 1)
+            niveis[nome.strip()] = nivel.strip().upper()
+    return niveis
+
+
+class FiltroContexto(logging.Filter):
+    # Roda no thread que emitiu o registro, onde o contextvar da requisição ainda está valendo
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return True
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar só uma fração dos registros DEBUG (eventos de alto volume)."""
+
+    def __init__(self, taxa: float = LOG_AMOSTRA_DEBUG):
+        super().__init__()
+        self.taxa = taxa
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        taxa = getattr(record, "amostra", self.taxa)
+        if taxa >= 1:
+            return True
+        record.amostra = taxa  # quem lê os logs pode reponderar as contagens
+        return random.random() < taxa
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record):
+        registro = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            registro["request_id"] = record.request_id
+        if getattr(record, "amostra", None) is not None:
+            registro["amostra"] = record.amostra
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith("_"):
+                registro[chave] = valor
+        if record.exc_info:
+            registro["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            registro["exc"] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class _QueueHandlerEstruturado(logging.handlers.QueueHandler):
+    # O QueueHandler padrão achata tudo numa string; aqui a mensagem é resolvida (args podem não
+    # ser thread-safe) e o traceback vira texto, mas os campos extras seguem no registro
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # fila cheia (stdout travado): descarta em vez de bloquear a requisição
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configurar_logs(nivel: str = LOG_LEVEL, niveis: str = LOG_LEVELS, formato: str = LOG_FORMATO, destino=None) -> None:
+    """Instala o QueueHandler no logger raiz e inicia o listener. Chamadas repetidas reconfiguram."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    saida = logging.StreamHandler(destino or sys.stdout)
+    saida.setFormatter(FormatadorJSON() if formato == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+    ))
+    fila: queue.Queue = queue.Queue(LOG_FILA_MAXIMA)
+    handler = _QueueHandlerEstruturado(fila)
+    handler.addFilter(FiltroContexto())
+    handler.addFilter(FiltroAmostragem())
+
+    raiz = logging.getLogger()
+    for antigo in [h for h in raiz.handlers if isinstance(h, _QueueHandlerEstruturado)]:
+        raiz.removeHandler(antigo)
+    raiz.addHandler(handler)
+    raiz.setLevel(nivel)
+    for nome, nivel_modulo in parse_niveis(niveis).items():
+        logging.getLogger(nome).setLevel(nivel_modulo)
+
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+    _listener.start()
+
+
+def parar_logs() -> None:
+    # Esvazia a fila antes de sair do processo
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(parar_logs)
+
+
+class RequestIdMiddleware:
+    """
+    Dá um id a cada requisição (reaproveita o X-Request-ID do cliente/proxy se for válido),
+    devolve no cabeçalho da resposta, deixa disponível para todos os logs da requisição e
+    registra uma linha de acesso com status e duração.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("app.http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for nome, valor in scope.get("headers", []):
+            if nome == b"x-request-id":
+                candidato = valor.decode("latin-1")
+                request_id = candidato if _RE_REQUEST_ID.fullmatch(candidato) else None
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        inicio = time.perf_counter()
+        status_code = 500
+        duracao = None
+
+        async def send_com_id(mensagem):
+            nonlocal status_code, duracao
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            elif mensagem["type"] == "http.response.body" and not mensagem.get("more_body", False):
+                # Mede até o fim da resposta: BackgroundTasks que rodam depois não entram na conta
+                duracao = time.perf_counter() - inicio
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, send_com_id)
+        finally:
+            duracao = duracao if duracao is not None else time.perf_counter() - inicio
+            self.logger.info(
+                "%s %s %s", scope["method"], scope["path"], status_code,
+                extra={"metodo": scope["method"], "caminho": scope["path"], "status": status_code,
+                       "duracao_ms": round(duracao * 1000, 2)},
+            )
+            _request_id.reset(token)
@@ -1,73 +1,203 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, status, Response, Query, File, UploadFile
-# from fastapi.staticfiles import StaticFiles # REMOVIDO se as fotos de perfil vão SÓ para o GCS
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query, File, UploadFile, BackgroundTasks
+from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta, timezone 
-from typing import Annotated, List, Optional 
+from typing import Annotated, List, Literal, Optional
 # import shutil # REMOVIDO - Não vamos mais salvar localmente com shutil
-import uuid
 import os 
-from google.cloud import storage # IMPORTADO para interagir com o GCS
+import asyncio
+import logging
+import tempfile
+from contextlib import asynccontextmanager
 
 from .database import engine, get_db 
-from . import models, schemas, crud
+from . import agenda_ics, geo, models, schemas, crud
+from .logs import configurar_logs, RequestIdMiddleware
+from .metricas import MetricasMiddleware, instrumentar_engine, instrumentar_fila_jobs, gerar_metricas, CONTENT_TYPE_LATEST
+from .orcamento_consultas import orcamento_consultas
+from .compressao import CompressaoMiddleware
+from .armazenamento import (
+    Armazenamento, ArmazenamentoLocal, ArmazenamentoNaoConfigurado, obter_armazenamento,
+    ARMAZENAMENTO_BACKEND, ARMAZENAMENTO_LOCAL_DIR, ARMAZENAMENTO_LOCAL_URL_BASE
+)
+from .fotos import (
+    LimiteTamanhoUploadMiddleware, FOTO_TAMANHO_MAXIMO_BYTES, MARGEM_MULTIPART_BYTES, TIPOS_IMAGEM_ACEITOS,
+    validar_foto, validar_foto_enviada, nome_arquivo_foto, nome_arquivo_pertence_ao_musico, trocar_foto_perfil
+)
+from .limpeza_fotos import executar_limpeza_periodica, LIMPEZA_FOTOS_INTERVALO_SEGUNDOS
+from .arquivamento_pedidos import executar_arquivamento_periodico, ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS
+from .limpeza_refresh_tokens import executar_limpeza_refresh_tokens_periodica, LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS
+from .series_shows import executar_expansao_periodica, SERIES_SHOWS_INTERVALO_SEGUNDOS
+from .jobs import ExecutorJobs, definir_executor_ativo, JOBS_WORKER_EM_PROCESSO
+from .perfilamento import PerfilamentoMiddleware, RotaPerfilavel, PERFILAMENTO_ATIVO
+from .consultas_lentas import (
+    instrumentar_consultas_lentas, executar_relatorio_periodico, registro_consultas,
+    CONSULTAS_LENTAS_ATIVO, CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS, CONSULTAS_LENTAS_TOP
+)
 from .security import (
     criar_access_token, ACCESS_TOKEN_EXPIRE_MINUTES,
-    obter_payload_token_musico, obter_payload_token_fan
+    criar_refresh_token, decodificar_refresh_token,
+    obter_payload_token_musico, obter_payload_token_fan,
+    executar_no_pool_de_hash, verificar_e_atualizar_senha, verificar_token_admin
 )
 # import datetime # Removido import datetime duplicado
 
+configurar_logs()
+logger = logging.getLogger(__name__)
+
 models.Base.metadata.create_all(bind=engine)
+instrumentar_engine(engine) # Tempo e quantidade de consultas SQL por requisição (/metrics)
+instrumentar_fila_jobs(engine) # Profundidade e espera da fila de jobs (/metrics)
+if CONSULTAS_LENTAS_ATIVO:
+    instrumentar_consultas_lentas(engine) # Consultas agrupadas por SQL normalizado e função do crud (/admin/consultas_lentas)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tarefas = []
+    # Limpeza periódica das fotos órfãs no armazenamento (LIMPEZA_FOTOS_INTERVALO_SEGUNDOS=0 desliga)
+    if LIMPEZA_FOTOS_INTERVALO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(executar_limpeza_periodica(engine)))
+    # Pedidos tratados e antigos saem da tabela quente (ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS=0 desliga)
+    if ARQUIVAMENTO_PEDIDOS_INTERVALO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(executar_arquivamento_periodico(engine)))
+    # Refresh tokens usados e já expirados (LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS=0 desliga)
+    if LIMPEZA_REFRESH_TOKENS_INTERVALO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(executar_limpeza_refresh_tokens_periodica(engine)))
+    # Séries de shows: gera as ocorrências que entram na janela (SERIES_SHOWS_INTERVALO_SEGUNDOS=0 desliga)
+    if SERIES_SHOWS_INTERVALO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(executar_expansao_periodica(engine)))
+    # Workers da fila de jobs neste processo; com JOBS_WORKER_EM_PROCESSO=false, rode `python -m app.jobs`
+    executor_jobs = ExecutorJobs(engine) if JOBS_WORKER_EM_PROCESSO else None
+    if executor_jobs is not None:
+        definir_executor_ativo(executor_jobs)
+        tarefas.append(asyncio.create_task(executor_jobs.executar_para_sempre()))
+    if CONSULTAS_LENTAS_ATIVO and CONSULTAS_LENTAS_INTERVALO_RELATORIO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(executar_relatorio_periodico()))
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    if executor_jobs is not None:
+        definir_executor_ativo(None)
+        await executor_jobs.parar()
 
 app = FastAPI(
     title="PalcoApp API",
     description="API para o PalcoApp, conectando músicos e seu público.",
     version="0.1.0",
+    lifespan=lifespan,
 )
+if PERFILAMENTO_ATIVO:
+    app.router.route_class = RotaPerfilavel # Endpoints síncronos (threadpool) também entram no perfil
+
+# Comprime (gzip/brotli) as respostas JSON grandes, como /musicos/ e /usuarios/me/
+app.add_middleware(CompressaoMiddleware)
+# Recusa uploads grandes demais antes que o corpo seja lido e guardado
+app.add_middleware(LimiteTamanhoUploadMiddleware, limites={
+    "/musicos/me/foto_perfil": FOTO_TAMANHO_MAXIMO_BYTES + MARGEM_MULTIPART_BYTES,
+    "/armazenamento/upload": FOTO_TAMANHO_MAXIMO_BYTES,
+})
+# Latência, tamanho (já comprimido) e consultas SQL por rota, para o /metrics
+app.add_middleware(MetricasMiddleware)
+# Perfil de CPU sob demanda (cabeçalho X-Perfil assinado ou amostra); dentro do RequestIdMiddleware para ter o request id
+if PERFILAMENTO_ATIVO:
+    app.add_middleware(PerfilamentoMiddleware)
+# Por último = mais externo: o request id vale para tudo o que os outros middlewares e handlers logarem
+app.add_middleware(RequestIdMiddleware)
 
-# REMOVIDO os.makedirs para app/static/profile_pics
-# REMOVIDO app.mount("/static", ...) se você não tiver OUTROS arquivos estáticos sendo servidos por ele.
-# Se você tiver, por exemplo, CSS/JS para a documentação do FastAPI que estão em app/static,
-# então você pode manter o app.mount, mas ele não será mais usado para as fotos de perfil.
-# Para simplificar, vou remover por agora, assumindo que as fotos de perfil são os únicos "estáticos dinâmicos".
-# Se precisar de volta para outros arquivos, me avise.
+# Com o armazenamento local (desenvolvimento/testes), as fotos são servidas pela própria API
+if ARMAZENAMENTO_BACKEND == "local":
+    os.makedirs(ARMAZENAMENTO_LOCAL_DIR, exist_ok=True)
+    app.mount(ARMAZENAMENTO_LOCAL_URL_BASE, StaticFiles(directory=ARMAZENAMENTO_LOCAL_DIR), name="static")
 
 
 # --- Funções de Dependência para Obter Usuários Logados ---
-async def obter_musico_logado(token_payload: Annotated[schemas.TokenData, Depends(obter_payload_token_musico)], db: Annotated[Session, Depends(get_db)]) -> models.Musico:
-    if token_payload.role != "musico": raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido para este tipo de usuário")
+# Identidades (id/email/is_active) vêm do cache curto do crud (crud.obter_identidade_em_cache), para que requisições
+# autenticadas seguidas não voltem ao banco; os relacionamentos só são carregados pelos handlers que os retornam.
+# Dependências síncronas (def): o FastAPI as roda no threadpool, e a consulta de um cache frio não trava o event loop.
+def _obter_principal(token_payload: schemas.TokenData, db: Session, role: str) -> schemas.UsuarioAutenticado:
+    if token_payload.role != role: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido para este tipo de usuário")
     if token_payload.user_id is None: raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido: user_id não encontrado")
-    musico = crud.obter_musico_por_id(db, musico_id=token_payload.user_id)
+    return crud.obter_identidade_em_cache(db, role, token_payload.user_id)
+
+def obter_principal_musico(token_payload: Annotated[schemas.TokenData, Depends(obter_payload_token_musico)], db: Annotated[Session, Depends(get_db)]) -> schemas.UsuarioAutenticado:
+    principal = _obter_principal(token_payload, db, "musico")
+    if principal is None: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Músico não encontrado para o token fornecido.")
+    if not principal.is_active: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário inativo")
+    return principal
+
+def obter_principal_fan(token_payload: Annotated[schemas.TokenData, Depends(obter_payload_token_fan)], db: Annotated[Session, Depends(get_db)]) -> schemas.UsuarioAutenticado:
+    principal = _obter_principal(token_payload, db, "fan")
+    if principal is None: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário (fã) não encontrado para o token fornecido.")
+    if not principal.is_active: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário inativo")
+    return principal
+
+# Versões com o grafo completo (repertório, shows, pedidos...), só para handlers que retornam o perfil
+def obter_musico_logado(principal: Annotated[schemas.UsuarioAutenticado, Depends(obter_principal_musico)], db: Annotated[Session, Depends(get_db)]) -> models.Musico:
+    musico = crud.obter_musico_por_id(db, musico_id=principal.id)
     if musico is None: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Músico não encontrado para o token fornecido.")
     return musico
 
-async def obter_usuario_publico_logado(token_payload: Annotated[schemas.TokenData, Depends(obter_payload_token_fan)], db: Annotated[Session, Depends(get_db)]) -> models.UsuarioPublico:
-    if token_payload.role != "fan": raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso não permitido para este tipo de usuário")
-    if token_payload.user_id is None: raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido: user_id não encontrado")
-    usuario = crud.obter_usuario_publico_por_id(db, usuario_id=token_payload.user_id)
+def obter_usuario_publico_logado(principal: Annotated[schemas.UsuarioAutenticado, Depends(obter_principal_fan)], db: Annotated[Session, Depends(get_db)]) -> models.UsuarioPublico:
+    usuario = crud.obter_usuario_publico_por_id(db, usuario_id=principal.id)
     if usuario is None: raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário (fã) não encontrado para o token fornecido.")
     return usuario
 
 # --- Endpoints de Autenticação ---
+def _emitir_tokens(user_id: int, email: str, role: str, nome_exibicao: str) -> dict:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = criar_access_token(data={"sub": email, "user_id": user_id, "role": role}, expires_delta=access_token_expires)
+    refresh_token = criar_refresh_token(user_id=user_id, email=email, role=role)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer", "user_id": user_id, "email": email, "role": role, "nome_exibicao": nome_exibicao}
+
+async def _autenticar(db: Session, conta, role: str, senha: str):
+    if conta is None: return None
+    # Só o bcrypt (centenas de ms de CPU) vai para o pool de hashing; a leitura da conta e a regravação do hash
+    # ficam no threadpool da requisição, para que a latência do banco não ocupe as vagas de HASH_POOL_MAX_FILA
+    senha_correta, novo_hash = await executar_no_pool_de_hash(verificar_e_atualizar_senha, senha, conta.hashed_password)
+    return await run_in_threadpool(crud.concluir_autenticacao, db, conta, role, senha_correta, novo_hash)
+
 @app.post("/token", response_model=schemas.Token, tags=["Autenticação - Músicos"], summary="Login para Músicos")
+@orcamento_consultas(3)
 async def login_musico_para_obter_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Annotated[Session, Depends(get_db)]):
-    musico = crud.autenticar_musico(db, email=form_data.username, senha_texto_plano=form_data.password)
+    musico = await run_in_threadpool(crud.obter_musico_por_email, db, email=form_data.username)
+    musico = await _autenticar(db, musico, "musico", form_data.password)
     if not musico: raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = criar_access_token(data={"sub": musico.email, "user_id": musico.id, "role": "musico"}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer", "user_id": musico.id, "email": musico.email, "role": "musico", "nome_exibicao": musico.nome_artistico}
+    return _emitir_tokens(musico.id, musico.email, "musico", musico.nome_artistico)
 
 @app.post("/usuarios/token", response_model=schemas.Token, tags=["Autenticação - Fãs"], summary="Login para Usuários (Fãs)")
+@orcamento_consultas(3)
 async def login_fan_para_obter_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Annotated[Session, Depends(get_db)]):
-    usuario_publico = crud.autenticar_usuario_publico(db, email=form_data.username, senha_texto_plano=form_data.password)
+    usuario_publico = await run_in_threadpool(crud.obter_usuario_publico_por_email, db, email=form_data.username)
+    usuario_publico = await _autenticar(db, usuario_publico, "fan", form_data.password)
     if not usuario_publico: raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email ou senha incorretos", headers={"WWW-Authenticate": "Bearer"})
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = criar_access_token(data={"sub": usuario_publico.email, "user_id": usuario_publico.id, "role": "fan"}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer", "user_id": usuario_publico.id, "email": usuario_publico.email, "role": "fan", "nome_exibicao": usuario_publico.nome_completo or usuario_publico.email}
+    return _emitir_tokens(usuario_publico.id, usuario_publico.email, "fan", usuario_publico.nome_completo or usuario_publico.email)
+
+@app.post("/token/refresh", response_model=schemas.Token, tags=["Autenticação - Músicos", "Autenticação - Fãs"], summary="Renovar tokens (músicos e fãs)")
+@orcamento_consultas(2)
+def renovar_tokens(refresh: schemas.RefreshTokenRequest, db: Annotated[Session, Depends(get_db)]):
+    # Não passa pelo bcrypt: valida o refresh token, revoga-o no banco (rotação) e emite um novo par
+    token_data, jti_digest, expira_em = decodificar_refresh_token(refresh.refresh_token)
+    if token_data.role == "musico":
+        conta = crud.obter_conta_musico(db, musico_id=token_data.user_id)
+        nome_exibicao = conta.nome_artistico if conta else None
+    elif token_data.role == "fan":
+        conta = crud.obter_conta_usuario_publico(db, usuario_id=token_data.user_id)
+        nome_exibicao = (conta.nome_completo or conta.email) if conta else None
+    else:
+        conta = None
+    if conta is None or not conta.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token inválido ou expirado", headers={"WWW-Authenticate": "Bearer"})
+    conta_id, email = conta.id, conta.email # Antes do commit, que expira a conta carregada
+    if not crud.marcar_refresh_token_usado(db, jti_digest, token_data.role, token_data.user_id, expira_em):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token inválido ou expirado", headers={"WWW-Authenticate": "Bearer"})
+    return _emitir_tokens(conta_id, email, token_data.role, nome_exibicao)
 
 # --- Endpoints de Músicos ---
 @app.post("/musicos/", response_model=schemas.Musico, status_code=status.HTTP_201_CREATED, tags=["Músicos"], summary="Cadastrar um novo músico")
+@orcamento_consultas(3)
 def criar_novo_musico(musico: schemas.MusicoCreate, db: Annotated[Session, Depends(get_db)]):
     db_musico_existente = crud.obter_musico_por_email(db, email=musico.email)
     if db_musico_existente: raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email já registrado")
@@ -81,6 +211,7 @@ def criar_novo_musico(musico: schemas.MusicoCreate, db: Annotated[Session, Depen
     summary="Listar músicos (perfis públicos)",
     description="Retorna uma lista paginada de músicos ativos. Pode ser filtrado por nome artístico e/ou gênero."
 )
+@orcamento_consultas(2)
 def ler_musicos_publico(
     db: Annotated[Session, Depends(get_db)], 
     skip: int = 0, 
@@ -92,16 +223,33 @@ def ler_musicos_publico(
     return musicos
 
 @app.get("/musicos/{musico_id}", response_model=schemas.MusicoPublicProfile, tags=["Músicos - Público"], summary="Obter perfil público de um músico específico")
+@orcamento_consultas(4)
 def ler_musico_especifico_publico(musico_id: int, db: Annotated[Session, Depends(get_db)]):
     db_musico = crud.obter_musico_por_id(db, musico_id=musico_id)
     if db_musico is None or not db_musico.is_active : raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Músico não encontrado ou inativo")
     return db_musico
 
+@app.get(
+    "/musicos/{musico_id}/shows.ics", response_class=Response, tags=["Músicos - Público"], summary="Agenda de shows do músico em iCalendar",
+    responses={200: {"content": {"text/calendar": {}}}, 304: {"description": "Agenda inalterada (If-None-Match)"}},
+)
+@orcamento_consultas(2)
+def ler_agenda_ics_do_musico(musico_id: int, request: Request, db: Annotated[Session, Depends(get_db)]):
+    # Do cache, já em bytes; nenhuma consulta enquanto nenhum show do músico mudar
+    agenda = agenda_ics.obter_agenda(db, musico_id)
+    if agenda is None: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Músico não encontrado ou inativo")
+    cabecalhos = {"ETag": agenda.etag, "Cache-Control": "public, no-cache"} # no-cache: o cliente guarda, mas sempre revalida
+    if agenda_ics.etag_confere(request.headers.get("if-none-match"), agenda.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+    return Response(content=agenda.conteudo, media_type=agenda_ics.TIPO_CONTEUDO, headers=cabecalhos)
+
 @app.get("/musicos/me/", response_model=schemas.Musico, tags=["Músicos - Perfil Logado"], summary="Obter perfil do músico logado")
+@orcamento_consultas(5)
 async def ler_musico_logado(musico_atual: Annotated[models.Musico, Depends(obter_musico_logado)]):
     return musico_atual
 
 @app.put("/musicos/me/", response_model=schemas.Musico, tags=["Músicos - Perfil Logado"], summary="Atualizar perfil do músico logado (dados textuais)")
+@orcamento_consultas(10)
 async def atualizar_perfil_musico_logado_textual( # Renomeado para diferenciar do upload de foto
     musico_update_payload: schemas.MusicoUpdate, 
     musico_logado: Annotated[models.Musico, Depends(obter_musico_logado)], 
@@ -110,110 +258,192 @@ async def atualizar_perfil_musico_logado_textual( # Renomeado para diferenciar d
     musico_atualizado = crud.atualizar_musico(db=db, musico_db_obj=musico_logado, musico_update_data=musico_update_payload)
     return musico_atualizado
 
-# --- MODIFICADO PARA USAR GOOGLE CLOUD STORAGE ---
+# --- Foto de perfil (GCS ou disco local, conforme ARMAZENAMENTO_BACKEND) ---
+def _obter_armazenamento_ou_500() -> Armazenamento:
+    try:
+        return obter_armazenamento()
+    except ArmazenamentoNaoConfigurado as e_config:
+        logger.error("Armazenamento de fotos não configurado: %s", e_config)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Configuração de armazenamento de fotos incompleta (bucket).")
+
 @app.put(
     "/musicos/me/foto_perfil", 
     response_model=schemas.Musico,
     tags=["Músicos - Perfil Logado"],
-    summary="Upload da foto de perfil do músico logado para GCS",
-    description="Permite que o músico autenticado faça upload ou atualize sua foto de perfil, armazenando no Google Cloud Storage."
+    summary="Upload da foto de perfil do músico logado",
+    description="Permite que o músico autenticado faça upload ou atualize sua foto de perfil, passando o arquivo pela API. Para enviar direto ao armazenamento, use /musicos/me/foto_perfil/upload_assinado."
 )
+@orcamento_consultas(11)
 async def upload_foto_perfil_musico_gcs( 
     musico_logado: Annotated[models.Musico, Depends(obter_musico_logado)],
     db: Annotated[Session, Depends(get_db)],
+    background_tasks: BackgroundTasks,
     foto_arquivo: UploadFile = File(..., description="Arquivo da imagem de perfil (jpg, png)") 
 ):
-    GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
-    # GOOGLE_APPLICATION_CREDENTIALS deve estar configurado no ambiente do Render
-    
-    if not GCS_BUCKET_NAME:
-        print("[UPLOAD_FOTO_GCS] ERRO FATAL: Variável de ambiente GCS_BUCKET_NAME não configurada.")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Configuração de armazenamento de fotos incompleta (bucket).")
-
-    try:
-        storage_client = storage.Client()
-        print("[UPLOAD_FOTO_GCS] Cliente Google Cloud Storage inicializado.")
-    except Exception as e_client:
-        print(f"[UPLOAD_FOTO_GCS] ERRO FATAL ao inicializar cliente GCS: {e_client}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao conectar com o serviço de armazenamento de fotos.")
-
-    allowed_extensions = {"png", "jpg", "jpeg"}
-    original_filename = foto_arquivo.filename if foto_arquivo.filename else "unknown_file.tmp"
-    file_extension = original_filename.split(".")[-1].lower() if "." in original_filename else "tmp"
-    
-    if file_extension not in allowed_extensions:
-        print(f"[UPLOAD_FOTO_GCS] ERRO: Tipo de arquivo inválido: {file_extension}")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tipo de arquivo inválido ({file_extension}). Apenas PNG, JPG, JPEG.")
-
-    gcs_blob_name = f"profile_pics/user_{musico_logado.id}_{uuid.uuid4()}.{file_extension}"
-    url_publica_gcs = ""
-
+    armazenamento = _obter_armazenamento_ou_500()
     try:
-        print(f"[UPLOAD_FOTO_GCS] Preparando upload para Bucket: '{GCS_BUCKET_NAME}', Blob: '{gcs_blob_name}', ContentType: {foto_arquivo.content_type}")
-        
-        bucket = storage_client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(gcs_blob_name)
-        
-        contents = await foto_arquivo.read()
-        blob.upload_from_string(contents, content_type=foto_arquivo.content_type) # Faz o upload
-        
-        print(f"[UPLOAD_FOTO_GCS] Upload para GCS de '{gcs_blob_name}' BEM-SUCEDIDO.")
-
-        # Torna o blob publicamente legível (IMPORTANTE se o bucket não tiver essa política por padrão)
-        # Se você já configurou o bucket para que TODOS os novos objetos sejam públicos, isso pode não ser estritamente necessário
-        # ou pode até dar erro se as permissões do bucket forem uniformes e não permitirem ACLs por objeto.
-        # Teste primeiro sem isso se o bucket já for public-read. Se as imagens não carregarem, adicione.
+        # O tamanho já foi limitado pelo LimiteTamanhoUploadMiddleware; aqui o tipo é conferido pelo conteúdo
+        tipo_imagem = await validar_foto(foto_arquivo)
+        nome_arquivo = nome_arquivo_foto(musico_logado.id, tipo_imagem)
         try:
-            blob.make_public()
-            print(f"[UPLOAD_FOTO_GCS] Blob '{gcs_blob_name}' tornado público.")
-        except Exception as e_public:
-            print(f"[UPLOAD_FOTO_GCS] AVISO: Não foi possível tornar o blob '{gcs_blob_name}' público programaticamente: {e_public}. Verifique as permissões do bucket (deve ser 'Uniform' com 'allUsers' como 'Storage Object Viewer').")
-            # Se o bucket já é public-read, esta exceção pode ser ignorada, a URL pública ainda deve funcionar.
-
-        url_publica_gcs = blob.public_url 
-        print(f"[UPLOAD_FOTO_GCS] URL pública obtida do GCS: {url_publica_gcs}")
-
-    except Exception as e_upload:
-        print(f"[UPLOAD_FOTO_GCS] ERRO CRÍTICO durante o upload para GCS: {e_upload}, Tipo: {type(e_upload)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Não foi possível concluir o upload da foto: {e_upload}")
+            # As chamadas do armazenamento são bloqueantes: rodam num thread, lendo o arquivo temporário em pedaços
+            url_publica = await run_in_threadpool(
+                armazenamento.enviar_arquivo, nome_arquivo, foto_arquivo.file, foto_arquivo.size, tipo_imagem.content_type
+            )
+        except Exception as e_upload:
+            logger.exception("Erro durante o upload da foto", extra={"musico_id": musico_logado.id})
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Não foi possível concluir o upload da foto: {e_upload}")
     finally:
         await foto_arquivo.close() 
-    
-    # Lógica para deletar foto ANTIGA do GCS (Opcional, mas recomendado)
-    if musico_logado.foto_perfil_url and musico_logado.foto_perfil_url.startswith(f"https://storage.googleapis.com/{GCS_BUCKET_NAME}/"):
-        if musico_logado.foto_perfil_url != url_publica_gcs:
-            try:
-                old_blob_name_parts = musico_logado.foto_perfil_url.split(f"https://storage.googleapis.com/{GCS_BUCKET_NAME}/")
-                if len(old_blob_name_parts) > 1:
-                    old_blob_name = old_blob_name_parts[1].split("?")[0] 
-                    if old_blob_name: 
-                        old_bucket_to_delete_from = storage_client.bucket(GCS_BUCKET_NAME)
-                        old_blob_to_delete = old_bucket_to_delete_from.blob(old_blob_name)
-                        if old_blob_to_delete.exists(storage_client): # Passar o cliente pode ser necessário em algumas versões
-                            old_blob_to_delete.delete(client=storage_client) # Passar o cliente pode ser necessário
-                            print(f"[UPLOAD_FOTO_GCS] Foto antiga '{old_blob_name}' deletada do GCS.")
-                        else:
-                            print(f"[UPLOAD_FOTO_GCS] Foto antiga '{old_blob_name}' não encontrada no GCS para deletar (URL no BD: {musico_logado.foto_perfil_url}).")
-            except Exception as e_del_gcs:
-                print(f"[UPLOAD_FOTO_GCS] AVISO: Erro ao tentar deletar foto antiga do GCS '{musico_logado.foto_perfil_url}': {e_del_gcs}")
-
-    musico_atualizado = crud.atualizar_foto_perfil_musico(db, musico_id=musico_logado.id, foto_url=url_publica_gcs)
-    if not musico_atualizado:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Não foi possível atualizar o perfil do músico no banco com a nova URL da foto.")
-    
-    print(f"[UPLOAD_FOTO_GCS] URL da foto '{url_publica_gcs}' atualizada no banco para músico ID {musico_logado.id}.")
-    return musico_atualizado
+
+    return await trocar_foto_perfil(db, musico_logado, nome_arquivo, url_publica, background_tasks)
+
+@app.post(
+    "/musicos/me/foto_perfil/upload_assinado",
+    response_model=schemas.FotoUploadAssinado,
+    tags=["Músicos - Perfil Logado"],
+    summary="Gerar URL para enviar a foto de perfil direto ao armazenamento"
+)
+@orcamento_consultas(1)
+async def gerar_upload_assinado_foto_perfil(
+    pedido_upload: schemas.FotoUploadAssinadoCreate,
+    principal: Annotated[schemas.UsuarioAutenticado, Depends(obter_principal_musico)],
+):
+    armazenamento = _obter_armazenamento_ou_500()
+    nome_arquivo = nome_arquivo_foto(principal.id, TIPOS_IMAGEM_ACEITOS[pedido_upload.content_type])
+    upload = await run_in_threadpool(armazenamento.gerar_upload_assinado, nome_arquivo, pedido_upload.content_type, FOTO_TAMANHO_MAXIMO_BYTES)
+    return {"upload_url": upload.url, "metodo": upload.metodo, "headers": upload.headers, "nome_arquivo": nome_arquivo,
+            "expira_em": upload.expira_em, "tamanho_maximo_bytes": FOTO_TAMANHO_MAXIMO_BYTES}
+
+@app.post(
+    "/musicos/me/foto_perfil/finalizar",
+    response_model=schemas.Musico,
+    tags=["Músicos - Perfil Logado"],
+    summary="Confirmar a foto de perfil enviada pela URL assinada"
+)
+@orcamento_consultas(11)
+async def finalizar_upload_foto_perfil(
+    finalizar: schemas.FotoUploadFinalizar,
+    musico_logado: Annotated[models.Musico, Depends(obter_musico_logado)],
+    db: Annotated[Session, Depends(get_db)],
+    background_tasks: BackgroundTasks,
+):
+    if not nome_arquivo_pertence_ao_musico(finalizar.nome_arquivo, musico_logado.id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Arquivo de upload inválido para este músico.")
+    armazenamento = _obter_armazenamento_ou_500()
+    await validar_foto_enviada(armazenamento, finalizar.nome_arquivo)
+    await run_in_threadpool(armazenamento.publicar, finalizar.nome_arquivo) # Pela URL assinada, o objeto chega sem ACL pública
+    url_publica = armazenamento.url_publica(finalizar.nome_arquivo)
+    return await trocar_foto_perfil(db, musico_logado, finalizar.nome_arquivo, url_publica, background_tasks)
+
+@app.put("/armazenamento/upload", status_code=status.HTTP_204_NO_CONTENT, include_in_schema=False)
+@orcamento_consultas(0)
+async def receber_upload_assinado_local(request: Request, nome: str, content_type: str, expira_em: int, assinatura: str):
+    # Só existe com ARMAZENAMENTO_BACKEND=local: faz o papel da URL assinada do GCS em desenvolvimento/testes
+    armazenamento = _obter_armazenamento_ou_500()
+    if not isinstance(armazenamento, ArmazenamentoLocal):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not armazenamento.validar_upload_assinado(nome, content_type, expira_em, assinatura):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Assinatura de upload inválida ou expirada.")
+    if request.headers.get("content-type") != content_type:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Content-Type diferente do assinado.")
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as temporario:
+        async for pedaco in request.stream():
+            temporario.write(pedaco)
+        await run_in_threadpool(armazenamento.enviar_arquivo, nome, temporario, None, content_type)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# --- Shows em lote, séries recorrentes e busca por proximidade ---
+@app.get(
+    "/shows/proximos",
+    response_model=List[schemas.ShowProximo],
+    tags=["Shows - Público"],
+    summary="Shows futuros perto de um ponto",
+    description="Shows com coordenadas a até raio_km do ponto, do mais perto para o mais longe."
+)
+@orcamento_consultas(geo.PROXIMOS_MAX_BUSCAS + 1) # Normalmente 2; regiões mais densas que o teto de candidatos refazem a busca (ver crud)
+def ler_shows_proximos(
+    db: Annotated[Session, Depends(get_db)],
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    raio_km: float = Query(default=10, gt=0, le=200),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    proximos = crud.obter_shows_proximos(db, latitude=lat, longitude=lon, raio_km=raio_km, limit=limit)
+    return [{"show": show, "distancia_km": distancia} for show, distancia in proximos]
+
+@app.post("/shows/lote", response_model=List[schemas.Show], status_code=status.HTTP_201_CREATED, tags=["Shows"], summary="Cadastrar vários shows de uma vez")
+@orcamento_consultas(7)
+def criar_shows_em_lote(
+    lote: schemas.ShowLoteCreate,
+    principal: Annotated[schemas.UsuarioAutenticado, Depends(obter_principal_musico)],
+    db: Annotated[Session, Depends(get_db)],
+):
+    return crud.criar_shows_em_lote(db, shows=lote.shows, musico_id=principal.id)
+
+@app.post(
+    "/shows/series",
+    response_model=schemas.SerieShowCriada,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Shows"],
+    summary="Cadastrar uma série de shows recorrentes",
+    description="Cria os shows da regra (semanal ou mensal, com exceções) até o horizonte configurado; os seguintes são gerados conforme a data se aproxima."
+)
+@orcamento_consultas(9)
+def criar_serie_de_shows(
+    serie: schemas.SerieShowCreate,
+    principal: Annotated[schemas.UsuarioAutenticado, Depends(obter_principal_musico)],
+    db: Annotated[Session, Depends(get_db)],
+):
+    db_serie, gerados = crud.criar_serie_show(db, serie=serie, musico_id=principal.id)
+    return {"serie": db_serie, "shows_gerados": gerados}
+
+# --- Locais (casas de show deduplicadas) ---
+@app.get("/locais/{local_id}", response_model=schemas.Local, tags=["Locais - Público"], summary="Obter um local")
+@orcamento_consultas(1)
+def ler_local(local_id: int, db: Annotated[Session, Depends(get_db)]):
+    local = crud.obter_local_por_id(db, local_id=local_id)
+    if local is None: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Local não encontrado")
+    return local
+
+@app.get("/locais/{local_id}/shows", response_model=List[schemas.Show], tags=["Locais - Público"], summary="Shows de um local")
+@orcamento_consultas(2)
+def ler_shows_do_local(
+    local_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    skip: int = 0,
+    limit: int = Query(default=100, ge=1, le=500),
+    incluir_passados: bool = False,
+):
+    if crud.obter_local_por_id(db, local_id=local_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Local não encontrado")
+    return crud.obter_shows_do_local(db, local_id=local_id, skip=skip, limit=limit, incluir_passados=incluir_passados)
 
 # ... (Restante dos seus endpoints de repertório, shows, usuários (Fãs), favoritos, pedidos, etc., permanecem os mesmos que você me enviou) ...
 
+# --- Métricas ---
+@app.get("/metrics", tags=["Geral"], include_in_schema=False, summary="Métricas no formato do Prometheus")
+@orcamento_consultas(2) # Fila de jobs (palcoapp_jobs_*), lida no máximo a cada JOBS_METRICAS_CACHE_SEGUNDOS
+def ler_metricas_prometheus(): return Response(content=gerar_metricas(), media_type=CONTENT_TYPE_LATEST)
+
+# --- Diagnóstico (exigem X-Admin-Token) ---
+@app.get("/admin/consultas_lentas", tags=["Admin"], include_in_schema=False, summary="Consultas SQL agrupadas, por tempo total ou p95", dependencies=[Depends(verificar_token_admin)])
+@orcamento_consultas(0)
+def ler_consultas_lentas(ordem: Literal["total", "p95", "maximo", "execucoes"] = "total", limite: int = Query(default=CONSULTAS_LENTAS_TOP, ge=1, le=500)):
+    return {"ativo": CONSULTAS_LENTAS_ATIVO, "grupos_descartados": registro_consultas.descartados, "consultas": registro_consultas.relatorio(ordem, limite)}
+
+@app.delete("/admin/consultas_lentas", status_code=status.HTTP_204_NO_CONTENT, tags=["Admin"], include_in_schema=False, summary="Zerar o registro de consultas", dependencies=[Depends(verificar_token_admin)])
+@orcamento_consultas(0)
+def zerar_consultas_lentas():
+    registro_consultas.zerar()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 # --- Rota Raiz ---
 @app.get("/", tags=["Geral"], summary="Endpoint Raiz da API")
+@orcamento_consultas(0)
 async def root(): return {"message": "Bem-vindo ao PalcoApp API! O cérebro está funcionando!"}
 
 # --- Rota de Itens (Exemplo) ---
 @app.get("/items/{item_id}", tags=["Geral - Exemplo"], include_in_schema=False, summary="Exemplo de rota com parâmetro")
+@orcamento_consultas(0)
 async def read_item(item_id: int, q: Optional[str] = None): return {"item_id": item_id, "q": q}
\ No newline at end of file
@@ -0,0 +1,279 @@
+# app/metricas.py
+# Métricas Prometheus expostas em /metrics: latência, tamanho de resposta e requisições em
+# andamento por rota, tempo/quantidade de consultas ao banco por requisição (eventos do engine) e
+# a fila de jobs (profundidade, espera e duração) e a compressão de respostas por rota.
+#
+# As rotas aparecem pelo template ("/musicos/{musico_id}"), nunca pelo caminho cru, para que o
+# número de séries fique limitado. Com vários processos (gunicorn/uvicorn --workers), defina
+# PROMETHEUS_MULTIPROC_DIR para que /metrics agregue todos eles.
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, REGISTRY
+from prometheus_client import CONTENT_TYPE_LATEST  # noqa: F401 (reexportado para o endpoint)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .orcamento_consultas import verificar_consulta, verificar_fim_da_requisicao
+
+logger = logging.getLogger(__name__)
+
+# A fila é lida do banco a cada raspagem; dentro deste intervalo, a leitura anterior é reaproveitada
+JOBS_METRICAS_CACHE_SEGUNDOS = float(os.getenv("JOBS_METRICAS_CACHE_SEGUNDOS", "10"))
+
+ROTA_DESCONHECIDA = "<sem rota>"
+_BUCKETS_LATENCIA = (0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+_BUCKETS_JOBS = (0.05, 0.25, 1, 5, 15, 60, 300, 900, 3600)
+
+REQUISICOES_DURACAO = Histogram(
+    "palcoapp_http_requisicao_duracao_segundos", "Latência das requisições HTTP",
+    ("metodo", "rota", "status"), buckets=_BUCKETS_LATENCIA,
+)
+REQUISICOES_EM_ANDAMENTO = Gauge(
+    "palcoapp_http_requisicoes_em_andamento", "Requisições HTTP sendo atendidas", ("metodo",), multiprocess_mode="livesum",
+)
+RESPOSTA_TAMANHO = Histogram(
+    "palcoapp_http_resposta_bytes", "Tamanho do corpo das respostas (após compressão)", ("metodo", "rota"), buckets=_BUCKETS_BYTES,
+)
+DB_TEMPO_POR_REQUISICAO = Histogram(
+    "palcoapp_db_tempo_por_requisicao_segundos", "Tempo total em consultas SQL por requisição",
+    ("metodo", "rota"), buckets=_BUCKETS_LATENCIA,
+)
+DB_CONSULTAS_POR_REQUISICAO = Histogram(
+    "palcoapp_db_consultas_por_requisicao", "Quantidade de consultas SQL por requisição",
+    ("metodo", "rota"), buckets=_BUCKETS_CONSULTAS,
+)
+DB_CONSULTAS_FORA_DE_REQUISICAO = Counter(
+    "palcoapp_db_consultas_fora_de_requisicao", "Consultas SQL feitas fora de uma requisição (jobs, tarefas de fundo)",
+)
+# Alimentadas pelo CompressaoMiddleware; como contadores comuns, somam todos os processos com PROMETHEUS_MULTIPROC_DIR
+COMPRESSAO_RESPOSTAS = Counter("palcoapp_compressao_respostas", "Respostas comprimidas", ("rota", "codificacao"))
+COMPRESSAO_BYTES_ORIGINAIS = Counter("palcoapp_compressao_bytes_originais", "Bytes antes da compressão", ("rota", "codificacao"))
+COMPRESSAO_BYTES_COMPRIMIDOS = Counter("palcoapp_compressao_bytes_comprimidos", "Bytes após a compressão", ("rota", "codificacao"))
+COMPRESSAO_CPU = Counter("palcoapp_compressao_cpu_segundos", "CPU gasto comprimindo", ("rota", "codificacao"))
+JOBS_EXECUTADOS = Counter(
+    "palcoapp_jobs_executados", "Jobs executados, por resultado (concluido, reagendado, falhou)", ("tipo", "resultado"),
+)
+JOBS_ESPERA = Histogram(
+    "palcoapp_jobs_espera_segundos", "Tempo entre o horário previsto do job e o início da execução", ("tipo",), buckets=_BUCKETS_JOBS,
+)
+JOBS_DURACAO = Histogram(
+    "palcoapp_jobs_duracao_segundos", "Duração da execução dos jobs", ("tipo",), buckets=_BUCKETS_JOBS,
+)
+
+
+class EstatisticasDB:
+    """
+    Acumulador de consultas da requisição atual (compartilhado com os threads do threadpool).
+    Deixa de contar (`ativa` = False) quando a resposta termina: o que BackgroundTasks e jobs
+    fazem depois não é custo da rota.
+    """
+    __slots__ = ("consultas", "segundos", "ativa", "scope")
+
+    def __init__(self, scope=None):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.ativa = True
+        self.scope = scope
+
+
+_db_requisicao: contextvars.ContextVar[Optional[EstatisticasDB]] = contextvars.ContextVar("db_requisicao", default=None)
+
+
+def obter_estatisticas_db() -> Optional[EstatisticasDB]:
+    return _db_requisicao.get()
+
+
+# --- Eventos do engine ---
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metricas_inicio", []).append(time.perf_counter())
+    estatisticas = _db_requisicao.get()
+    if estatisticas is None or not estatisticas.ativa:
+        DB_CONSULTAS_FORA_DE_REQUISICAO.inc()
+        return
+    estatisticas.consultas += 1
+    verificar_consulta(estatisticas.scope, estatisticas.consultas, statement)
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["_metricas_inicio"].pop()
+    estatisticas = _db_requisicao.get()
+    if estatisticas is not None and estatisticas.ativa:
+        estatisticas.segundos += time.perf_counter() - inicio
+
+
+def _erro_na_consulta(contexto_excecao):
+    # Consulta que falhou não passa pelo after_cursor_execute: descarta o início empilhado
+    conn = contexto_excecao.connection
+    if conn is not None and conn.info.get("_metricas_inicio"):
+        conn.info["_metricas_inicio"].pop()
+
+
+def instrumentar_engine(engine) -> None:
+    """Liga a contagem/cronometragem de consultas no engine (idempotente)."""
+    if event.contains(engine, "before_cursor_execute", _antes_da_consulta):
+        return
+    event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+    event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+    event.listen(engine, "handle_error", _erro_na_consulta)
+
+
+# --- Middleware ---
+class MetricasMiddleware:
+    """
+    Mede cada requisição HTTP. O custo fica em poucos microssegundos: os filhos rotulados
+    das métricas são guardados num dict local em vez de passar por .labels() a cada vez.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._series: Dict[Tuple[str, str, str], tuple] = {}
+        self._em_andamento: Dict[str, object] = {}
+
+    def _filhos(self, metodo: str, rota: str, status: str) -> tuple:
+        chave = (metodo, rota, status)
+        filhos = self._series.get(chave)
+        if filhos is None:
+            filhos = self._series[chave] = (
+                REQUISICOES_DURACAO.labels(metodo, rota, status),
+                RESPOSTA_TAMANHO.labels(metodo, rota),
+                DB_TEMPO_POR_REQUISICAO.labels(metodo, rota),
+                DB_CONSULTAS_POR_REQUISICAO.labels(metodo, rota),
+            )
+        return filhos
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        em_andamento = self._em_andamento.get(metodo)
+        if em_andamento is None:
+            em_andamento = self._em_andamento[metodo] = REQUISICOES_EM_ANDAMENTO.labels(metodo)
+        estatisticas = EstatisticasDB(scope)
+        token = _db_requisicao.set(estatisticas)
+        inicio = time.perf_counter()
+        status_code = 500
+        tamanho = 0
+        duracao = None
+
+        async def send_medido(mensagem):
+            nonlocal status_code, tamanho, duracao
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                tamanho += len(mensagem.get("body", b""))
+                if not mensagem.get("more_body", False):
+                    duracao = time.perf_counter() - inicio  # BackgroundTasks depois da resposta não contam
+                    estatisticas.ativa = False
+            await send(mensagem)
+
+        em_andamento.inc()
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            em_andamento.dec()
+            _db_requisicao.reset(token)
+            rota = getattr(scope.get("route"), "path", None) or ROTA_DESCONHECIDA
+            if duracao is None:
+                duracao = time.perf_counter() - inicio
+            latencia, resposta, db_tempo, db_consultas = self._filhos(metodo, rota, str(status_code))
+            latencia.observe(duracao)
+            resposta.observe(tamanho)
+            db_tempo.observe(estatisticas.segundos)
+            db_consultas.observe(estatisticas.consultas)
+            verificar_fim_da_requisicao(scope, estatisticas.consultas)
+            for ouvinte in _ouvintes_requisicao:
+                ouvinte(metodo, rota, status_code, estatisticas.consultas)
+
+
+# Callbacks chamados ao fim de cada requisição com (metodo, rota, status, consultas); usados pelos testes
+_ouvintes_requisicao: List[Callable[[str, str, int, int], None]] = []
+
+
+@contextlib.contextmanager
+def observar_requisicoes(ouvinte: Callable[[str, str, int, int], None]) -> Iterator[None]:
+    _ouvintes_requisicao.append(ouvinte)
+    try:
+        yield
+    finally:
+        _ouvintes_requisicao.remove(ouvinte)
+
+
+# --- Exportação ---
+class _ColetorFilaJobs:
+    """
+    Profundidade da fila por tipo/status e espera do job pronto mais antigo, lidas da tabela jobs
+    (a mesma para todos os processos, então vale também com PROMETHEUS_MULTIPROC_DIR). São duas
+    consultas por leitura, reaproveitada por JOBS_METRICAS_CACHE_SEGUNDOS; se o banco falhar, as
+    séries da fila ficam de fora da raspagem em vez de derrubar o /metrics.
+    """
+
+    def __init__(self):
+        self.bind = None
+        self._leitura: Optional[Dict[str, Dict]] = None
+        self._lida_em = 0.0
+        self._lock = threading.Lock()
+
+    def _ler(self) -> Optional[Dict[str, Dict]]:
+        from .jobs import obter_fila_jobs  # import tardio: jobs importa este módulo
+
+        with self._lock:
+            if self._leitura is None or time.monotonic() - self._lida_em >= JOBS_METRICAS_CACHE_SEGUNDOS:
+                try:
+                    with Session(bind=self.bind) as db:
+                        self._leitura = obter_fila_jobs(db)
+                except SQLAlchemyError:
+                    logger.warning("Não foi possível ler a fila de jobs para o /metrics", exc_info=True)
+                    return None
+                self._lida_em = time.monotonic()
+            return self._leitura
+
+    def collect(self):
+        if self.bind is None:
+            return
+        leitura = self._ler()
+        if leitura is None:
+            return
+        fila = GaugeMetricFamily("palcoapp_jobs_fila", "Jobs na tabela, por tipo e status", labels=("tipo", "status"))
+        for tipo, por_status in leitura["fila"].items():
+            for status_job, quantidade in por_status.items():
+                fila.add_metric((tipo, status_job), quantidade)
+        espera = GaugeMetricFamily(
+            "palcoapp_jobs_espera_mais_antiga_segundos", "Há quanto tempo o job pendente mais antigo já podia ter rodado", labels=("tipo",),
+        )
+        for tipo, segundos in leitura["espera_mais_antiga_s"].items():
+            espera.add_metric((tipo,), segundos)
+        yield from (fila, espera)
+
+
+_coletor_fila_jobs = _ColetorFilaJobs()
+
+
+def instrumentar_fila_jobs(bind) -> None:
+    """Passa a exportar a fila de jobs lida de `bind` no /metrics."""
+    with _coletor_fila_jobs._lock:
+        _coletor_fila_jobs.bind = bind
+        _coletor_fila_jobs._leitura = None
+
+
+REGISTRY.register(_coletor_fila_jobs)
+
+
+def gerar_metricas() -> bytes:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_coletor_fila_jobs)
+        return generate_latest(registro)
+    return generate_latest(REGISTRY)
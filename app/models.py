@@ -1,8 +1,77 @@
 # app/models.py
-from sqlalchemy import Table, Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+import enum
+
+from sqlalchemy import Table, Column, Integer, SmallInteger, BigInteger, Float, String, Boolean, ForeignKey, DateTime, Text, JSON, LargeBinary, Index, CheckConstraint, UniqueConstraint, text
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import TypeDecorator
 from .database import Base
-import datetime
+
+
+class agora_utc(FunctionElement):
+    """
+    Hora atual calculada pelo banco, em UTC sem fuso (como as demais colunas DateTime), para
+    server_default. Um default Python tipo datetime.now(...) é avaliado uma vez, no import do
+    módulo: todas as linhas gravadas por um worker ficavam com a hora em que ele subiu.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(agora_utc)
+def _agora_utc(elemento, compilador, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(agora_utc, "postgresql")
+def _agora_utc_postgresql(elemento, compilador, **kw):
+    # statement_timestamp(), não now(): pedidos gravados na mesma transação não ficam com a mesma hora
+    return "timezone('utc', statement_timestamp())"
+
+
+@compiles(agora_utc, "sqlite")
+def _agora_utc_sqlite(elemento, compilador, **kw):
+    # CURRENT_TIMESTAMP do SQLite só tem segundos
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+
+class StatusPedido(str, enum.Enum):
+    PENDENTE = "pendente"
+    ATENDIDO = "atendido"
+    RECUSADO = "recusado"
+
+    def __str__(self):
+        return self.value
+
+
+# Código gravado no banco (SMALLINT). Só acrescente códigos novos: os existentes estão nos dados e no índice parcial
+CODIGOS_STATUS_PEDIDO = {StatusPedido.PENDENTE: 0, StatusPedido.ATENDIDO: 1, StatusPedido.RECUSADO: 2}
+_STATUS_POR_CODIGO = {codigo: status for status, codigo in CODIGOS_STATUS_PEDIDO.items()}
+
+# Transições aceitas por crud.atualizar_status_pedido_musica: atendido/recusado são finais
+TRANSICOES_STATUS_PEDIDO = {
+    StatusPedido.PENDENTE: {StatusPedido.ATENDIDO, StatusPedido.RECUSADO},
+    StatusPedido.ATENDIDO: set(),
+    StatusPedido.RECUSADO: set(),
+}
+
+
+class TipoStatusPedido(TypeDecorator):
+    """StatusPedido no Python, SMALLINT no banco. Aceita o texto ("pendente") nas comparações e atribuições."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, valor, dialeto):
+        return None if valor is None else CODIGOS_STATUS_PEDIDO[StatusPedido(valor)]
+
+    def process_literal_param(self, valor, dialeto):
+        return str(self.process_bind_param(valor, dialeto))
+
+    def process_result_value(self, valor, dialeto):
+        return None if valor is None else _STATUS_POR_CODIGO[valor]
+
 
 # Tabela de associação para Favoritos (existente)
 favoritos_table = Table(
@@ -22,17 +91,24 @@ class Musico(Base):
     link_gorjeta = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     foto_perfil_url = Column(String, nullable=True) # Armazenará o caminho/URL da foto
+    foto_perfil_variantes = Column(JSON, nullable=True) # Miniaturas: {"webp": {"256": url, ...}, "jpg": {...}}
     
     itens_repertorio = relationship("ItemRepertorio", back_populates="musico_dono", cascade="all, delete-orphan")
     shows = relationship("Show", back_populates="musico", cascade="all, delete-orphan")
+    series_shows = relationship("SerieShow", back_populates="musico", cascade="all, delete-orphan")
     favoritado_por = relationship("UsuarioPublico", secondary=favoritos_table, back_populates="musicos_favoritos")
     
     # NOVO RELACIONAMENTO: Pedidos recebidos por este músico
     pedidos_recebidos = relationship("PedidoMusica", back_populates="musico_destinatario", cascade="all, delete-orphan", foreign_keys="[PedidoMusica.musico_id]")
+    pedidos_recebidos_arquivados = relationship("PedidoMusicaArquivado", back_populates="musico_destinatario", cascade="all, delete-orphan")
 
 
 class ItemRepertorio(Base):
     __tablename__ = "itens_repertorio"
+    __table_args__ = (
+        # Repertório de um músico: musico_id = ? ORDER BY id
+        Index("ix_itens_repertorio_musico_id_id", "musico_id", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     nome_musica = Column(String, index=True)
     artista_original = Column(String, nullable=True)
@@ -41,19 +117,105 @@ class ItemRepertorio(Base):
     
     # NOVO RELACIONAMENTO: Pedidos feitos para este item de repertório
     pedidos_desta_musica = relationship("PedidoMusica", back_populates="item_repertorio_pedido", cascade="all, delete-orphan")
+    pedidos_desta_musica_arquivados = relationship("PedidoMusicaArquivado", back_populates="item_repertorio_pedido", cascade="all, delete-orphan")
 
 
 class Show(Base):
     __tablename__ = "shows"
+    __table_args__ = (
+        # Agenda de um músico: musico_id = ? ORDER BY data_hora_evento
+        Index("ix_shows_musico_id_data_hora_evento", "musico_id", "data_hora_evento"),
+        # Uma ocorrência por data em cada série: expandir a mesma janela duas vezes não duplica shows
+        Index("ux_shows_serie_id_data_hora_evento", "serie_id", "data_hora_evento", unique=True),
+        # Shows próximos: geocelula BETWEEN ? AND ? (poucas faixas, ver app/geo.py) AND data_hora_evento >= agora
+        Index("ix_shows_geocelula_data_hora_evento", "geocelula", "data_hora_evento"),
+        # Página do local: local_id = ? AND data_hora_evento >= agora ORDER BY data_hora_evento
+        Index("ix_shows_local_id_data_hora_evento", "local_id", "data_hora_evento"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     data_hora_evento = Column(DateTime, nullable=False, index=True)
     local_nome = Column(String, nullable=False)
     local_endereco = Column(String, nullable=True)
     descricao_evento = Column(Text, nullable=True)
     link_evento = Column(String, nullable=True)
-    data_hora_cadastro = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geocelula = Column(BigInteger, nullable=True) # geo.geocelula(latitude, longitude); sempre gravada junto com elas
+    data_hora_cadastro = Column(DateTime, nullable=False, server_default=agora_utc())
     musico_id = Column(Integer, ForeignKey("musicos.id"), nullable=False)
     musico = relationship("Musico", back_populates="shows")
+    # Preenchido nos shows gerados por uma SerieShow; editar/apagar o show não mexe na série
+    serie_id = Column(Integer, ForeignKey("series_shows.id", ondelete="SET NULL", name="fk_shows_serie_id_series_shows"), nullable=True)
+    serie = relationship("SerieShow", back_populates="shows")
+    # Local deduplicado (app/locais.py); local_nome/local_endereco guardam o texto como o músico digitou
+    local_id = Column(Integer, ForeignKey("locais.id", name="fk_shows_local_id_locais"), nullable=True)
+    local = relationship("Local", back_populates="shows")
+
+
+class SerieShow(Base):
+    # Regra de recorrência (semanal/mensal, com exceções) expandida em linhas de Show por app/series_shows.py.
+    # Só a janela até expandida_ate existe em `shows`; o resto é gerado quando a janela avança.
+    __tablename__ = "series_shows"
+    __table_args__ = (
+        CheckConstraint("frequencia IN ('semanal', 'mensal')", name="ck_series_shows_frequencia"),
+        CheckConstraint("intervalo >= 1", name="ck_series_shows_intervalo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    musico_id = Column(Integer, ForeignKey("musicos.id"), nullable=False, index=True)
+    musico = relationship("Musico", back_populates="series_shows")
+    frequencia = Column(String, nullable=False) # "semanal" ou "mensal" (mesmo dia do mês de data_hora_inicio)
+    intervalo = Column(Integer, nullable=False, default=1) # a cada N semanas/meses
+    dias_semana = Column(JSON, nullable=True) # Só semanal: [0..6], segunda = 0. Vazio = o dia de data_hora_inicio
+    data_hora_inicio = Column(DateTime, nullable=False) # Primeira ocorrência e horário de todas (UTC sem fuso)
+    data_fim = Column(DateTime, nullable=True)
+    max_ocorrencias = Column(Integer, nullable=True)
+    excecoes = Column(JSON, nullable=False, default=list) # Datas ("AAAA-MM-DD") puladas
+    local_nome = Column(String, nullable=False)
+    local_endereco = Column(String, nullable=True)
+    descricao_evento = Column(Text, nullable=True)
+    link_evento = Column(String, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    local_id = Column(Integer, ForeignKey("locais.id", name="fk_series_shows_local_id_locais"), nullable=True)
+    expandida_ate = Column(DateTime, nullable=False, index=True) # Ocorrências antes disto já estão em `shows`
+    encerrada = Column(Boolean, nullable=False, default=False) # Passou de data_fim/max_ocorrencias: nada mais a gerar
+    data_hora_cadastro = Column(DateTime, nullable=False, server_default=agora_utc())
+    shows = relationship("Show", back_populates="serie", passive_deletes=True)
+
+class Local(Base):
+    # Casa de show, deduplicada pelo nome normalizado (e pelo endereço, quando há): ver app/locais.py
+    __tablename__ = "locais"
+    __table_args__ = (
+        UniqueConstraint("chave", "endereco_normalizado", name="uq_locais_chave_endereco_normalizado"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    nome = Column(String, nullable=False) # Como foi digitado da primeira vez
+    endereco = Column(String, nullable=True)
+    chave = Column(String, nullable=False) # Nome sem acento, caixa, pontuação, espaços nem artigo inicial
+    bloco = Column(String, nullable=False, index=True) # chave[:4]: os candidatos da comparação aproximada
+    endereco_normalizado = Column(String, nullable=False, default="")
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    data_hora_cadastro = Column(DateTime, nullable=False, server_default=agora_utc())
+    shows = relationship("Show", back_populates="local")
+
+
+class RefreshTokenUsado(Base):
+    # Rotação dos refresh tokens (security.decodificar_refresh_token): o jti de cada token usado, até o token expirar.
+    # No banco, e não na memória de cada worker, para valer entre processos e sobreviver a reinícios.
+    __tablename__ = "refresh_tokens_usados"
+    __table_args__ = (
+        # Poda dos expirados em lotes (app/limpeza_refresh_tokens.py): expira_em < agora
+        Index("ix_refresh_tokens_usados_expira_em", "expira_em"),
+    )
+
+    jti_digest = Column(LargeBinary(16), primary_key=True) # blake2b de 16 bytes do jti; a PK recusa o segundo uso
+    role = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    expira_em = Column(DateTime, nullable=False) # exp do token, em UTC sem fuso
+
 
 class UsuarioPublico(Base):
     __tablename__ = "usuarios_publico"
@@ -62,17 +224,31 @@ class UsuarioPublico(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
-    data_cadastro = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    data_cadastro = Column(DateTime, nullable=False, server_default=agora_utc())
 
     musicos_favoritos = relationship("Musico", secondary=favoritos_table, back_populates="favoritado_por")
     
     # NOVO RELACIONAMENTO: Pedidos feitos por este usuário
     pedidos_feitos = relationship("PedidoMusica", back_populates="solicitante", cascade="all, delete-orphan", foreign_keys="[PedidoMusica.solicitante_id]")
+    pedidos_feitos_arquivados = relationship("PedidoMusicaArquivado", back_populates="solicitante", cascade="all, delete-orphan")
 
 
 # --- NOVO MODELO PedidoMusica ABAIXO ---
 class PedidoMusica(Base):
     __tablename__ = "pedidos_musica"
+    __table_args__ = (
+        # Fila do músico e histórico do fã: <dono> = ? ORDER BY data_hora_pedido DESC, id DESC. O id
+        # desempata pedidos do mesmo instante; com ele no índice, a ordem sai inteira do índice (lido de trás para frente)
+        Index("ix_pedidos_musica_musico_id_data_hora_pedido", "musico_id", "data_hora_pedido", "id"),
+        Index("ix_pedidos_musica_solicitante_id_data_hora_pedido", "solicitante_id", "data_hora_pedido", "id"),
+        # Só os pendentes (a minoria, depois de um tempo): a fila que o músico consulta durante o show
+        Index(
+            "ix_pedidos_musica_pendentes", "musico_id", "data_hora_pedido", "id",
+            postgresql_where=text("status_pedido = 0"),
+            sqlite_where=text("status_pedido = 0"),
+        ),
+        CheckConstraint("status_pedido IN (0, 1, 2)", name="ck_pedidos_musica_status_pedido"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -90,5 +266,51 @@ class PedidoMusica(Base):
     
     # Informações do Pedido
     mensagem_opcional = Column(Text, nullable=True)
-    data_hora_pedido = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc), index=True)
-    status_pedido = Column(String, default="pendente", index=True) # Ex: "pendente", "atendido", "recusado"
\ No newline at end of file
+    data_hora_pedido = Column(DateTime, nullable=False, server_default=agora_utc(), index=True)
+    status_pedido = Column(TipoStatusPedido, nullable=False, default=StatusPedido.PENDENTE, server_default=text("0"))
+
+
+class PedidoMusicaArquivado(Base):
+    # Pedidos já tratados e antigos, movidos de pedidos_musica pelo arquivamento (app/arquivamento_pedidos.py)
+    # para a tabela quente ficar só com o que as filas ao vivo leem. Mesmas colunas (e o mesmo id) de PedidoMusica.
+    __tablename__ = "pedidos_musica_arquivo"
+    __table_args__ = (
+        Index("ix_pedidos_musica_arquivo_musico_id_data_hora_pedido", "musico_id", "data_hora_pedido", "id"),
+        Index("ix_pedidos_musica_arquivo_solicitante_id_data_hora_pedido", "solicitante_id", "data_hora_pedido", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    solicitante_id = Column(Integer, ForeignKey("usuarios_publico.id"), nullable=False)
+    solicitante = relationship("UsuarioPublico", back_populates="pedidos_feitos_arquivados")
+    musico_id = Column(Integer, ForeignKey("musicos.id"), nullable=False)
+    musico_destinatario = relationship("Musico", back_populates="pedidos_recebidos_arquivados")
+    item_repertorio_id = Column(Integer, ForeignKey("itens_repertorio.id"), nullable=False)
+    item_repertorio_pedido = relationship("ItemRepertorio", back_populates="pedidos_desta_musica_arquivados")
+    mensagem_opcional = Column(Text, nullable=True)
+    data_hora_pedido = Column(DateTime, nullable=False)
+    status_pedido = Column(TipoStatusPedido, nullable=False)
+    arquivado_em = Column(DateTime, nullable=False, server_default=agora_utc())
+
+
+class Job(Base):
+    # Fila de tarefas em segundo plano (app/jobs.py). Datas em UTC sem fuso.
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Consulta de reserva: status = 'pendente' AND executar_em <= agora ORDER BY executar_em
+        Index("ix_jobs_status_executar_em", "status", "executar_em"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False, index=True)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="pendente") # "pendente", "executando", "concluido", "falhou"
+    tentativas = Column(Integer, nullable=False, default=0)
+    max_tentativas = Column(Integer, nullable=False, default=5)
+    executar_em = Column(DateTime, nullable=False)
+    criado_em = Column(DateTime, nullable=False)
+    iniciado_em = Column(DateTime, nullable=True)
+    concluido_em = Column(DateTime, nullable=True)
+    # Reserva com prazo: se o worker morrer, o job volta a ficar disponível depois de travado_ate
+    travado_por = Column(String, nullable=True)
+    travado_ate = Column(DateTime, nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
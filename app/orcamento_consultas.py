@@ -0,0 +1,64 @@
+# app/orcamento_consultas.py
+# Orçamento de consultas SQL por rota, contra N+1: cada endpoint declara quantas consultas
+# pode fazer com @orcamento_consultas(n). A contagem é a do MetricasMiddleware (eventos
+# before_cursor_execute do engine, só as consultas feitas até a resposta ser enviada).
+#
+# ORCAMENTO_CONSULTAS_MODO:
+#   "log"       (padrão) registra um aviso quando a requisição termina acima do orçamento
+#   "erro"      lança OrcamentoConsultasExcedido na consulta que estoura (usado nos testes)
+#   "desligado" não confere
+import logging
+import os
+from typing import Callable, Optional, TypeVar
+
+ORCAMENTO_CONSULTAS_MODO = os.getenv("ORCAMENTO_CONSULTAS_MODO", "log")
+# Orçamento das rotas sem declaração; 0 = sem limite
+ORCAMENTO_CONSULTAS_PADRAO = int(os.getenv("ORCAMENTO_CONSULTAS_PADRAO", "0"))
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+
+class OrcamentoConsultasExcedido(Exception):
+    pass
+
+
+def orcamento_consultas(maximo: int) -> Callable[[F], F]:
+    """Declara o máximo de consultas SQL que o endpoint decorado pode fazer por requisição."""
+    def decorar(endpoint: F) -> F:
+        endpoint._orcamento_consultas = maximo
+        return endpoint
+    return decorar
+
+
+def orcamento_da_rota(scope) -> Optional[int]:
+    rota = scope.get("route")
+    maximo = getattr(getattr(rota, "endpoint", None), "_orcamento_consultas", None)
+    if maximo is None and rota is not None and ORCAMENTO_CONSULTAS_PADRAO > 0:
+        return ORCAMENTO_CONSULTAS_PADRAO
+    return maximo
+
+
+def verificar_consulta(scope, consultas: int, statement: str) -> None:
+    """Chamado antes de cada consulta da requisição; no modo "erro", impede a que estoura o orçamento."""
+    if ORCAMENTO_CONSULTAS_MODO != "erro":
+        return
+    maximo = orcamento_da_rota(scope)
+    if maximo is not None and consultas > maximo:
+        rota = getattr(scope.get("route"), "path", scope.get("path"))
+        raise OrcamentoConsultasExcedido(
+            f"{scope.get('method')} {rota}: a consulta nº {consultas} excede o orçamento de {maximo}. SQL: {statement[:300]}"
+        )
+
+
+def verificar_fim_da_requisicao(scope, consultas: int) -> None:
+    if ORCAMENTO_CONSULTAS_MODO != "log":
+        return
+    maximo = orcamento_da_rota(scope)
+    if maximo is not None and consultas > maximo:
+        rota = getattr(scope.get("route"), "path", scope.get("path"))
+        logger.warning(
+            "%s %s fez %d consultas SQL (orçamento: %d)", scope.get("method"), rota, consultas, maximo,
+            extra={"rota": rota, "consultas": consultas, "orcamento": maximo},
+        )
@@ -0,0 +1,210 @@
+# app/perfilamento.py
+# Perfil de CPU de requisições reais, sob demanda, com o profiler estatístico pyinstrument.
+#
+# Só com PERFILAMENTO_ATIVO=true (senão o middleware nem é instalado). Uma requisição é perfilada quando:
+#   - traz o cabeçalho X-Perfil assinado com o ADMIN_TOKEN (gere com `python -m app.perfilamento`), ou
+#   - cai na amostra aleatória PERFILAMENTO_TAXA_AMOSTRA (0 = nunca).
+# As demais só pagam a procura pelo cabeçalho. O resultado (formato speedscope, abra em
+# https://www.speedscope.app) vai para PERFILAMENTO_DIR com a rota e o request id no nome; os
+# arquivos mais antigos são apagados quando o diretório passa de PERFILAMENTO_MAX_BYTES.
+import argparse
+import contextvars
+import datetime
+import functools
+import hashlib
+import hmac
+import inspect
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+
+from . import security
+from .logs import obter_request_id
+
+PERFILAMENTO_ATIVO = os.getenv("PERFILAMENTO_ATIVO", "false").lower() in ("1", "true", "sim")
+PERFILAMENTO_TAXA_AMOSTRA = float(os.getenv("PERFILAMENTO_TAXA_AMOSTRA", "0"))
+PERFILAMENTO_DIR = os.getenv("PERFILAMENTO_DIR", os.path.join(tempfile.gettempdir(), "palcoapp_perfis"))
+PERFILAMENTO_MAX_BYTES = int(os.getenv("PERFILAMENTO_MAX_BYTES", str(200 * 1024 * 1024)))
+PERFILAMENTO_INTERVALO_SEGUNDOS = float(os.getenv("PERFILAMENTO_INTERVALO_SEGUNDOS", "0.001"))
+
+CABECALHO_GATILHO = b"x-perfil"
+SUFIXO_ARQUIVO = ".speedscope.json"
+
+logger = logging.getLogger(__name__)
+
+# Perfil da requisição atual; os handlers síncronos (threadpool) juntam o deles aqui
+_perfil_requisicao: contextvars.ContextVar[Optional["_PerfilRequisicao"]] = contextvars.ContextVar("perfil_requisicao", default=None)
+_lock_rotacao = threading.Lock()
+
+
+def assinar_gatilho(validade_segundos: float = 600, chave: Optional[str] = None) -> str:
+    """Valor do cabeçalho X-Perfil: '<expira_em>.<hmac>', válido por `validade_segundos`."""
+    chave = chave or security.ADMIN_TOKEN
+    if not chave:
+        raise RuntimeError("ADMIN_TOKEN não configurado")
+    expira_em = int(time.time() + validade_segundos)
+    assinatura = hmac.new(chave.encode("utf-8"), f"perfil:{expira_em}".encode(), hashlib.sha256).hexdigest()
+    return f"{expira_em}.{assinatura}"
+
+
+def gatilho_valido(valor: str) -> bool:
+    chave = security.ADMIN_TOKEN
+    if not chave or "." not in valor:
+        return False
+    expira_em, assinatura = valor.split(".", 1)
+    if not expira_em.isdigit() or int(expira_em) < time.time():
+        return False
+    esperada = hmac.new(chave.encode("utf-8"), f"perfil:{expira_em}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperada, assinatura)
+
+
+class _PerfilRequisicao:
+    def __init__(self):
+        from pyinstrument import Profiler  # só importado quando alguma requisição é perfilada
+        self._profiler_cls = Profiler
+        self.profiler = Profiler(interval=PERFILAMENTO_INTERVALO_SEGUNDOS, async_mode="enabled")
+        self.sessoes_threads = []
+        self._lock = threading.Lock()
+
+    def perfilar_no_thread(self, funcao, *args, **kwargs):
+        # O pyinstrument só amostra o thread em que foi iniciado: o trecho no threadpool ganha o seu
+        profiler = self._profiler_cls(interval=PERFILAMENTO_INTERVALO_SEGUNDOS, async_mode="disabled")
+        profiler.start()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            sessao = profiler.stop()
+            with self._lock:
+                self.sessoes_threads.append(sessao)
+
+    def sessao_combinada(self):
+        sessao = self.profiler.last_session
+        for sessao_thread in self.sessoes_threads:
+            sessao = sessao_thread if sessao is None else type(sessao).combine(sessao, sessao_thread)
+        return sessao
+
+
+class RotaPerfilavel(APIRoute):
+    """
+    APIRoute cujo endpoint síncrono também é perfilado (ele roda no threadpool, fora do alcance
+    do profiler do event loop). `endpoint` continua sendo a função original; só a chamada muda.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        if not inspect.iscoroutinefunction(endpoint):
+            original = self.dependant.call
+
+            @functools.wraps(original)
+            def chamar(*args, **kwargs):
+                perfil = _perfil_requisicao.get()
+                if perfil is None:
+                    return original(*args, **kwargs)
+                return perfil.perfilar_no_thread(original, *args, **kwargs)
+
+            self.dependant.call = chamar
+
+
+def _nome_arquivo(metodo: str, rota: str, request_id: Optional[str]) -> str:
+    agora = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    rota_limpa = re.sub(r"[^A-Za-z0-9]+", "_", rota).strip("_") or "raiz"
+    return f"{agora}_{metodo}_{rota_limpa}_{request_id or 'sem-id'}{SUFIXO_ARQUIVO}"
+
+
+def rotacionar(diretorio: str = PERFILAMENTO_DIR, max_bytes: int = PERFILAMENTO_MAX_BYTES) -> int:
+    """Apaga os perfis mais antigos até o diretório caber em `max_bytes`. Devolve quantos apagou."""
+    with _lock_rotacao:
+        arquivos = []
+        for entrada in os.scandir(diretorio):
+            if entrada.is_file() and entrada.name.endswith(SUFIXO_ARQUIVO):
+                info = entrada.stat()
+                arquivos.append((info.st_mtime, entrada.name, info.st_size))
+        total = sum(tamanho for _, _, tamanho in arquivos)
+        apagados = 0
+        for _, nome, tamanho in sorted(arquivos):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(diretorio, nome))
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+            apagados += 1
+        return apagados
+
+
+def _gravar_perfil(sessao, nome_arquivo: str, diretorio: str) -> None:
+    from pyinstrument.renderers import SpeedscopeRenderer
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, nome_arquivo)
+    with open(caminho + ".parcial", "w", encoding="utf-8") as arquivo:
+        arquivo.write(SpeedscopeRenderer().render(sessao))
+    os.replace(caminho + ".parcial", caminho)
+    rotacionar(diretorio)
+
+
+class PerfilamentoMiddleware:
+    """Perfila as requisições com gatilho (cabeçalho assinado ou amostra) e grava o perfil depois da resposta."""
+
+    def __init__(self, app, taxa_amostra: float = PERFILAMENTO_TAXA_AMOSTRA, diretorio: str = PERFILAMENTO_DIR):
+        self.app = app
+        self.taxa_amostra = taxa_amostra
+        self.diretorio = diretorio
+
+    def _disparado(self, scope) -> bool:
+        for nome, valor in scope.get("headers", []):
+            if nome == CABECALHO_GATILHO:
+                return gatilho_valido(valor.decode("latin-1"))
+        return self.taxa_amostra > 0 and random.random() < self.taxa_amostra
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._disparado(scope):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = _PerfilRequisicao()
+        token = _perfil_requisicao.set(perfil)
+        request_id = obter_request_id()
+        nome_arquivo = None
+
+        async def send_com_perfil(mensagem):
+            nonlocal nome_arquivo
+            if mensagem["type"] == "http.response.start":
+                # A rota já foi resolvida aqui; o nome do arquivo volta no cabeçalho para quem pediu o perfil
+                rota = getattr(scope.get("route"), "path", None) or "sem_rota"
+                nome_arquivo = _nome_arquivo(scope["method"], rota, request_id)
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"x-perfil-arquivo", nome_arquivo.encode("latin-1"))]
+            await send(mensagem)
+
+        perfil.profiler.start()
+        try:
+            await self.app(scope, receive, send_com_perfil)
+        finally:
+            perfil.profiler.stop()
+            _perfil_requisicao.reset(token)
+            if nome_arquivo is None:
+                nome_arquivo = _nome_arquivo(scope["method"], "sem_rota", request_id)
+            try:
+                await run_in_threadpool(_gravar_perfil, perfil.sessao_combinada(), nome_arquivo, self.diretorio)
+                logger.info("Perfil gravado: %s", nome_arquivo, extra={"arquivo": nome_arquivo, "caminho": scope["path"]})
+            except Exception as e_perfil:
+                logger.exception("Erro ao gravar o perfil da requisição: %s", e_perfil)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera o valor do cabeçalho X-Perfil (usa ADMIN_TOKEN)")
+    parser.add_argument("--validade", type=float, default=600, help="Segundos até o gatilho expirar")
+    args = parser.parse_args()
+    print(f"X-Perfil: {assinar_gatilho(args.validade)}")
+
+
+if __name__ == "__main__":
+    main()
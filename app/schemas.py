@@ -1,13 +1,17 @@
 # app/schemas.py
-from pydantic import BaseModel, EmailStr, Field, HttpUrl, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, HttpUrl, ConfigDict, model_validator
+from typing import Annotated, Optional, List, Dict, Literal
 import datetime
+import os
+
+from .models import StatusPedido
 
 # --- Esquemas "Slim" (já existentes, MusicoSlim é importante aqui) ---
 class MusicoSlim(BaseModel):
     id: int
     nome_artistico: str
     foto_perfil_url: Optional[str] = None
+    foto_perfil_variantes: Optional[Dict[str, Dict[str, str]]] = None # {"webp": {"96": url, "256": url, "640": url}, "jpg": {...}}
     model_config = ConfigDict(from_attributes=True)
 
 # ... (outros schemas ItemRepertorioBase, ItemRepertorioCreate, etc. permanecem os mesmos) ...
@@ -24,14 +28,31 @@ class ItemRepertorio(ItemRepertorioBase):
 
 
 # --- Esquemas para Shows ---
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+
+def _validar_coordenadas(modelo):
+    if (modelo.latitude is None) != (modelo.longitude is None):
+        raise ValueError("Informe latitude e longitude juntas")
+    return modelo
+
+def _validar_coordenadas_atualizacao(modelo):
+    # Na atualização parcial, só uma das duas deixaria a geocelula nula e o show sumiria de /shows/proximos
+    if len({"latitude", "longitude"} & modelo.model_fields_set) == 1:
+        raise ValueError("Informe latitude e longitude juntas")
+    return _validar_coordenadas(modelo)
+
 class ShowBase(BaseModel):
     data_hora_evento: datetime.datetime
     local_nome: str
     local_endereco: Optional[str] = None
     descricao_evento: Optional[str] = None
     link_evento: Optional[HttpUrl] = None
+    latitude: Optional[Latitude] = None # Sem coordenadas, o show não aparece em /shows/proximos
+    longitude: Optional[Longitude] = None
 
-class ShowCreate(ShowBase): pass
+class ShowCreate(ShowBase):
+    _coordenadas = model_validator(mode="after")(_validar_coordenadas)
 
 class ShowUpdate(BaseModel):
     data_hora_evento: Optional[datetime.datetime] = None
@@ -39,20 +60,82 @@ class ShowUpdate(BaseModel):
     local_endereco: Optional[str] = None
     descricao_evento: Optional[str] = None
     link_evento: Optional[HttpUrl] = None
+    latitude: Optional[Latitude] = None
+    longitude: Optional[Longitude] = None
+
+    _coordenadas = model_validator(mode="after")(_validar_coordenadas_atualizacao)
 
 # ***** ALTERAÇÃO AQUI NO SCHEMAS.SHOW *****
 class Show(ShowBase): # Este é o schema que será usado como response_model para listas de shows
-    id: int
+    id: Optional[int] = None # None numa ocorrência de série ainda não gerada (data além da janela do job)
     # musico_id: int # Ainda pode ser mantido se quiser o ID explícito, mas o objeto musico já o terá.
                    # Se o frontend já espera musico_id, mantenha.
                    # Para evitar redundância, podemos remover se o objeto musico for sempre incluído.
                    # Por ora, vou manter, mas o frontend usará o musico.nome_artistico.
     data_hora_cadastro: datetime.datetime
     musico: MusicoSlim # <<< NOVO CAMPO PARA INCLUIR DETALHES DO MÚSICO
+    serie_id: Optional[int] = None # Show gerado por uma série recorrente
+    local_id: Optional[int] = None # Local deduplicado (/locais/{local_id})
 
     model_config = ConfigDict(from_attributes=True)
 # ***** FIM DA ALTERAÇÃO *****
 
+# Criação em lote: todos os shows numa transação (tudo ou nada)
+SHOWS_LOTE_MAXIMO = int(os.getenv("SHOWS_LOTE_MAXIMO", "100"))
+
+class Local(BaseModel):
+    id: int
+    nome: str
+    endereco: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class ShowProximo(BaseModel):
+    show: Show
+    distancia_km: float
+
+class ShowLoteCreate(BaseModel):
+    shows: List[ShowCreate] = Field(..., min_length=1, max_length=SHOWS_LOTE_MAXIMO)
+
+# Séries de shows recorrentes (app/series_shows.py)
+class SerieShowBase(BaseModel):
+    frequencia: Literal["semanal", "mensal"]
+    intervalo: int = Field(default=1, ge=1, le=52) # a cada N semanas/meses
+    dias_semana: Optional[List[Annotated[int, Field(ge=0, le=6)]]] = None # só semanal; segunda = 0
+    data_hora_inicio: datetime.datetime
+    data_fim: Optional[datetime.datetime] = None
+    max_ocorrencias: Optional[int] = Field(default=None, ge=1)
+    excecoes: List[datetime.date] = []
+    local_nome: str
+    local_endereco: Optional[str] = None
+    descricao_evento: Optional[str] = None
+    link_evento: Optional[HttpUrl] = None
+    latitude: Optional[Latitude] = None
+    longitude: Optional[Longitude] = None
+
+class SerieShowCreate(SerieShowBase):
+    _coordenadas = model_validator(mode="after")(_validar_coordenadas)
+
+    @model_validator(mode="after")
+    def validar_regra(self):
+        if self.dias_semana is not None and self.frequencia != "semanal":
+            raise ValueError("dias_semana só vale para séries semanais")
+        if self.data_fim is not None and self.data_fim < self.data_hora_inicio:
+            raise ValueError("data_fim anterior a data_hora_inicio")
+        return self
+
+class SerieShow(SerieShowBase):
+    id: int
+    musico_id: int
+    expandida_ate: datetime.datetime # Shows até aqui já existem; os seguintes são gerados conforme a janela avança
+    encerrada: bool
+    model_config = ConfigDict(from_attributes=True)
+
+class SerieShowCriada(BaseModel):
+    serie: SerieShow
+    shows_gerados: int
+
 
 # ... (UsuarioPublicoSlim, ItemRepertorioSlim, PedidoMusica, Musico, UsuarioPublico, Token, TokenData - permanecem os mesmos) ...
 class UsuarioPublicoSlim(BaseModel):
@@ -73,11 +156,11 @@ class PedidoMusicaCreate(PedidoMusicaBase):
     item_repertorio_id: int
     musico_id: int
 class PedidoMusicaUpdateStatus(BaseModel):
-    status_pedido: str
+    status_pedido: StatusPedido
 class PedidoMusica(PedidoMusicaBase):
     id: int
     data_hora_pedido: datetime.datetime
-    status_pedido: str
+    status_pedido: StatusPedido
     solicitante: UsuarioPublicoSlim
     musico_destinatario: MusicoSlim
     item_repertorio_pedido: ItemRepertorioSlim
@@ -90,6 +173,7 @@ class MusicoBase(BaseModel):
     descricao: Optional[str] = None
     link_gorjeta: Optional[str] = None
     foto_perfil_url: Optional[str] = None
+    foto_perfil_variantes: Optional[Dict[str, Dict[str, str]]] = None
     itens_repertorio: List[ItemRepertorio] = []
     shows: List[Show] = [] # Esta lista de shows agora usará o schema Show modificado
     pedidos_recebidos: List[PedidoMusica] = []
@@ -125,7 +209,23 @@ class UsuarioPublico(UsuarioPublicoBase):
     pedidos_feitos: List[PedidoMusica] = []
     model_config = ConfigDict(from_attributes=True)
 
+# --- Upload direto da foto de perfil (URL assinada) ---
+class FotoUploadAssinadoCreate(BaseModel):
+    content_type: Literal["image/jpeg", "image/png"]
+class FotoUploadAssinado(BaseModel):
+    upload_url: str; metodo: str; headers: Dict[str, str]; nome_arquivo: str; expira_em: int; tamanho_maximo_bytes: int
+class FotoUploadFinalizar(BaseModel):
+    nome_arquivo: str
+
 class Token(BaseModel):
     access_token: str; token_type: str; user_id: int; email: EmailStr; role: str; nome_exibicao: str
+    refresh_token: Optional[str] = None
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 class TokenData(BaseModel):
-    email: Optional[EmailStr] = None; user_id: Optional[int] = None; role: Optional[str] = None
\ No newline at end of file
+    email: Optional[EmailStr] = None; user_id: Optional[int] = None; role: Optional[str] = None
+
+# Identidade mínima do usuário logado (só colunas, sem relacionamentos), usada pelas dependências de autenticação
+class UsuarioAutenticado(BaseModel):
+    id: int; email: str; is_active: bool; role: str
+    model_config = ConfigDict(frozen=True)
\ No newline at end of file
@@ -1,36 +1,94 @@
 # app/security.py
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import hashlib
+import hmac
+import heapq
+import logging
+import threading
+import time
+import uuid
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from . import schemas # Para o esquema schemas.TokenData
+from .cache import CacheTTL
 
 load_dotenv() 
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = "minha_palavra_chave_secreta_e_longa_para_o_palcoapp_12345_!@#$%" 
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+TOKEN_CACHE_MAX_ITENS = int(os.getenv("TOKEN_CACHE_MAX_ITENS", "10000"))
+# Token das rotas /admin/* (cabeçalho X-Admin-Token); sem ele definido, as rotas respondem 404
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Custo do bcrypt (log2 das iterações). Hashes com custo menor são refeitos no próximo login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt libera o GIL, então um pool de threads já tira o hashing do event loop
+HASH_POOL_THREADS = int(os.getenv("HASH_POOL_THREADS", str(min(4, os.cpu_count() or 1))))
+# Máximo de operações de hash em andamento ou na fila; acima disso o login recebe 503
+HASH_POOL_MAX_FILA = int(os.getenv("HASH_POOL_MAX_FILA", "32"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_pool_hash = ThreadPoolExecutor(max_workers=HASH_POOL_THREADS, thread_name_prefix="hash-senha")
+_vagas_pool_hash = threading.BoundedSemaphore(HASH_POOL_MAX_FILA)
+
+T = TypeVar("T")
 
 def verificar_senha(senha_texto_plano: str, senha_hasheada: str) -> bool:
-    # print(f"DEBUG security.verificar_senha: Verificando senha...") # DEBUG
     try:
         resultado = pwd_context.verify(senha_texto_plano, senha_hasheada)
-        # print(f"DEBUG security.verificar_senha: Resultado da verificação: {resultado}") # DEBUG
         return resultado
     except Exception as e:
-        # print(f"ERRO em security.verificar_senha: {type(e).__name__} - {e}") # DEBUG
+        # Hash corrompido ou de esquema desconhecido: trata como senha incorreta
+        logger.warning("Falha ao verificar hash de senha: %s", type(e).__name__)
         return False
 
+def verificar_e_atualizar_senha(senha_texto_plano: str, senha_hasheada: str) -> Tuple[bool, Optional[str]]:
+    # Retorna (senha_correta, novo_hash); novo_hash só vem preenchido se o hash salvo usa parâmetros desatualizados
+    try:
+        return pwd_context.verify_and_update(senha_texto_plano, senha_hasheada)
+    except Exception:
+        return False, None
+
+async def executar_no_pool_de_hash(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Roda `func` (que faz bcrypt) no pool de threads de hashing, fora do event loop.
+    Se já houver HASH_POOL_MAX_FILA operações em andamento, recusa com 503 em vez de enfileirar sem limite.
+    """
+    if not _vagas_pool_hash.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Muitos logins simultâneos. Tente novamente em instantes.",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        # copy_context: o request_id dos logs e a contagem de consultas da requisição valem no thread do pool
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(_pool_hash, functools.partial(contexto.run, func, *args, **kwargs))
+    finally:
+        _vagas_pool_hash.release()
+
 def obter_hash_da_senha(senha: str) -> str:
-    # print(f"DEBUG security.obter_hash_da_senha: Gerando hash...") # DEBUG
     return pwd_context.hash(senha)
 
 def criar_access_token(
@@ -38,7 +96,6 @@ def criar_access_token(
     expires_delta: Optional[timedelta] = None
 ) -> str:
     to_encode = data.copy()
-    # print(f"DEBUG security.criar_access_token: Entrando com data: {to_encode}") # DEBUG
     try:
         if expires_delta:
             expire = datetime.now(timezone.utc) + expires_delta
@@ -46,20 +103,15 @@ def criar_access_token(
             expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire})
-        # print(f"DEBUG security.criar_access_token: Payload para codificar: {to_encode}") # DEBUG
         
         if not SECRET_KEY:
-            # print("ERRO FATAL security.criar_access_token: SECRET_KEY não está definida!") # DEBUG
             raise ValueError("SECRET_KEY não configurada para JWT.")
 
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-        # print(f"DEBUG security.criar_access_token: Token JWT codificado: {encoded_jwt[:20]}...") # DEBUG
         return encoded_jwt
     except JWTError as e:
-        # print(f"ERRO JWTError em security.criar_access_token: {e}") # DEBUG
         raise
     except Exception as e:
-        # print(f"ERRO GERAL em security.criar_access_token: {type(e).__name__} - {e}") # DEBUG
         raise
 
 # OAuth2PasswordBearer para o endpoint de login dos músicos
@@ -78,12 +130,73 @@ oauth2_scheme_fan = OAuth2PasswordBearer(tokenUrl="/usuarios/token")
 # aponte para o tokenUrl correto.
 # Para simplificar, vamos manter uma função de decodificação, mas as dependências de obter usuário serão específicas.
 
+class ListaRevogacao:
+    """
+    Conjunto de digests revogados, cada um guardado só até a expiração do token
+    correspondente (depois disso o próprio `exp` já o invalida). A consulta é O(1)
+    e a memória fica limitada aos tokens ainda válidos.
+    """
+
+    def __init__(self):
+        self._expiracoes: Dict[bytes, float] = {}
+        self._fila: List[tuple] = []  # heap (expira_em, digest) para podar em ordem
+        self._lock = threading.Lock()
+
+    def _podar(self, agora: float) -> None:
+        while self._fila and self._fila[0][0] <= agora:
+            expira_em, digest = heapq.heappop(self._fila)
+            if self._expiracoes.get(digest) == expira_em:
+                del self._expiracoes[digest]
+
+    def revogar(self, digest: bytes, expira_em: float) -> None:
+        with self._lock:
+            self._podar(time.time())
+            self._expiracoes[digest] = expira_em
+            heapq.heappush(self._fila, (expira_em, digest))
+
+    def esta_revogado(self, digest: bytes) -> bool:
+        expira_em = self._expiracoes.get(digest)
+        return expira_em is not None and expira_em > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expiracoes)
+
+
+# Tokens já verificados (assinatura + TokenData validado), indexados pelo digest do token.
+# Cada entrada expira junto com o `exp` do JWT, então o cache nunca estende a validade de um token.
+_cache_tokens_verificados = CacheTTL(max_itens=TOKEN_CACHE_MAX_ITENS, ttl_segundos=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_tokens_revogados = ListaRevogacao()
+
+def _digest_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+def revogar_token(token: str) -> None:
+    # Gancho de revogação: tira o token do cache e o rejeita até que expire
+    digest = _digest_token(token)
+    _cache_tokens_verificados.remover(digest)
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return
+    if exp is not None:
+        _tokens_revogados.revogar(digest, float(exp))
+
+def limpar_cache_tokens() -> None:
+    _cache_tokens_verificados.limpar()
+
 async def decodificar_validar_token_base(token: str) -> schemas.TokenData: # Função base sem Depends
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    digest = _digest_token(token)
+    if _tokens_revogados.esta_revogado(digest):
+        raise credentials_exception
+    token_data = _cache_tokens_verificados.obter(digest)
+    if token_data is not None:
+        return token_data
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: Optional[str] = payload.get("sub")
@@ -92,18 +205,66 @@ async def decodificar_validar_token_base(token: str) -> schemas.TokenData: # Fun
 
         if email is None or user_id is None or role is None:
             raise credentials_exception
+        if payload.get("type") == "refresh": # Refresh token não serve como access token
+            raise credentials_exception
         
         token_data = schemas.TokenData(email=email, user_id=user_id, role=role)
     except JWTError:
         raise credentials_exception
     except Exception: # Captura outras exceções durante o processo
         raise credentials_exception
+
+    exp = payload.get("exp")
+    if exp is not None:
+        restante = float(exp) - time.time()
+        if restante > 0:
+            _cache_tokens_verificados.definir(digest, token_data, expira_em=time.monotonic() + restante)
     return token_data
 
+# --- Refresh tokens ---
+# Cada refresh token tem um jti único e só pode ser usado uma vez (rotação). Os jtis já usados ficam
+# no banco (models.RefreshTokenUsado, via crud.marcar_refresh_token_usado) até o token expirar, para que a
+# rotação valha entre workers e depois de um reinício.
+
+def _digest_jti(jti: str) -> bytes:
+    return hashlib.blake2b(jti.encode("utf-8"), digest_size=16).digest()
+
+def criar_refresh_token(user_id: int, email: str, role: str, expires_delta: Optional[timedelta] = None) -> str:
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode = {"sub": email, "user_id": user_id, "role": role, "type": "refresh", "jti": uuid.uuid4().hex, "exp": expire}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def decodificar_refresh_token(token: str) -> Tuple[schemas.TokenData, bytes, datetime]:
+    """
+    Valida o refresh token (assinatura, tipo, exp) e devolve (TokenData, digest do jti, expiração em UTC sem fuso).
+    Não o consome: quem chama marca o digest como usado no banco e recusa o token se ele já estava lá.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido ou expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    jti = payload.get("jti")
+    if payload.get("type") != "refresh" or not jti or payload.get("user_id") is None or payload.get("role") is None:
+        raise credentials_exception
+    expira_em = datetime.fromtimestamp(float(payload["exp"]), timezone.utc).replace(tzinfo=None)
+    return schemas.TokenData(email=payload.get("sub"), user_id=payload["user_id"], role=payload["role"]), _digest_jti(jti), expira_em
+
 # Dependência que usa o scheme de músico (para documentação)
 async def obter_payload_token_musico(token: str = Depends(oauth2_scheme_musico)) -> schemas.TokenData:
     return await decodificar_validar_token_base(token)
 
 # Dependência que usa o scheme de fã (para documentação)
 async def obter_payload_token_fan(token: str = Depends(oauth2_scheme_fan)) -> schemas.TokenData:
-    return await decodificar_validar_token_base(token)
\ No newline at end of file
+    return await decodificar_validar_token_base(token)
+
+# Dependência das rotas de diagnóstico (/admin/*)
+async def verificar_token_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administrador inválido")
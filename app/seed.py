@@ -0,0 +1,324 @@
+# app/seed.py
+# Gerador de dados sintéticos em volume (benchmarks, testes de carga, planos de consulta).
+#
+# Gera músicos, fãs, repertório, shows, pedidos e favoritos a partir das tabelas de app/models.py,
+# com popularidade enviesada (Zipf: poucos músicos recebem a maior parte dos shows, pedidos e
+# favoritos). É determinístico: a mesma --semente produz os mesmos dados.
+#
+# Rápido porque não passa pelo crud: os IDs são gerados aqui (os filhos referenciam os pais sem
+# ida ao banco), as linhas vão em INSERTs de várias linhas (COPY no PostgreSQL), em lotes, e
+# todas as contas usam o mesmo hash bcrypt, calculado uma vez.
+#
+# Uso: python -m app.seed --musicos 100000 --itens-por-musico 100 --shows 1000000 --pedidos 50000000 --fas 1000000
+# Roda sobre o DATABASE_URL; acrescenta aos dados existentes (os IDs continuam do maior atual).
+import argparse
+import bisect
+import csv
+import datetime
+import io
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence
+
+from sqlalchemy import Table, func, select, text
+
+from . import geo, models
+from .locais import chave_nome, normalizar
+from .security import obter_hash_da_senha
+
+SENHA_PADRAO = "senha_seed_123"
+DOMINIO_EMAIL = "seed.palcoapp.dev"
+# Limite de parâmetros por comando no SQLite (>= 3.32); os lotes de INSERT de várias linhas cabem nele
+_MAX_PARAMETROS_SQLITE = 32766
+
+GENEROS = ["rock", "mpb", "samba", "jazz", "forró", "pop", "blues", "sertanejo", "pagode", "reggae", "funk", "choro"]
+PALAVRAS = ["noite", "mar", "saudade", "estrada", "lua", "coração", "cidade", "chuva", "sol", "tempo", "amor", "rio", "vento", "festa"]
+LOCAIS = ["Bar do Zé", "Casa de Shows Palco", "Teatro Municipal", "Praça Central", "Pub da Esquina", "Festival de Verão", "Café Cultural"]
+# Centros (lat, lon) em volta dos quais os locais são espalhados (~15 km), para a busca por proximidade ter densidade real.
+# Cada cidade tem um local de cada nome de LOCAIS
+CIDADES = (
+    ("São Paulo", -23.5505, -46.6333), ("Rio de Janeiro", -22.9068, -43.1729), ("Belo Horizonte", -19.9167, -43.9345),
+    ("Recife", -8.0476, -34.8770), ("Porto Alegre", -30.0346, -51.2177), ("Brasília", -15.7939, -47.8828),
+)
+STATUS_PEDIDO = ((models.StatusPedido.PENDENTE, 0.2), (models.StatusPedido.ATENDIDO, 0.65), (models.StatusPedido.RECUSADO, 0.15))
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigSeed(NamedTuple):
+    musicos: int = 1000
+    fas: int = 2000
+    itens_por_musico: int = 20  # média; cada músico tem entre 1 e 2x-1
+    shows: int = 5000
+    pedidos: int = 20000
+    favoritos_por_fa: int = 5  # média
+    zipf: float = 1.1  # expoente; 0 = uniforme
+    semente: int = 42
+    lote: int = 5000
+    senha: str = SENHA_PADRAO
+    data_base: datetime.datetime = datetime.datetime(2026, 1, 1)
+
+
+class AmostradorZipf:
+    """Sorteia IDs com probabilidade ~ 1/posição^s; a posição de cada ID no ranking é embaralhada pela semente."""
+
+    def __init__(self, ids: Sequence[int], expoente: float, aleatorio: random.Random):
+        self.ids = list(ids)
+        aleatorio.shuffle(self.ids)
+        acumulado, self.acumulados = 0.0, []
+        for posicao in range(1, len(self.ids) + 1):
+            acumulado += 1.0 / posicao ** expoente
+            self.acumulados.append(acumulado)
+        self.aleatorio = aleatorio
+
+    def sortear(self) -> int:
+        alvo = self.aleatorio.random() * self.acumulados[-1]
+        return self.ids[bisect.bisect_left(self.acumulados, alvo)]
+
+
+# --- Carga em lote ---
+class _Carregador:
+    def __init__(self, conn, tamanho_lote: int):
+        self.conn = conn
+        self.dialeto = conn.dialect
+        self.tamanho_lote = tamanho_lote
+        self.usar_copy = self.dialeto.name == "postgresql" and self.dialeto.driver == "psycopg2"
+        self._sql_por_tamanho: Dict[tuple, str] = {}
+
+    def carregar(self, tabela: Table, colunas: List[str], linhas: Iterable[tuple]) -> int:
+        total, inicio = 0, time.perf_counter()
+        processadores = [tabela.c[nome].type.bind_processor(self.dialeto) for nome in colunas]
+        por_lote = self.tamanho_lote if self.usar_copy else max(1, min(self.tamanho_lote, _MAX_PARAMETROS_SQLITE // len(colunas)))
+        linhas = iter(linhas)
+        while True:
+            lote = list(itertools.islice(linhas, por_lote))
+            if not lote:
+                break
+            if self.usar_copy:
+                self._copy(tabela, colunas, processadores, lote)
+            else:
+                self._inserir(tabela, colunas, processadores, lote)
+            total += len(lote)
+        self.conn.commit()
+        logger.info("%s: %d linhas em %.1f s", tabela.name, total, time.perf_counter() - inicio, extra={"tabela": tabela.name, "linhas": total})
+        return total
+
+    def _inserir(self, tabela: Table, colunas: List[str], processadores, lote: List[tuple]) -> None:
+        # INSERT ... VALUES (...), (...), ... montado direto no formato de parâmetros do driver:
+        # sem compilar um statement do SQLAlchemy com milhares de parâmetros a cada lote
+        chave = (tabela.name, len(lote))
+        sql = self._sql_por_tamanho.get(chave)
+        if sql is None:
+            marcador = "?" if self.dialeto.paramstyle == "qmark" else "%s"
+            linha = "(" + ", ".join([marcador] * len(colunas)) + ")"
+            sql = self._sql_por_tamanho[chave] = (
+                f"INSERT INTO {tabela.name} ({', '.join(colunas)}) VALUES " + ", ".join([linha] * len(lote))
+            )
+        parametros = []
+        for valores in lote:
+            for processador, valor in zip(processadores, valores):
+                parametros.append(processador(valor) if processador is not None and valor is not None else valor)
+        self.conn.exec_driver_sql(sql, tuple(parametros))
+
+    def _copy(self, tabela: Table, colunas: List[str], processadores, lote: List[tuple]) -> None:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for valores in lote:
+            # Os processadores convertem tipos próprios (ex.: StatusPedido -> código SMALLINT) como no INSERT
+            escritor.writerow([
+                _valor_csv(processador(valor) if processador is not None and valor is not None else valor)
+                for processador, valor in zip(processadores, valores)
+            ])
+        buffer.seek(0)
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {tabela.name} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+    def ajustar_sequencias(self, tabelas: Iterable[Table]) -> None:
+        # No PostgreSQL os IDs explícitos não avançam as sequências: sem isto o próximo INSERT normal colidiria
+        if self.dialeto.name != "postgresql":
+            return
+        for tabela in tabelas:
+            self.conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{tabela.name}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {tabela.name}))"
+            ))
+        self.conn.commit()
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return None  # campo vazio sem aspas = NULL no COPY csv
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor)
+    return valor
+
+
+# --- Geradores de linhas ---
+def _proximo_id(conn, tabela: Table) -> int:
+    return (conn.execute(select(func.max(tabela.c.id))).scalar() or 0) + 1
+
+
+def _titulo(aleatorio: random.Random) -> str:
+    return " ".join(aleatorio.sample(PALAVRAS, aleatorio.randint(1, 3))).capitalize()
+
+
+def _momento(aleatorio: random.Random, base: datetime.datetime, dias_antes: int, dias_depois: int) -> datetime.datetime:
+    return base + datetime.timedelta(seconds=aleatorio.randint(-dias_antes * 86400, dias_depois * 86400))
+
+
+def semear(bind, config: ConfigSeed = ConfigSeed()) -> Dict[str, int]:
+    """Gera e grava os dados. Devolve quantas linhas foram inseridas por tabela."""
+    aleatorio = random.Random(config.semente)
+    hash_senha = obter_hash_da_senha(config.senha)
+    musicos_t, fas_t = models.Musico.__table__, models.UsuarioPublico.__table__
+    itens_t, shows_t, pedidos_t = models.ItemRepertorio.__table__, models.Show.__table__, models.PedidoMusica.__table__
+    locais_t = models.Local.__table__
+    resumo: Dict[str, int] = {}
+
+    with bind.connect() as conn:
+        carregador = _Carregador(conn, config.lote)
+        primeiro_musico, primeiro_fa = _proximo_id(conn, musicos_t), _proximo_id(conn, fas_t)
+        primeiro_item, primeiro_show, primeiro_pedido = _proximo_id(conn, itens_t), _proximo_id(conn, shows_t), _proximo_id(conn, pedidos_t)
+        primeiro_local = _proximo_id(conn, locais_t)
+        ids_musicos = range(primeiro_musico, primeiro_musico + config.musicos)
+        ids_fas = range(primeiro_fa, primeiro_fa + config.fas)
+
+        def gerar_musicos() -> Iterator[tuple]:
+            for musico_id in ids_musicos:
+                yield (
+                    musico_id, f"Artista {musico_id} {_titulo(aleatorio)}", f"musico{musico_id}@{DOMINIO_EMAIL}", hash_senha,
+                    ", ".join(aleatorio.sample(GENEROS, aleatorio.randint(1, 3))),
+                    f"Banda de {aleatorio.choice(GENEROS)} desde {aleatorio.randint(1980, 2024)}",
+                    f"https://gorjeta.example/{musico_id}" if aleatorio.random() < 0.3 else None,
+                    aleatorio.random() > 0.02,
+                )
+        resumo["musicos"] = carregador.carregar(musicos_t, [
+            "id", "nome_artistico", "email", "hashed_password", "generos_musicais", "descricao", "link_gorjeta", "is_active",
+        ], gerar_musicos())
+
+        def gerar_fas() -> Iterator[tuple]:
+            for fa_id in ids_fas:
+                yield (fa_id, f"Fã {fa_id}", f"fa{fa_id}@{DOMINIO_EMAIL}", hash_senha, True,
+                       _momento(aleatorio, config.data_base, 3 * 365, 0))
+        resumo["usuarios_publico"] = carregador.carregar(fas_t, [
+            "id", "nome_completo", "email", "hashed_password", "is_active", "data_cadastro",
+        ], gerar_fas())
+
+        # Repertório contíguo por músico: (primeiro id, quantidade), para os pedidos escolherem uma música do músico
+        faixas_repertorio: Dict[int, tuple] = {}
+
+        def gerar_itens() -> Iterator[tuple]:
+            item_id = primeiro_item
+            for musico_id in ids_musicos:
+                quantidade = aleatorio.randint(1, max(1, 2 * config.itens_por_musico - 1))
+                faixas_repertorio[musico_id] = (item_id, quantidade)
+                for _ in range(quantidade):
+                    yield (item_id, _titulo(aleatorio), f"Autor {aleatorio.randint(1, 5000)}", musico_id)
+                    item_id += 1
+        resumo["itens_repertorio"] = carregador.carregar(itens_t, ["id", "nome_musica", "artista_original", "musico_id"], gerar_itens())
+
+        popularidade = AmostradorZipf(ids_musicos, config.zipf, aleatorio)
+
+        # Locais já deduplicados (como app/locais.py gravaria): id, nome, endereço e coordenadas
+        locais_gerados = []
+
+        def gerar_locais() -> Iterator[tuple]:
+            local_id = primeiro_local
+            for cidade, centro_lat, centro_lon in CIDADES:
+                for nome in LOCAIS:
+                    endereco = f"Rua {local_id}, Centro, {cidade}"  # Único: rodar o seed de novo não colide com os locais já gravados
+                    latitude, longitude = round(centro_lat + aleatorio.uniform(-0.15, 0.15), 6), round(centro_lon + aleatorio.uniform(-0.15, 0.15), 6)
+                    locais_gerados.append((local_id, nome, endereco, latitude, longitude))
+                    yield (local_id, nome, endereco, chave_nome(nome), chave_nome(nome)[:4], normalizar(endereco), latitude, longitude)
+                    local_id += 1
+        resumo["locais"] = carregador.carregar(locais_t, [
+            "id", "nome", "endereco", "chave", "bloco", "endereco_normalizado", "latitude", "longitude",
+        ], gerar_locais() if config.shows else iter(()))
+
+        def gerar_shows() -> Iterator[tuple]:
+            for show_id in range(primeiro_show, primeiro_show + config.shows):
+                evento = _momento(aleatorio, config.data_base, 365, 365)
+                local_id, nome, endereco, latitude, longitude = aleatorio.choice(locais_gerados)
+                yield (show_id, evento, nome, endereco, None, None, latitude, longitude, geo.geocelula(latitude, longitude), local_id,
+                       evento - datetime.timedelta(days=aleatorio.randint(1, 90)), popularidade.sortear())
+        resumo["shows"] = carregador.carregar(shows_t, [
+            "id", "data_hora_evento", "local_nome", "local_endereco", "descricao_evento", "link_evento",
+            "latitude", "longitude", "geocelula", "local_id", "data_hora_cadastro", "musico_id",
+        ], gerar_shows() if config.musicos else iter(()))
+
+        estados, pesos = zip(*STATUS_PEDIDO)
+        pesos_acumulados = list(itertools.accumulate(pesos))
+
+        def gerar_pedidos() -> Iterator[tuple]:
+            for pedido_id in range(primeiro_pedido, primeiro_pedido + config.pedidos):
+                musico_id = popularidade.sortear()
+                inicio_itens, quantidade = faixas_repertorio[musico_id]
+                yield (
+                    pedido_id, primeiro_fa + aleatorio.randrange(config.fas), musico_id, inicio_itens + aleatorio.randrange(quantidade),
+                    "Toca essa, por favor!" if aleatorio.random() < 0.3 else None,
+                    _momento(aleatorio, config.data_base, 365, 0),
+                    estados[bisect.bisect_left(pesos_acumulados, aleatorio.random() * pesos_acumulados[-1])],
+                )
+        resumo["pedidos_musica"] = carregador.carregar(pedidos_t, [
+            "id", "solicitante_id", "musico_id", "item_repertorio_id", "mensagem_opcional", "data_hora_pedido", "status_pedido",
+        ], gerar_pedidos() if config.fas and config.musicos else iter(()))
+
+        def gerar_favoritos() -> Iterator[tuple]:
+            for fa_id in ids_fas:
+                quantidade = min(config.musicos, int(aleatorio.expovariate(1 / config.favoritos_por_fa))) if config.favoritos_por_fa else 0
+                escolhidos = set()
+                for _ in range(quantidade * 3):  # Zipf repete muito: limita as tentativas
+                    if len(escolhidos) >= quantidade:
+                        break
+                    escolhidos.add(popularidade.sortear())
+                for musico_id in sorted(escolhidos):
+                    yield (fa_id, musico_id)
+        resumo["usuario_musico_favoritos"] = carregador.carregar(
+            models.favoritos_table, ["usuario_publico_id", "musico_id"], gerar_favoritos() if config.musicos else iter(())
+        )
+
+        carregador.ajustar_sequencias([musicos_t, fas_t, itens_t, locais_t, shows_t, pedidos_t])
+    return resumo
+
+
+def main():
+    padrao = ConfigSeed()
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos em volume no DATABASE_URL")
+    parser.add_argument("--musicos", type=int, default=padrao.musicos)
+    parser.add_argument("--fas", type=int, default=padrao.fas)
+    parser.add_argument("--itens-por-musico", type=int, default=padrao.itens_por_musico, help="Média de músicas no repertório")
+    parser.add_argument("--shows", type=int, default=padrao.shows)
+    parser.add_argument("--pedidos", type=int, default=padrao.pedidos)
+    parser.add_argument("--favoritos-por-fa", type=int, default=padrao.favoritos_por_fa, help="Média de favoritos por fã")
+    parser.add_argument("--zipf", type=float, default=padrao.zipf, help="Viés de popularidade (0 = uniforme)")
+    parser.add_argument("--semente", type=int, default=padrao.semente)
+    parser.add_argument("--lote", type=int, default=padrao.lote, help="Linhas por INSERT/COPY")
+    parser.add_argument("--senha", default=padrao.senha, help="Senha de todas as contas geradas")
+    parser.add_argument("--data-base", type=datetime.datetime.fromisoformat, default=padrao.data_base, help="Datas são geradas em torno desta")
+    args = parser.parse_args()
+
+    from .database import engine
+    from .logs import configurar_logs
+    configurar_logs()
+    models.Base.metadata.create_all(bind=engine)
+    config = ConfigSeed(
+        musicos=args.musicos, fas=args.fas, itens_por_musico=args.itens_por_musico, shows=args.shows, pedidos=args.pedidos,
+        favoritos_por_fa=args.favoritos_por_fa, zipf=args.zipf, semente=args.semente, lote=args.lote, senha=args.senha,
+        data_base=args.data_base,
+    )
+    inicio = time.perf_counter()
+    resumo = semear(engine, config)
+    print(json.dumps({"linhas": resumo, "segundos": round(time.perf_counter() - inicio, 1)}))
+
+
+if __name__ == "__main__":
+    main()
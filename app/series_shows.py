@@ -0,0 +1,211 @@
+# app/series_shows.py
+# Shows recorrentes: uma SerieShow guarda a regra (semanal ou mensal, a cada N, com exceções, até uma data
+# ou um número de ocorrências) e é expandida em linhas de Show comuns, com um INSERT em lote por expansão.
+# Assim as listagens, o índice (musico_id, data_hora_evento) e o resto da API não precisam saber de séries.
+#
+# A expansão é preguiçosa: só a janela até agora + SERIES_SHOWS_HORIZONTE_DIAS existe em `shows`
+# (expandida_ate marca até onde). Só o job periódico e a criação da série gravam shows; uma consulta por
+# data além da janela (crud.obter_todos_os_shows) calcula as ocorrências daquele dia em memória, sem
+# gravar nada, até SERIES_SHOWS_HORIZONTE_MAXIMO_DIAS.
+#
+# Uso avulso: python -m app.series_shows [--dias N]
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+from typing import Iterator, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, or_, update
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import agenda_ics, geo, models
+from .jobs import enfileirar, tarefa
+
+logger = logging.getLogger(__name__)
+
+SERIES_SHOWS_HORIZONTE_DIAS = float(os.getenv("SERIES_SHOWS_HORIZONTE_DIAS", "90"))
+# Consultas por datas mais distantes que isto não calculam ocorrências (uma busca em 2099 não percorre décadas de agenda)
+SERIES_SHOWS_HORIZONTE_MAXIMO_DIAS = float(os.getenv("SERIES_SHOWS_HORIZONTE_MAXIMO_DIAS", "730"))
+SERIES_SHOWS_INTERVALO_SEGUNDOS = float(os.getenv("SERIES_SHOWS_INTERVALO_SEGUNDOS", "3600"))  # 0 desliga
+
+
+def utc_sem_fuso(data_hora: datetime.datetime) -> datetime.datetime:
+    """Como as demais colunas DateTime: UTC sem fuso. Datas sem fuso são consideradas já em UTC."""
+    if data_hora.tzinfo is None:
+        return data_hora
+    return data_hora.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _agora() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _datas_da_regra(serie: models.SerieShow) -> Iterator[datetime.datetime]:
+    inicio = serie.data_hora_inicio
+    passo = serie.intervalo or 1
+    if serie.frequencia == "semanal":
+        dias = sorted(set(serie.dias_semana or [inicio.weekday()]))
+        segunda = inicio - datetime.timedelta(days=inicio.weekday())
+        semana = 0
+        while True:
+            for dia in dias:
+                data_hora = segunda + datetime.timedelta(weeks=semana, days=dia)
+                if data_hora >= inicio:
+                    yield data_hora
+            semana += passo
+    else:
+        meses = 0
+        while True:
+            anos, mes = divmod(inicio.month - 1 + meses, 12)
+            try:
+                yield inicio.replace(year=inicio.year + anos, month=mes + 1)
+            except ValueError:
+                pass  # Mês sem esse dia (31 em abril, 29 de fevereiro): pula, como o RRULE do iCalendar
+            meses += passo
+
+
+def ocorrencias(serie: models.SerieShow) -> Iterator[datetime.datetime]:
+    """Todas as datas da série, em ordem. Pode ser infinita: quem consome para numa data."""
+    excecoes = set(serie.excecoes or ())
+    for numero, data_hora in enumerate(_datas_da_regra(serie)):
+        if serie.data_fim is not None and data_hora > serie.data_fim:
+            return
+        # Como no iCalendar, as exceções contam para max_ocorrencias (COUNT vale antes do EXDATE)
+        if serie.max_ocorrencias is not None and numero >= serie.max_ocorrencias:
+            return
+        if data_hora.date().isoformat() not in excecoes:
+            yield data_hora
+
+
+def expandir_serie(db: Session, serie: models.SerieShow, ate: datetime.datetime) -> int:
+    """
+    Grava (sem commit) os shows da série de expandida_ate até `ate`, num INSERT em lote, e avança a janela.
+    Devolve quantos shows criou. Se outra transação expandiu a série antes, não faz nada.
+    """
+    de = serie.expandida_ate
+    if serie.encerrada or ate <= de:
+        return 0
+    datas: List[datetime.datetime] = []
+    encerrada = True
+    for data_hora in ocorrencias(serie):
+        if data_hora >= ate:
+            encerrada = False
+            break
+        if data_hora >= de:
+            datas.append(data_hora)
+
+    # Reserva a janela com UPDATE condicional: duas expansões simultâneas da mesma série não geram o mesmo show
+    avancou = db.execute(
+        update(models.SerieShow)
+        .where(models.SerieShow.id == serie.id, models.SerieShow.expandida_ate == de)
+        .values(expandida_ate=ate, encerrada=encerrada)
+    ).rowcount
+    if avancou != 1:
+        return 0
+    if datas:
+        geocelula = geo.geocelula(serie.latitude, serie.longitude)
+        db.execute(insert(models.Show), [
+            {
+                "musico_id": serie.musico_id, "serie_id": serie.id, "data_hora_evento": data_hora,
+                "local_nome": serie.local_nome, "local_endereco": serie.local_endereco,
+                "descricao_evento": serie.descricao_evento, "link_evento": serie.link_evento,
+                "latitude": serie.latitude, "longitude": serie.longitude, "geocelula": geocelula,
+                "local_id": serie.local_id,
+            }
+            for data_hora in datas
+        ])
+    return len(datas)
+
+
+def ocorrencias_nao_geradas(db: Session, inicio: datetime.datetime, fim: datetime.datetime) -> List[models.Show]:
+    """
+    Shows das séries em [inicio, fim) que ainda não estão em `shows` (depois de expandida_ate), montados em
+    memória e nunca gravados: ficam com id None até o job chegar àquela data. Uma consulta.
+    """
+    series = db.query(models.SerieShow).options(joinedload(models.SerieShow.musico)).filter(
+        models.SerieShow.encerrada.is_(False),
+        models.SerieShow.expandida_ate < fim,
+        models.SerieShow.data_hora_inicio < fim,
+        or_(models.SerieShow.data_fim.is_(None), models.SerieShow.data_fim >= inicio),
+    ).all()
+    shows = []
+    for serie in series:
+        de = max(inicio, serie.expandida_ate)
+        for data_hora in ocorrencias(serie):
+            if data_hora >= fim:
+                break
+            if data_hora >= de:
+                show = models.Show(
+                    musico_id=serie.musico_id, serie_id=serie.id, data_hora_evento=data_hora,
+                    local_nome=serie.local_nome, local_endereco=serie.local_endereco,
+                    descricao_evento=serie.descricao_evento, link_evento=serie.link_evento,
+                    latitude=serie.latitude, longitude=serie.longitude, local_id=serie.local_id,
+                    data_hora_cadastro=serie.data_hora_cadastro,
+                )
+                # Sem o evento de relacionamento: o backref poria o show transiente na sessão (e no próximo flush)
+                set_committed_value(show, "musico", serie.musico)
+                shows.append(show)
+    return shows
+
+
+def expandir_series_ate(db: Session, ate: datetime.datetime, musico_id: Optional[int] = None) -> int:
+    """Expande até `ate` todas as séries (ou as de um músico) com a janela aquém disso, com commit por série."""
+    consulta = db.query(models.SerieShow).filter(models.SerieShow.encerrada.is_(False), models.SerieShow.expandida_ate < ate)
+    if musico_id is not None:
+        consulta = consulta.filter(models.SerieShow.musico_id == musico_id)
+    total = 0
+    for serie in consulta.order_by(models.SerieShow.id).all():
+        dono, criados = serie.musico_id, expandir_serie(db, serie, ate)
+        db.commit()
+        if criados:
+            agenda_ics.invalidar_agenda(dono)
+        total += criados
+    return total
+
+
+def expandir_series(bind, horizonte_dias: float = SERIES_SHOWS_HORIZONTE_DIAS) -> int:
+    """Leva todas as séries até agora + horizonte. Bloqueante: no servidor, chame via run_in_threadpool."""
+    ate = _agora() + datetime.timedelta(days=horizonte_dias)
+    with Session(bind=bind) as db:
+        criados = expandir_series_ate(db, ate)
+    logger.info("Expansão das séries de shows concluída", extra={"shows_criados": criados, "expandida_ate": ate.isoformat()})
+    return criados
+
+
+@tarefa("expansao_series_shows", concorrencia=1, max_tentativas=3)
+def _job_expansao_series_shows(bind) -> None:
+    expandir_series(bind)
+
+
+def _agendar_expansao(bind) -> None:
+    with Session(bind=bind) as db:
+        enfileirar(db, "expansao_series_shows", unico=True)
+
+
+async def executar_expansao_periodica(bind, intervalo_segundos: float = SERIES_SHOWS_INTERVALO_SEGUNDOS) -> None:
+    # Como o arquivamento de pedidos: o laço só enfileira o job; o worker de jobs executa
+    while True:
+        await asyncio.sleep(intervalo_segundos)
+        try:
+            await run_in_threadpool(_agendar_expansao, bind)
+        except Exception as e_expansao:
+            logger.exception("Erro ao agendar a expansão das séries de shows: %s", e_expansao)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera os shows das séries recorrentes até agora + N dias")
+    parser.add_argument("--dias", type=float, default=SERIES_SHOWS_HORIZONTE_DIAS)
+    args = parser.parse_args()
+
+    from .database import engine
+    from .logs import configurar_logs
+    configurar_logs()
+    print(json.dumps({"shows_criados": expandir_series(engine, horizonte_dias=args.dias)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_autenticacao.py
+# Microbenchmark do custo de autenticação por requisição (validação do JWT),
+# comparando o caminho sem cache (decode + HMAC + TokenData) com o cache de tokens verificados.
+#
+# Uso: python benchmarks/bench_autenticacao.py [--iteracoes 20000]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.security import criar_access_token, decodificar_validar_token_base, limpar_cache_tokens
+
+
+async def medir(token: str, iteracoes: int, com_cache: bool) -> float:
+    limpar_cache_tokens()
+    await decodificar_validar_token_base(token)  # aquece (e popula o cache)
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        if not com_cache:
+            limpar_cache_tokens()
+        await decodificar_validar_token_base(token)
+    return (time.perf_counter() - inicio) / iteracoes * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark da validação de JWT por requisição")
+    parser.add_argument("--iteracoes", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = criar_access_token(
+        data={"sub": "bench@example.com", "user_id": 1, "role": "musico"},
+        expires_delta=timedelta(minutes=30),
+    )
+    sem_cache = asyncio.run(medir(token, args.iteracoes, com_cache=False))
+    com_cache = asyncio.run(medir(token, args.iteracoes, com_cache=True))
+    print(json.dumps({
+        "iteracoes": args.iteracoes,
+        "us_por_requisicao_sem_cache": round(sem_cache, 2),
+        "us_por_requisicao_com_cache": round(com_cache, 2),
+        "aceleracao": round(sem_cache / com_cache, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# benchmarks/bench_cenarios.py
+# Teste de carga por cenário contra a app real e um banco semeado (SQLite em arquivo temporário,
+# ou o DATABASE_URL do ambiente). Dois modos:
+#   --modo processo  app ASGI chamada no mesmo processo (httpx.ASGITransport): mede a app sem rede
+#   --modo uvicorn   sobe um uvicorn num subprocesso e faz HTTP de verdade
+#
+# Cenários: navegar_musicos, abrir_perfil, fan_pede_musica, musico_consulta_fila, rajada_login.
+# Um cenário cujas rotas não existem na app é reportado como "indisponivel" em vez de falhar.
+#
+# Saída em JSON (req/s e p50/p95/p99 por cenário). Para comparar duas execuções:
+#   python benchmarks/bench_cenarios.py executar --saida base.json
+#   python benchmarks/bench_cenarios.py executar --saida novo.json
+#   python benchmarks/bench_cenarios.py comparar base.json novo.json [--tolerancia 10]
+# O comparar sai com código 1 se algum cenário piorou além da tolerância (em %).
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+_db_temporario = os.path.join(tempfile.mkdtemp(prefix="palco_bench_"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_temporario}")
+# Logs de acesso de cada requisição só atrapalhariam a medição
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app.seed import DOMINIO_EMAIL, GENEROS, SENHA_PADRAO
+
+
+def percentil(amostras: List[float], p: float) -> Optional[float]:
+    if not amostras:
+        return None
+    ordenadas = sorted(amostras)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return round(ordenadas[indice] * 1000, 2)
+
+
+# --- Banco semeado ---
+def semear(musicos: int, fas: int, semente: int = 42) -> dict:
+    """Semeia com app.seed (só na primeira execução sobre o banco) e devolve os IDs usados pelos cenários."""
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.seed import ConfigSeed, semear as semear_banco
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Musico).count() < musicos:
+            semear_banco(engine, ConfigSeed(
+                musicos=musicos, fas=fas, itens_por_musico=10, shows=musicos * 3, pedidos=musicos * 20, semente=semente,
+            ))
+        ids_musicos = [linha.id for linha in db.query(models.Musico.id).filter(models.Musico.is_active == True).order_by(models.Musico.id)]
+        return {
+            "musicos": ids_musicos,
+            "itens": {linha.musico_id: linha.id for linha in db.query(models.ItemRepertorio.musico_id, models.ItemRepertorio.id)},
+            "fas": [linha.id for linha in db.query(models.UsuarioPublico.id).order_by(models.UsuarioPublico.id)],
+        }
+    finally:
+        db.close()
+
+
+# --- Cenários ---
+class Contexto:
+    def __init__(self, client, dados: dict, aleatorio: random.Random):
+        self.client = client
+        self.dados = dados
+        self.aleatorio = aleatorio
+        self.tokens_musico: List[str] = []
+        self.tokens_fa: List[str] = []
+
+    def musico_qualquer(self) -> int:
+        # Alguns perfis são bem mais acessados que outros (cauda longa)
+        musicos = self.dados["musicos"]
+        return musicos[min(len(musicos) - 1, int(self.aleatorio.paretovariate(1.2)) - 1)]
+
+
+async def navegar_musicos(ctx: Contexto):
+    parametros = {"skip": ctx.aleatorio.choice([0, 0, 0, 20, 40]), "limit": 20}
+    sorteio = ctx.aleatorio.random()
+    if sorteio < 0.2:
+        parametros["genero"] = ctx.aleatorio.choice(GENEROS)
+    elif sorteio < 0.3:
+        parametros["search"] = "Bench 1"
+    return await ctx.client.get("/musicos/", params=parametros)
+
+
+async def abrir_perfil(ctx: Contexto):
+    return await ctx.client.get(f"/musicos/{ctx.musico_qualquer()}")
+
+
+async def fan_pede_musica(ctx: Contexto):
+    musico_id = ctx.musico_qualquer()
+    return await ctx.client.post(
+        "/pedidos/", headers={"Authorization": f"Bearer {ctx.aleatorio.choice(ctx.tokens_fa)}"},
+        json={"musico_id": musico_id, "item_repertorio_id": ctx.dados["itens"][musico_id], "mensagem_opcional": "Toca essa!"},
+    )
+
+
+async def musico_consulta_fila(ctx: Contexto):
+    return await ctx.client.get("/musicos/me/pedidos/", headers={"Authorization": f"Bearer {ctx.aleatorio.choice(ctx.tokens_musico)}"})
+
+
+async def rajada_login(ctx: Contexto):
+    musico_id = ctx.aleatorio.choice(ctx.dados["musicos"])
+    return await ctx.client.post("/token", data={"username": f"musico{musico_id}@{DOMINIO_EMAIL}", "password": SENHA_PADRAO})
+
+
+# nome -> (função, (método, rota) exigidos)
+CENARIOS: Dict[str, tuple] = {
+    "navegar_musicos": (navegar_musicos, ("GET", "/musicos/")),
+    "abrir_perfil": (abrir_perfil, ("GET", "/musicos/{musico_id}")),
+    "fan_pede_musica": (fan_pede_musica, ("POST", "/pedidos/")),
+    "musico_consulta_fila": (musico_consulta_fila, ("GET", "/musicos/me/pedidos/")),
+    "rajada_login": (rajada_login, ("POST", "/token")),
+}
+
+
+def rotas_da_app() -> set:
+    from fastapi.routing import APIRoute
+    from app.main import app
+    return {(metodo, rota.path) for rota in app.routes if isinstance(rota, APIRoute) for metodo in rota.methods}
+
+
+async def _obter_tokens(ctx: Contexto, quantidade: int = 5) -> None:
+    for musico_id in ctx.dados["musicos"][:quantidade]:
+        r = await ctx.client.post("/token", data={"username": f"musico{musico_id}@{DOMINIO_EMAIL}", "password": SENHA_PADRAO})
+        ctx.tokens_musico.append(r.json()["access_token"])
+    for fa_id in ctx.dados["fas"][:quantidade]:
+        r = await ctx.client.post("/usuarios/token", data={"username": f"fa{fa_id}@{DOMINIO_EMAIL}", "password": SENHA_PADRAO})
+        ctx.tokens_fa.append(r.json()["access_token"])
+
+
+async def medir_cenario(ctx: Contexto, funcao: Callable[[Contexto], Awaitable], duracao: float, concorrencia: int, aquecimento: float) -> dict:
+    latencias: List[float] = []
+    status: Dict[str, int] = {}
+    erros = 0
+
+    async def usuario(ate: float, registrar: bool):
+        nonlocal erros
+        while time.perf_counter() < ate:
+            inicio = time.perf_counter()
+            try:
+                resposta = await funcao(ctx)
+            except Exception:
+                erros += 1
+                continue
+            if registrar:
+                latencias.append(time.perf_counter() - inicio)
+                status[str(resposta.status_code)] = status.get(str(resposta.status_code), 0) + 1
+                if resposta.status_code >= 500:
+                    erros += 1
+
+    if aquecimento > 0:
+        ate = time.perf_counter() + aquecimento
+        await asyncio.gather(*(usuario(ate, False) for _ in range(concorrencia)))
+    inicio_total = time.perf_counter()
+    ate = inicio_total + duracao
+    await asyncio.gather(*(usuario(ate, True) for _ in range(concorrencia)))
+    decorrido = time.perf_counter() - inicio_total
+    return {
+        "requisicoes": len(latencias), "erros": erros, "status": status,
+        "rps": round(len(latencias) / decorrido, 1),
+        "p50_ms": percentil(latencias, 50), "p95_ms": percentil(latencias, 95), "p99_ms": percentil(latencias, 99),
+    }
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _subir_uvicorn(porta: int) -> subprocess.Popen:
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(porta), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=os.environ.copy(),
+    )
+    limite = time.time() + 30
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("uvicorn terminou antes de ficar pronto")
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=0.2):
+                return processo
+        except OSError:
+            time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError("uvicorn não ficou pronto em 30 s")
+
+
+async def executar(args) -> dict:
+    import httpx
+
+    dados = semear(args.musicos, args.fas)
+    disponiveis = rotas_da_app()
+    processo = None
+    if args.modo == "uvicorn":
+        porta = _porta_livre()
+        processo = _subir_uvicorn(porta)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{porta}", limits=httpx.Limits(max_connections=args.concorrencia))
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    resultados = {}
+    try:
+        async with client:
+            ctx = Contexto(client, dados, random.Random(args.semente))
+            await _obter_tokens(ctx)
+            for nome in args.cenarios:
+                funcao, rota_exigida = CENARIOS[nome]
+                if rota_exigida not in disponiveis:
+                    resultados[nome] = {"indisponivel": f"{rota_exigida[0]} {rota_exigida[1]} não existe na app"}
+                    continue
+                resultados[nome] = await medir_cenario(ctx, funcao, args.duracao, args.concorrencia, args.aquecimento)
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    return {
+        "meta": {
+            "modo": args.modo, "duracao_s": args.duracao, "concorrencia": args.concorrencia,
+            "musicos": args.musicos, "fas": args.fas, "semente": args.semente,
+            "banco": os.environ["DATABASE_URL"].split("://", 1)[0], "python": platform.python_version(),
+            "commit": _commit_atual(), "data": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        },
+        "cenarios": resultados,
+    }
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def comparar(base: dict, novo: dict, tolerancia: float) -> dict:
+    """Variação em % de req/s e p95 por cenário; piorou = req/s caiu ou p95 subiu mais que a tolerância."""
+    cenarios = {}
+    for nome, b in base["cenarios"].items():
+        n = novo["cenarios"].get(nome)
+        if n is None or "indisponivel" in b or "indisponivel" in n:
+            continue
+        variacao_rps = round((n["rps"] - b["rps"]) / b["rps"] * 100, 1) if b["rps"] else None
+        variacao_p95 = round((n["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100, 1) if b["p95_ms"] else None
+        piorou = (variacao_rps is not None and variacao_rps < -tolerancia) or (variacao_p95 is not None and variacao_p95 > tolerancia)
+        cenarios[nome] = {
+            "rps": [b["rps"], n["rps"]], "variacao_rps_pct": variacao_rps,
+            "p95_ms": [b["p95_ms"], n["p95_ms"]], "variacao_p95_pct": variacao_p95,
+            "piorou": piorou,
+        }
+    relatorio = {
+        "base": base["meta"].get("commit"), "novo": novo["meta"].get("commit"), "tolerancia_pct": tolerancia,
+        "cenarios": cenarios, "regressoes": sorted(nome for nome, c in cenarios.items() if c["piorou"]),
+    }
+    diferencas = [chave for chave in ("modo", "concorrencia", "musicos", "banco") if base["meta"].get(chave) != novo["meta"].get(chave)]
+    if diferencas:
+        relatorio["aviso"] = f"Execuções com configuração diferente ({', '.join(diferencas)}): a comparação pode não valer"
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por cenário contra um banco semeado")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_exec = sub.add_parser("executar", help="Roda os cenários e imprime/grava o resultado em JSON")
+    p_exec.add_argument("--modo", choices=["processo", "uvicorn"], default="processo")
+    p_exec.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    p_exec.add_argument("--duracao", type=float, default=10, help="Segundos medidos por cenário")
+    p_exec.add_argument("--aquecimento", type=float, default=2, help="Segundos descartados antes de medir")
+    p_exec.add_argument("--concorrencia", type=int, default=20)
+    p_exec.add_argument("--musicos", type=int, default=500)
+    p_exec.add_argument("--fas", type=int, default=200)
+    p_exec.add_argument("--semente", type=int, default=42)
+    p_exec.add_argument("--saida", help="Arquivo JSON para gravar o resultado")
+
+    p_comp = sub.add_parser("comparar", help="Compara duas execuções; código de saída 1 se houver regressão")
+    p_comp.add_argument("base")
+    p_comp.add_argument("novo")
+    p_comp.add_argument("--tolerancia", type=float, default=10, help="Piora máxima aceita, em %%")
+    args = parser.parse_args()
+
+    if args.comando == "comparar":
+        with open(args.base, encoding="utf-8") as arquivo_base, open(args.novo, encoding="utf-8") as arquivo_novo:
+            relatorio = comparar(json.load(arquivo_base), json.load(arquivo_novo), args.tolerancia)
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        sys.exit(1 if relatorio["regressoes"] else 0)
+
+    resultado = asyncio.run(executar(args))
+    saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(saida)
+    print(saida)
+
+
+if __name__ == "__main__":
+    main()
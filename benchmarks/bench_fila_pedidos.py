@@ -0,0 +1,136 @@
+# benchmarks/bench_fila_pedidos.py
+# Leitura da fila de pendentes do músico (crud.obter_pedidos_para_musico com StatusPedido.PENDENTE)
+# numa tabela em que quase tudo já foi tratado (--pendentes 0.01 = 99% atendidos/recusados).
+#
+# Mede a mesma consulta em três variantes de índice, removendo-os um a um:
+#   indice_parcial    ix_pedidos_musica_pendentes (musico_id, data_hora_pedido, id) WHERE status = pendente
+#   indice_composto   só o (musico_id, data_hora_pedido, id): percorre também os tratados do músico
+#   sem_indice        nenhum índice por músico (como antes dos índices compostos)
+# e reporta p50/p95 em ms e o plano do banco para cada uma.
+#
+# Banco: SQLite em arquivo temporário, ou o DATABASE_URL do ambiente com --recriar-banco (as tabelas são
+# apagadas e recriadas: nunca aponte para um banco com dados que importam).
+# Uso: python benchmarks/bench_fila_pedidos.py [--pedidos 200000] [--pendentes 0.01] [--repeticoes 500]
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+_db_temporario = os.path.join(tempfile.mkdtemp(prefix="palco_bench_"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_temporario}")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import event, func, select, text
+
+from app import crud, models
+from app.database import SessionLocal, engine
+from app.seed import ConfigSeed, semear
+
+VARIANTES = [
+    ("indice_parcial", None),
+    ("indice_composto", "ix_pedidos_musica_pendentes"),
+    ("sem_indice", "ix_pedidos_musica_musico_id_data_hora_pedido"),
+]
+
+
+def percentil(amostras: List[float], p: float) -> float:
+    ordenadas = sorted(amostras)
+    return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))] * 1000, 3)
+
+
+def preparar(pedidos: int, musicos: int, fas: int, fracao_pendentes: float, semente: int) -> None:
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    semear(engine, ConfigSeed(musicos=musicos, fas=fas, itens_por_musico=10, shows=0, pedidos=pedidos, favoritos_por_fa=0, semente=semente))
+    # Sobrescreve a distribuição do seed: só `fracao_pendentes` continua pendente
+    a_cada = max(1, round(1 / fracao_pendentes)) if fracao_pendentes > 0 else 0
+    tabela = models.PedidoMusica.__table__
+    with engine.begin() as conexao:
+        condicao = (tabela.c.id % a_cada == 0) if a_cada else text("1 = 0")
+        conexao.execute(tabela.update().values(status_pedido=models.StatusPedido.ATENDIDO))
+        conexao.execute(tabela.update().where(tabela.c.id % 5 == 0).values(status_pedido=models.StatusPedido.RECUSADO))
+        conexao.execute(tabela.update().where(condicao).values(status_pedido=models.StatusPedido.PENDENTE))
+        conexao.exec_driver_sql("ANALYZE")
+
+
+def plano(musico_id: int) -> str:
+    capturado = {}
+
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        capturado.setdefault("sql", (statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", antes)
+    try:
+        with SessionLocal() as db:
+            crud.obter_pedidos_para_musico(db, musico_id=musico_id, status_pedido=models.StatusPedido.PENDENTE, limit=50)
+    finally:
+        event.remove(engine, "before_cursor_execute", antes)
+    statement, parameters = capturado["sql"]
+    prefixo = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conexao:
+        return " | ".join(str(linha[-1]) for linha in conexao.exec_driver_sql(prefixo + statement, parameters))
+
+
+def medir(ids_musicos: List[int], repeticoes: int, aleatorio: random.Random) -> dict:
+    amostras = []
+    linhas = 0
+    with SessionLocal() as db:
+        for _ in range(repeticoes):
+            musico_id = aleatorio.choice(ids_musicos)
+            inicio = time.perf_counter()
+            fila = crud.obter_pedidos_para_musico(db, musico_id=musico_id, status_pedido=models.StatusPedido.PENDENTE, limit=50)
+            amostras.append(time.perf_counter() - inicio)
+            linhas += len(fila)
+            db.expunge_all()
+    return {"p50_ms": percentil(amostras, 50), "p95_ms": percentil(amostras, 95), "linhas_por_leitura": round(linhas / repeticoes, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fila de pendentes do músico com quase todos os pedidos já tratados")
+    parser.add_argument("--pedidos", type=int, default=200000)
+    parser.add_argument("--musicos", type=int, default=200)
+    parser.add_argument("--fas", type=int, default=2000)
+    parser.add_argument("--pendentes", type=float, default=0.01, help="Fração dos pedidos ainda pendente")
+    parser.add_argument("--repeticoes", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--recriar-banco", action="store_true", help="Confirma o uso do DATABASE_URL do ambiente (apaga as tabelas)")
+    args = parser.parse_args()
+    if os.environ["DATABASE_URL"] != f"sqlite:///{_db_temporario}" and not args.recriar_banco:
+        parser.error("DATABASE_URL definido: este benchmark apaga e recria as tabelas; confirme com --recriar-banco")
+
+    preparar(args.pedidos, args.musicos, args.fas, args.pendentes, args.semente)
+    pedidos = models.PedidoMusica.__table__
+    with engine.connect() as conexao:
+        # Os músicos com mais pedidos (Zipf): é neles que percorrer os tratados custa caro
+        ids_musicos = conexao.execute(
+            select(pedidos.c.musico_id).group_by(pedidos.c.musico_id).order_by(func.count().desc()).limit(20)
+        ).scalars().all()
+
+    resultado = {"banco": engine.dialect.name, "pedidos": args.pedidos, "fracao_pendentes": args.pendentes, "variantes": {}}
+    removidos = []
+    try:
+        for nome, indice_a_remover in VARIANTES:
+            if indice_a_remover:
+                indice = next(i for i in pedidos.indexes if i.name == indice_a_remover)
+                indice.drop(bind=engine)
+                removidos.append(indice)
+                with engine.begin() as conexao:
+                    conexao.exec_driver_sql("ANALYZE")
+            medir(ids_musicos, 20, random.Random(args.semente))  # aquece o cache do banco
+            resultado["variantes"][nome] = {**medir(ids_musicos, args.repeticoes, random.Random(args.semente)), "plano": plano(ids_musicos[0])}
+    finally:
+        for indice in removidos:
+            indice.create(bind=engine)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_imagens.py
+# Vazão do pipeline de miniaturas (app/imagens.py) com 1..N processos.
+# Gera fotos sintéticas no tamanho de câmera de celular (12 MP, JPEG com ruído) e
+# mede quantas fotos por segundo o pool de processos consegue transformar em variantes.
+#
+# Uso: python benchmarks/bench_imagens.py [--fotos 24] [--workers 1,2,4,8]
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from PIL import Image
+
+from app.imagens import gerar_variantes
+
+
+def foto_sintetica(largura: int = 4032, altura: int = 3024, semente: int = 0) -> bytes:
+    ruido = Image.effect_noise((largura, altura), 40 + semente % 20).convert("RGB")
+    gradiente = Image.linear_gradient("L").resize((largura, altura)).convert("RGB")
+    saida = io.BytesIO()
+    Image.blend(ruido, gradiente, 0.5).save(saida, format="JPEG", quality=90)
+    return saida.getvalue()
+
+
+def medir(fotos, workers: int) -> dict:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(gerar_variantes, fotos[:workers]))  # aquece os processos
+        inicio = time.perf_counter()
+        list(pool.map(gerar_variantes, fotos))
+        duracao = time.perf_counter() - inicio
+    return {"workers": workers, "fotos": len(fotos), "segundos": round(duracao, 3),
+            "fotos_por_segundo": round(len(fotos) / duracao, 2), "ms_por_foto": round(duracao / len(fotos) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão do pipeline de miniaturas")
+    parser.add_argument("--fotos", type=int, default=24)
+    parser.add_argument("--workers", default=",".join(str(w) for w in sorted({1, 2, 4, os.cpu_count() or 1})))
+    args = parser.parse_args()
+
+    fotos = [foto_sintetica(semente=i) for i in range(args.fotos)]
+    resultados = [medir(fotos, int(w)) for w in args.workers.split(",")]
+    print(json.dumps({"cpus": os.cpu_count(), "tamanho_medio_kb": sum(map(len, fotos)) // len(fotos) // 1024,
+                      "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_login_concorrente.py
+# Teste de carga: logins simultâneos (bcrypt) misturados com leituras públicas,
+# rodando a app ASGI real num único event loop, como um worker do uvicorn.
+# Mede a latência das leituras públicas enquanto os logins acontecem: com o bcrypt
+# no pool de hashing, as leituras não devem ficar esperando pelos logins.
+#
+# Uso: python benchmarks/bench_login_concorrente.py [--logins 40] [--leituras 400] [--concorrencia 20]
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+_db_temporario = os.path.join(tempfile.mkdtemp(prefix="palco_bench_"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_temporario}")
+
+import httpx
+
+from app.database import SessionLocal
+from app.main import app
+from app import crud, schemas
+from app.security import BCRYPT_ROUNDS, HASH_POOL_THREADS, HASH_POOL_MAX_FILA
+
+
+def percentil(amostras, p):
+    if not amostras:
+        return None
+    ordenadas = sorted(amostras)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return round(ordenadas[indice] * 1000, 2)
+
+
+def preparar_dados():
+    db = SessionLocal()
+    try:
+        if crud.obter_musico_por_email(db, email="bench_login@example.com") is None:
+            crud.criar_musico(db=db, musico=schemas.MusicoCreate(
+                email="bench_login@example.com", password="senhabench123", nome_artistico="Bench Login"
+            ))
+    finally:
+        db.close()
+
+
+async def executar(logins: int, leituras: int, concorrencia: int) -> dict:
+    transporte = httpx.ASGITransport(app=app)
+    latencias_login, latencias_leitura, recusados = [], [], 0
+    limite = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as client:
+        async def login():
+            nonlocal recusados
+            async with limite:
+                inicio = time.perf_counter()
+                r = await client.post("/token", data={"username": "bench_login@example.com", "password": "senhabench123"})
+                if r.status_code == 503:
+                    recusados += 1
+                else:
+                    latencias_login.append(time.perf_counter() - inicio)
+
+        async def leitura():
+            async with limite:
+                inicio = time.perf_counter()
+                await client.get("/")
+                latencias_leitura.append(time.perf_counter() - inicio)
+
+        # Intercala logins e leituras para simular tráfego misto
+        tarefas = []
+        for i in range(max(logins, leituras)):
+            if i < logins:
+                tarefas.append(login())
+            if i < leituras:
+                tarefas.append(leitura())
+        inicio_total = time.perf_counter()
+        await asyncio.gather(*tarefas)
+        duracao = time.perf_counter() - inicio_total
+
+    return {
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "hash_pool_threads": HASH_POOL_THREADS,
+        "hash_pool_max_fila": HASH_POOL_MAX_FILA,
+        "duracao_s": round(duracao, 3),
+        "logins": {"ok": len(latencias_login), "recusados_503": recusados,
+                   "p50_ms": percentil(latencias_login, 50), "p95_ms": percentil(latencias_login, 95)},
+        "leituras_publicas": {"total": len(latencias_leitura),
+                              "p50_ms": percentil(latencias_leitura, 50), "p95_ms": percentil(latencias_leitura, 95),
+                              "p99_ms": percentil(latencias_leitura, 99),
+                              "media_ms": round(statistics.mean(latencias_leitura) * 1000, 2) if latencias_leitura else None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logins simultâneos misturados com leituras públicas")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--leituras", type=int, default=400)
+    parser.add_argument("--concorrencia", type=int, default=20)
+    args = parser.parse_args()
+
+    preparar_dados()
+    resultado = asyncio.run(executar(args.logins, args.leituras, args.concorrencia))
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_metricas.py
+# Microbenchmark do custo por requisição do MetricasMiddleware: chama uma app ASGI mínima
+# com e sem o middleware e reporta a diferença em microssegundos.
+#
+# Uso: python benchmarks/bench_metricas.py [--iteracoes 50000]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.metricas import MetricasMiddleware
+
+
+class _Rota:
+    path = "/musicos/{musico_id}"
+
+
+async def app_minima(scope, receive, send):
+    scope["route"] = _Rota
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(mensagem):
+    pass
+
+
+async def medir(app, iteracoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        await app({"type": "http", "method": "GET", "path": "/musicos/1", "headers": []}, _receive, _send)
+    return (time.perf_counter() - inicio) / iteracoes * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por requisição da coleta de métricas")
+    parser.add_argument("--iteracoes", type=int, default=50000)
+    args = parser.parse_args()
+
+    async def executar():
+        com_metricas = MetricasMiddleware(app_minima)
+        await medir(com_metricas, 1000)  # aquece (cria as séries)
+        sem = await medir(app_minima, args.iteracoes)
+        com = await medir(com_metricas, args.iteracoes)
+        return sem, com
+
+    sem, com = asyncio.run(executar())
+    print(json.dumps({
+        "iteracoes": args.iteracoes,
+        "sem_middleware_us": round(sem, 2),
+        "com_middleware_us": round(com, 2),
+        "custo_por_requisicao_us": round(com - sem, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
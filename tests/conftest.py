@@ -12,7 +12,21 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# Custo baixo de bcrypt nos testes (o padrão de produção é 12)
+os.environ.setdefault("BCRYPT_ROUNDS", "5")
+# Fotos vão para o disco, num diretório temporário, em vez do GCS
+import tempfile
+os.environ.setdefault("ARMAZENAMENTO_BACKEND", "local")
+os.environ.setdefault("ARMAZENAMENTO_LOCAL_DIR", tempfile.mkdtemp(prefix="palcoapp_testes_"))
+# Rota que passar do orçamento de consultas (@orcamento_consultas) falha o teste em vez de só logar
+os.environ.setdefault("ORCAMENTO_CONSULTAS_MODO", "erro")
+# Middleware de perfil instalado (só perfila com gatilho), gravando num diretório temporário
+os.environ.setdefault("PERFILAMENTO_ATIVO", "true")
+os.environ.setdefault("PERFILAMENTO_DIR", tempfile.mkdtemp(prefix="palcoapp_perfis_"))
+
 from app.main import app
+from app import agenda_ics, crud
+from app.metricas import instrumentar_engine, observar_requisicoes
 from app.database import Base, get_db
 # Importe todos os modelos que serão criados/usados
 from app.models import Musico, UsuarioPublico # Adicionado UsuarioPublico
@@ -26,6 +40,7 @@ engine_test = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+instrumentar_engine(engine_test)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
 
 @pytest.fixture(scope="function")
@@ -52,12 +67,41 @@ def test_app_client(setup_database):
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db_test
+    crud.limpar_cache_principais() # O banco é recriado a cada teste, então IDs se repetem entre testes
+    agenda_ics.limpar_cache()
     
     with TestClient(app) as client:
         yield client
     
     app.dependency_overrides.clear()
 
+class ConsultasSQL:
+    """Consultas SQL de cada requisição feita pelo test_app_client, na ordem em que terminaram."""
+
+    def __init__(self):
+        self.requisicoes = []  # (metodo, rota, status, consultas)
+
+    def registrar(self, metodo, rota, status_code, consultas):
+        self.requisicoes.append((metodo, rota, status_code, consultas))
+
+    def ultima(self) -> int:
+        assert self.requisicoes, "Nenhuma requisição foi feita"
+        return self.requisicoes[-1][3]
+
+    def assert_maximo(self, maximo: int) -> None:
+        metodo, rota, _, consultas = self.requisicoes[-1]
+        assert consultas <= maximo, f"{metodo} {rota} fez {consultas} consultas SQL (esperado no máximo {maximo})"
+
+    def limpar(self):
+        self.requisicoes.clear()
+
+@pytest.fixture(scope="function")
+def consultas_sql():
+    # Uso: faça a requisição e depois consultas_sql.assert_maximo(n)
+    registro = ConsultasSQL()
+    with observar_requisicoes(registro.registrar):
+        yield registro
+
 # --- Fixtures de Dados de Teste ---
 @pytest.fixture(scope="function")
 def test_musician(db_session: SQLAlchemySession):
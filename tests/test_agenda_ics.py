@@ -0,0 +1,77 @@
+# tests/test_agenda_ics.py
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import agenda_ics, crud, models, schemas
+
+# As fixtures test_app_client, db_session, test_musician e consultas_sql virão de conftest.py
+
+
+def _show(nome, dias=7, **extras):
+    data = datetime.datetime(2030, 5, 10, 21, 30) + datetime.timedelta(days=dias)
+    return schemas.ShowCreate(data_hora_evento=data, local_nome=nome, **extras)
+
+
+def _eventos(corpo: bytes) -> list:
+    # Desfaz a dobra das linhas (CRLF + espaço) antes de procurar as propriedades
+    texto = corpo.decode("utf-8").replace("\r\n ", "")
+    return [bloco.split("END:VEVENT")[0] for bloco in texto.split("BEGIN:VEVENT")[1:]]
+
+
+def test_renderiza_escapa_e_dobra_linhas(db_session: Session, test_musician: dict):
+    """Testa o texto do feed: CRLF, escape de vírgula/ponto e vírgula/quebra de linha e linhas de até 75 octetos."""
+    musico_id = test_musician["obj_id"]
+    descricao = "Repertório: samba, choro; e MPB\nIngressos na porta. " + "Participação especial de convidados. " * 3
+    show = crud.criar_show_para_musico(db_session, _show("Bar do Zé", local_endereco="Rua Augusta, 1500", descricao_evento=descricao, latitude=-23.556, longitude=-46.662), musico_id)
+
+    corpo = agenda_ics.obter_agenda(db_session, musico_id).conteudo
+    assert corpo.startswith(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n") and corpo.endswith(b"END:VCALENDAR\r\n")
+    assert all(len(linha) <= 75 for linha in corpo.split(b"\r\n"))
+    assert b"\n" not in corpo.replace(b"\r\n", b"")
+
+    evento = _eventos(corpo)[0]
+    assert f"UID:show-{show.id}@palcoapp" in evento
+    assert "DTSTART:20300517T213000Z" in evento and "DTEND:20300517T233000Z" in evento
+    assert "LOCATION:Bar do Zé\\, Rua Augusta\\, 1500" in evento
+    assert "DESCRIPTION:Repertório: samba\\, choro\\; e MPB\\nIngressos na porta." in evento
+    assert "GEO:-23.556000;-46.662000" in evento
+
+
+def test_feed_do_musico_com_etag_e_304(test_app_client: TestClient, db_session: Session, test_musician: dict, consultas_sql):
+    """Testa o /musicos/{id}/shows.ics: shows em ordem, 304 sem consultas com If-None-Match e feed refeito após uma escrita."""
+    musico_id = test_musician["obj_id"]
+    crud.criar_shows_em_lote(db_session, [_show("Teatro Municipal", dias=20), _show("Casa Nova", dias=5)], musico_id)
+    url = f"/musicos/{musico_id}/shows.ics"
+
+    response = test_app_client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/calendar; charset=utf-8"
+    assert [evento.split("SUMMARY:")[1].split("\r\n")[0] for evento in _eventos(response.content)] == [
+        f"{test_musician['data_create'].nome_artistico} - Casa Nova", f"{test_musician['data_create'].nome_artistico} - Teatro Municipal",
+    ]
+    consultas_sql.assert_maximo(2)
+    etag = response.headers["etag"]
+
+    # Do cache: o mesmo corpo e nenhuma consulta; com o ETag, nem o corpo
+    assert test_app_client.get(url).content == response.content
+    consultas_sql.assert_maximo(0)
+    nao_modificado = test_app_client.get(url, headers={"If-None-Match": etag})
+    assert (nao_modificado.status_code, nao_modificado.content, nao_modificado.headers["etag"]) == (304, b"", etag)
+    consultas_sql.assert_maximo(0)
+
+    # Escrita no crud invalida: novo ETag, com o show novo
+    show = crud.criar_show_para_musico(db_session, _show("Bar do Zé", dias=1), musico_id)
+    atualizado = test_app_client.get(url, headers={"If-None-Match": etag})
+    assert atualizado.status_code == 200 and atualizado.headers["etag"] != etag
+    assert f"UID:show-{show.id}@palcoapp" in atualizado.text
+
+    crud.deletar_show_do_musico(db_session, show.id, musico_id)
+    assert f"UID:show-{show.id}@palcoapp" not in test_app_client.get(url).text
+
+    assert test_app_client.get("/musicos/999999/shows.ics").status_code == 404
+    db_session.get(models.Musico, musico_id).is_active = False
+    db_session.commit()
+    agenda_ics.invalidar_agenda(musico_id)
+    assert test_app_client.get(url).status_code == 404
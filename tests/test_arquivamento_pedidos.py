@@ -0,0 +1,71 @@
+# tests/test_arquivamento_pedidos.py
+import datetime
+
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.arquivamento_pedidos import arquivar_pedidos
+from tests.conftest import engine_test
+
+# As fixtures db_session, test_musician e test_fan virão de conftest.py
+
+
+def _criar_pedidos(db_session: Session, musico_id: int, fan_id: int) -> dict:
+    item = crud.criar_item_repertorio_para_musico(db_session, schemas.ItemRepertorioCreate(nome_musica="Asa Branca"), musico_id)
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    pedidos = {}
+    for nome, dias_atras, status_pedido in [
+        ("atendido_antigo", 90, "atendido"),
+        ("recusado_antigo", 60, "recusado"),
+        ("atendido_antigo_2", 45, "atendido"),
+        ("pendente_antigo", 80, "pendente"),
+        ("atendido_recente", 2, "atendido"),
+    ]:
+        pedido = models.PedidoMusica(
+            solicitante_id=fan_id, musico_id=musico_id, item_repertorio_id=item.id,
+            data_hora_pedido=agora - datetime.timedelta(days=dias_atras), status_pedido=status_pedido,
+        )
+        db_session.add(pedido)
+        db_session.flush()
+        pedidos[nome] = pedido.id
+    db_session.commit()
+    return pedidos
+
+
+def test_arquiva_em_lotes_so_os_tratados_e_antigos(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa que só os pedidos atendidos/recusados mais velhos que o limite saem da tabela quente, lote a lote."""
+    pedidos = _criar_pedidos(db_session, test_musician["obj_id"], test_fan["id"])
+
+    assert arquivar_pedidos(engine_test, dias=30, tamanho_lote=2, simular=True) == {"arquivados": 3, "lotes": 0}
+    resumo = arquivar_pedidos(engine_test, dias=30, tamanho_lote=2, pausa_segundos=0)
+
+    assert resumo == {"arquivados": 3, "lotes": 2}
+    quentes = {pedido.id for pedido in db_session.query(models.PedidoMusica)}
+    arquivados = {pedido.id: pedido for pedido in db_session.query(models.PedidoMusicaArquivado)}
+    assert quentes == {pedidos["pendente_antigo"], pedidos["atendido_recente"]}
+    assert set(arquivados) == {pedidos["atendido_antigo"], pedidos["recusado_antigo"], pedidos["atendido_antigo_2"]}
+    assert arquivados[pedidos["recusado_antigo"]].status_pedido == "recusado"
+    assert arquivados[pedidos["recusado_antigo"]].arquivado_em is not None
+
+    # Nada mais elegível: a segunda passada não move nada
+    assert arquivar_pedidos(engine_test, dias=30, tamanho_lote=2, pausa_segundos=0) == {"arquivados": 0, "lotes": 0}
+
+
+def test_leitura_so_consulta_o_arquivo_quando_pedido(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa que as listagens ignoram o arquivo por padrão e, com incluir_arquivados, intercalam as duas tabelas em ordem."""
+    pedidos = _criar_pedidos(db_session, test_musician["obj_id"], test_fan["id"])
+    arquivar_pedidos(engine_test, dias=30, pausa_segundos=0)
+    mais_novo_primeiro = [
+        pedidos["atendido_recente"], pedidos["atendido_antigo_2"], pedidos["recusado_antigo"],
+        pedidos["pendente_antigo"], pedidos["atendido_antigo"],
+    ]
+
+    fila = crud.obter_pedidos_para_musico(db_session, musico_id=test_musician["obj_id"])
+    assert [pedido.id for pedido in fila] == [pedidos["atendido_recente"], pedidos["pendente_antigo"]]
+
+    completo = crud.obter_pedidos_para_musico(db_session, musico_id=test_musician["obj_id"], incluir_arquivados=True)
+    assert [pedido.id for pedido in completo] == mais_novo_primeiro
+    pagina = crud.obter_pedidos_feitos_por_fan(db_session, solicitante_id=test_fan["id"], skip=1, limit=3, incluir_arquivados=True)
+    assert [pedido.id for pedido in pagina] == mais_novo_primeiro[1:4]
+    # Os arquivados serializam com o mesmo schema dos pedidos da tabela quente
+    assert schemas.PedidoMusica.model_validate(pagina[0]).item_repertorio_pedido.nome_musica == "Asa Branca"
@@ -0,0 +1,68 @@
+# tests/test_compressao.py
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+
+from app.compressao import CompressaoMiddleware, escolher_codificacao
+
+# As fixtures test_app_client e db_session virão de conftest.py
+
+
+def test_escolher_codificacao_respeita_accept_encoding():
+    """Testa a negociação de codificação, incluindo q=0 e o curinga '*'."""
+    assert escolher_codificacao("gzip") == "gzip"
+    assert escolher_codificacao("gzip, br") in ("br", "gzip")
+    assert escolher_codificacao("br;q=0, gzip;q=0.5") == "gzip"
+    assert escolher_codificacao("identity") is None
+    assert escolher_codificacao("gzip;q=0") is None
+
+
+def test_resposta_grande_sai_comprimida(test_app_client: TestClient, db_session: Session):
+    """Testa que um JSON acima do tamanho mínimo é comprimido e contabilizado nas métricas."""
+    crud.criar_musico(db=db_session, musico=schemas.MusicoCreate(
+        email="compressao@example.com", password="senha123", nome_artistico="Banda Comprimida",
+        descricao="Rock, samba e forró todas as sextas. " * 100
+    ))
+
+    response = test_app_client.get("/musicos/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()[0]["nome_artistico"] == "Banda Comprimida"  # httpx descomprime automaticamente
+
+    rotulos = {"rota": "/musicos/", "codificacao": "gzip"}
+    originais = REGISTRY.get_sample_value("palcoapp_compressao_bytes_originais_total", rotulos)
+    assert originais > REGISTRY.get_sample_value("palcoapp_compressao_bytes_comprimidos_total", rotulos)
+    # Expostas só pelo /metrics (não há mais um endpoint JSON aberto)
+    assert 'palcoapp_compressao_respostas_total{codificacao="gzip",rota="/musicos/"}' in test_app_client.get("/metrics").text
+    assert test_app_client.get("/metricas/compressao").status_code == 404
+
+
+def test_resposta_pequena_nao_e_comprimida(test_app_client: TestClient):
+    """Testa que respostas abaixo do tamanho mínimo passam sem compressão."""
+    response = test_app_client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def test_resposta_em_streaming_e_comprimida_por_pedacos():
+    """Testa a compressão de respostas geradas por um gerador (StreamingResponse)."""
+    app_streaming = FastAPI()
+    app_streaming.add_middleware(CompressaoMiddleware, tamanho_minimo=10)
+
+    @app_streaming.get("/stream")
+    def stream():
+        def gerar():
+            for i in range(50):
+                yield f'{{"linha": {i}, "texto": "palco palco palco"}}\n'
+        return StreamingResponse(gerar(), media_type="application/json")
+
+    with TestClient(app_streaming) as client:
+        response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("\n") == 50
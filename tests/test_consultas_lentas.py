@@ -0,0 +1,89 @@
+# tests/test_consultas_lentas.py
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, security
+from app.consultas_lentas import (
+    RegistroConsultas, impressao_digital, instrumentar_consultas_lentas, desinstrumentar_consultas_lentas, registro_consultas,
+)
+from tests.conftest import engine_test
+
+# As fixtures test_app_client, db_session e test_musician virão de conftest.py
+
+
+@pytest.fixture
+def registro_ligado():
+    registro_consultas.zerar()
+    instrumentar_consultas_lentas(engine_test)
+    yield registro_consultas
+    desinstrumentar_consultas_lentas(engine_test)
+    registro_consultas.zerar()
+
+
+def test_impressao_digital_troca_literais_e_listas():
+    """Testa que execuções da mesma consulta com valores diferentes caem no mesmo grupo."""
+    a = impressao_digital("SELECT * FROM musicos WHERE id IN (1, 2, 3) AND nome = 'Ana'  LIMIT 10")
+    b = impressao_digital("SELECT * FROM musicos\n WHERE id IN (7, 8) AND nome = 'O''Brien' LIMIT 50")
+    assert a == b == "SELECT * FROM musicos WHERE id IN (?+) AND nome = ? LIMIT ?"
+    # Parâmetros de cada driver e identificadores com dígitos
+    assert impressao_digital("SELECT anon_1.id FROM t WHERE x = %(x_1)s AND y = $2 AND z = :z") == "SELECT anon_1.id FROM t WHERE x = ? AND y = ? AND z = ?"
+    # INSERT em lote: um grupo só, qualquer que seja o número de linhas
+    uma_linha = impressao_digital("INSERT INTO shows (a, b) VALUES (?, ?)")
+    assert uma_linha == impressao_digital("INSERT INTO shows (a, b) VALUES (?, ?), (?, ?),\n (?, ?)") == "INSERT INTO shows (a, b) VALUES (?+)"
+    assert impressao_digital("INSERT INTO t (a) VALUES (1), (2) RETURNING id") == "INSERT INTO t (a) VALUES (?+) RETURNING id"
+
+
+def test_relatorio_ordena_e_limita_os_grupos():
+    """Testa o top-N por total e por p95 e o descarte do grupo de menor total com a tabela cheia."""
+    registro = RegistroConsultas(max_grupos=2, limiar_ms=10_000)
+    for _ in range(10):
+        registro.registrar("SELECT 1 FROM a", 0.001, "app.crud.rapida_e_frequente")
+    registro.registrar("SELECT 1 FROM b", 0.005, "app.crud.lenta_e_rara")
+    registro.registrar("SELECT 1 FROM c", 0.0001, "app.crud.irrelevante")
+
+    assert [linha["funcao"] for linha in registro.relatorio("total")] == ["app.crud.rapida_e_frequente", "app.crud.irrelevante"]
+    assert registro.descartados == 1
+    assert registro.relatorio("p95", 1)[0]["p95_ms"] == 1.0
+
+
+def test_grupo_novo_herda_o_total_do_descartado():
+    """Testa o space-saving: com a tabela cheia, um grupo novo não é o próximo a sair e pode chegar ao top-N."""
+    registro = RegistroConsultas(max_grupos=3, limiar_ms=10_000)
+    for tabela, duracao in (("a", 0.010), ("b", 0.005), ("c", 0.002)):
+        registro.registrar(f"SELECT 1 FROM {tabela}", duracao, "app.crud.antiga")
+    # A nova descarta a de menor peso (c) e herda os 2 ms dela: com 4 ms próprios, passa a pesar mais que b.
+    # Sem a herança, seria ela (4 ms < 5 ms) a sair quando chegasse a próxima
+    registro.registrar("SELECT 1 FROM nova_1", 0.004, "app.crud.nova")
+    registro.registrar("SELECT 1 FROM nova_2", 0.001, "app.crud.nova")
+    assert {linha["sql"] for linha in registro.relatorio("total")} == {"SELECT ? FROM a", "SELECT ? FROM nova_1", "SELECT ? FROM nova_2"}
+
+    # A que fica lenta depois sobe ao topo
+    for _ in range(5):
+        registro.registrar("SELECT 1 FROM nova_1", 0.004, "app.crud.nova")
+    topo = registro.relatorio("total", 1)[0]
+    assert (topo["sql"], topo["herdado_ms"]) == ("SELECT ? FROM nova_1", 2.0)
+    assert registro.descartados == 2
+
+
+def test_registra_a_funcao_do_crud_que_fez_a_consulta(registro_ligado, db_session, test_musician: dict):
+    """Testa que cada grupo traz a função do crud responsável."""
+    crud.obter_musico_por_email(db_session, email=test_musician["email"])
+    crud.obter_musico_por_email(db_session, email="outro@example.com")
+
+    grupos = [linha for linha in registro_ligado.relatorio("execucoes", 50) if linha["funcao"] == "app.crud.obter_musico_por_email"]
+    assert len(grupos) == 1
+    assert grupos[0]["execucoes"] == 2
+    assert "?" in grupos[0]["sql"] and "example.com" not in grupos[0]["sql"]
+
+
+def test_endpoint_admin_exige_token(test_app_client: TestClient, registro_ligado, test_musician: dict, monkeypatch):
+    """Testa /admin/consultas_lentas: 404 sem ADMIN_TOKEN configurado, 403 com token errado, relatório com o certo."""
+    assert test_app_client.get("/admin/consultas_lentas").status_code == 404
+
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "segredo-admin")
+    assert test_app_client.get("/admin/consultas_lentas", headers={"X-Admin-Token": "errado"}).status_code == 403
+
+    test_app_client.get(f"/musicos/{test_musician['obj_id']}")
+    response = test_app_client.get("/admin/consultas_lentas", params={"ordem": "p95"}, headers={"X-Admin-Token": "segredo-admin"})
+    assert response.status_code == 200
+    assert "app.crud.obter_musico_por_id" in {linha["funcao"] for linha in response.json()["consultas"]}
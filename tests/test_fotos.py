@@ -0,0 +1,173 @@
+# tests/test_fotos.py
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.armazenamento import ArmazenamentoGCS
+from app.fotos import detectar_tipo_imagem, FOTO_TAMANHO_MAXIMO_BYTES
+
+# As fixtures test_app_client e test_musician_token virão de conftest.py
+
+PNG_MINIMO = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def test_detectar_tipo_imagem_pelos_magic_bytes():
+    """Testa que o tipo vem do conteúdo do arquivo, não da extensão."""
+    assert detectar_tipo_imagem(b"\xff\xd8\xff\xe0\x00\x10JFIF").content_type == "image/jpeg"
+    assert detectar_tipo_imagem(PNG_MINIMO).extensao == "png"
+    assert detectar_tipo_imagem(b"<?php echo 'oi'; ?>") is None
+    assert detectar_tipo_imagem(b"") is None
+
+
+def _png(tamanho: int = 200) -> bytes:
+    saida = io.BytesIO()
+    Image.new("RGB", (tamanho, tamanho), (10, 120, 200)).save(saida, format="PNG")
+    return saida.getvalue()
+
+
+def test_upload_foto_rejeita_arquivo_que_nao_e_imagem(test_app_client: TestClient, test_musician_token: str):
+    """Testa que um arquivo com extensão .jpg mas conteúdo de texto é recusado."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    files = {"foto_arquivo": ("foto.jpg", b"isto nao e uma imagem", "image/jpeg")}
+
+    response = test_app_client.put("/musicos/me/foto_perfil", headers=headers, files=files)
+    assert response.status_code == 400
+    assert "Tipo de arquivo inválido" in response.json()["detail"]
+
+
+def test_upload_foto_acima_do_limite_e_recusado_antes_do_parse(test_app_client: TestClient, test_musician_token: str):
+    """Testa que um corpo acima do limite recebe 413 sem chegar ao handler."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    files = {"foto_arquivo": ("grande.png", PNG_MINIMO + b"\x00" * (FOTO_TAMANHO_MAXIMO_BYTES + 128 * 1024), "image/png")}
+
+    response = test_app_client.put("/musicos/me/foto_perfil", headers=headers, files=files)
+    assert response.status_code == 413
+
+
+def test_upload_foto_pela_api_gera_miniaturas(test_app_client: TestClient, test_musician_token: str):
+    """Testa o upload pela API no armazenamento local, incluindo as miniaturas geradas em segundo plano."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    files = {"foto_arquivo": ("qualquer_nome.txt", _png(), "application/octet-stream")}
+
+    response = test_app_client.put("/musicos/me/foto_perfil", headers=headers, files=files)
+    assert response.status_code == 200, response.json()
+    foto_url = response.json()["foto_perfil_url"]
+    assert foto_url.startswith("/static/profile_pics/user_") and foto_url.endswith(".png")
+    assert test_app_client.get(foto_url).content[:8] == b"\x89PNG\r\n\x1a\n"
+
+    # A tarefa de segundo plano roda antes do TestClient devolver a resposta
+    perfil = test_app_client.get("/musicos/me/", headers=headers).json()
+    assert set(perfil["foto_perfil_variantes"]) == {"webp", "jpg"}
+    assert test_app_client.get(perfil["foto_perfil_variantes"]["webp"]["96"]).status_code == 200
+
+
+def test_upload_assinado_e_finalizacao(test_app_client: TestClient, test_musician_token: str):
+    """Testa o fluxo direto: URL assinada, envio do arquivo e finalização registrando a foto."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    response_url = test_app_client.post("/musicos/me/foto_perfil/upload_assinado", headers=headers, json={"content_type": "image/png"})
+    assert response_url.status_code == 200
+    upload = response_url.json()
+
+    response_put = test_app_client.request(upload["metodo"], upload["upload_url"], headers=upload["headers"], content=_png())
+    assert response_put.status_code == 204
+
+    response_finalizar = test_app_client.post("/musicos/me/foto_perfil/finalizar", headers=headers, json={"nome_arquivo": upload["nome_arquivo"]})
+    assert response_finalizar.status_code == 200, response_finalizar.json()
+    assert response_finalizar.json()["foto_perfil_url"].endswith(upload["nome_arquivo"])
+
+
+def test_upload_assinado_gcs_limita_tamanho_e_publica():
+    """Testa que a URL do GCS assina o limite de tamanho e que publicar() aplica a ACL pública no objeto."""
+    chamadas = []
+
+    class BlobFalso:
+        def __init__(self, nome):
+            self.name = nome
+
+        def generate_signed_url(self, **opcoes):
+            chamadas.append(("assinar", self.name, opcoes))
+            return "https://storage.googleapis.com/assinada"
+
+        def make_public(self):
+            chamadas.append(("publico", self.name))
+
+    class ClienteFalso:
+        def bucket(self, nome):
+            return type("BucketFalso", (), {"blob": staticmethod(BlobFalso)})()
+
+    armazenamento = ArmazenamentoGCS("bucket-teste")
+    armazenamento._cliente = ClienteFalso()
+
+    upload = armazenamento.gerar_upload_assinado("profile_pics/a.png", "image/png", FOTO_TAMANHO_MAXIMO_BYTES)
+    assert upload.headers == {"Content-Type": "image/png", "x-goog-content-length-range": f"0,{FOTO_TAMANHO_MAXIMO_BYTES}"}
+    assert chamadas[0][2]["headers"] == {"x-goog-content-length-range": f"0,{FOTO_TAMANHO_MAXIMO_BYTES}"}
+
+    armazenamento.publicar("profile_pics/a.png")
+    assert chamadas[-1] == ("publico", "profile_pics/a.png")
+
+
+def test_finalizar_upload_de_outro_musico_e_recusado(test_app_client: TestClient, test_musician_token: str):
+    """Testa que o músico não pode registrar como sua um arquivo com nome de outro músico."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    nome_alheio = "profile_pics/user_999_0b6f1c1e-3f5a-4d5e-9a43-2f1f7e0b8a11.png"
+    response = test_app_client.post("/musicos/me/foto_perfil/finalizar", headers=headers, json={"nome_arquivo": nome_alheio})
+    assert response.status_code == 400
+
+
+def test_upload_assinado_local_rejeita_assinatura_invalida(test_app_client: TestClient):
+    response = test_app_client.put(
+        "/armazenamento/upload",
+        params={"nome": "profile_pics/x.png", "content_type": "image/png", "expira_em": 4102444800, "assinatura": "0" * 64},
+        headers={"Content-Type": "image/png"}, content=_png()
+    )
+    assert response.status_code == 403
+
+
+def test_trocar_foto_remove_a_antiga_em_segundo_plano(test_app_client: TestClient, test_musician_token: str):
+    """Testa que, ao trocar a foto, a anterior e suas miniaturas somem do armazenamento depois da resposta."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    files = {"foto_arquivo": ("a.png", _png(), "image/png")}
+    test_app_client.put("/musicos/me/foto_perfil", headers=headers, files=files)
+    perfil_antigo = test_app_client.get("/musicos/me/", headers=headers).json()
+
+    files = {"foto_arquivo": ("b.png", _png(120), "image/png")}
+    response = test_app_client.put("/musicos/me/foto_perfil", headers=headers, files=files)
+    assert response.status_code == 200
+
+    assert test_app_client.get(perfil_antigo["foto_perfil_url"]).status_code == 404
+    assert test_app_client.get(perfil_antigo["foto_perfil_variantes"]["jpg"]["256"]).status_code == 404
+    assert test_app_client.get(response.json()["foto_perfil_url"]).status_code == 200
+
+
+def test_limpeza_remove_apenas_fotos_orfas_antigas(db_session, test_musician: dict, tmp_path):
+    """Testa a limpeza: mantém a foto referenciada (e miniaturas) e os arquivos recentes, remove os órfãos antigos."""
+    import os
+    import time
+
+    from app import crud
+    from app.armazenamento import ArmazenamentoLocal
+    from app.limpeza_fotos import coletar_fotos_orfas
+
+    armazenamento = ArmazenamentoLocal(str(tmp_path), "/static")
+    base_viva = "user_1_11111111-1111-1111-1111-111111111111"
+    base_orfa = "user_1_22222222-2222-2222-2222-222222222222"
+    nomes = {
+        "viva": f"profile_pics/{base_viva}.png",
+        "viva_miniatura": f"profile_pics/variantes/{base_viva}_96.webp",
+        "orfa": f"profile_pics/{base_orfa}.jpg",
+        "orfa_miniatura": f"profile_pics/variantes/{base_orfa}_96.webp",
+        "orfa_recente": "profile_pics/user_1_33333333-3333-3333-3333-333333333333.jpg",
+    }
+    uma_semana_atras = time.time() - 7 * 24 * 3600
+    for chave, nome in nomes.items():
+        armazenamento.enviar_bytes(nome, b"x", "image/png")
+        if chave != "orfa_recente":
+            os.utime(tmp_path / nome, (uma_semana_atras, uma_semana_atras))
+    crud.atualizar_foto_perfil_musico(db_session, musico_id=test_musician["obj_id"], foto_url=armazenamento.url_publica(nomes["viva"]))
+
+    resumo = coletar_fotos_orfas(db_session.get_bind(), armazenamento, idade_minima_segundos=3600, tamanho_lote=2)
+
+    assert resumo == {"verificados": 5, "recentes": 1, "referenciados": 2, "deletados": 2, "falhas": 0}
+    restantes = {arquivo.nome for arquivo in armazenamento.listar("profile_pics/")}
+    assert restantes == {nomes["viva"], nomes["viva_miniatura"], nomes["orfa_recente"]}
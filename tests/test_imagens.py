@@ -0,0 +1,52 @@
+# tests/test_imagens.py
+import io
+
+from PIL import Image
+
+from app.imagens import FORMATOS_VARIANTE, gerar_variantes, nome_blob_variante, obter_pool_imagens, TAMANHOS_MINIATURA
+
+
+def _foto_jpeg_com_exif(largura: int = 1200, altura: int = 800) -> bytes:
+    imagem = Image.new("RGB", (largura, altura), (200, 80, 40))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: girar 90° para exibir
+    exif[0x010F] = "CameraDeTeste"  # Make
+    saida = io.BytesIO()
+    imagem.save(saida, format="JPEG", exif=exif)
+    return saida.getvalue()
+
+
+def test_gerar_variantes_cria_miniaturas_sem_exif():
+    """Testa que cada tamanho sai em WebP e JPEG, quadrado e sem metadados EXIF."""
+    variantes = gerar_variantes(_foto_jpeg_com_exif())
+
+    assert set(variantes) == {"webp", "jpg"}
+    for formato, formato_pil in (("webp", "WEBP"), ("jpg", "JPEG")):
+        assert set(variantes[formato]) == set(TAMANHOS_MINIATURA)
+        for tamanho, dados in variantes[formato].items():
+            with Image.open(io.BytesIO(dados)) as miniatura:
+                assert miniatura.format == formato_pil
+                assert miniatura.size == (tamanho, tamanho)
+                assert len(miniatura.getexif()) == 0
+
+
+def test_gerar_variantes_aceita_png_com_transparencia():
+    """Testa que PNG com canal alfa é convertido (fundo branco) para JPEG/WebP."""
+    imagem = Image.new("RGBA", (300, 300), (0, 0, 0, 0))
+    saida = io.BytesIO()
+    imagem.save(saida, format="PNG")
+
+    variantes = gerar_variantes(saida.getvalue())
+    with Image.open(io.BytesIO(variantes["jpg"][96])) as miniatura:
+        assert miniatura.getpixel((10, 10)) == (255, 255, 255)
+
+
+def test_nome_blob_variante():
+    assert nome_blob_variante("profile_pics/user_1_abc.jpg", 256, "webp") == "profile_pics/variantes/user_1_abc_256.webp"
+
+
+def test_pool_de_imagens_nao_usa_fork():
+    """Testa que o pool de processos parte de um processo limpo (forkserver/spawn), não de um fork com threads."""
+    pool = obter_pool_imagens()
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert set(pool.submit(gerar_variantes, _foto_jpeg_com_exif()).result(timeout=60)) == set(FORMATOS_VARIANTE)
@@ -0,0 +1,165 @@
+# tests/test_jobs.py
+import asyncio
+import datetime
+
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session
+
+from app import jobs, metricas, models
+from app.jobs import ExecutorJobs, _TIPOS, enfileirar, reservar_jobs, tarefa
+
+
+@pytest.fixture
+def tipos_de_teste():
+    """Registra tipos de job só para o teste e remove depois."""
+    registrados = []
+
+    def registrar(tipo, funcao, **opcoes):
+        tarefa(tipo, **opcoes)(funcao)
+        registrados.append(tipo)
+
+    yield registrar
+    for tipo in registrados:
+        _TIPOS.pop(tipo, None)
+
+
+def _drenar(bind, **opcoes):
+    asyncio.run(ExecutorJobs(bind, **opcoes).drenar())
+
+
+def test_job_executado_e_concluido(db_session: Session, tipos_de_teste):
+    recebidos = []
+    tipos_de_teste("teste_ok", lambda bind, valor: recebidos.append(valor))
+
+    job = enfileirar(db_session, "teste_ok", {"valor": 42})
+    _drenar(db_session.get_bind())
+
+    db_session.refresh(job)
+    assert recebidos == [42]
+    assert job.status == "concluido" and job.tentativas == 1 and job.travado_por is None
+
+
+def test_job_com_falha_e_reagendado_e_depois_marcado_como_falhou(db_session: Session, tipos_de_teste):
+    async def sempre_falha(bind):
+        raise RuntimeError("indisponível")
+    tipos_de_teste("teste_falha", sempre_falha, max_tentativas=2)
+
+    job = enfileirar(db_session, "teste_falha")
+    _drenar(db_session.get_bind())
+    db_session.refresh(job)
+    assert job.status == "pendente" and job.tentativas == 1
+    assert job.executar_em > datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    assert "indisponível" in job.ultimo_erro
+
+    # Espera exponencial: não roda de novo antes da hora
+    _drenar(db_session.get_bind())
+    db_session.refresh(job)
+    assert job.tentativas == 1
+
+    job.executar_em = datetime.datetime(2000, 1, 1)
+    db_session.commit()
+    _drenar(db_session.get_bind())
+    db_session.refresh(job)
+    assert job.status == "falhou" and job.tentativas == 2
+
+
+def test_limite_de_concorrencia_por_tipo(db_session: Session, tipos_de_teste):
+    simultaneos = {"agora": 0, "maximo": 0}
+
+    async def lento(bind):
+        simultaneos["agora"] += 1
+        simultaneos["maximo"] = max(simultaneos["maximo"], simultaneos["agora"])
+        await asyncio.sleep(0.01)
+        simultaneos["agora"] -= 1
+    tipos_de_teste("teste_lento", lento, concorrencia=2)
+
+    for _ in range(6):
+        enfileirar(db_session, "teste_lento")
+    _drenar(db_session.get_bind(), workers=8)
+
+    assert simultaneos["maximo"] == 2
+    assert db_session.query(models.Job).filter(models.Job.status == "concluido").count() == 6
+
+
+def test_reserva_exclusiva_e_recuperacao_de_reserva_vencida(db_session: Session, tipos_de_teste):
+    tipos_de_teste("teste_reserva", lambda bind: None, concorrencia=5)
+    job = enfileirar(db_session, "teste_reserva")
+    bind = db_session.get_bind()
+
+    assert [j.id for j in reservar_jobs(bind, {"teste_reserva": 5}, "worker-a")] == [job.id]
+    assert reservar_jobs(bind, {"teste_reserva": 5}, "worker-b") == []
+
+    # worker-a "morreu": quando a reserva vence, outro worker pode pegar o job
+    db_session.refresh(job)
+    job.travado_ate = datetime.datetime(2000, 1, 1)
+    db_session.commit()
+    reservados = reservar_jobs(bind, {"teste_reserva": 5}, "worker-b")
+    assert [j.id for j in reservados] == [job.id] and reservados[0].tentativas == 2
+
+
+def test_reserva_vencida_na_ultima_tentativa_vira_falha(db_session: Session, tipos_de_teste):
+    """Testa que um job com max_tentativas esgotado e reserva vencida não é pego de novo: fica como 'falhou'."""
+    tipos_de_teste("teste_uma_vez", lambda bind: None, max_tentativas=1)
+    job = enfileirar(db_session, "teste_uma_vez")
+    bind = db_session.get_bind()
+    assert [j.id for j in reservar_jobs(bind, {"teste_uma_vez": 1}, "worker-a")] == [job.id]
+
+    db_session.refresh(job)
+    job.travado_ate = datetime.datetime(2000, 1, 1)
+    db_session.commit()
+    assert reservar_jobs(bind, {"teste_uma_vez": 1}, "worker-b") == []
+    db_session.refresh(job)
+    assert (job.status, job.tentativas, job.travado_por) == ("falhou", 1, None)
+
+
+def test_job_longo_renova_a_reserva(db_session: Session, tipos_de_teste, monkeypatch):
+    """Testa que a reserva é renovada enquanto o job roda, então outro worker não o pega depois do prazo original."""
+    monkeypatch.setattr(jobs, "JOBS_RESERVA_SEGUNDOS", 1)
+    monkeypatch.setattr(jobs, "JOBS_RENOVACAO_SEGUNDOS", 0.2)
+    pegos_por_outro = []
+
+    async def longo(bind):
+        await asyncio.sleep(1.5)
+        pegos_por_outro.extend(await run_in_threadpool(reservar_jobs, bind, {"teste_longo": 1}, "worker-b"))
+
+    tipos_de_teste("teste_longo", longo)
+    job = enfileirar(db_session, "teste_longo")
+    _drenar(db_session.get_bind())
+
+    db_session.refresh(job)
+    assert pegos_por_outro == []
+    assert (job.status, job.tentativas) == ("concluido", 1)
+
+
+def test_enfileirar_unico_nao_duplica(db_session: Session, tipos_de_teste):
+    tipos_de_teste("teste_unico", lambda bind: None)
+    assert enfileirar(db_session, "teste_unico", unico=True) is not None
+    assert enfileirar(db_session, "teste_unico", unico=True) is None
+
+
+def test_metricas_da_fila(test_app_client, db_session: Session, tipos_de_teste, consultas_sql, monkeypatch):
+    """Testa a fila no /metrics: profundidade por tipo/status, espera do mais antigo, jobs executados e leitura em cache."""
+    tipos_de_teste("teste_metricas", lambda bind: None)
+    executados_antes = REGISTRY.get_sample_value("palcoapp_jobs_executados_total", {"tipo": "teste_metricas", "resultado": "concluido"}) or 0.0
+    enfileirar(db_session, "teste_metricas")
+    _drenar(db_session.get_bind())
+    enfileirar(db_session, "teste_metricas")
+    enfileirar(db_session, "teste_metricas")
+    monkeypatch.setattr(metricas._coletor_fila_jobs, "bind", None)
+    metricas.instrumentar_fila_jobs(db_session.get_bind())
+
+    response = test_app_client.get("/metrics")
+    assert response.status_code == 200
+    consultas_sql.assert_maximo(2)
+    assert 'palcoapp_jobs_fila{status="pendente",tipo="teste_metricas"} 2.0' in response.text
+    assert 'palcoapp_jobs_fila{status="concluido",tipo="teste_metricas"} 1.0' in response.text
+    assert 'palcoapp_jobs_espera_mais_antiga_segundos{tipo="teste_metricas"}' in response.text
+    assert REGISTRY.get_sample_value("palcoapp_jobs_executados_total", {"tipo": "teste_metricas", "resultado": "concluido"}) == executados_antes + 1
+    assert REGISTRY.get_sample_value("palcoapp_jobs_duracao_segundos_count", {"tipo": "teste_metricas"}) >= 1
+
+    # Outra raspagem logo em seguida reaproveita a leitura
+    assert test_app_client.get("/metrics").status_code == 200
+    consultas_sql.assert_maximo(0)
+    assert test_app_client.get("/metricas/jobs").status_code == 404
\ No newline at end of file
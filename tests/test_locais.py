@@ -0,0 +1,108 @@
+# tests/test_locais.py
+import datetime
+import random
+import string
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.locais import chave_nome
+
+# As fixtures test_app_client, db_session, test_musician e consultas_sql virão de conftest.py
+
+
+def _show(nome, endereco=None, dias=7, **extras):
+    data = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=dias)
+    return schemas.ShowCreate(data_hora_evento=data, local_nome=nome, local_endereco=endereco, **extras)
+
+
+def test_chave_ignora_acento_caixa_pontuacao_e_artigo():
+    """Testa a normalização do nome do local."""
+    assert chave_nome("Bar do Zé") == chave_nome("bar do ze") == chave_nome("O Bar do Zé!") == chave_nome("BAR  DO  ZÉ") == "bardoze"
+    assert chave_nome("Bar do Zeca") != "bardoze"
+
+
+def test_grafias_do_mesmo_local_viram_um_so(db_session: Session, test_musician: dict):
+    """Testa a deduplicação: grafias e endereços equivalentes reaproveitam o local; nomes ou endereços diferentes não."""
+    musico_id = test_musician["obj_id"]
+    primeiro = crud.criar_show_para_musico(db_session, _show("Bar do Zé", "Rua Augusta, 1500", latitude=-23.556, longitude=-46.662), musico_id)
+    lote = crud.criar_shows_em_lote(db_session, [
+        _show("bar do ze", "R. Augusta 1500", dias=8),
+        _show("O Bar do Zé!", None, dias=9),
+        _show("Bar do Zé", "Av. Boa Viagem, 20, Recife", dias=10),
+        _show("Bar do Zeca", "Rua Augusta, 1500", dias=11),
+        _show("Casa Nova", None, dias=12),
+        _show("casa nova", None, dias=13),  # Repetido no mesmo lote: um local só
+    ], musico_id)
+
+    por_nome = {show.local_nome: show.local_id for show in lote}
+    assert por_nome["bar do ze"] == por_nome["O Bar do Zé!"] == primeiro.local_id
+    assert len({primeiro.local_id, por_nome["Bar do Zé"], por_nome["Bar do Zeca"], por_nome["Casa Nova"]}) == 4
+    assert por_nome["casa nova"] == por_nome["Casa Nova"]
+    assert db_session.query(models.Local).count() == 4
+
+    local = crud.obter_local_por_id(db_session, primeiro.local_id)
+    assert (local.nome, local.latitude) == ("Bar do Zé", -23.556)  # Primeira grafia; coordenadas do primeiro show que as tinha
+
+    # Editar o nome do local move o show
+    crud.atualizar_show_do_musico(db_session, primeiro.id, musico_id, schemas.ShowUpdate(local_nome="Casa Nova", local_endereco=None))
+    assert db_session.get(models.Show, primeiro.id).local_id == por_nome["Casa Nova"]
+
+
+def test_endpoint_shows_do_local(test_app_client: TestClient, db_session: Session, test_musician: dict, consultas_sql):
+    """Testa o /locais/{id}/shows: só os shows do local, futuros por padrão, em ordem de data."""
+    musico_id = test_musician["obj_id"]
+    shows = crud.criar_shows_em_lote(db_session, [
+        _show("Teatro Municipal", dias=20), _show("teatro municipal", dias=5), _show("Teatro Municipal", dias=-3), _show("Outro Palco", dias=1),
+    ], musico_id)
+    local_id = shows[0].local_id
+
+    response = test_app_client.get(f"/locais/{local_id}/shows")
+    assert response.status_code == 200, response.json()
+    assert [show["local_nome"] for show in response.json()] == ["teatro municipal", "Teatro Municipal"]
+    assert all(show["local_id"] == local_id for show in response.json())
+    consultas_sql.assert_maximo(2)
+
+    assert len(test_app_client.get(f"/locais/{local_id}/shows", params={"incluir_passados": True}).json()) == 3
+    assert test_app_client.get(f"/locais/{local_id}").json()["nome"] == "Teatro Municipal"
+    assert test_app_client.get("/locais/999999/shows").status_code == 404
+
+
+def test_bloco_cheio_nao_traz_todos_os_candidatos(db_session: Session, monkeypatch):
+    """Testa o teto de candidatos aproximados: a chave igual sempre é achada, e o resto do bloco vem limitado."""
+    from app import locais
+    nomes = [f"Bar do Artista Numero {numero}" for numero in range(40)] + ["Bar do Zé", "Bar Zero"]
+    criados = locais.resolver_locais(db_session, [(nome, None, None, None) for nome in nomes])
+    db_session.commit()
+    bar_do_ze = criados[-2]
+
+    monkeypatch.setattr(locais, "LOCAIS_MAX_CANDIDATOS", 3)
+    candidatos = locais._candidatos(db_session, [("bardoze", ""), ("bardozee", "")])
+    assert bar_do_ze in candidatos and len(candidatos) <= 1 + 3
+    # Fora da faixa de tamanho compatível com o limiar: os nomes longos do bloco nem são lidos
+    assert all(len(local.chave) <= 11 for local in candidatos)
+    assert locais.resolver_locais(db_session, [("O bar do ze", None, None, None)])[0].id == bar_do_ze.id
+
+
+def test_locais_novos_sao_relidos_pela_chave(db_session: Session, monkeypatch):
+    """Testa que a releitura depois do INSERT em lote traz só os locais novos, não o bloco inteiro."""
+    from app import locais
+    aleatorio = random.Random(3)
+    nomes = ["Bard " + "".join(aleatorio.choice(string.ascii_lowercase) for _ in range(12)) for _ in range(30)]
+    assert len({local.id for local in locais.resolver_locais(db_session, [(nome, None, None, None) for nome in nomes])}) == 30
+    db_session.commit()
+    db_session.expunge_all()
+
+    monkeypatch.setattr(locais, "LOCAIS_MAX_CANDIDATOS", 2)
+    carregados = []
+    registrar = lambda local, contexto: carregados.append(local.chave)
+    event.listen(models.Local, "load", registrar)
+    try:
+        novo = locais.resolver_locais(db_session, [("Bar do Artista Convidado", "Rua Nova, 10", None, None)])[0]
+    finally:
+        event.remove(models.Local, "load", registrar)
+    assert novo.id is not None and novo.chave == "bardoartistaconvidado"
+    # Mesmo bloco ("bard") dos 30: até 2 candidatos aproximados mais o local novo
+    assert len(carregados) <= 2 + 1
@@ -0,0 +1,78 @@
+# tests/test_logs.py
+import io
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.logs import FiltroAmostragem, configurar_logs, parar_logs, parse_niveis
+
+
+def _registros(destino: io.StringIO):
+    parar_logs()  # esvazia a fila do listener antes de ler
+    return [json.loads(linha) for linha in destino.getvalue().splitlines()]
+
+
+def test_registro_json_com_request_id_e_extras(test_app_client: TestClient):
+    """Testa que os logs de uma requisição saem em JSON, com o request id e os campos extras."""
+    destino = io.StringIO()
+    configurar_logs(nivel="INFO", niveis="", formato="json", destino=destino)
+    try:
+        response = test_app_client.get("/", headers={"X-Request-ID": "req-teste-123"})
+        assert response.headers["x-request-id"] == "req-teste-123"
+        logging.getLogger("app.teste").warning("fora de requisição", extra={"musico_id": 7})
+    finally:
+        registros = _registros(destino)
+        configurar_logs()
+
+    acesso = next(r for r in registros if r["logger"] == "app.http")
+    assert acesso["request_id"] == "req-teste-123"
+    assert acesso["status"] == 200 and acesso["caminho"] == "/" and acesso["duracao_ms"] >= 0
+    avulso = next(r for r in registros if r["logger"] == "app.teste")
+    assert avulso["musico_id"] == 7 and "request_id" not in avulso
+
+
+def test_request_id_invalido_e_substituido(test_app_client: TestClient):
+    response = test_app_client.get("/", headers={"X-Request-ID": "invalido com espacos"})
+    request_id = response.headers["x-request-id"]
+    assert request_id != "invalido com espacos" and len(request_id) == 32
+
+
+def test_excecao_vira_campo_exc():
+    destino = io.StringIO()
+    configurar_logs(nivel="INFO", niveis="", formato="json", destino=destino)
+    try:
+        try:
+            raise ValueError("falhou")
+        except ValueError:
+            logging.getLogger("app.teste").exception("erro tratado")
+    finally:
+        registros = _registros(destino)
+        configurar_logs()
+    assert "ValueError: falhou" in registros[-1]["exc"]
+
+
+def test_niveis_por_modulo():
+    assert parse_niveis("app.crud=debug, app.jobs=WARNING,invalido") == {"app.crud": "DEBUG", "app.jobs": "WARNING"}
+    destino = io.StringIO()
+    configurar_logs(nivel="WARNING", niveis="app.crud=DEBUG", formato="json", destino=destino)
+    try:
+        logging.getLogger("app.crud").debug("visível")
+        logging.getLogger("app.outro").info("escondido")
+    finally:
+        registros = _registros(destino)
+        logging.getLogger("app.crud").setLevel(logging.NOTSET)
+        configurar_logs()
+    assert [r["msg"] for r in registros] == ["visível"]
+
+
+def test_amostragem_de_debug():
+    filtro = FiltroAmostragem(taxa=0.0)
+    registro_debug = logging.LogRecord("app.teste", logging.DEBUG, __file__, 1, "x", None, None)
+    registro_info = logging.LogRecord("app.teste", logging.INFO, __file__, 1, "x", None, None)
+    assert not filtro.filter(registro_debug)
+    assert filtro.filter(registro_info)
+
+    sempre = logging.LogRecord("app.teste", logging.DEBUG, __file__, 1, "x", None, None)
+    sempre.amostra = 1
+    assert filtro.filter(sempre)
@@ -0,0 +1,34 @@
+# tests/test_metricas.py
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+
+def _valor(nome: str, **rotulos) -> float:
+    return REGISTRY.get_sample_value(nome, rotulos) or 0.0
+
+
+def test_metricas_por_template_de_rota_e_consultas(test_app_client: TestClient, test_musician: dict):
+    """Testa que a rota aparece pelo template e que as consultas SQL da requisição são contadas."""
+    rotulos = {"metodo": "GET", "rota": "/musicos/{musico_id}"}
+    antes = _valor("palcoapp_http_requisicao_duracao_segundos_count", status="200", **rotulos)
+    consultas_antes = _valor("palcoapp_db_consultas_por_requisicao_sum", **rotulos)
+
+    response = test_app_client.get(f"/musicos/{test_musician['obj_id']}")
+    assert response.status_code == 200
+
+    assert _valor("palcoapp_http_requisicao_duracao_segundos_count", status="200", **rotulos) == antes + 1
+    assert _valor("palcoapp_db_consultas_por_requisicao_sum", **rotulos) > consultas_antes
+    assert _valor("palcoapp_db_tempo_por_requisicao_segundos_count", **rotulos) >= 1
+    assert _valor("palcoapp_http_resposta_bytes_sum", **rotulos) > 0
+
+
+def test_endpoint_metrics_no_formato_prometheus(test_app_client: TestClient):
+    test_app_client.get("/rota/que/nao/existe/12345")
+    response = test_app_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    corpo = response.text
+    assert "palcoapp_http_requisicoes_em_andamento" in corpo
+    # Caminhos sem rota não viram séries próprias
+    assert "/rota/que/nao/existe/12345" not in corpo
+    assert 'rota="<sem rota>"' in corpo
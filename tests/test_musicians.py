@@ -141,4 +141,45 @@ def test_ler_perfil_musico_logado_token_invalido(test_app_client: TestClient):
     
     assert response.status_code == 401
     # A mensagem de detalhe aqui virá da exceção em decodificar_validar_token
-    assert response.json()["detail"] == "Não foi possível validar as credenciais"
\ No newline at end of file
+    assert response.json()["detail"] == "Não foi possível validar as credenciais"
+
+def test_ler_perfil_musico_inativo_retorna_403(test_app_client: TestClient, test_musician_token: str, test_musician: dict, db_session: Session):
+    """Testa que a identidade mínima carregada por requisição bloqueia músicos inativos."""
+    musico_db = db_session.get(models.Musico, test_musician["obj_id"])
+    musico_db.is_active = False
+    db_session.commit()
+
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    response = test_app_client.get("/musicos/me/", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Usuário inativo"
+
+
+def test_obter_identidade_musico_nao_carrega_relacionamentos(test_musician: dict, db_session: Session):
+    """Testa que a identidade do músico logado traz só id/email/is_active."""
+    identidade = crud.obter_identidade_musico(db_session, musico_id=test_musician["obj_id"])
+    assert identidade == schemas.UsuarioAutenticado(
+        id=test_musician["obj_id"], email=test_musician["email"], is_active=True, role="musico"
+    )
+    assert crud.obter_identidade_musico(db_session, musico_id=9999) is None
+
+
+def test_login_refaz_hash_com_custo_desatualizado(test_app_client: TestClient, db_session: Session):
+    """Testa que o login regrava de forma transparente um hash bcrypt com custo menor que o configurado."""
+    from passlib.hash import bcrypt
+    from app.security import BCRYPT_ROUNDS
+
+    musico_db = models.Musico(
+        email="hashantigo@example.com", nome_artistico="Hash Antigo",
+        hashed_password=bcrypt.using(rounds=4).hash("senhaantiga123"), is_active=True
+    )
+    db_session.add(musico_db)
+    db_session.commit()
+
+    response = test_app_client.post("/token", data={"username": "hashantigo@example.com", "password": "senhaantiga123"})
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    novo_hash = crud.obter_musico_por_email(db_session, email="hashantigo@example.com").hashed_password
+    assert bcrypt.from_string(novo_hash).rounds == BCRYPT_ROUNDS
+    assert bcrypt.verify("senhaantiga123", novo_hash)
@@ -0,0 +1,77 @@
+# tests/test_orcamento_consultas.py
+import datetime
+import logging
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app import crud, models, orcamento_consultas
+from app.main import app, ler_musico_especifico_publico
+from app.orcamento_consultas import OrcamentoConsultasExcedido
+
+# As fixtures test_app_client, consultas_sql e test_musician_token virão de conftest.py
+
+
+def test_todas_as_rotas_declaram_orcamento():
+    """Testa que nenhum endpoint fica sem @orcamento_consultas."""
+    sem_orcamento = [
+        rota.path for rota in app.routes
+        if isinstance(rota, APIRoute) and getattr(rota.endpoint, "_orcamento_consultas", None) is None
+    ]
+    assert sem_orcamento == []
+
+
+def _criar_musicos_com_shows(db_session, quantidade: int, inicio: int = 0):
+    for i in range(quantidade):
+        musico = models.Musico(email=f"musico{inicio + i}@example.com", nome_artistico=f"Músico {inicio + i}", hashed_password="x")
+        db_session.add(musico)
+        db_session.flush()
+        for dia in range(1, 4):
+            db_session.add(models.Show(musico_id=musico.id, local_nome="Bar", data_hora_evento=datetime.datetime(2030, 1, dia)))
+    db_session.commit()
+
+
+def test_listagem_de_musicos_nao_cresce_com_o_numero_de_linhas(test_app_client: TestClient, db_session, consultas_sql):
+    """Testa que a listagem faz o mesmo número de consultas com 1 ou 20 músicos (sem N+1)."""
+    _criar_musicos_com_shows(db_session, 1)
+    assert test_app_client.get("/musicos/").status_code == 200
+    com_um = consultas_sql.ultima()
+
+    _criar_musicos_com_shows(db_session, 19, inicio=1)
+    response = test_app_client.get("/musicos/")
+    assert len(response.json()) == 20
+    assert consultas_sql.ultima() == com_um
+    consultas_sql.assert_maximo(2)
+
+
+def test_rotas_autenticadas_dentro_do_orcamento_com_cache_frio(test_app_client: TestClient, test_musician_token: str, consultas_sql):
+    """Testa o pior caso das rotas autenticadas: identidade fora do cache."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+
+    crud.limpar_cache_principais()
+    assert test_app_client.get("/musicos/me/", headers=headers).status_code == 200
+    consultas_sql.assert_maximo(5)
+
+    crud.limpar_cache_principais()
+    assert test_app_client.put("/musicos/me/", headers=headers, json={"descricao": "Nova descrição"}).status_code == 200
+    consultas_sql.assert_maximo(10)
+
+
+def test_modo_erro_falha_na_consulta_que_estoura(test_app_client: TestClient, test_musician: dict, monkeypatch):
+    """Testa que, nos testes (modo "erro"), passar do orçamento derruba a requisição."""
+    monkeypatch.setattr(ler_musico_especifico_publico, "_orcamento_consultas", 0)
+    with pytest.raises(OrcamentoConsultasExcedido, match="/musicos/{musico_id}"):
+        test_app_client.get(f"/musicos/{test_musician['obj_id']}")
+
+
+def test_modo_log_registra_aviso(test_app_client: TestClient, test_musician: dict, monkeypatch, caplog):
+    """Testa que, em produção (modo "log"), a requisição segue e o excesso vira um aviso no log."""
+    monkeypatch.setattr(orcamento_consultas, "ORCAMENTO_CONSULTAS_MODO", "log")
+    monkeypatch.setattr(ler_musico_especifico_publico, "_orcamento_consultas", 0)
+    with caplog.at_level(logging.WARNING, logger="app.orcamento_consultas"):
+        response = test_app_client.get(f"/musicos/{test_musician['obj_id']}")
+    assert response.status_code == 200
+    avisos = [registro for registro in caplog.records if registro.name == "app.orcamento_consultas"]
+    assert len(avisos) == 1
+    assert avisos[0].rota == "/musicos/{musico_id}" and avisos[0].orcamento == 0
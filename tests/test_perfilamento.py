@@ -0,0 +1,75 @@
+# tests/test_perfilamento.py
+import json
+import os
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from pyinstrument.renderers import SpeedscopeRenderer
+
+from app import security
+from app.perfilamento import PERFILAMENTO_DIR, SUFIXO_ARQUIVO, _PerfilRequisicao, assinar_gatilho, gatilho_valido, rotacionar
+
+# As fixtures test_app_client e test_musician virão de conftest.py
+
+
+def _ocupar_cpu(segundos: float) -> int:
+    fim = time.perf_counter() + segundos
+    contador = 0
+    while time.perf_counter() < fim:
+        contador += 1
+    return contador
+
+
+def test_gatilho_assinado_valida_chave_e_expiracao(monkeypatch):
+    """Testa o cabeçalho X-Perfil: só vale com a assinatura do ADMIN_TOKEN e dentro da validade."""
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "segredo-admin")
+    assert gatilho_valido(assinar_gatilho(60))
+    assert not gatilho_valido(assinar_gatilho(60, chave="outra-chave"))
+    assert not gatilho_valido(assinar_gatilho(-1))
+    assert not gatilho_valido("lixo")
+
+    monkeypatch.setattr(security, "ADMIN_TOKEN", None)
+    assert not gatilho_valido(assinar_gatilho(60, chave="segredo-admin"))
+
+
+def test_requisicao_com_gatilho_grava_perfil_speedscope(test_app_client: TestClient, test_musician: dict, monkeypatch):
+    """Testa que a requisição disparada grava o perfil com rota e request id no nome, e que as outras não."""
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "segredo-admin")
+    antes = set(os.listdir(PERFILAMENTO_DIR))
+
+    response = test_app_client.get(f"/musicos/{test_musician['obj_id']}", headers={"X-Request-ID": "req-perfil-1"})
+    assert "x-perfil-arquivo" not in response.headers
+    assert set(os.listdir(PERFILAMENTO_DIR)) == antes
+
+    response = test_app_client.get(
+        f"/musicos/{test_musician['obj_id']}", headers={"X-Perfil": assinar_gatilho(60), "X-Request-ID": "req-perfil-2"}
+    )
+    assert response.status_code == 200
+    nome_arquivo = response.headers["x-perfil-arquivo"]
+    assert nome_arquivo.endswith(f"_GET_musicos_musico_id_req-perfil-2{SUFIXO_ARQUIVO}")
+    with open(os.path.join(PERFILAMENTO_DIR, nome_arquivo), encoding="utf-8") as arquivo:
+        assert "speedscope" in json.load(arquivo)["$schema"]
+
+
+def test_trecho_no_threadpool_entra_no_perfil():
+    """Testa que o trabalho de um handler síncrono (outro thread) aparece no perfil combinado."""
+    perfil = _PerfilRequisicao()
+    perfil.profiler.start()
+    trabalhador = threading.Thread(target=perfil.perfilar_no_thread, args=(_ocupar_cpu, 0.05))
+    trabalhador.start()
+    trabalhador.join()
+    perfil.profiler.stop()
+    assert "_ocupar_cpu" in SpeedscopeRenderer().render(perfil.sessao_combinada())
+
+
+def test_rotacao_apaga_os_perfis_mais_antigos(tmp_path):
+    """Testa que a rotação apaga os arquivos mais antigos até caber no limite."""
+    for i in range(5):
+        caminho = tmp_path / f"perfil_{i}{SUFIXO_ARQUIVO}"
+        caminho.write_bytes(b"x" * 100)
+        os.utime(caminho, (1000 + i, 1000 + i))
+    (tmp_path / "outro_arquivo.txt").write_bytes(b"x" * 1000)
+
+    assert rotacionar(str(tmp_path), max_bytes=250) == 3
+    assert sorted(os.listdir(tmp_path)) == ["outro_arquivo.txt", f"perfil_3{SUFIXO_ARQUIVO}", f"perfil_4{SUFIXO_ARQUIVO}"]
@@ -0,0 +1,111 @@
+# tests/test_planos_consulta.py
+# Planos (EXPLAIN QUERY PLAN) das consultas quentes do crud, num banco semeado: falha se alguma
+# volta a varrer a tabela inteira ou a ordenar em memória (índice faltando ou consulta que deixou de usá-lo).
+import contextlib
+import re
+
+import pytest
+from sqlalchemy import event, func, select, text
+
+from app import crud, models
+from app.seed import ConfigSeed, semear
+from tests.conftest import engine_test
+
+# As fixtures setup_database e db_session virão de conftest.py
+
+CONFIG_PLANOS = ConfigSeed(musicos=40, fas=80, itens_por_musico=10, shows=400, pedidos=4000, favoritos_por_fa=3, lote=500)
+
+# Tabelas com volume (as pequenas ou buscadas por chave primária não entram)
+_TABELAS_GRANDES = ("pedidos_musica", "shows", "itens_repertorio")
+# "SCAN shows" ou "SCAN shows USING INDEX ..." (varredura completa, mesmo que pelo índice)
+_RE_VARREDURA = re.compile(r"^SCAN (%s)\b" % "|".join(_TABELAS_GRANDES))
+
+
+@pytest.fixture(scope="function")
+def banco_semeado(db_session):
+    semear(engine_test, CONFIG_PLANOS)
+    with engine_test.begin() as conexao:
+        conexao.exec_driver_sql("ANALYZE")  # estatísticas, como num banco de verdade
+    return db_session
+
+
+@contextlib.contextmanager
+def _capturar_selects():
+    capturados = []
+
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            capturados.append((statement, parameters))
+
+    event.listen(engine_test, "before_cursor_execute", antes)
+    try:
+        yield capturados
+    finally:
+        event.remove(engine_test, "before_cursor_execute", antes)
+
+
+def _problemas_no_plano(funcao, *args, **kwargs):
+    """Roda a função do crud, faz EXPLAIN QUERY PLAN de cada SELECT que ela emitiu e devolve os passos ruins."""
+    with _capturar_selects() as capturados:
+        funcao(*args, **kwargs)
+    assert capturados, f"{funcao.__name__} não consultou o banco"
+    problemas = []
+    with engine_test.connect() as conexao:
+        for statement, parameters in capturados:
+            for linha in conexao.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+                detalhe = linha[-1]
+                if _RE_VARREDURA.match(detalhe) or "USE TEMP B-TREE" in detalhe:
+                    problemas.append(f"{detalhe}  <- {' '.join(statement.split())[:160]}")
+    return problemas
+
+
+def _mais_pedido(db, coluna):
+    return db.execute(select(coluna).group_by(coluna).order_by(func.count().desc()).limit(1)).scalar_one()
+
+
+def test_consultas_quentes_usam_indices(banco_semeado):
+    """Testa que nenhuma consulta quente do crud faz varredura completa ou sort em memória."""
+    db = banco_semeado
+    musico_id = _mais_pedido(db, models.PedidoMusica.musico_id)
+    fa_id = _mais_pedido(db, models.PedidoMusica.solicitante_id)
+    dia_com_show = db.execute(select(models.Show.data_hora_evento).limit(1)).scalar_one().date()
+
+    chamadas = [
+        (crud.obter_pedidos_para_musico, dict(musico_id=musico_id)),
+        (crud.obter_pedidos_para_musico, dict(musico_id=musico_id, status_pedido="pendente")),
+        (crud.obter_pedidos_feitos_por_fan, dict(solicitante_id=fa_id)),
+        (crud.obter_shows_do_musico, dict(musico_id=musico_id)),
+        (crud.obter_itens_repertorio_do_musico, dict(musico_id=musico_id)),
+        (crud.obter_todos_os_shows, dict()),
+        (crud.obter_todos_os_shows, dict(data_filtro=dia_com_show)),
+        (crud.obter_shows_proximos, dict(latitude=-23.5505, longitude=-46.6333, raio_km=10)),
+        (crud.obter_shows_do_local, dict(local_id=db.execute(select(models.Show.local_id).limit(1)).scalar_one())),
+        (crud.obter_musico_por_id, dict(musico_id=musico_id)),
+        (crud.obter_usuario_publico_por_id, dict(usuario_id=fa_id)),
+    ]
+    problemas = {}
+    for funcao, kwargs in chamadas:
+        encontrados = _problemas_no_plano(funcao, db, **kwargs)
+        db.expunge_all()
+        if encontrados:
+            problemas[f"{funcao.__name__}({kwargs})"] = encontrados
+    assert problemas == {}
+
+
+def test_fila_de_pendentes_usa_o_indice_parcial(banco_semeado):
+    """Testa que a fila de pendentes do músico é servida pelo índice parcial."""
+    musico_id = _mais_pedido(banco_semeado, models.PedidoMusica.musico_id)
+    with _capturar_selects() as capturados:
+        crud.obter_pedidos_para_musico(banco_semeado, musico_id=musico_id, status_pedido="pendente")
+    statement, parameters = capturados[0]
+    with engine_test.connect() as conexao:
+        plano = " | ".join(linha[-1] for linha in conexao.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+    assert "ix_pedidos_musica_pendentes" in plano
+
+
+def test_verificacao_detecta_regressao_sem_o_indice(banco_semeado):
+    """Testa a própria verificação: sem o índice composto, a agenda do músico volta a varrer ou ordenar."""
+    musico_id = _mais_pedido(banco_semeado, models.PedidoMusica.musico_id)
+    with engine_test.begin() as conexao:
+        conexao.execute(text("DROP INDEX ix_shows_musico_id_data_hora_evento"))
+    assert _problemas_no_plano(crud.obter_shows_do_musico, banco_semeado, musico_id=musico_id) != []
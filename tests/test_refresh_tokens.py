@@ -0,0 +1,85 @@
+# tests/test_refresh_tokens.py
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import models, security
+from app.limpeza_refresh_tokens import remover_refresh_tokens_expirados
+
+# As fixtures test_app_client, test_musician e test_fan virão de conftest.py
+
+
+def _login(client: TestClient, url: str, email: str, senha: str) -> dict:
+    response = client.post(url, data={"username": email, "password": senha})
+    assert response.status_code == 200, response.json()
+    return response.json()
+
+
+def test_refresh_token_renova_tokens_do_musico(test_app_client: TestClient, test_musician: dict, monkeypatch):
+    """Testa que /token/refresh emite um novo par de tokens sem passar pelo bcrypt."""
+    tokens = _login(test_app_client, "/token", test_musician["data_create"].email, test_musician["data_create"].password)
+    assert tokens["refresh_token"]
+
+    def bcrypt_proibido(*args, **kwargs):
+        raise AssertionError("refresh não deve verificar senha")
+    monkeypatch.setattr(security.pwd_context, "verify_and_update", bcrypt_proibido)
+
+    response = test_app_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200, response.json()
+    novos = response.json()
+    assert novos["role"] == "musico"
+    assert novos["user_id"] == test_musician["obj_id"]
+    assert novos["refresh_token"] != tokens["refresh_token"]
+
+    perfil = test_app_client.get("/musicos/me/", headers={"Authorization": f"Bearer {novos['access_token']}"})
+    assert perfil.status_code == 200
+
+
+def test_refresh_token_nao_pode_ser_reutilizado(test_app_client: TestClient, test_fan: dict):
+    """Testa a rotação: um refresh token já usado é rejeitado."""
+    tokens = _login(test_app_client, "/usuarios/token", test_fan["data_create"].email, test_fan["data_create"].password)
+
+    primeira = test_app_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert primeira.status_code == 200
+    assert primeira.json()["role"] == "fan"
+
+    segunda = test_app_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert segunda.status_code == 401
+
+
+def test_refresh_tokens_usados_ficam_no_banco(test_app_client: TestClient, db_session: Session, test_fan: dict, consultas_sql):
+    """Testa que o uso fica gravado no banco (vale para todos os workers) sem podar nada na renovação."""
+    tokens = _login(test_app_client, "/usuarios/token", test_fan["data_create"].email, test_fan["data_create"].password)
+    ontem = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=1)
+    db_session.add(models.RefreshTokenUsado(jti_digest=b"expirado-da-cont", role="fan", user_id=test_fan["id"], expira_em=ontem))
+    db_session.commit()
+
+    assert test_app_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    consultas_sql.assert_maximo(2)
+    _, digest, _ = security.decodificar_refresh_token(tokens["refresh_token"])
+    assert {linha.jti_digest for linha in db_session.query(models.RefreshTokenUsado)} == {digest, b"expirado-da-cont"}
+
+
+def test_limpeza_apaga_expirados_de_todas_as_contas_em_lotes(db_session: Session):
+    """Testa a poda periódica: saem os jtis expirados de qualquer conta, lote a lote, e ficam os ainda válidos."""
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    db_session.add_all(
+        [models.RefreshTokenUsado(jti_digest=f"expirado-{i:07d}".encode(), role="fan", user_id=i, expira_em=agora - datetime.timedelta(hours=1)) for i in range(7)]
+        + [models.RefreshTokenUsado(jti_digest=b"valido-00000000", role="musico", user_id=1, expira_em=agora + datetime.timedelta(days=1))]
+    )
+    db_session.commit()
+
+    assert remover_refresh_tokens_expirados(db_session.get_bind(), tamanho_lote=3) == 7
+    assert [linha.jti_digest for linha in db_session.query(models.RefreshTokenUsado)] == [b"valido-00000000"]
+
+
+def test_tokens_nao_sao_intercambiaveis(test_app_client: TestClient, test_musician: dict):
+    """Testa que access token não renova e refresh token não autentica endpoints."""
+    tokens = _login(test_app_client, "/token", test_musician["data_create"].email, test_musician["data_create"].password)
+
+    response_refresh = test_app_client.post("/token/refresh", json={"refresh_token": tokens["access_token"]})
+    assert response_refresh.status_code == 401
+
+    response_perfil = test_app_client.get("/musicos/me/", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response_perfil.status_code == 401
@@ -0,0 +1,129 @@
+# tests/test_security.py
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app import security
+
+
+def _token(email: str, user_id: int) -> str:
+    return security.criar_access_token(
+        data={"sub": email, "user_id": user_id, "role": "musico"}, expires_delta=timedelta(minutes=5)
+    )
+
+
+def test_token_verificado_fica_em_cache():
+    """Testa que a segunda validação do mesmo token vem do cache, sem novo decode."""
+    security.limpar_cache_tokens()
+    token = _token("cache_token@example.com", 101)
+
+    primeiro = asyncio.run(security.decodificar_validar_token_base(token))
+    segundo = asyncio.run(security.decodificar_validar_token_base(token))
+    assert segundo is primeiro
+    assert segundo.email == "cache_token@example.com"
+
+
+def test_revogar_token_remove_do_cache_e_rejeita():
+    """Testa que um token revogado deixa de ser aceito mesmo já estando em cache."""
+    token = _token("revogado@example.com", 102)
+    asyncio.run(security.decodificar_validar_token_base(token))
+
+    security.revogar_token(token)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(security.decodificar_validar_token_base(token))
+    assert exc_info.value.status_code == 401
+
+
+def test_token_expirado_nao_e_aceito():
+    """Testa que tokens expirados continuam sendo rejeitados (o cache respeita o exp)."""
+    token = security.criar_access_token(
+        data={"sub": "expirado@example.com", "user_id": 103, "role": "musico"}, expires_delta=timedelta(seconds=-1)
+    )
+    with pytest.raises(HTTPException):
+        asyncio.run(security.decodificar_validar_token_base(token))
+
+
+def test_lista_revogacao_poda_entradas_expiradas():
+    """Testa que a lista de revogação só guarda digests de tokens ainda válidos."""
+    lista = security.ListaRevogacao()
+    lista.revogar(b"expirado", expira_em=0)
+    lista.revogar(b"valido", expira_em=4102444800)  # 2100-01-01
+    assert not lista.esta_revogado(b"expirado")
+    assert lista.esta_revogado(b"valido")
+    assert len(lista) == 1
+
+
+def test_login_so_manda_o_bcrypt_para_o_pool_de_hash(test_app_client, test_musician: dict, monkeypatch):
+    """Testa que o pool de hashing só recebe a verificação da senha; a consulta da conta fica fora dele."""
+    from app import main
+    no_pool = []
+    original = main.executar_no_pool_de_hash
+
+    async def registrar(func, *args, **kwargs):
+        no_pool.append(func)
+        return await original(func, *args, **kwargs)
+    monkeypatch.setattr(main, "executar_no_pool_de_hash", registrar)
+
+    dados = test_musician["data_create"]
+    assert test_app_client.post("/token", data={"username": dados.email, "password": dados.password}).status_code == 200
+    assert test_app_client.post("/token", data={"username": dados.email, "password": "senha-errada"}).status_code == 401
+    assert test_app_client.post("/token", data={"username": "ninguem@example.com", "password": "x"}).status_code == 401
+    assert no_pool == [security.verificar_e_atualizar_senha, security.verificar_e_atualizar_senha]
+
+
+def test_login_regrava_hash_com_custo_desatualizado(test_app_client, db_session, test_musician: dict):
+    """Testa que o login com um hash de custo menor que BCRYPT_ROUNDS regrava o hash (fora do pool de hashing)."""
+    from passlib.hash import bcrypt
+    from app import models
+    dados = test_musician["data_create"]
+    musico = db_session.get(models.Musico, test_musician["obj_id"])
+    musico.hashed_password = bcrypt.using(rounds=4).hash(dados.password)
+    db_session.commit()
+
+    assert test_app_client.post("/token", data={"username": dados.email, "password": dados.password}).status_code == 200
+    db_session.expire_all()
+    assert db_session.get(models.Musico, test_musician["obj_id"]).hashed_password.startswith(f"$2b${security.BCRYPT_ROUNDS:02d}$")
+
+
+def test_conta_desativada_perde_o_acesso_sem_esperar_o_cache(test_app_client, db_session, test_musician: dict, test_musician_token: str):
+    """Testa que escritas na conta invalidam a identidade em cache e que uma conta desativada é barrada na hora."""
+    from app import crud, models
+
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    musico_id = test_musician["obj_id"]
+    assert test_app_client.get("/musicos/me/", headers=headers).status_code == 200
+    assert crud._cache_principais.obter(("musico", musico_id)) is not None
+
+    assert test_app_client.put("/musicos/me/", headers=headers, json={"descricao": "Nova descrição"}).status_code == 200
+    assert crud._cache_principais.obter(("musico", musico_id)) is None
+
+    assert test_app_client.get("/musicos/me/", headers=headers).status_code == 200
+    db_session.get(models.Musico, musico_id).is_active = False
+    db_session.commit()
+    crud.invalidar_principal("musico", musico_id)
+    response = test_app_client.get("/musicos/me/", headers=headers)
+    assert response.status_code == 403 and response.json()["detail"] == "Usuário inativo"
+
+
+def test_identidade_lida_antes_de_uma_invalidacao_nao_volta_ao_cache(db_session, test_musician: dict, monkeypatch):
+    """Testa que uma leitura concorrente com atualizar_* (invalidação no meio dela) não recoloca a identidade antiga no cache."""
+    from app import crud
+
+    crud.limpar_cache_principais()
+    musico_id = test_musician["obj_id"]
+    carregar = crud.obter_identidade_musico
+
+    def carregar_com_escrita_concorrente(db, user_id):
+        identidade = carregar(db, user_id)
+        crud.invalidar_principal("musico", user_id)  # Outra requisição faz commit e invalida logo depois da leitura
+        return identidade
+
+    monkeypatch.setattr(crud, "obter_identidade_musico", carregar_com_escrita_concorrente)
+    assert crud.obter_identidade_em_cache(db_session, "musico", musico_id).id == musico_id
+    assert crud._cache_principais.obter(("musico", musico_id)) is None
+
+    monkeypatch.setattr(crud, "obter_identidade_musico", carregar)
+    crud.obter_identidade_em_cache(db_session, "musico", musico_id)
+    assert crud._cache_principais.obter(("musico", musico_id)) is not None
@@ -0,0 +1,61 @@
+# tests/test_seed.py
+from collections import Counter
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import models
+from app.database import Base
+from app.seed import ConfigSeed, DOMINIO_EMAIL, SENHA_PADRAO, semear
+from tests.conftest import engine_test
+
+# As fixtures setup_database, db_session e test_app_client virão de conftest.py
+
+CONFIG_PEQUENA = ConfigSeed(musicos=30, fas=40, itens_por_musico=4, shows=60, pedidos=500, favoritos_por_fa=3, lote=64)
+
+
+def _conteudo(db_session):
+    # Tudo menos o hash da senha (o sal do bcrypt é aleatório)
+    return (
+        db_session.execute(select(models.Musico.id, models.Musico.nome_artistico, models.Musico.generos_musicais).order_by(models.Musico.id)).all(),
+        db_session.execute(select(models.PedidoMusica.musico_id, models.PedidoMusica.item_repertorio_id, models.PedidoMusica.status_pedido).order_by(models.PedidoMusica.id)).all(),
+        db_session.execute(select(models.favoritos_table).order_by(*models.favoritos_table.c)).all(),
+    )
+
+
+def test_semear_gera_as_quantidades_pedidas_com_referencias_validas(setup_database, db_session):
+    """Testa as contagens por tabela e que cada pedido aponta para uma música do próprio músico."""
+    resumo = semear(engine_test, CONFIG_PEQUENA)
+
+    assert resumo["musicos"] == db_session.query(models.Musico).count() == 30
+    assert resumo["usuarios_publico"] == 40
+    assert resumo["shows"] == 60 and resumo["pedidos_musica"] == 500
+    assert resumo["itens_repertorio"] == db_session.query(models.ItemRepertorio).count()
+    pedidos_invalidos = db_session.query(models.PedidoMusica).join(models.ItemRepertorio).filter(
+        models.ItemRepertorio.musico_id != models.PedidoMusica.musico_id
+    ).count()
+    assert pedidos_invalidos == 0
+
+
+def test_semear_e_deterministico_e_enviesado(setup_database, db_session):
+    """Testa que a mesma semente gera os mesmos dados e que poucos músicos concentram os pedidos."""
+    semear(engine_test, CONFIG_PEQUENA)
+    primeira = _conteudo(db_session)
+    db_session.close()
+    Base.metadata.drop_all(bind=engine_test)
+    Base.metadata.create_all(bind=engine_test)
+    semear(engine_test, CONFIG_PEQUENA)
+    assert _conteudo(db_session) == primeira
+
+    por_musico = Counter(musico_id for musico_id, _, _ in primeira[1])
+    _, pedidos_do_topo = por_musico.most_common(1)[0]
+    assert pedidos_do_topo > 5 * (500 / 30)  # muito acima da média uniforme
+
+
+def test_contas_semeadas_fazem_login(test_app_client: TestClient):
+    """Testa que o hash reaproveitado é válido para todas as contas."""
+    semear(engine_test, ConfigSeed(musicos=3, fas=2, shows=0, pedidos=0))
+    response = test_app_client.post("/token", data={"username": f"musico2@{DOMINIO_EMAIL}", "password": SENHA_PADRAO})
+    assert response.status_code == 200, response.json()
+    response = test_app_client.post("/usuarios/token", data={"username": f"fa1@{DOMINIO_EMAIL}", "password": SENHA_PADRAO})
+    assert response.status_code == 200, response.json()
@@ -0,0 +1,88 @@
+# tests/test_series_shows.py
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.series_shows import expandir_series_ate, ocorrencias
+
+# As fixtures test_app_client, db_session, test_musician e test_musician_token virão de conftest.py
+
+
+def _serie(**regra) -> models.SerieShow:
+    return models.SerieShow(**{"intervalo": 1, "excecoes": [], **regra})
+
+
+def test_ocorrencias_semanais_mensais_e_excecoes():
+    """Testa a expansão da regra: dias da semana, intervalo, meses sem o dia, exceções e limites."""
+    sexta = datetime.datetime(2026, 1, 2, 21, 0)  # sexta-feira
+    semanal = _serie(frequencia="semanal", intervalo=2, dias_semana=[4, 5], data_hora_inicio=sexta, max_ocorrencias=5, excecoes=["2026-01-16"])
+    assert list(ocorrencias(semanal)) == [
+        datetime.datetime(2026, 1, 2, 21, 0), datetime.datetime(2026, 1, 3, 21, 0),
+        datetime.datetime(2026, 1, 17, 21, 0), datetime.datetime(2026, 1, 30, 21, 0),
+    ]  # 16/01 é exceção, mas conta para as 5 ocorrências
+
+    dia_31 = _serie(frequencia="mensal", data_hora_inicio=datetime.datetime(2026, 1, 31, 20, 0), data_fim=datetime.datetime(2026, 6, 1))
+    assert [data.date() for data in ocorrencias(dia_31)] == [datetime.date(2026, 1, 31), datetime.date(2026, 3, 31), datetime.date(2026, 5, 31)]
+
+
+def test_criar_serie_gera_so_a_janela_e_expande_depois(db_session: Session, test_musician: dict):
+    """Testa que a série gera os shows até o horizonte e que expandir de novo só acrescenta os que faltam."""
+    musico_id = test_musician["obj_id"]
+    inicio = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)).replace(tzinfo=None, hour=21, minute=0, second=0, microsecond=0)
+    pedido = schemas.SerieShowCreate(frequencia="semanal", data_hora_inicio=inicio, local_nome="Bar do Zé", excecoes=[(inicio + datetime.timedelta(weeks=1)).date()])
+    serie, gerados = crud.criar_serie_show(db_session, pedido, musico_id)
+
+    shows = crud.obter_shows_do_musico(db_session, musico_id=musico_id, limit=1000)
+    assert gerados == len(shows) == 12  # 13 semanas no horizonte de 90 dias, menos a exceção
+    assert all(show.serie_id == serie.id and show.local_nome == "Bar do Zé" for show in shows)
+    assert serie.expandida_ate > shows[-1].data_hora_evento
+
+    ate = serie.expandida_ate + datetime.timedelta(weeks=4)
+    assert expandir_series_ate(db_session, ate) == 4
+    assert expandir_series_ate(db_session, ate) == 0  # Mesma janela: nada duplicado
+    assert len(crud.obter_shows_do_musico(db_session, musico_id=musico_id, limit=1000)) == 16
+
+
+def test_consulta_por_data_distante_calcula_sem_gravar(db_session: Session, test_musician: dict):
+    """Testa que listar os shows de um dia além do horizonte mostra as ocorrências daquele dia sem gravá-las."""
+    inicio = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)).replace(tzinfo=None, hour=21, minute=0, second=0, microsecond=0)
+    serie, _ = crud.criar_serie_show(db_session, schemas.SerieShowCreate(frequencia="mensal", data_hora_inicio=inicio, local_nome="Teatro Municipal"), test_musician["obj_id"])
+    daqui_a_um_ano = inicio.replace(year=inicio.year + 1) if inicio.day <= 28 else inicio + datetime.timedelta(days=365)
+    expandida_ate, gravados = serie.expandida_ate, db_session.query(models.Show).count()
+
+    shows = crud.obter_todos_os_shows(db_session, data_filtro=daqui_a_um_ano.date())
+    assert [(show.local_nome, show.id, show.serie_id) for show in shows] == ([("Teatro Municipal", None, serie.id)] if inicio.day <= 28 else [])
+    if shows:
+        assert schemas.Show.model_validate(shows[0]).musico.id == test_musician["obj_id"]
+    db_session.commit()
+    db_session.expire_all()
+    assert (db_session.get(models.SerieShow, serie.id).expandida_ate, db_session.query(models.Show).count()) == (expandida_ate, gravados)
+
+
+def test_endpoints_lote_e_series(test_app_client: TestClient, test_musician_token: str, consultas_sql):
+    """Testa a criação em lote (um INSERT, resposta na ordem da agenda) e a criação de série pela API."""
+    headers = {"Authorization": f"Bearer {test_musician_token}"}
+    amanha = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    shows = [{"data_hora_evento": (amanha + datetime.timedelta(days=dias)).isoformat(), "local_nome": f"Palco {dias}"} for dias in (3, 1, 2)]
+
+    response = test_app_client.post("/shows/lote", headers=headers, json={"shows": shows})
+    assert response.status_code == 201, response.json()
+    assert [show["local_nome"] for show in response.json()] == ["Palco 1", "Palco 2", "Palco 3"]
+    assert all(show["musico"]["nome_artistico"] and show["serie_id"] is None for show in response.json())
+    consultas_sql.assert_maximo(7)
+
+    # Lote inválido não grava nada
+    invalido = shows + [{"local_nome": "Sem data"}]
+    assert test_app_client.post("/shows/lote", headers=headers, json={"shows": invalido}).status_code == 422
+    assert test_app_client.post("/shows/lote", headers=headers, json={"shows": []}).status_code == 422
+
+    serie = {"frequencia": "mensal", "dias_semana": [4], "data_hora_inicio": amanha.isoformat(), "local_nome": "Pub"}
+    assert test_app_client.post("/shows/series", headers=headers, json=serie).status_code == 422
+    del serie["dias_semana"]
+    response = test_app_client.post("/shows/series", headers=headers, json={**serie, "max_ocorrencias": 2})
+    assert response.status_code == 201, response.json()
+    assert response.json()["shows_gerados"] == 2
+    assert response.json()["serie"]["encerrada"] is True
+    consultas_sql.assert_maximo(9)
@@ -0,0 +1,106 @@
+# tests/test_shows_proximos.py
+import datetime
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, geo, models, schemas
+
+# As fixtures test_app_client, db_session, test_musician e consultas_sql virão de conftest.py
+
+AVENIDA_PAULISTA = (-23.5614, -46.6559)
+
+
+def _dentro_de_alguma_faixa(celula, faixas):
+    return any(inicio <= celula <= fim for inicio, fim in faixas)
+
+
+def test_faixas_cobrem_todo_o_circulo():
+    """Testa que as faixas de geocelula contêm todo ponto dentro do raio, inclusive perto do antimeridiano e dos polos."""
+    aleatorio = random.Random(7)
+    for centro, raio_km in [(AVENIDA_PAULISTA, 5), (AVENIDA_PAULISTA, 150), ((0.0, 179.99), 30), ((-17.5, -179.95), 20), ((89.9, 10.0), 50)]:
+        faixas = geo.faixas_geocelula(centro[0], centro[1], raio_km)
+        assert len(faixas) <= 8
+        for _ in range(500):
+            latitude = max(-90.0, min(90.0, centro[0] + aleatorio.uniform(-1, 1) * raio_km / 111.32))
+            longitude = centro[1] + aleatorio.uniform(-3, 3) * raio_km / 111.32
+            longitude = (longitude + 180.0) % 360.0 - 180.0
+            if geo.distancia_km(centro[0], centro[1], latitude, longitude) <= raio_km:
+                assert _dentro_de_alguma_faixa(geo.geocelula(latitude, longitude), faixas), (centro, raio_km, latitude, longitude)
+
+
+def test_proximos_filtra_por_raio_e_data_e_ordena_por_distancia(db_session: Session, test_musician: dict):
+    """Testa que só vêm shows futuros dentro do raio, do mais perto para o mais longe, e que editar as coordenadas move o show."""
+    musico_id = test_musician["obj_id"]
+    amanha = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    locais = {
+        "MASP": (-23.5614, -46.6558, amanha),
+        "Ibirapuera": (-23.5874, -46.6576, amanha),
+        "Santos": (-23.9608, -46.3336, amanha),
+        "Ontem no MASP": (-23.5614, -46.6558, amanha - datetime.timedelta(days=2)),
+        "Sem coordenadas": (None, None, amanha),
+    }
+    criados = crud.criar_shows_em_lote(db_session, [
+        schemas.ShowCreate(data_hora_evento=data, local_nome=nome, latitude=latitude, longitude=longitude)
+        for nome, (latitude, longitude, data) in locais.items()
+    ], musico_id)
+
+    proximos = crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=10)
+    assert [show.local_nome for show, _ in proximos] == ["MASP", "Ibirapuera"]
+    assert proximos[0][1] < 0.1 and 2.5 < proximos[1][1] < 3.5
+    assert [show.local_nome for show, _ in crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=100)] == ["MASP", "Ibirapuera", "Santos"]
+
+    santos = next(show for show in criados if show.local_nome == "Santos")
+    crud.atualizar_show_do_musico(db_session, santos.id, musico_id, schemas.ShowUpdate(latitude=-23.5505, longitude=-46.6333))
+    assert "Santos" in [show.local_nome for show, _ in crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=10)]
+    assert [show.local_nome for show, _ in crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=100, limit=1)] == ["MASP"]
+
+
+def test_regiao_acima_do_teto_de_candidatos_ainda_traz_os_mais_proximos(db_session: Session, test_musician: dict, monkeypatch):
+    """Testa que, quando o raio pedido passa do teto de candidatos, a busca encolhe o raio em vez de ordenar uma amostra arbitrária."""
+    monkeypatch.setattr(geo, "PROXIMOS_MAX_CANDIDATOS", 10)
+    amanha = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    # Os distantes (Campinas, ~85 km) são gravados primeiro: uma leitura truncada pegaria só eles
+    campinas = [schemas.ShowCreate(data_hora_evento=amanha, local_nome=f"Campinas {i}", latitude=-22.9056 + i * 1e-4, longitude=-47.0608) for i in range(30)]
+    perto = [schemas.ShowCreate(data_hora_evento=amanha, local_nome=nome, latitude=latitude, longitude=-46.6559)
+             for nome, latitude in [("A", -23.5620), ("B", -23.5700), ("C", -23.5900)]]
+    crud.criar_shows_em_lote(db_session, campinas, test_musician["obj_id"])
+    crud.criar_shows_em_lote(db_session, perto, test_musician["obj_id"])
+
+    assert [show.local_nome for show, _ in crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=200, limit=3)] == ["A", "B", "C"]
+    # Sem raio que caiba no teto e tenha 5 shows: vêm os mais próximos que a busca garantiu, nunca uma amostra de Campinas
+    assert [show.local_nome for show, _ in crud.obter_shows_proximos(db_session, *AVENIDA_PAULISTA, raio_km=200, limit=5)] == ["A", "B", "C"]
+
+
+def test_atualizacao_exige_as_duas_coordenadas(db_session: Session, test_musician: dict):
+    """Testa que atualizar só a latitude (ou só a longitude) é recusado, no schema e contra os valores gravados."""
+    amanha = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    show = crud.criar_show_para_musico(db_session, schemas.ShowCreate(data_hora_evento=amanha, local_nome="MASP", latitude=-23.5614, longitude=-46.6558), test_musician["obj_id"])
+    with pytest.raises(ValidationError):
+        schemas.ShowUpdate(latitude=-23.0)
+    with pytest.raises(ValidationError):
+        schemas.ShowUpdate(latitude=-23.0, longitude=None)
+    assert schemas.ShowUpdate(latitude=None, longitude=None).model_fields_set == {"latitude", "longitude"}  # Remove as duas
+
+    with pytest.raises(ValueError):
+        crud.atualizar_show_do_musico(db_session, show.id, test_musician["obj_id"], schemas.ShowUpdate.model_construct(latitude=None, _fields_set={"latitude"}))
+    assert db_session.get(models.Show, show.id).geocelula is not None
+
+
+def test_endpoint_proximos(test_app_client: TestClient, db_session: Session, test_musician: dict, consultas_sql):
+    """Testa o /shows/proximos: formato da resposta, validação dos parâmetros e duas consultas (candidatos e shows)."""
+    amanha = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    crud.criar_shows_em_lote(db_session, [schemas.ShowCreate(data_hora_evento=amanha, local_nome="MASP", latitude=-23.5614, longitude=-46.6558)], test_musician["obj_id"])
+
+    response = test_app_client.get("/shows/proximos", params={"lat": AVENIDA_PAULISTA[0], "lon": AVENIDA_PAULISTA[1], "raio_km": 5})
+    assert response.status_code == 200, response.json()
+    assert [(item["show"]["local_nome"], item["show"]["musico"]["id"]) for item in response.json()] == [("MASP", test_musician["obj_id"])]
+    assert response.json()[0]["distancia_km"] < 0.1
+    consultas_sql.assert_maximo(2)
+
+    assert test_app_client.get("/shows/proximos", params={"lat": 91, "lon": 0}).status_code == 422
+    assert test_app_client.get("/shows/proximos", params={"lat": 0, "lon": 0, "raio_km": 1000}).status_code == 422
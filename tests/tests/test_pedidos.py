@@ -1,8 +1,11 @@
 # tests/test_pedidos.py
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from app import schemas, crud, models
 import datetime
+import time
 
 # Fixtures: test_app_client, db_session,
 # test_musician, test_musician_token,
@@ -173,4 +176,82 @@ def test_pedir_musica_item_repertorio_invalido(
     }
     response = test_app_client.post("/pedidos/", headers=headers_fan, json=dados_pedido)
     assert response.status_code == 404
-    assert response.json()["detail"] == "Item de repertório não encontrado ou não pertence ao músico especificado"
\ No newline at end of file
+    assert response.json()["detail"] == "Item de repertório não encontrado ou não pertence ao músico especificado"
+
+
+# --- Ordem da fila de pedidos (crud) ---
+
+def _pedido_via_crud(db_session: Session, fan_id: int, musico_id: int, item_id: int) -> models.PedidoMusica:
+    return crud.criar_pedido_musica(
+        db_session, schemas.PedidoMusicaCreate(musico_id=musico_id, item_repertorio_id=item_id), solicitante_id=fan_id
+    )
+
+
+def test_data_hora_pedido_gerada_pelo_banco_a_cada_pedido(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa que cada pedido recebe a hora da gravação (não a hora em que o módulo foi importado)."""
+    item = crud.criar_item_repertorio_para_musico(db_session, schemas.ItemRepertorioCreate(nome_musica="Asa Branca"), test_musician["obj_id"])
+    antes = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(seconds=1)
+
+    primeiro = _pedido_via_crud(db_session, test_fan["id"], test_musician["obj_id"], item.id)
+    time.sleep(0.01)
+    segundo = _pedido_via_crud(db_session, test_fan["id"], test_musician["obj_id"], item.id)
+
+    assert antes <= primeiro.data_hora_pedido < segundo.data_hora_pedido
+    fila = crud.obter_pedidos_para_musico(db_session, musico_id=test_musician["obj_id"])
+    assert [pedido.id for pedido in fila] == [segundo.id, primeiro.id]
+
+
+def test_pedidos_do_mesmo_instante_desempatados_pelo_id(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa que pedidos com a mesma data_hora_pedido saem em ordem estável (id decrescente), inclusive paginados."""
+    item = crud.criar_item_repertorio_para_musico(db_session, schemas.ItemRepertorioCreate(nome_musica="Asa Branca"), test_musician["obj_id"])
+    instante = datetime.datetime(2026, 6, 1, 21, 0)
+    ids = []
+    for _ in range(4):
+        pedido = models.PedidoMusica(solicitante_id=test_fan["id"], musico_id=test_musician["obj_id"], item_repertorio_id=item.id, data_hora_pedido=instante)
+        db_session.add(pedido)
+        db_session.flush()
+        ids.append(pedido.id)
+    db_session.commit()
+
+    pagina_1 = crud.obter_pedidos_para_musico(db_session, musico_id=test_musician["obj_id"], limit=2)
+    pagina_2 = crud.obter_pedidos_para_musico(db_session, musico_id=test_musician["obj_id"], skip=2, limit=2)
+    assert [pedido.id for pedido in pagina_1 + pagina_2] == sorted(ids, reverse=True)
+    historico_do_fan = crud.obter_pedidos_feitos_por_fan(db_session, solicitante_id=test_fan["id"])
+    assert [pedido.id for pedido in historico_do_fan] == sorted(ids, reverse=True)
+
+
+# --- Status do pedido (crud) ---
+
+def test_status_gravado_como_codigo_e_transicoes_validadas(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa o status como SMALLINT no banco e que atendido/recusado são finais."""
+    item = crud.criar_item_repertorio_para_musico(db_session, schemas.ItemRepertorioCreate(nome_musica="Asa Branca"), test_musician["obj_id"])
+    pedido = _pedido_via_crud(db_session, test_fan["id"], test_musician["obj_id"], item.id)
+    assert pedido.status_pedido is models.StatusPedido.PENDENTE
+
+    pedido = crud.atualizar_status_pedido_musica(db_session, pedido, "atendido")
+    codigo = db_session.execute(text("SELECT status_pedido FROM pedidos_musica WHERE id = :id"), {"id": pedido.id}).scalar_one()
+    assert codigo == models.CODIGOS_STATUS_PEDIDO[models.StatusPedido.ATENDIDO]
+    assert schemas.PedidoMusica.model_validate(pedido).model_dump(mode="json")["status_pedido"] == "atendido"
+
+    # Repetir o mesmo status não é erro; voltar atrás ou trocar um status final é
+    assert crud.atualizar_status_pedido_musica(db_session, pedido, models.StatusPedido.ATENDIDO).status_pedido is models.StatusPedido.ATENDIDO
+    with pytest.raises(crud.TransicaoStatusPedidoInvalida):
+        crud.atualizar_status_pedido_musica(db_session, pedido, models.StatusPedido.RECUSADO)
+    with pytest.raises(crud.TransicaoStatusPedidoInvalida):
+        crud.atualizar_status_pedido_musica(db_session, pedido, models.StatusPedido.PENDENTE)
+    with pytest.raises(ValueError):
+        crud.atualizar_status_pedido_musica(db_session, pedido, "hackeado")
+
+
+def test_transicao_concorrente_recusada(db_session: Session, test_musician: dict, test_fan: dict):
+    """Testa que, se outra requisição já mudou o status, a transição feita a partir do status antigo é recusada."""
+    item = crud.criar_item_repertorio_para_musico(db_session, schemas.ItemRepertorioCreate(nome_musica="Asa Branca"), test_musician["obj_id"])
+    pedido = _pedido_via_crud(db_session, test_fan["id"], test_musician["obj_id"], item.id)
+    with Session(bind=db_session.get_bind()) as outra_sessao:
+        crud.atualizar_status_pedido_musica(outra_sessao, outra_sessao.get(models.PedidoMusica, pedido.id), "recusado")
+
+    # db_session ainda enxerga o pedido como pendente
+    with pytest.raises(crud.TransicaoStatusPedidoInvalida):
+        crud.atualizar_status_pedido_musica(db_session, pedido, "atendido")
+    db_session.refresh(pedido)
+    assert pedido.status_pedido is models.StatusPedido.RECUSADO